@@ -7,7 +7,7 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from .models import CardGame, CardStats
-from wallets.models import Wallet
+from wallets.services import InsufficientFunds, credit_winnings, debit_stake, wallet_balances
 
 MIN_BET = Decimal("100.00")
 WIN_PROBABILITY = 0.35  # 35% chance of winning
@@ -62,35 +62,12 @@ def start_card_game(request):
         return Response({'error': 'Invalid grid size'}, status=400)
 
     with transaction.atomic():
-        wallet = Wallet.objects.select_for_update().get(user=request.user)
-
-        # Check combined balance first
-        combined_balance = wallet.balance + wallet.spot_balance
-        
-        if combined_balance < bet_amount:
+        try:
+            wallet = debit_stake(request.user.id, bet_amount, game="cards")
+        except InsufficientFunds:
             return Response({'error': 'Insufficient balance'}, status=400)
-
-        remaining_cost = bet_amount
-        taken_from_wallet = Decimal('0')
-        taken_from_spot = Decimal('0')
-
-        # 1️⃣ Deduct from wallet balance first
-        if wallet.balance > 0:
-            taken_from_wallet = min(wallet.balance, remaining_cost)
-            wallet.balance -= taken_from_wallet
-            remaining_cost -= taken_from_wallet
-
-        # 2️⃣ If still remaining, deduct from spot balance
-        if remaining_cost > 0 and wallet.spot_balance > 0:
-            taken_from_spot = min(wallet.spot_balance, remaining_cost)
-            wallet.spot_balance -= taken_from_spot
-            remaining_cost -= taken_from_spot
-
-        # This should not happen since we checked combined balance, but keep as safety
-        if remaining_cost > 0:
-            return Response({'error': 'Insufficient funds'}, status=400)
-
-        wallet.save(update_fields=["balance", "spot_balance"])
+        except ValueError as e:
+            return Response({'error': str(e)}, status=409)
 
         cards = create_card_deck(grid_size)
 
@@ -113,8 +90,8 @@ def start_card_game(request):
             'spot_balance': float(wallet.spot_balance),
             'combined_balance': float(wallet.balance + wallet.spot_balance),
             'deduction_breakdown': {
-                'from_wallet': float(taken_from_wallet),
-                'from_spot': float(taken_from_spot)
+                'from_wallet': float(wallet.taken_from_wallet),
+                'from_spot': float(wallet.taken_from_spot)
             }
         })
 
@@ -130,7 +107,6 @@ def reveal_card(request):
         return Response({'error': 'Invalid parameters'}, status=400)
 
     with transaction.atomic():
-        wallet = Wallet.objects.select_for_update().get(user=request.user)
         game = CardGame.objects.select_for_update().get(
             id=game_id,
             user=request.user,
@@ -152,6 +128,7 @@ def reveal_card(request):
         # FIRST PICK
         if len(revealed) % 2 == 1:
             game.save()
+            wallet = wallet_balances(request.user.id)
             return Response({
                 'card_value': cards[card_index],
                 'match_found': None,
@@ -184,8 +161,7 @@ def reveal_card(request):
                 win_amount = (game.bet_amount * win_ratio).quantize(Decimal("0.01"))
                 
                 # Credit winnings to spot_balance
-                wallet.spot_balance += win_amount
-                wallet.save(update_fields=["spot_balance"])
+                wallet = credit_winnings(request.user.id, win_amount, game="cards")
 
                 game.status = 'completed'
                 game.win_amount = win_amount
@@ -229,6 +205,7 @@ def reveal_card(request):
                 })
 
             game.save()
+            wallet = wallet_balances(request.user.id)
             return Response({
                 'card_value': cards[card_index],
                 'match_found': True,
@@ -243,6 +220,7 @@ def reveal_card(request):
         if game.attempts >= 3:
             game.status = 'failed'
             game.save()
+            wallet = wallet_balances(request.user.id)
             return Response({
                 'card_value': cards[card_index],
                 'match_found': False,
@@ -252,6 +230,7 @@ def reveal_card(request):
             })
 
         game.save()
+        wallet = wallet_balances(request.user.id)
         return Response({
             'card_value': cards[card_index],
             'match_found': False,
@@ -355,7 +334,6 @@ def cash_out_early(request):
         return Response({'error': 'Invalid game ID'}, status=400)
 
     with transaction.atomic():
-        wallet = Wallet.objects.select_for_update().get(user=request.user)
         game = CardGame.objects.select_for_update().get(
             id=game_id,
             user=request.user,
@@ -374,8 +352,7 @@ def cash_out_early(request):
         win_amount = (game.bet_amount * win_ratio).quantize(Decimal("0.01"))
         
         # Credit to spot_balance
-        wallet.spot_balance += win_amount
-        wallet.save(update_fields=["spot_balance"])
+        wallet = credit_winnings(request.user.id, win_amount, game="cards")
 
         game.status = 'failed'  # Mark as failed since not completed
         game.win_amount = win_amount
@@ -6,7 +6,7 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from django.db import transaction
 from .models import ColorSwitchGame, ColorSwitchStats
-from wallets.models import Wallet
+from wallets.services import InsufficientFunds, credit_winnings, debit_stake, wallet_balances
 
 logger = logging.getLogger(__name__)
 
@@ -71,39 +71,13 @@ def start_color_switch(request):
         return Response({'error': 'Sequence length must be between 3-15'}, status=400)
 
     with transaction.atomic():
-        wallet = Wallet.objects.select_for_update().get(user=request.user)
-        logger.info(f"Wallet retrieved: balance={wallet.balance}, spot={wallet.spot_balance}")
-        
-        # Check combined balance first
-        combined_balance = wallet.balance + wallet.spot_balance
-        
-        logger.info(f"Combined balance: {combined_balance}, Bet amount: {bet_amount}")
-        
-        if combined_balance < bet_amount:
-            logger.warning(f"Insufficient balance: {combined_balance} < {bet_amount}")
+        try:
+            wallet = debit_stake(request.user.id, bet_amount, game="colorswitch")
+        except InsufficientFunds:
             return Response({'error': 'Insufficient balance'}, status=400)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=409)
 
-        remaining_cost = bet_amount
-        taken_from_wallet = Decimal('0')
-        taken_from_spot = Decimal('0')
-        
-        logger.info(f"Before deduction - Balance: {wallet.balance}, Spot: {wallet.spot_balance}")
-
-        # 1️⃣ Deduct from wallet balance first
-        if wallet.balance > 0:
-            taken_from_wallet = min(wallet.balance, remaining_cost)
-            wallet.balance -= taken_from_wallet
-            remaining_cost -= taken_from_wallet
-            logger.info(f"Deducted from wallet: {taken_from_wallet}")
-
-        # 2️⃣ If still remaining, deduct from spot balance
-        if remaining_cost > 0 and wallet.spot_balance > 0:
-            taken_from_spot = min(wallet.spot_balance, remaining_cost)
-            wallet.spot_balance -= taken_from_spot
-            remaining_cost -= taken_from_spot
-            logger.info(f"Deducted from spot: {taken_from_spot}")
-            
-        wallet.save(update_fields=["balance", "spot_balance"])
         logger.info(f"After deduction - Balance: {wallet.balance}, Spot: {wallet.spot_balance}")
 
         # Create wallet transaction
@@ -140,8 +114,8 @@ def start_color_switch(request):
             "spot_balance": float(wallet.spot_balance),
             "combined_balance": float(wallet.balance + wallet.spot_balance),
             "deduction_breakdown": {
-                "from_wallet": float(taken_from_wallet),
-                "from_spot": float(taken_from_spot)
+                "from_wallet": float(wallet.taken_from_wallet),
+                "from_spot": float(wallet.taken_from_spot)
             }
         })
 
@@ -153,7 +127,6 @@ def submit_sequence(request):
     player_sequence = request.data.get("player_sequence", [])
 
     with transaction.atomic():
-        wallet = Wallet.objects.select_for_update().get(user=request.user)
         game = ColorSwitchGame.objects.select_for_update().get(
             id=game_id, user=request.user, status__in=["playing", "showing"]
         )
@@ -169,6 +142,7 @@ def submit_sequence(request):
             stats.longest_sequence = max(stats.longest_sequence, game.sequence_length)
             stats.save()
 
+            wallet = wallet_balances(request.user.id)
             return Response({
                 "status": "lost",
                 "correct": False,
@@ -211,6 +185,7 @@ def submit_sequence(request):
         game.status = "showing"
         game.save()
 
+        wallet = wallet_balances(request.user.id)
         return Response({
             "status": "correct",
             "correct": True,
@@ -230,7 +205,6 @@ def cash_out_colors(request):
     game_id = request.data.get("game_id")
 
     with transaction.atomic():
-        wallet = Wallet.objects.select_for_update().get(user=request.user)
         game = ColorSwitchGame.objects.select_for_update().get(
             id=game_id, user=request.user, status="showing"
         )
@@ -263,8 +237,7 @@ def cash_out_colors(request):
                 win_tier = "mega_jackpot"
 
         # Credit winnings to spot_balance
-        wallet.spot_balance += win_amount
-        wallet.save(update_fields=["spot_balance"])
+        wallet = credit_winnings(request.user.id, win_amount, game="colorswitch")
 
         game.win_amount = win_amount
         game.win_ratio = win_ratio
@@ -0,0 +1,415 @@
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.utils import timezone
+
+from . import metrics
+from .autocashout import AutoCashoutBook
+from .capture import record_room
+from .checkpoint import EngineCheckpoint, PHASE_SETTLED
+from .curve import curve_params, flight_elapsed, multiplier_at, time_to_reach
+from .engine import (
+    BETTING_DURATION, COUNTDOWN_INTERVAL, TICK_INTERVAL, COOLDOWN_DURATION, auto_cashout_items, bet_feed_items,
+    create_new_round, write_intake,
+)
+from .feed import PlayerFeed
+from .history import RoundHistory, round_summary, phase_snapshot, PHASE_BETTING, PHASE_RUNNING, PHASE_CRASHED
+from .intake import BetIntake, FINAL_FLUSH_ATTEMPTS, INTAKE_FLUSH_INTERVAL
+from .models import GameRound, RiskSettings
+from .protocol import DEFAULT_ROOM, SYNC_INTERVAL, PROTOCOL_SPARSE, group_name, room_groups, user_group
+from wallets.services import settle_lost_bets_bulk, settle_auto_cashouts_atomic
+
+logger = logging.getLogger(__name__)
+
+HEARTBEAT_CHECK_INTERVAL = 5  # seconds
+
+# room -> the one thread that room's database calls run in
+_room_executors = {}
+
+
+def room_database(room: str):
+    """
+    database_sync_to_async for one room's engine. Each room gets a worker
+    thread (and database connection) of its own instead of sharing Channels'
+    single thread-sensitive one, so a slow settlement in one room does not
+    hold up the bet writes of the others. Calls within a room still run one
+    at a time, in order. Stale connections are closed before and after
+    every call, as database_sync_to_async does.
+    """
+    executor = _room_executors.get(room)
+    if executor is None:
+        executor = _room_executors.setdefault(
+            room, ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"crash-db-{room}")
+        )
+    return lambda func: database_sync_to_async(func, thread_sensitive=False, executor=executor)
+
+
+def _save_round(round_obj: GameRound, **fields):
+    for name, value in fields.items():
+        setattr(round_obj, name, value)
+    round_obj.save(update_fields=list(fields))
+
+
+def _push_history(history: RoundHistory, round_obj: GameRound):
+    history.push(round_summary(round_obj))
+
+
+def _load_flight(round_obj: GameRound):
+    return AutoCashoutBook.for_round(round_obj), RiskSettings.get().max_win_per_bet
+
+
+class AsyncRound:
+    """
+    One crash round driven from a single event loop.
+
+    Every broadcast goes through the same channel layer on the same loop, so
+    the Redis connection is reused for the whole engine lifetime. Ticks are
+    scheduled against loop.time() (monotonic) at fixed offsets from the start
+    of the flight: a late tick does not push the following ones back, and if
+    the loop falls more than a tick behind the missed ticks are skipped
+    instead of being sent in a burst.
+    """
+
+    def __init__(self, round_obj: GameRound, channel_layer=None, heartbeat=None):
+        self.round = round_obj
+        self.layer = channel_layer or get_channel_layer()
+        self.heartbeat = heartbeat
+        self.room = round_obj.room_key
+        self.db = room_database(self.room)
+        self.dense_group = group_name(self.room)
+        self.sparse_group = group_name(self.room, PROTOCOL_SPARSE)
+        self.history = RoundHistory(self.room)
+        self.checkpoint = EngineCheckpoint(self.room)
+        self.intake = BetIntake(round_obj.id)
+        self.feed = PlayerFeed(self.room, round_obj.id)
+        self.channels = {}  # user id -> channel name of the socket the bet came from
+        self.tick_lags = []
+        self._last_heartbeat = time.monotonic()
+
+    async def send(self, group, type_, data):
+        with metrics.broadcast(self.room):
+            await self.layer.group_send(group, {"type": type_, "data": data})
+
+    async def send_room(self, type_, data):
+        """Room-wide events go to the groups of every protocol"""
+        record_room(self.room, type_, data)
+        for group in room_groups(self.room):
+            await self.send(group, type_, data)
+
+    async def send_player(self, user_id, type_, data, channel=None):
+        """
+        Through the user group to every socket of the bettor; the one the
+        bet came from gets it straight away first (see engine.send_player)
+        """
+        message = {"type": type_, "data": data}
+        channel = channel or self.channels.get(user_id)
+        with metrics.broadcast(self.room):
+            if channel:
+                await self.layer.send(channel, message)
+                message = {**message, "sent_to": channel}
+            await self.layer.group_send(user_group(user_id, self.room), message)
+
+    async def send_feed(self):
+        data = await sync_to_async(self.feed.collect, thread_sensitive=False)()
+        if data:
+            await self.send_room("player.feed", data)
+
+    async def set_phase(self, phase, **extra):
+        snapshot = phase_snapshot(self.round, phase, **extra)
+        await sync_to_async(self.history.set_phase, thread_sensitive=False)(snapshot)
+        await self.save_checkpoint(phase)
+
+    async def save_checkpoint(self, phase):
+        await sync_to_async(self.checkpoint.save, thread_sensitive=False)(self.round, phase)
+
+    async def check_heartbeat(self):
+        if not self.heartbeat:
+            return
+        now = time.monotonic()
+        if now - self._last_heartbeat >= HEARTBEAT_CHECK_INTERVAL:
+            # Redis round trip, keep it off the loop
+            await sync_to_async(self.heartbeat.tick, thread_sensitive=False)()
+            self._last_heartbeat = now
+
+    async def sleep_until(self, deadline: float):
+        loop = asyncio.get_running_loop()
+        delay = deadline - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return loop.time() - deadline
+
+    async def run(self):
+        """A round taken over from a dead engine skips the phases it already went through"""
+        cpu_start = time.process_time()
+        report = metrics.RoundReport(self.room)
+
+        if self.round.status == "PENDING":
+            await self.betting_phase()
+        await self.flight_phase()
+        lost = await self.crash_and_settle()
+        await self.cooldown_phase(lost)
+
+        logger.info(f"{report.line(self.round)}, cpu={(time.process_time() - cpu_start) * 1000:.1f}ms")
+
+    # 1️⃣ BETTING PHASE
+    async def betting_phase(self):
+        round_obj = self.round
+        await self.check_heartbeat()
+
+        await self.send_room("round.start", {
+            "round_id": round_obj.id,
+            "betting_duration": BETTING_DURATION,
+            "server_seed_hash": round_obj.server_seed_hash,
+        })
+        with metrics.db_write(self.room, "betting"):
+            await self.save_round(status="PENDING")
+
+        loop = asyncio.get_running_loop()
+        betting_end = loop.time() + BETTING_DURATION
+        await self.set_phase(PHASE_BETTING, betting_ends_at=int((time.time() + BETTING_DURATION) * 1000))
+        next_at = next_countdown = loop.time()
+        while next_at < betting_end:
+            await self.check_heartbeat()
+            if loop.time() >= next_countdown:
+                await self.send_room("round.countdown", {
+                    "remaining": max(0.0, betting_end - loop.time()),
+                })
+                next_countdown += COUNTDOWN_INTERVAL
+            # Queued bets are written in batches while the window is open;
+            # a failed batch stays queued for the next pass
+            try:
+                await self.flush_bets()
+            except Exception as e:
+                logger.error(f"[CRASH] Bet flush failed, retrying: {e}")
+            if self.feed.due():
+                await self.send_feed()
+            next_at += INTAKE_FLUSH_INTERVAL
+            await self.sleep_until(min(next_at, betting_end))
+
+        await self.close_betting()
+        await self.send_feed()
+
+    # Round storage. DemoAsyncRound (crash/demo.py) keeps all of it in Redis instead.
+    async def save_round(self, **fields):
+        await self.db(_save_round)(self.round, **fields)
+
+    async def flush_bets(self):
+        # Redis + bulk inserts in the DB thread; the confirmations go out from the loop
+        written, dropped = await self.db(write_intake)(self.room, self.intake)
+        for entry, bet in written:
+            if entry.get("channel"):
+                self.channels[entry["user_id"]] = entry["channel"]
+            await self.send_player(entry["user_id"], "bet.confirmed", {"ref": entry["ref"], "bet_id": bet.id})
+        for entry in dropped:
+            await self.send_player(
+                entry["user_id"],
+                "bet.rejected",
+                {"ref": entry["ref"], "bet_amount": entry["amount"]},
+                channel=entry.get("channel"),
+            )
+        if written:
+            self.feed.add_bets(bet_feed_items(written))
+
+    async def close_betting(self):
+        # No bet gets queued after this; write the rest before locking
+        await sync_to_async(self.intake.close, thread_sensitive=False)()
+        for attempt in range(1, FINAL_FLUSH_ATTEMPTS + 1):
+            try:
+                await self.flush_bets()
+                return
+            except Exception as e:
+                # Out of attempts: the batch is still queued for recover_open_rounds()
+                if attempt == FINAL_FLUSH_ATTEMPTS:
+                    raise
+                logger.error(f"[CRASH] Final bet flush failed (attempt {attempt}): {e}")
+                await asyncio.sleep(INTAKE_FLUSH_INTERVAL)
+
+    async def load_flight(self):
+        """(AutoCashoutBook, max win per bet) once bets are locked"""
+        return await self.db(_load_flight)(self.round)
+
+    async def settle_auto_cashouts(self, due, ceiling, max_win):
+        return await self.db(settle_auto_cashouts_atomic)(due, ceiling=ceiling, max_win=max_win)
+
+    async def settle_lost(self):
+        """Lose every open bet and mark the round SETTLED; returns (bet_id, user_id, amount) per lost bet"""
+        # Runs in the DB thread; the heartbeat is renewed from there between audit batches
+        on_progress = self.heartbeat.tick if self.heartbeat else None
+        lost = await self.db(settle_lost_bets_bulk)(self.round, on_progress=on_progress)
+        await self.save_round(status="SETTLED")
+        return lost
+
+    async def push_history(self):
+        await self.db(_push_history)(self.history, self.round)
+
+    # 2️⃣ LOCK BETS → 3️⃣ FLIGHT PHASE
+    async def flight_phase(self):
+        round_obj = self.round
+        await self.check_heartbeat()
+
+        if round_obj.status == "PENDING":
+            with metrics.db_write(self.room, "lock"):
+                await self.save_round(status="RUNNING", started_at=timezone.now())
+        if round_obj.status == "RUNNING":
+            await self.set_phase(PHASE_RUNNING)
+            await self.send_room("round.lock_bets", {
+                "round_id": round_obj.id,
+                # Sparse clients draw the curve from these
+                "started_at": int(round_obj.started_at.timestamp() * 1000),
+                "curve": curve_params(),
+            })
+
+        auto_cashouts, max_win = await self.load_flight()
+
+        loop = asyncio.get_running_loop()
+        # started_at on the loop clock, so a resumed flight carries on from where it was
+        start = loop.time() - flight_elapsed(round_obj.started_at)
+        # The last tick lands on the crash itself, where the consumers stop accepting cashouts
+        crash_at = start + time_to_reach(round_obj.crash_point)
+        tick = 0
+        next_sync = start
+
+        while True:
+            await self.check_heartbeat()
+
+            elapsed = loop.time() - start
+            multiplier = multiplier_at(elapsed)
+            crashed = multiplier >= round_obj.crash_point
+            if crashed:
+                multiplier = round_obj.crash_point
+
+            due = auto_cashouts.pop_due(multiplier, round_obj.crash_point)
+            if due:
+                settle_start = time.perf_counter()
+                with metrics.db_write(self.room, "flight"):
+                    results = await self.settle_auto_cashouts(due, multiplier, max_win)
+                metrics.bets_settled(self.room, "auto_cashout", len(results), time.perf_counter() - settle_start)
+                if results:
+                    await self.broadcast_auto_cashouts(results)
+            if crashed or self.feed.due():
+                await self.send_feed()
+
+            if settings.CRASH_LEGACY_TICKS:
+                await self.send(self.dense_group, "round.multiplier", {"multiplier": str(multiplier)})
+
+            # Sparse clients interpolate; they only need a periodic correction
+            if not crashed and loop.time() >= next_sync:
+                await self.send(self.sparse_group, "round.sync", {
+                    "multiplier": str(multiplier),
+                    "elapsed": elapsed,
+                    "server_time": int(time.time() * 1000),
+                })
+                next_sync += SYNC_INTERVAL
+
+            if crashed:
+                return
+
+            tick += 1
+            next_at = start + tick * TICK_INTERVAL
+            now = loop.time()
+            if next_at < now:
+                # Fell behind: drop the missed ticks instead of bursting them
+                tick = int((now - start) / TICK_INTERVAL) + 1
+                next_at = start + tick * TICK_INTERVAL
+            lag = await self.sleep_until(min(next_at, crash_at))
+            self.tick_lags.append(lag)
+            metrics.TICK_LAG.observe(lag, room=self.room)
+
+    async def broadcast_auto_cashouts(self, results):
+        self.feed.add_cashouts(auto_cashout_items(results))
+        for result in results:
+            await self.send_player(result["user_id"], "bet.auto.cashout", {
+                "bet_id": result["bet_id"],
+                "multiplier": str(result["multiplier"]),
+                "payout": str(result["payout"]),
+                "balance": str(result["wallet_balance"]),
+            })
+
+    # 4️⃣ CRASH → 5️⃣ SETTLE LOSERS
+    async def crash_and_settle(self):
+        round_obj = self.round
+        await self.check_heartbeat()
+
+        if round_obj.status == "RUNNING":
+            with metrics.db_write(self.room, "crash"):
+                await self.save_round(status="CRASHED", crashed_at=timezone.now())
+        await self.set_phase(PHASE_CRASHED)
+        await self.send_room("round.crash", {
+            "round_id": round_obj.id,
+            "crash_point": str(round_obj.crash_point),
+            "server_seed": round_obj.server_seed,
+            "client_seed": round_obj.client_seed,
+            "nonce": round_obj.nonce,
+        })
+
+        settle_start = time.perf_counter()
+        with metrics.db_write(self.room, "settle"):
+            lost = await self.settle_lost()
+        metrics.bets_settled(self.room, "lost", len(lost), time.perf_counter() - settle_start)
+        await self.push_history()
+        await self.save_checkpoint(PHASE_SETTLED)
+        return lost
+
+    # 6️⃣ COOLDOWN
+    async def cooldown_phase(self, lost):
+        round_obj = self.round
+        loop = asyncio.get_running_loop()
+        cooldown_end = loop.time() + COOLDOWN_DURATION
+
+        for bet_id, user_id, amount in lost:
+            await self.send_player(user_id, "bet.crashed", {
+                "bet_id": bet_id,
+                "crash_multiplier": str(round_obj.crash_point),
+                "lost_amount": str(amount),
+            })
+
+        while loop.time() < cooldown_end:
+            await self.check_heartbeat()
+            await self.sleep_until(min(loop.time() + COUNTDOWN_INTERVAL, cooldown_end))
+        await self.check_heartbeat()
+
+
+async def run_single_round_async(round_obj: GameRound, heartbeat=None, channel_layer=None):
+    """
+    Asyncio counterpart of engine.run_single_round().
+    heartbeat (optional): LockHeartbeat instance to keep Redis lock alive.
+    """
+    await AsyncRound(round_obj, channel_layer=channel_layer, heartbeat=heartbeat).run()
+
+
+async def run_engine_async(
+    is_demo: bool,
+    heartbeat=None,
+    seeds=None,
+    is_running=lambda: True,
+    on_round=None,
+    room: str = DEFAULT_ROOM,
+    channel_layer=None,
+    resume=None,
+):
+    """
+    Round loop for `run_crash_engine --async`: one event loop, one channel layer.
+    Several rooms can run on the same loop, one call per room.
+    resume (optional): round from engine.take_over_round() to finish first.
+    """
+    channel_layer = channel_layer or get_channel_layer()
+
+    while is_running():
+        if heartbeat:
+            await sync_to_async(heartbeat.tick, thread_sensitive=False)()
+
+        round_start = time.monotonic()
+        round_obj = resume or await room_database(room)(create_new_round)(
+            is_demo=is_demo, seeds=seeds, room=room
+        )
+        resume = None
+        await run_single_round_async(round_obj, heartbeat=heartbeat, channel_layer=channel_layer)
+
+        if on_round:
+            on_round(round_obj, time.monotonic() - round_start)
@@ -0,0 +1,44 @@
+from bisect import bisect_left, bisect_right
+from decimal import Decimal
+
+from .models import CrashBet
+
+
+class AutoCashoutBook:
+    """
+    In-memory index of a round's auto-cashout targets, sorted by multiplier.
+
+    Built once when bets lock. Each tick pops only the targets the curve has
+    crossed since the previous tick, so the cost per tick is proportional to
+    the number of bets being cashed out.
+    """
+
+    def __init__(self, entries):
+        entries = sorted(entries)
+        self._targets = [target for target, _ in entries]
+        self._bet_ids = [bet_id for _, bet_id in entries]
+        self._cursor = 0
+
+    @classmethod
+    def for_round(cls, round_obj):
+        rows = CrashBet.objects.filter(
+            round=round_obj,
+            status="ACTIVE",
+            auto_cashout__isnull=False,
+        ).values_list("auto_cashout", "id")
+        return cls(rows)
+
+    def __len__(self):
+        return len(self._targets) - self._cursor
+
+    def pop_due(self, multiplier: Decimal, crash_point: Decimal):
+        """
+        Return the bet ids whose target is <= multiplier.
+        Targets at or above the crash point never win.
+        """
+        end = bisect_right(self._targets, multiplier, lo=self._cursor)
+        end = min(end, bisect_left(self._targets, crash_point, lo=self._cursor))
+
+        due = self._bet_ids[self._cursor:end]
+        self._cursor = max(self._cursor, end)
+        return due
@@ -0,0 +1,147 @@
+"""
+Throwaway fixtures and timing helpers for the crash benchmark commands.
+
+Everything a benchmark creates lives inside rolled_back(), so running one
+against a real database leaves no rows behind.
+"""
+import asyncio
+import statistics
+import time
+from collections import Counter
+from contextlib import contextmanager
+from decimal import Decimal
+
+from channels.layers import InMemoryChannelLayer
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import UNUSABLE_PASSWORD_PREFIX, make_password
+from django.db import transaction
+
+from wallets.models import Wallet
+from .models import GameRound, CrashBet
+from .protocol import DEFAULT_ROOM
+
+
+class _Rollback(Exception):
+    pass
+
+
+class RecordingChannelLayer(InMemoryChannelLayer):
+    """
+    In-memory layer that timestamps every round.multiplier broadcast and
+    optionally adds a fixed delay per send to stand in for the Redis round trip.
+    """
+
+    def __init__(self, send_latency=0.0, **kwargs):
+        super().__init__(**kwargs)
+        self.send_latency = send_latency
+        self.tick_times = []
+        self.flight_sends = Counter()
+
+    async def group_send(self, group, message):
+        if message["type"] == "round.multiplier":
+            self.tick_times.append(time.monotonic())
+        if message["type"] in ("round.multiplier", "round.sync"):
+            self.flight_sends[group] += 1
+        if self.send_latency:
+            await asyncio.sleep(self.send_latency)
+        await super().group_send(group, message)
+
+
+@contextmanager
+def rolled_back():
+    try:
+        with transaction.atomic():
+            yield
+            raise _Rollback
+    except _Rollback:
+        pass
+
+
+@contextmanager
+def timed(results: dict, key: str):
+    start = time.perf_counter()
+    yield
+    results[key] = time.perf_counter() - start
+
+
+def percentile(values, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(values) -> str:
+    if not values:
+        return "n=0"
+    return (
+        f"n={len(values)} mean={statistics.fmean(values) * 1000:.2f}ms "
+        f"p50={percentile(values, 50) * 1000:.2f}ms "
+        f"p99={percentile(values, 99) * 1000:.2f}ms"
+    )
+
+
+# Users made by make_users() carry this email domain and an unusable
+# password, so cleanups can tell them from real accounts
+BENCH_EMAIL_DOMAIN = "bench.invalid"
+
+
+def bench_users(prefix="bench"):
+    """The users make_users(prefix=...) created, and nobody else"""
+    return get_user_model().objects.filter(
+        username__startswith=f"{prefix}_",
+        email__endswith=f"@{BENCH_EMAIL_DOMAIN}",
+        password__startswith=UNUSABLE_PASSWORD_PREFIX,
+    )
+
+
+def make_users(count: int, balance=Decimal("100000.00"), prefix="bench"):
+    User = get_user_model()
+    User.objects.bulk_create(
+        [
+            User(
+                username=f"{prefix}_{i}",
+                email=f"{prefix}_{i}@{BENCH_EMAIL_DOMAIN}",
+                password=make_password(None),
+                user_uid=f"Z{i:07d}",
+            )
+            for i in range(count)
+        ],
+        batch_size=1000,
+    )
+    users = list(bench_users(prefix).order_by("id"))
+    Wallet.objects.bulk_create(
+        [Wallet(user=user, balance=balance) for user in users],
+        batch_size=1000,
+    )
+    return users
+
+
+def make_round(status="RUNNING", crash_point=Decimal("2.00"), is_demo=False, room=DEFAULT_ROOM):
+    return GameRound.objects.create(
+        server_seed="bench",
+        server_seed_hash="bench",
+        client_seed="bench",
+        nonce=0,
+        crash_point=crash_point,
+        status=status,
+        is_demo=is_demo,
+        room=room,
+    )
+
+
+def make_bets(round_obj, users, amount=Decimal("100.00"), status="ACTIVE"):
+    CrashBet.objects.bulk_create(
+        [
+            CrashBet(
+                user=user,
+                round=round_obj,
+                bet_amount=amount,
+                status=status,
+                is_demo=round_obj.is_demo,
+            )
+            for user in users
+        ],
+        batch_size=1000,
+    )
@@ -0,0 +1,135 @@
+"""
+Traffic capture of the crash websocket, replayed by replay_crash_traffic.
+
+With CRASH_CAPTURE_DIR set, every CrashConsumer records what it receives
+and sends, and the engine records its room-wide events, as one JSON line
+per message:
+
+    {"t": epoch seconds, "k": kind, "s": socket, "u": user id, "r": room key,
+     "e": event, "d": data}
+
+kind is one of:
+    conn    socket accepted; d = {"mode", "room", "protocol"}
+    in      client -> server message
+    out     server -> client message
+    close   socket closed
+    room    engine broadcast to the whole room (round.start, round.crash, ...)
+
+Per-tick multiplier frames are left out unless CRASH_CAPTURE_TICKS is set:
+they are most of the volume and the replayed engine sends its own.
+
+Lines are queued and written by a background thread, so recording never
+blocks the event loop. Each process writes its own file, one per hour:
+    <CRASH_CAPTURE_DIR>/crash-<host>-<pid>-<YYYYMMDDHH>.jsonl.gz
+"""
+import atexit
+import gzip
+import json
+import os
+import queue
+import socket
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+
+TICK_EVENTS = {"multiplier_update", "multiplier_sync", "round.multiplier", "round.sync"}
+FLUSH_INTERVAL = 1.0  # seconds
+
+_recorder = None
+_recorder_lock = threading.Lock()
+
+
+class TrafficRecorder:
+    def __init__(self, directory, ticks: bool = False):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.ticks = ticks
+        self._queue = queue.SimpleQueue()
+        self._file = None
+        self._hour = None
+        self._thread = threading.Thread(target=self._write_loop, name="crash-capture", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def record(self, kind, socket_id=None, user_id=None, room=None, event=None, data=None):
+        if not self.ticks and event in TICK_EVENTS:
+            return
+        now = time.time()
+        # Serialized right away: data may be reused once this returns. Decimals
+        # and datetimes are written as strings.
+        line = json.dumps(
+            {"t": round(now, 4), "k": kind, "s": socket_id, "u": user_id, "r": room, "e": event, "d": data},
+            separators=(",", ":"),
+            default=str,
+        )
+        self._queue.put((now, line))
+
+    def _path(self, hour):
+        return self.directory / f"crash-{socket.gethostname()}-{os.getpid()}-{hour}.jsonl.gz"
+
+    def _write_loop(self):
+        while True:
+            try:
+                item = self._queue.get(timeout=FLUSH_INTERVAL)
+            except queue.Empty:
+                if self._file:
+                    self._file.flush()
+                continue
+            if item is None:
+                break
+            now, line = item
+            hour = time.strftime("%Y%m%d%H", time.gmtime(now))
+            if hour != self._hour:
+                if self._file:
+                    self._file.close()
+                self._file = gzip.open(self._path(hour), "at", encoding="utf-8")
+                self._hour = hour
+            self._file.write(line + "\n")
+        if self._file:
+            self._file.close()
+            self._file = None
+
+    def close(self):
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join(timeout=5)
+
+
+def recorder():
+    """The process's TrafficRecorder, or None when capture is off"""
+    global _recorder
+    if not settings.CRASH_CAPTURE_DIR:
+        return None
+    if _recorder is None:
+        with _recorder_lock:
+            if _recorder is None:
+                _recorder = TrafficRecorder(settings.CRASH_CAPTURE_DIR, ticks=settings.CRASH_CAPTURE_TICKS)
+    return _recorder
+
+
+def record_room(room, event, data):
+    """Engine side: a room-wide broadcast"""
+    rec = recorder()
+    if rec:
+        rec.record("room", room=room, event=event, data=data)
+
+
+def read_capture(paths):
+    """Records of capture files (plain or gzipped), in time order"""
+    records = []
+    for path in paths:
+        path = Path(path)
+        opener = gzip.open if path.suffix == ".gz" else open
+        with opener(path, "rt", encoding="utf-8") as fh:
+            try:
+                for line in fh:
+                    line = line.strip()
+                    if line:
+                        records.append(json.loads(line))
+            except (EOFError, ValueError):
+                # Tail of a file whose process died mid-write
+                pass
+    records.sort(key=lambda record: record["t"])
+    return records
@@ -0,0 +1,50 @@
+"""
+Engine checkpoint for hot-standby failover.
+
+The engine holding a room's lock writes one small record per phase change:
+
+    crash:checkpoint:<room>  {"round_id", "phase", "started_at", "written_at", ...}
+
+A standby that takes the lock over reads it to find the round the previous
+engine left behind and whether that round can be resumed (see
+engine.take_over_round()). Times are epoch milliseconds, so two hosts only
+need reasonably synced clocks.
+"""
+import json
+import time
+
+from .history import PHASE_BETTING, PHASE_RUNNING, PHASE_CRASHED  # noqa: F401
+from .redis_lock import shared_redis
+
+PHASE_SETTLED = "settled"
+
+CHECKPOINT_TTL = 24 * 3600  # seconds
+
+
+def now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+class EngineCheckpoint:
+    def __init__(self, room, client=None):
+        """room: room key, see protocol.room_key()"""
+        self.room = room
+        self.r = client or shared_redis()
+        self.key = f"crash:checkpoint:{room}"
+
+    def save(self, round_obj, phase: str, **extra):
+        record = {
+            "round_id": round_obj.id,
+            "phase": phase,
+            "started_at": int(round_obj.started_at.timestamp() * 1000) if round_obj.started_at else None,
+            "written_at": now_ms(),
+        }
+        record.update(extra)
+        self.r.set(self.key, json.dumps(record), ex=CHECKPOINT_TTL)
+
+    def load(self):
+        raw = self.r.get(self.key)
+        return json.loads(raw) if raw else None
+
+    def clear(self):
+        self.r.delete(self.key)
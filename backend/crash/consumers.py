@@ -1,6 +1,10 @@
 import json
+import time
+import uuid
 from decimal import Decimal
+from urllib.parse import parse_qs
 from channels.generic.websocket import AsyncJsonWebsocketConsumer
+from asgiref.sync import sync_to_async
 from channels.db import database_sync_to_async
 from django.utils import timezone
 from django.db import transaction, DatabaseError, models
@@ -8,12 +12,29 @@ from django.conf import settings
 from django.core.cache import cache
 import logging
 
-from .models import GameRound, CrashBet, RiskSettings
-from wallets.services import place_bet_atomic, cashout_atomic, process_auto_cashout
-from wallets.models import Wallet
+from .models import GameRound, CrashBet
+from .capture import recorder
+from .curve import curve_params, multiplier_since
+from .demo import DemoStore, redis_demo
+from .feed import push_cashout
+from .history import RoundHistory, PHASE_RUNNING, PHASE_CRASHED
+from .intake import BetIntake, bet_lookup, bet_reference
+from .ledger import RoundLedger, ALREADY_BET, PLAYER_LIMIT, EXPOSURE_LIMIT
+from .protocol import DEFAULT_ROOM, PROTOCOL_DENSE, PROTOCOLS, group_name, room_key, user_group
+from .ratelimit import ACTION_BET, ACTION_CASHOUT, RateLimited, buckets_for, load_limits, risk_settings, take
+from wallets.services import cashout_atomic, reserve_bet_funds, release_bet_funds
 
 logger = logging.getLogger(__name__)
 
+CONNECT_HISTORY = 20  # recent rounds sent with the connect handshake
+
+# Rate limited events: bucket, and the event answering a rejected message
+LIMITED_EVENTS = {
+    "place_bet": (ACTION_BET, "bet_failed"),
+    "cashout": (ACTION_CASHOUT, "cashout_failed"),
+    "cancel_auto_cashout": (ACTION_CASHOUT, "cancel_auto_cashout_failed"),
+}
+
 class CrashConsumer(AsyncJsonWebsocketConsumer):
     async def connect(self):
         if self.scope["user"].is_anonymous:
@@ -21,45 +42,83 @@ class CrashConsumer(AsyncJsonWebsocketConsumer):
             return
 
         self.user = self.scope["user"]
-        self.mode = self.scope["url_route"]["kwargs"]["mode"]
+        kwargs = self.scope["url_route"]["kwargs"]
+        self.mode = kwargs["mode"]
         self.is_demo = self.mode == "demo"
-        self.group_name = f"crash_{self.mode}"
-        self.user_group_name = f"crash_user_{self.user.id}_{self.mode}"
+        # ws/crash/<mode>/<room>/ → one of several rooms hosted by the engine
+        self.room_name = kwargs.get("room", DEFAULT_ROOM)
+        try:
+            self.room = room_key(self.mode, self.room_name)
+        except ValueError:
+            await self.close()
+            return
+        # ?protocol=sparse → no per-tick multiplier, the client interpolates the curve
+        query = parse_qs(self.scope.get("query_string", b"").decode())
+        protocol = (query.get("protocol") or [PROTOCOL_DENSE])[0]
+        self.protocol = protocol if protocol in PROTOCOLS else PROTOCOL_DENSE
+        # Demo rooms kept in Redis: bets, cashouts and balances never reach the database
+        self.demo_store = DemoStore(self.room_name) if self.is_demo and redis_demo() else None
+
+        self.group_name = group_name(self.room, self.protocol)
+        self.user_group_name = user_group(self.user.id, self.room)
 
         # Join both main group and user-specific group
         await self.channel_layer.group_add(self.group_name, self.channel_name)
         await self.channel_layer.group_add(self.user_group_name, self.channel_name)
         await self.accept()
 
-        logger.info(f"[CRASH] User {self.user.username} connected in {self.mode} mode")
+        self.capture = recorder()
+        if self.capture:
+            self.capture_id = uuid.uuid4().hex[:12]
+            self._record("conn", data={"mode": self.mode, "room": self.room_name, "protocol": self.protocol})
+
+        logger.info(f"[CRASH] User {self.user.username} connected in {self.mode} mode, room {self.room_name}")
 
-        # Send current round info
-        current_round = await self._get_current_round()
-        if current_round:
+        # Current round from the engine's Redis snapshot: no SQL on connect
+        phase, recent = await self._get_lobby()
+        if phase and phase["phase"] != PHASE_CRASHED:
             await self.send_json({
                 "event": "connected",
                 "mode": self.mode,
+                "protocol": self.protocol,
                 "data": {
-                    "round_id": current_round.id,
-                    "status": current_round.status,
+                    "round_id": phase["round_id"],
+                    "status": phase["status"],
                     "multiplier": 1.0,
-                    "phase": "running" if current_round.status == "RUNNING" else "betting"
+                    "phase": "running" if phase["phase"] == PHASE_RUNNING else "betting",
+                    # Lets sparse clients joining mid-flight draw the curve
+                    "started_at": phase["started_at"],
+                    "betting_ends_at": phase.get("betting_ends_at"),
+                    "curve": curve_params(),
+                    "history": recent,
                 }
             })
         else:
             await self.send_json({
                 "event": "connected",
                 "mode": self.mode,
+                "protocol": self.protocol,
+                "data": {"history": recent},
             })
 
     async def disconnect(self, close_code):
-        await self.channel_layer.group_discard(self.group_name, self.channel_name)
-        await self.channel_layer.group_discard(self.user_group_name, self.channel_name)
+        # Connections closed during connect() never joined any group
+        if hasattr(self, "user_group_name"):
+            await self.channel_layer.group_discard(self.group_name, self.channel_name)
+            await self.channel_layer.group_discard(self.user_group_name, self.channel_name)
+        if getattr(self, "capture", None):
+            self._record("close")
         logger.info(f"[CRASH] User {self.user.username if hasattr(self, 'user') else 'Anonymous'} disconnected")
 
     async def receive_json(self, content, **kwargs):
         event = content.get("event")
         data = content.get("data") or {}
+        if self.capture:
+            self._record("in", event, data)
+        
+        # Floods are turned away here, before any SQL or wallet lock
+        if event in LIMITED_EVENTS and not await self._allow(event, data):
+            return
         
         logger.info(f"[CRASH] Received WebSocket event: {event} from user {self.user.username}")
         logger.info(f"[CRASH] Event data: {data}")
@@ -73,18 +132,56 @@ class CrashConsumer(AsyncJsonWebsocketConsumer):
         else:
             logger.warning(f"[CRASH] Unknown event received: {event}")
 
-    @database_sync_to_async
-    def _get_current_round(self):
-        return GameRound.objects.filter(
-            is_demo=self.is_demo, 
-            status__in=["PENDING", "RUNNING"]
-        ).order_by("-id").first()
+    async def send_json(self, content, close=False):
+        if getattr(self, "capture", None):
+            self._record("out", content.get("event"), content.get("data"))
+        await super().send_json(content, close=close)
+
+    def _record(self, kind, event=None, data=None):
+        self.capture.record(kind, self.capture_id, self.user.id, self.room, event, data)
+
+    async def _allow(self, event, data):
+        action, failed_event = LIMITED_EVENTS[event]
+        buckets = buckets_for(action)
+        if buckets is None:
+            buckets = await database_sync_to_async(load_limits)()
+        try:
+            await sync_to_async(take, thread_sensitive=False)(
+                action,
+                buckets,
+                self.user.id,
+                ip=self.scope["client"][0] if self.scope.get("client") else None,
+                device_fp=data.get("device_fp"),
+            )
+        except RateLimited as e:
+            logger.debug(f"[CRASH] Rate limited {event} from user {self.user.username}")
+            await self.send_json({
+                "event": failed_event,
+                "error": str(e),
+                "data": {
+                    **({"bet_amount": data.get("amount", "0")} if event == "place_bet" else {"bet_id": data.get("bet_id")}),
+                    "retry_after_ms": e.retry_after_ms,
+                },
+            })
+            return False
+        return True
+
+    async def _risk(self):
+        """RiskSettings as cached by the rate limiter, re-read in the DB thread once stale"""
+        if buckets_for(ACTION_BET) is None:
+            await database_sync_to_async(load_limits)()
+        return risk_settings()
+
+    @sync_to_async(thread_sensitive=False)
+    def _get_lobby(self):
+        history = RoundHistory(self.room)
+        return history.phase(), history.recent(CONNECT_HISTORY)
 
     @database_sync_to_async
     def _get_active_bet(self, round_obj=None):
         """Get user's active bet for current round"""
         if not round_obj:
-            round_obj = GameRound.objects.filter(is_demo=self.is_demo).order_by("-id").first()
+            round_obj = GameRound.objects.filter(is_demo=self.is_demo, room=self.room_name).order_by("-id").first()
         
         if not round_obj:
             return None
@@ -96,297 +193,212 @@ class CrashConsumer(AsyncJsonWebsocketConsumer):
             is_demo=self.is_demo
         ).first()
 
-    @database_sync_to_async
-    def _place_bet(self, user, amount, auto_cashout, ip, device_fp):
-        logger.info(f"[CRASH] Placing bet: user={user.username}, amount={amount}, auto_cashout={auto_cashout}")
+    def _check_bet(self, amount, auto_cashout, risk):
+        """Bet limits of the risk settings, shared by real and demo bets"""
+        # Validate bet amount against risk settings
+        if amount > risk.max_bet_per_player:
+            error_msg = f"Maximum bet is ₦{risk.max_bet_per_player:,.2f}"
+            logger.warning(f"[CRASH] {error_msg}")
+            raise ValueError(error_msg)
         
-        with transaction.atomic():
-            round_obj = GameRound.objects.filter(
-                is_demo=self.is_demo, 
-                status="PENDING"
-            ).select_for_update().order_by("-id").first()
-            
-            if not round_obj:
-                logger.warning("[CRASH] No active betting round available")
-                raise ValueError("No active betting round available")
-            
-            logger.info(f"[CRASH] Round found: {round_obj.id}, status: {round_obj.status}")
-            
-            risk = RiskSettings.get()
-            
-            # Validate bet amount against risk settings
-            if amount > risk.max_bet_per_player:
-                error_msg = f"Maximum bet is ₦{risk.max_bet_per_player:,.2f}"
+        if amount < risk.min_bet_per_player:
+            error_msg = f"Minimum bet is ₦{risk.min_bet_per_player:,.2f}"
+            logger.warning(f"[CRASH] {error_msg}")
+            raise ValueError(error_msg)
+        
+        # Validate auto cashout if provided
+        if auto_cashout:
+            if auto_cashout < risk.min_auto_cashout:
+                error_msg = f"Minimum auto cashout is {risk.min_auto_cashout}x"
                 logger.warning(f"[CRASH] {error_msg}")
                 raise ValueError(error_msg)
-            
-            if amount < risk.min_bet_per_player:
-                error_msg = f"Minimum bet is ₦{risk.min_bet_per_player:,.2f}"
+            if auto_cashout > risk.max_auto_cashout:
+                error_msg = f"Maximum auto cashout is {risk.max_auto_cashout}x"
                 logger.warning(f"[CRASH] {error_msg}")
                 raise ValueError(error_msg)
-            
-            # Check user's existing active bet (using unique_together constraint)
-            existing_bet = CrashBet.objects.filter(
-                user=user,
-                round=round_obj,
-                status="ACTIVE",
-                is_demo=self.is_demo
-            ).first()
-            
-            if existing_bet:
-                logger.warning(f"[CRASH] User already has active bet: {existing_bet.id}")
-                raise ValueError("You already have an active bet in this round")
-            
-            # Check max bet per player per round
-            total_player_bet = CrashBet.objects.filter(
-                user=user,
-                round=round_obj,
-                is_demo=self.is_demo
-            ).aggregate(total=models.Sum('bet_amount'))['total'] or Decimal('0')
-            
-            if total_player_bet + amount > risk.max_bet_per_player_per_round:
-                error_msg = f"Maximum bet per round is ₦{risk.max_bet_per_player_per_round:,.2f}"
-                logger.warning(f"[CRASH] {error_msg}")
-                raise ValueError(error_msg)
-            
-            # Calculate total exposure for the round
-            total_exposure = CrashBet.objects.filter(
-                round=round_obj, 
-                status__in=["ACTIVE", "CASHED_OUT", "PENDING"]
-            ).aggregate(total=models.Sum('bet_amount'))['total'] or Decimal('0')
-            
-            if total_exposure + amount > risk.max_exposure_per_round:
-                logger.warning(f"[CRASH] Round exposure limit reached: {total_exposure + amount} > {risk.max_exposure_per_round}")
-                raise ValueError("Round exposure limit reached")
-            
-            # Validate auto cashout if provided
-            if auto_cashout:
-                if auto_cashout < risk.min_auto_cashout:
-                    error_msg = f"Minimum auto cashout is {risk.min_auto_cashout}x"
-                    logger.warning(f"[CRASH] {error_msg}")
-                    raise ValueError(error_msg)
-                if auto_cashout > risk.max_auto_cashout:
-                    error_msg = f"Maximum auto cashout is {risk.max_auto_cashout}x"
-                    logger.warning(f"[CRASH] {error_msg}")
-                    raise ValueError(error_msg)
-            
-            # Check user's wallet balance - check both balance and spot_balance
-            wallet = Wallet.objects.select_for_update().get(user=user)
-            total_available_balance = wallet.balance + wallet.spot_balance
-            
-            logger.info(f"[CRASH] Wallet balance: {wallet.balance}, Spot balance: {wallet.spot_balance}, Total: {total_available_balance}")
-            
-            if total_available_balance < amount:
-                logger.warning(f"[CRASH] Insufficient total balance: {total_available_balance} < {amount}")
-                raise ValueError("Insufficient balance")
-            
-            logger.info(f"[CRASH] Sufficient balance: {total_available_balance} >= {amount}")
-            
-            # Place bet atomically (service will handle the split between balance and spot_balance)
-            ref = f"CRASHBET-{round_obj.id}-{user.id}-{int(timezone.now().timestamp())}"
-            logger.info(f"[CRASH] Processing bet with ref: {ref}")
-            
-            try:
-                # Call place_bet_atomic which handles the split between balance and spot_balance
-                new_balance = place_bet_atomic(user, amount, ref)
-                logger.info(f"[CRASH] Bet atomic completed, new balance: {new_balance}")
-                
-                # Refresh wallet to get updated balances
-                wallet.refresh_from_db()
-                logger.info(f"[CRASH] Updated wallet - Balance: {wallet.balance}, Spot: {wallet.spot_balance}")
-                
-            except Exception as e:
-                logger.error(f"[CRASH] Error in place_bet_atomic: {str(e)}")
-                raise ValueError("Failed to process bet. Please try again.")
-            
-            # Create bet record
-            bet = CrashBet.objects.create(
-                user=user,
-                round=round_obj,
-                bet_amount=amount,
-                auto_cashout=auto_cashout,
-                status="ACTIVE",
-                is_demo=self.is_demo,
-                ip_address=ip,
-                device_fingerprint=device_fp,
-            )
-            
-            logger.info(f"[CRASH] Bet created successfully: {bet.id}")
-            
-            # Return the wallet's total available balance for response
-            total_balance = wallet.balance + wallet.spot_balance
-            
-            return round_obj, bet, total_balance
 
     @database_sync_to_async
-    def _cashout(self, user, bet_id, current_multiplier):
-        """Process manual cashout by user"""
-        logger.info(f"[CRASH] Processing cashout: user={user.username}, bet_id={bet_id}, multiplier={current_multiplier}")
+    def _place_bet(self, user, amount, auto_cashout, ip, device_fp):
+        """Returns (round_id, bet_id, placed_at, new balance)"""
+        logger.info(f"[CRASH] Placing bet: user={user.username}, amount={amount}, auto_cashout={auto_cashout}")
+        
+        round_obj = GameRound.objects.filter(
+            is_demo=self.is_demo, 
+            room=self.room_name,
+            status="PENDING"
+        ).order_by("-id").first()
+        
+        if not round_obj:
+            logger.warning("[CRASH] No active betting round available")
+            raise ValueError("No active betting round available")
+        
+        logger.info(f"[CRASH] Round found: {round_obj.id}, status: {round_obj.status}")
+        
+        risk = risk_settings()
+        self._check_bet(amount, auto_cashout, risk)
+        
+        # Existing bet, per-player round total and round exposure come from the
+        # live Redis ledger: one atomic script, no SQL aggregates, no round lock
+        ledger = RoundLedger(round_obj.id)
+        reserved = ledger.reserve(user.id, amount, risk)
+        
+        if reserved == ALREADY_BET:
+            logger.warning(f"[CRASH] User already has a bet in round {round_obj.id}")
+            raise ValueError("You already have an active bet in this round")
+        
+        if reserved == PLAYER_LIMIT:
+            error_msg = f"Maximum bet per round is ₦{risk.max_bet_per_player_per_round:,.2f}"
+            logger.warning(f"[CRASH] {error_msg}")
+            raise ValueError(error_msg)
+        
+        if reserved == EXPOSURE_LIMIT:
+            logger.warning(f"[CRASH] Round exposure limit reached for round {round_obj.id}")
+            raise ValueError("Round exposure limit reached")
         
-        with transaction.atomic():
-            bet = CrashBet.objects.select_for_update().select_related('round').get(
-                id=bet_id, 
-                user=user, 
-                is_demo=self.is_demo
-            )
-            
-            logger.info(f"[CRASH] Bet found: {bet.id}, status: {bet.status}")
-            
-            if bet.status != "ACTIVE":
-                logger.warning(f"[CRASH] Bet is not active: {bet.status}")
-                raise ValueError("Bet is not active")
-            
-            round_obj = bet.round
-            
-            if round_obj.status != "RUNNING":
-                logger.warning(f"[CRASH] Round is not running: {round_obj.status}")
-                raise ValueError("Cannot cashout - round is not running")
-            
-            # Ensure current multiplier is valid (not after crash)
-            if round_obj.crash_point and current_multiplier > round_obj.crash_point:
-                logger.warning(f"[CRASH] Round has already crashed at {round_obj.crash_point}, current: {current_multiplier}")
-                raise ValueError("Round has already crashed")
-            
-            # Calculate payout and validate max win
-            payout = (bet.bet_amount * Decimal(str(current_multiplier))).quantize(Decimal("0.01"))
-            logger.info(f"[CRASH] Calculated payout: {bet.bet_amount} * {current_multiplier} = {payout}")
-            
-            risk = RiskSettings.get()
-            if payout > risk.max_win_per_bet:
-                logger.warning(f"[CRASH] Payout exceeds max win: {payout} > {risk.max_win_per_bat}")
-                raise ValueError(f"Maximum win per bet is ₦{risk.max_win_per_bet:,.2f}")
-            
-            # Process cashout
-            ref = f"CRASHCASHOUT-{bet.id}-{int(timezone.now().timestamp())}"
-            logger.info(f"[CRASH] Processing cashout with ref: {ref}")
-            
-            try:
-                # Use atomic cashout service
-                wallet_balance = cashout_atomic(user, bet, payout, ref)
-                logger.info(f"[CRASH] Cashout atomic completed, new balance: {wallet_balance}")
-                
-                # Update bet status
-                bet.status = "CASHED_OUT"
-                bet.cashout_multiplier = Decimal(str(current_multiplier))
-                bet.win_amount = payout
-                bet.cashed_out_at = timezone.now()
-                bet.save()
-                
-                logger.info(f"[CRASH] Bet updated to CASHED_OUT: {bet.id}")
-                
-                # Get wallet to return total balance
-                wallet = Wallet.objects.get(user=user)
-                total_balance = wallet.balance + wallet.spot_balance
-                
-                return bet, payout, round_obj, total_balance
-                
-            except Exception as e:
-                logger.error(f"[CRASH] Cashout failed for bet {bet_id}: {str(e)}")
-                raise ValueError("Cashout failed. Please try again.")
-
-    @database_sync_to_async
-    def _process_auto_cashout(self, round_obj, current_multiplier):
-        """Process auto cashouts for all qualifying bets"""
         try:
-            logger.info(f"[CRASH] Processing auto cashouts for round {round_obj.id} at multiplier {current_multiplier}")
-            
-            active_bets = CrashBet.objects.filter(
-                round=round_obj,
-                status="ACTIVE",
-                auto_cashout__isnull=False,
-                auto_cashout__lte=Decimal(str(current_multiplier)),
-                is_demo=self.is_demo
-            ).select_for_update().select_related('user')
-            
-            results = []
-            for bet in active_bets:
-                try:
-                    payout = (bet.bet_amount * Decimal(str(current_multiplier))).quantize(Decimal("0.01"))
-                    
-                    # Validate max win
-                    risk = RiskSettings.get()
-                    if payout > risk.max_win_per_bet:
-                        logger.warning(f"Auto cashout payout {payout} exceeds max win for bet {bet.id}")
-                        continue
-                    
-                    ref = f"AUTOCASHOUT-{bet.id}-{int(timezone.now().timestamp())}"
-                    
-                    # Process auto cashout
-                    wallet_balance = process_auto_cashout(bet.user, bet, payout, ref)
-                    
-                    # Update bet
-                    bet.status = "CASHED_OUT"
-                    bet.cashout_multiplier = Decimal(str(current_multiplier))
-                    bet.win_amount = payout
-                    bet.cashed_out_at = timezone.now()
-                    bet.save()
-                    
-                    # Get total wallet balance
-                    wallet = Wallet.objects.get(user=bet.user)
-                    total_balance = wallet.balance + wallet.spot_balance
-                    
-                    results.append({
-                        'bet_id': bet.id,
-                        'user_id': bet.user.id,
-                        'username': bet.user.username,
-                        'payout': payout,
-                        'multiplier': current_multiplier,
-                        'wallet_balance': total_balance
-                    })
-                    
-                    logger.info(f"[CRASH] Auto cashout processed for bet {bet.id}")
-                    
-                except Exception as e:
-                    logger.error(f"[CRASH] Auto cashout failed for bet {bet.id}: {str(e)}")
-                    continue
-            
-            logger.info(f"[CRASH] Auto cashout processing completed: {len(results)} bets")
-            return results
-            
-        except Exception as e:
-            logger.error(f"[CRASH] Auto cashout processing failed: {str(e)}")
-            return []
+            # Stake comes out of the wallet now; the bet rows are written in
+            # bulk by the engine (see crash/intake.py)
+            taken_from_wallet, taken_from_spot, new_balance = reserve_bet_funds(user.id, amount)
+        except Exception:
+            ledger.release(user.id, amount)
+            raise
+        
+        entry = {
+            "ref": bet_reference(round_obj.id, user.id),
+            "round_id": round_obj.id,
+            "user_id": user.id,
+            "username": user.username,
+            # The engine sends this bet's notifications straight to this socket
+            "channel": self.channel_name,
+            "amount": str(amount),
+            "auto_cashout": str(auto_cashout) if auto_cashout else None,
+            "from_wallet": str(taken_from_wallet),
+            "from_spot": str(taken_from_spot),
+            "is_demo": self.is_demo,
+            "ip": ip,
+            "device_fp": device_fp,
+            "placed_at": timezone.now().isoformat(),
+        }
+        
+        if not BetIntake(round_obj.id).push(entry):
+            # Engine closed the window between our status check and now
+            release_bet_funds(user.id, taken_from_wallet, taken_from_spot)
+            ledger.release(user.id, amount)
+            logger.warning(f"[CRASH] Betting closed for round {round_obj.id}")
+            raise ValueError("Betting is closed for this round")
+        
+        logger.info(f"[CRASH] Bet queued: {entry['ref']}")
+        
+        return round_obj.id, entry["ref"], entry["placed_at"], new_balance
+
+    @sync_to_async(thread_sensitive=False)
+    def _place_demo_bet(self, user, amount, auto_cashout, risk):
+        """
+        _place_bet() for a demo room kept in Redis: the bet is final once
+        booked. No database access here; risk comes from _risk().
+        """
+        logger.info(f"[CRASH] Placing demo bet: user={user.username}, amount={amount}, auto_cashout={auto_cashout}")
+        self._check_bet(amount, auto_cashout, risk)
+        bet, new_balance = self.demo_store.place_bet(user, amount, auto_cashout, self.channel_name)
+        logger.info(f"[CRASH] Demo bet booked: {bet['id']} in round {bet['round_id']}")
+        return bet["round_id"], bet["id"], bet["placed_at"], new_balance
 
     @database_sync_to_async
-    def _process_end_of_game_cashouts(self, round_obj, crash_multiplier):
-        """Process all remaining active bets at the end of the game"""
+    def _cashout(self, user, bet_id, received_at):
+        """
+        Process manual cashout by user, at the multiplier the round had on
+        this server's clock when the request arrived (received_at), not the
+        one the client reports. Nothing is locked to validate it.
+        """
+        logger.info(f"[CRASH] Processing cashout: user={user.username}, bet_id={bet_id}")
+        
+        bet = CrashBet.objects.select_related('round', 'user').get(
+            user=user, 
+            is_demo=self.is_demo,
+            **bet_lookup(bet_id)
+        )
+        
+        logger.info(f"[CRASH] Bet found: {bet.id}, status: {bet.status}")
+        
+        if bet.status != "ACTIVE":
+            logger.warning(f"[CRASH] Bet is not active: {bet.status}")
+            raise ValueError("Bet is not active")
+        
+        round_obj = bet.round
+        
+        if round_obj.status != "RUNNING" or not round_obj.started_at:
+            logger.warning(f"[CRASH] Round is not running: {round_obj.status}")
+            raise ValueError("Cannot cashout - round is not running")
+        
+        # The engine crashes at exactly time_to_reach(crash_point) on the same curve
+        current_multiplier = multiplier_since(round_obj.started_at, now=received_at)
+        if current_multiplier >= round_obj.crash_point:
+            logger.warning(f"[CRASH] Round has already crashed at {round_obj.crash_point}, current: {current_multiplier}")
+            raise ValueError("Round has already crashed")
+        
+        # Calculate payout and validate max win
+        payout = (bet.bet_amount * current_multiplier).quantize(Decimal("0.01"))
+        logger.info(f"[CRASH] Calculated payout: {bet.bet_amount} * {current_multiplier} = {payout}")
+        
+        risk = risk_settings()
+        if payout > risk.max_win_per_bet:
+            logger.warning(f"[CRASH] Payout exceeds max win: {payout} > {risk.max_win_per_bet}")
+            raise ValueError(f"Maximum win per bet is ₦{risk.max_win_per_bet:,.2f}")
+        
+        # Process cashout
+        ref = f"CRASHCASHOUT-{bet.id}-{int(received_at)}"
+        logger.info(f"[CRASH] Processing cashout with ref: {ref}")
+        
         try:
-            logger.info(f"[CRASH] Processing end of game for round {round_obj.id} at crash {crash_multiplier}")
-            
-            active_bets = CrashBet.objects.filter(
-                round=round_obj,
-                status="ACTIVE",
-                is_demo=self.is_demo
-            ).select_for_update().select_related('user')
-            
-            results = []
-            for bet in active_bets:
-                try:
-                    # At crash, bets lose (status becomes LOST)
-                    bet.status = "LOST"
-                    bet.save()
-                    
-                    results.append({
-                        'bet_id': bet.id,
-                        'user_id': bet.user.id,
-                        'username': bet.user.username,
-                        'status': 'LOST',
-                        'crash_multiplier': crash_multiplier,
-                        'lost_amount': bet.bet_amount
-                    })
-                    
-                    logger.info(f"[CRASH] Bet {bet.id} marked as LOST")
-                    
-                except Exception as e:
-                    logger.error(f"[CRASH] End game processing failed for bet {bet.id}: {str(e)}")
-                    continue
-            
-            logger.info(f"[CRASH] End of game processing completed: {len(results)} bets")
-            return results
-            
+            total_balance = cashout_atomic(bet, current_multiplier, payout, ref)
         except Exception as e:
-            logger.error(f"[CRASH] End of game processing failed: {str(e)}")
-            return []
+            logger.error(f"[CRASH] Cashout failed for bet {bet_id}: {str(e)}")
+            raise ValueError("Cashout failed. Please try again.")
+        
+        if total_balance is None:
+            # An auto cashout or the crash settlement got to the bet first
+            logger.warning(f"[CRASH] Bet {bet.id} was settled before the cashout")
+            raise ValueError("Bet is not active")
+        
+        logger.info(f"[CRASH] Bet updated to CASHED_OUT: {bet.id}, new balance: {total_balance}")
+        
+        return {
+            "round_id": round_obj.id,
+            "bet_id": bet.id,
+            "payout": payout,
+            "multiplier": bet.cashout_multiplier,
+            "balance": total_balance,
+            "cashed_out_at": bet.cashed_out_at or timezone.now(),
+        }
+
+    @sync_to_async(thread_sensitive=False)
+    def _demo_cashout(self, user, bet_id, received_at, risk):
+        """_cashout() for a demo room kept in Redis, priced the same way"""
+        round_obj, bet = self.demo_store.player_bet(user.id, bet_id)
+        if not bet or bet["status"] != "ACTIVE":
+            raise ValueError("Bet is not active")
+        if round_obj.status != "RUNNING" or not round_obj.started_at:
+            raise ValueError("Cannot cashout - round is not running")
+
+        current_multiplier = multiplier_since(round_obj.started_at, now=received_at)
+        if current_multiplier >= round_obj.crash_point:
+            raise ValueError("Round has already crashed")
+
+        payout = (Decimal(bet["amount"]) * current_multiplier).quantize(Decimal("0.01"))
+        if payout > risk.max_win_per_bet:
+            raise ValueError(f"Maximum win per bet is ₦{risk.max_win_per_bet:,.2f}")
+
+        balance = self.demo_store.settle(bet, "CASHED_OUT", payout, multiplier=current_multiplier)
+        if balance is None:
+            raise ValueError("Bet is not active")
+        return {
+            "round_id": round_obj.id,
+            "bet_id": bet["id"],
+            "payout": payout,
+            "multiplier": current_multiplier,
+            "balance": balance,
+            "cashed_out_at": timezone.now(),
+        }
 
     @database_sync_to_async
     def _cancel_auto_cashout(self, user, bet_id):
@@ -395,10 +407,10 @@ class CrashConsumer(AsyncJsonWebsocketConsumer):
         
         with transaction.atomic():
             bet = CrashBet.objects.select_for_update().get(
-                id=bet_id, 
                 user=user, 
                 status="ACTIVE",
-                is_demo=self.is_demo
+                is_demo=self.is_demo,
+                **bet_lookup(bet_id)
             )
             
             round_obj = bet.round
@@ -410,15 +422,16 @@ class CrashConsumer(AsyncJsonWebsocketConsumer):
             bet.save()
             
             logger.info(f"[CRASH] Auto cashout cancelled for bet {bet_id}")
-            return bet
+            return bet.id
 
-    @database_sync_to_async
-    def _get_round_by_id(self, round_id):
-        try:
-            return GameRound.objects.get(id=round_id, is_demo=self.is_demo)
-        except GameRound.DoesNotExist:
-            logger.warning(f"[CRASH] Round {round_id} not found")
-            return None
+    @sync_to_async(thread_sensitive=False)
+    def _cancel_demo_auto_cashout(self, user, bet_id):
+        round_obj, bet = self.demo_store.player_bet(user.id, bet_id)
+        if not bet or bet["status"] != "ACTIVE":
+            raise ValueError("Bet is not active")
+        if round_obj.status not in ("PENDING", "RUNNING") or not self.demo_store.cancel_auto_cashout(bet):
+            raise ValueError("Cannot modify auto cashout - round is not active")
+        return bet["id"]
 
     async def handle_place_bet(self, data):
         logger.info(f"[CRASH] handle_place_bet called for user {self.user.username}")
@@ -439,35 +452,31 @@ class CrashConsumer(AsyncJsonWebsocketConsumer):
             
             logger.info(f"[CRASH] Calling _place_bet with: amount={amount}, auto_cashout={auto_cashout}")
             
-            round_obj, bet, new_balance = await self._place_bet(user, amount, auto_cashout, ip, device_fp)
+            if self.demo_store:
+                round_id, bet_id, placed_at, new_balance = await self._place_demo_bet(
+                    user, amount, auto_cashout, await self._risk()
+                )
+            else:
+                round_id, bet_id, placed_at, new_balance = await self._place_bet(
+                    user, amount, auto_cashout, ip, device_fp
+                )
             
-            logger.info(f"[CRASH] Bet placed successfully: {bet.id}, new total balance: {new_balance}")
+            logger.info(f"[CRASH] Bet placed successfully: {bet_id}, new total balance: {new_balance}")
             
-            # Broadcast to all users
-            await self.channel_layer.group_send(
-                self.group_name,
-                {
-                    "type": "player.bet",
-                    "data": {
-                        "user": user.username,
-                        "bet_id": bet.id,
-                        "amount": str(amount),
-                        "auto_cashout": str(auto_cashout) if auto_cashout else None,
-                        "timestamp": timezone.now().isoformat()
-                    },
-                },
-            )
+            # The room hears about it from the engine's player.feed once the bet is written
 
             # Send confirmation to user
             await self.send_json({
                 "event": "bet_accepted",
                 "data": {
-                    "round_id": round_obj.id,
-                    "bet_id": bet.id,
+                    "round_id": round_id,
+                    # Provisional until bet_confirmed carries the stored id;
+                    # cashout accepts either. Demo bets get their final id here.
+                    "bet_id": bet_id,
                     "amount": str(amount),
                     "auto_cashout": str(auto_cashout) if auto_cashout else None,
                     "balance": str(new_balance),
-                    "placed_at": bet.created_at.isoformat()
+                    "placed_at": placed_at
                 }
             })
             
@@ -485,42 +494,40 @@ class CrashConsumer(AsyncJsonWebsocketConsumer):
         
         user = self.scope["user"]
         bet_id = data.get("bet_id")
+        # What the client saw; informational only, the server prices the cashout
         current_multiplier_str = data.get("multiplier", "1.0")
+        received_at = time.time()
         
         try:
-            current_multiplier = Decimal(str(current_multiplier_str))
-            logger.info(f"[CRASH] Calling _cashout with: bet_id={bet_id}, multiplier={current_multiplier}")
-            
-            bet, payout, round_obj, new_balance = await self._cashout(user, bet_id, current_multiplier)
-            
-            logger.info(f"[CRASH] Cashout successful: {bet.id}, new total balance: {new_balance}")
-            
-            # Broadcast to all users
-            await self.channel_layer.group_send(
-                self.group_name,
-                {
-                    "type": "player.cashout",
-                    "data": {
-                        "user": user.username,
-                        "bet_id": bet.id,
-                        "payout": str(payout),
-                        "multiplier": str(bet.cashout_multiplier),
-                        "cashout_type": "MANUAL",
-                        "timestamp": timezone.now().isoformat()
-                    },
-                },
-            )
+            logger.info(f"[CRASH] Calling _cashout with: bet_id={bet_id}, client multiplier={current_multiplier_str}")
+            
+            if self.demo_store:
+                result = await self._demo_cashout(user, bet_id, received_at, await self._risk())
+            else:
+                result = await self._cashout(user, bet_id, received_at)
+            
+            logger.info(f"[CRASH] Cashout successful: {result['bet_id']}, new total balance: {result['balance']}")
+            
+            # Batched into the room's next player.feed frame by the engine
+            await sync_to_async(push_cashout, thread_sensitive=False)(self.room, {
+                "round_id": result["round_id"],
+                "bet_id": result["bet_id"],
+                "user": user.username,
+                "payout": str(result["payout"]),
+                "multiplier": str(result["multiplier"]),
+                "cashout_type": "MANUAL",
+            })
 
             # Send confirmation to user
             await self.send_json({
                 "event": "cashout_success",
                 "data": {
-                    "bet_id": bet.id,
-                    "payout": str(payout),
-                    "multiplier": str(bet.cashout_multiplier),
-                    "balance": str(new_balance),
+                    "bet_id": result["bet_id"],
+                    "payout": str(result["payout"]),
+                    "multiplier": str(result["multiplier"]),
+                    "balance": str(result["balance"]),
                     "cashout_type": "MANUAL",
-                    "cashed_out_at": bet.cashed_out_at.isoformat() if bet.cashed_out_at else timezone.now().isoformat()
+                    "cashed_out_at": result["cashed_out_at"].isoformat()
                 }
             })
             
@@ -540,12 +547,13 @@ class CrashConsumer(AsyncJsonWebsocketConsumer):
         bet_id = data.get("bet_id")
         
         try:
-            bet = await self._cancel_auto_cashout(user, bet_id)
+            cancel = self._cancel_demo_auto_cashout if self.demo_store else self._cancel_auto_cashout
+            cancelled_id = await cancel(user, bet_id)
             
             await self.send_json({
                 "event": "auto_cashout_cancelled",
                 "data": {
-                    "bet_id": bet.id,
+                    "bet_id": cancelled_id,
                     "message": "Auto cashout disabled"
                 }
             })
@@ -572,97 +580,50 @@ class CrashConsumer(AsyncJsonWebsocketConsumer):
         await self.send_json({"event": "round_lock_bets", "data": event["data"]})
 
     async def round_multiplier(self, event):
-        data = event["data"]
-        current_multiplier = Decimal(str(data["multiplier"]))
-        
-        logger.info(f"[CRASH] Handling round_multiplier: {current_multiplier}")
-        
-        # Process auto cashouts when multiplier updates
-        round_id = data.get("round_id")
-        if round_id:
-            # Get round object
-            round_obj = await self._get_round_by_id(round_id)
-            if round_obj:
-                # Process auto cashouts
-                auto_cashout_results = await self._process_auto_cashout(round_obj, current_multiplier)
-                
-                # If any auto cashouts happened, broadcast them
-                if auto_cashout_results:
-                    logger.info(f"[CRASH] Processing {len(auto_cashout_results)} auto cashouts")
-                    for result in auto_cashout_results:
-                        await self.channel_layer.group_send(
-                            self.group_name,
-                            {
-                                "type": "player.cashout",
-                                "data": {
-                                    "user": result['username'],
-                                    "bet_id": result['bet_id'],
-                                    "payout": str(result['payout']),
-                                    "multiplier": str(result['multiplier']),
-                                    "cashout_type": "AUTO",
-                                    "timestamp": timezone.now().isoformat()
-                                },
-                            },
-                        )
-                        
-                        # Send individual notification to user
-                        await self.channel_layer.group_send(
-                            f"crash_user_{result['user_id']}_{self.mode}",
-                            {
-                                "type": "bet.auto.cashout",
-                                "data": {
-                                    "bet_id": result['bet_id'],
-                                    "multiplier": str(result['multiplier']),
-                                    "payout": str(result['payout']),
-                                    "balance": str(result['wallet_balance'])
-                                }
-                            }
-                        )
-        
-        await self.send_json({"event": "multiplier_update", "data": data})
+        # Auto cashouts are settled by the engine; consumers only relay ticks
+        await self.send_json({"event": "multiplier_update", "data": event["data"]})
+
+    async def round_sync(self, event):
+        # Sparse protocol only: periodic correction for the client-side curve
+        await self.send_json({"event": "multiplier_sync", "data": event["data"]})
 
     async def round_crash(self, event):
-        data = event["data"]
-        crash_multiplier = Decimal(str(data["crash_point"]))
-        round_id = data.get("round_id")
-        
-        logger.info(f"[CRASH] Handling round_crash at {crash_multiplier}")
-        
-        if round_id:
-            round_obj = await self._get_round_by_id(round_id)
-            if round_obj:
-                # Process all remaining bets as LOST
-                crash_results = await self._process_end_of_game_cashouts(round_obj, crash_multiplier)
-                
-                # Send crash notifications to affected users
-                if crash_results:
-                    logger.info(f"[CRASH] Processing {len(crash_results)} lost bets")
-                    for result in crash_results:
-                        await self.channel_layer.group_send(
-                            f"crash_user_{result['user_id']}_{self.mode}",
-                            {
-                                "type": "bet.crashed",
-                                "data": {
-                                    "bet_id": result['bet_id'],
-                                    "crash_multiplier": str(result['crash_multiplier']),
-                                    "lost_amount": str(result['lost_amount'])
-                                }
-                            }
-                        )
-        
-        await self.send_json({"event": "round_crash", "data": data})
-
-    async def player_bet(self, event):
-        await self.send_json({"event": "player_bet", "data": event["data"]})
-
-    async def player_cashout(self, event):
-        await self.send_json({"event": "player_cashout", "data": event["data"]})
+        # Losing bets are settled and notified by the engine
+        await self.send_json({"event": "round_crash", "data": event["data"]})
+
+    async def round_void(self, event):
+        # Round abandoned after an engine failover; open bets are refunded
+        await self.send_json({"event": "round_void", "data": event["data"]})
+
+    async def player_feed(self, event):
+        """Bets and cashouts of the room, one frame per FEED_INTERVAL (see crash/feed.py)"""
+        await self.send_json({"event": "player_feed", "data": event["data"]})
 
     # User-specific handlers
+    async def send_player_event(self, event, payload):
+        # The group copy of a message this socket already got directly
+        if event.get("sent_to") == self.channel_name:
+            return
+        await self.send_json(payload)
+
+    async def bet_confirmed(self, event):
+        """Queued bet written by the engine: maps the provisional ref to its id"""
+        await self.send_player_event(event, {"event": "bet_confirmed", "data": event["data"]})
+
+    async def bet_rejected(self, event):
+        """Queued bet could not be written; the stake has been refunded"""
+        await self.send_player_event(
+            event, {"event": "bet_failed", "error": "Bet could not be placed", "data": event["data"]}
+        )
+
     async def bet_auto_cashout(self, event):
         """Handle auto cashout notification for specific user"""
-        await self.send_json({"event": "auto_cashout_triggered", "data": event["data"]})
+        await self.send_player_event(event, {"event": "auto_cashout_triggered", "data": event["data"]})
 
     async def bet_crashed(self, event):
         """Handle crash notification for specific user"""
-        await self.send_json({"event": "bet_crashed", "data": event["data"]})
\ No newline at end of file
+        await self.send_player_event(event, {"event": "bet_crashed", "data": event["data"]})
+
+    async def bet_refunded(self, event):
+        """Stake refunded because the round was voided"""
+        await self.send_json({"event": "bet_refunded", "data": event["data"]})
\ No newline at end of file
@@ -0,0 +1,67 @@
+"""
+The multiplier curve, shared by the engines and the consumers.
+
+A flight is anchored on GameRound.started_at (wall clock, written when bets
+lock), so any server process can tell the multiplier of a running round
+from its own clock without asking the engine: the engine ticks from the same
+anchor and crashes at exactly time_to_reach(crash_point).
+"""
+import math
+import time
+from decimal import Decimal
+
+# multiplier(t) = CURVE_BASE ** (t * CURVE_RATE), t in seconds since lock_bets
+CURVE_BASE = 1.0025
+CURVE_RATE = 100
+CURVE_PRECISION = Decimal("0.01")
+
+_GROWTH = CURVE_RATE * math.log(CURVE_BASE)  # ln(multiplier) per second
+
+
+def multiplier_at(elapsed: float) -> Decimal:
+    return Decimal(str(CURVE_BASE ** (elapsed * CURVE_RATE))).quantize(CURVE_PRECISION)
+
+
+def flight_elapsed(started_at, now: float = None) -> float:
+    """Seconds of flight of a round that locked bets at started_at"""
+    return (time.time() if now is None else now) - started_at.timestamp()
+
+
+def multiplier_since(started_at, now: float = None) -> Decimal:
+    return multiplier_at(flight_elapsed(started_at, now))
+
+
+def time_to_reach(multiplier) -> float:
+    """
+    Earliest flight time at which multiplier_at() returns at least
+    multiplier. The closed form is only within a few ulps of the rounding
+    boundary, so the exact float is found by bisecting against
+    multiplier_at() itself: both sides always agree on which tick crossed.
+    """
+    target = Decimal(multiplier)
+    if target <= 1:
+        return 0.0
+
+    # Quantized half even, so target is reached half a cent below it
+    estimate = math.log(float(target - CURVE_PRECISION / 2)) / _GROWTH
+    lo, hi = estimate * (1 - 1e-9), estimate * (1 + 1e-9) + 1e-9
+    while multiplier_at(lo) >= target:
+        lo /= 2
+    while multiplier_at(hi) < target:
+        hi *= 2
+    while math.nextafter(lo, hi) < hi:
+        mid = (lo + hi) / 2
+        if multiplier_at(mid) >= target:
+            hi = mid
+        else:
+            lo = mid
+    return hi
+
+
+def curve_params() -> dict:
+    """Everything a client needs to draw the curve locally"""
+    return {
+        "base": str(CURVE_BASE),
+        "rate": CURVE_RATE,
+        "precision": str(CURVE_PRECISION),
+    }
@@ -0,0 +1,496 @@
+"""
+Zero-DB demo mode.
+
+With CRASH_DEMO_STORE = "redis" demo rooms never write to the database: the
+engine keeps the round, its bets and every player's demo balance in Redis
+with TTLs, and the consumers read and write the same keys. Players get the
+same protocol as real money; bets are final as soon as they are accepted,
+so no bet.confirmed follows bet_accepted. Amounts are stored in kobo like
+the round ledger.
+
+Keys:
+    crash:demo:round_seq             last demo round id (all rooms)
+    crash:demo:bet_seq               last demo bet id (all rooms)
+    crash:demo:<room key>:round      hash, the room's current round (DEMO_TTL)
+    crash:demo:<room key>:nonce      last nonce played in the room
+    crash:demo:bets:<round_id>       hash user id -> JSON bet (DEMO_TTL)
+    crash:demo:balance:<user_id>     demo balance (DEMO_BALANCE_TTL, renewed on use)
+"""
+import json
+import logging
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone as dt_timezone
+from decimal import Decimal
+from pathlib import Path
+
+from asgiref.sync import sync_to_async
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.utils import timezone
+
+from .async_engine import AsyncRound
+from .autocashout import AutoCashoutBook
+from .engine import group_send, send_room
+from .history import round_summary
+from .ledger import to_kobo
+from .models import RiskSettings
+from .protocol import DEFAULT_ROOM, group_name, room_key, user_group
+from .provably_fair import UNCHAINED_CLIENT_SEED, generate_round_result, generate_server_seed, sha256_hex
+from .redis_lock import shared_redis
+from .seed_chain import SeedChain, SeedCursor, default_chain_path
+
+logger = logging.getLogger(__name__)
+
+DEMO_TTL = 3600  # seconds a finished round and its bets are kept
+DEMO_BALANCE_TTL = 7 * 24 * 3600  # seconds of inactivity before a demo balance resets
+
+BET_CLOSED = -1
+ALREADY_BET = -2
+INSUFFICIENT = -3
+
+PLACE_LUA = """
+if redis.call('HGET', KEYS[1], 'id') ~= ARGV[1] or redis.call('HGET', KEYS[1], 'status') ~= 'PENDING' then
+    return -1
+end
+if redis.call('HEXISTS', KEYS[2], ARGV[2]) == 1 then
+    return -2
+end
+redis.call('SET', KEYS[3], ARGV[4], 'NX')
+if tonumber(redis.call('GET', KEYS[3])) < tonumber(ARGV[3]) then
+    return -3
+end
+local balance = redis.call('DECRBY', KEYS[3], ARGV[3])
+redis.call('EXPIRE', KEYS[3], ARGV[7])
+redis.call('HSET', KEYS[2], ARGV[2], ARGV[5])
+redis.call('EXPIRE', KEYS[2], ARGV[6])
+return balance
+"""
+
+# Compare-and-settle one ACTIVE bet and credit the player. ARGV[4] set:
+# auto cashout, only while the bet still has a target at or below it.
+SETTLE_LUA = """
+local raw = redis.call('HGET', KEYS[1], ARGV[1])
+if not raw then
+    return -1
+end
+local bet = cjson.decode(raw)
+if bet.status ~= 'ACTIVE' then
+    return -1
+end
+if ARGV[4] ~= '' and (bet.auto_cashout == cjson.null or tonumber(bet.auto_cashout) > tonumber(ARGV[4])) then
+    return -1
+end
+bet.status = ARGV[2]
+bet.win_amount = ARGV[5]
+bet.cashout_multiplier = ARGV[6]
+bet.settled_at = ARGV[7]
+redis.call('HSET', KEYS[1], ARGV[1], cjson.encode(bet))
+redis.call('SET', KEYS[2], ARGV[8], 'NX')
+local balance = redis.call('INCRBY', KEYS[2], ARGV[3])
+redis.call('EXPIRE', KEYS[2], ARGV[9])
+return balance
+"""
+
+# Every bet still ACTIVE at the crash is lost; returns them as stored
+LOSE_LUA = """
+local lost = {}
+local all = redis.call('HGETALL', KEYS[1])
+for i = 1, #all, 2 do
+    local bet = cjson.decode(all[i + 1])
+    if bet.status == 'ACTIVE' then
+        bet.status = 'LOST'
+        bet.win_amount = '0.00'
+        redis.call('HSET', KEYS[1], all[i], cjson.encode(bet))
+        table.insert(lost, all[i + 1])
+    end
+end
+return lost
+"""
+
+CANCEL_AUTO_LUA = """
+local raw = redis.call('HGET', KEYS[1], ARGV[1])
+if not raw then
+    return 0
+end
+local bet = cjson.decode(raw)
+if bet.status ~= 'ACTIVE' then
+    return 0
+end
+bet.auto_cashout = cjson.null
+redis.call('HSET', KEYS[1], ARGV[1], cjson.encode(bet))
+return 1
+"""
+
+
+def redis_demo() -> bool:
+    """Whether demo rooms run on DemoStore instead of the database"""
+    return settings.CRASH_DEMO_STORE == "redis"
+
+
+def _kobo_to_amount(kobo) -> Decimal:
+    return (Decimal(int(kobo)) / 100).quantize(Decimal("0.01"))
+
+
+def _ms(value):
+    return int(value.timestamp() * 1000) if value else ""
+
+
+def _from_ms(value):
+    return datetime.fromtimestamp(int(value) / 1000, tz=dt_timezone.utc) if value else None
+
+
+@dataclass
+class DemoGameRound:
+    """The GameRound fields the engine and the history buffer use, without a table behind them"""
+
+    id: int
+    server_seed: str
+    server_seed_hash: str
+    client_seed: str
+    nonce: int
+    crash_point: Decimal
+    room: str = DEFAULT_ROOM
+    status: str = "PENDING"
+    created_at: datetime = field(default_factory=timezone.now)
+    started_at: datetime = None
+    crashed_at: datetime = None
+    is_demo = True
+
+    @property
+    def room_key(self) -> str:
+        return room_key("demo", self.room)
+
+
+class DemoStore:
+    """Redis storage of one demo room, shared by its engine and its consumers"""
+
+    def __init__(self, room: str = DEFAULT_ROOM, client=None):
+        self.room = room
+        self.r = client or shared_redis()
+        prefix = f"crash:demo:{room_key('demo', room)}"
+        self.round_key = f"{prefix}:round"
+        self.nonce_key = f"{prefix}:nonce"
+
+    @staticmethod
+    def bets_key(round_id) -> str:
+        return f"crash:demo:bets:{round_id}"
+
+    @staticmethod
+    def balance_key(user_id) -> str:
+        return f"crash:demo:balance:{user_id}"
+
+    # ======================================================
+    # ROUNDS (ENGINE)
+    # ======================================================
+    def create_round(self, seeds=None, risk=None) -> DemoGameRound:
+        """
+        create_new_round() for a demo room. The engine passes risk, read
+        once per round in the DB thread, so nothing here touches the database.
+        """
+        risk = risk or RiskSettings.get()
+        if seeds is not None:
+            nonce, server_seed = seeds.take()
+            client_seed = seeds.client_seed
+            self.r.set(self.nonce_key, nonce)
+        else:
+            server_seed = generate_server_seed(settings.SECRET_KEY)
+            nonce = self.r.incr(self.nonce_key)
+            client_seed = UNCHAINED_CLIENT_SEED
+
+        crash_point = generate_round_result(server_seed, client_seed, nonce)
+        if crash_point > risk.max_multiplier_cap:
+            crash_point = Decimal(str(risk.max_multiplier_cap)).quantize(Decimal("0.01"))
+
+        round_obj = DemoGameRound(
+            id=self.r.incr("crash:demo:round_seq"),
+            server_seed=server_seed,
+            server_seed_hash=sha256_hex(server_seed),
+            client_seed=client_seed,
+            nonce=nonce,
+            crash_point=crash_point,
+            room=self.room,
+        )
+        self.save_round(round_obj)
+        return round_obj
+
+    def save_round(self, round_obj: DemoGameRound):
+        pipe = self.r.pipeline()
+        pipe.delete(self.round_key)
+        pipe.hset(self.round_key, mapping={
+            "id": round_obj.id,
+            "status": round_obj.status,
+            "server_seed": round_obj.server_seed,
+            "server_seed_hash": round_obj.server_seed_hash,
+            "client_seed": round_obj.client_seed,
+            "nonce": round_obj.nonce,
+            "crash_point": str(round_obj.crash_point),
+            "created_at": _ms(round_obj.created_at),
+            "started_at": _ms(round_obj.started_at),
+            "crashed_at": _ms(round_obj.crashed_at),
+        })
+        pipe.expire(self.round_key, DEMO_TTL)
+        pipe.execute()
+
+    def current_round(self):
+        """The room's latest round, or None"""
+        data = self.r.hgetall(self.round_key)
+        if not data:
+            return None
+        return DemoGameRound(
+            id=int(data["id"]),
+            server_seed=data["server_seed"],
+            server_seed_hash=data["server_seed_hash"],
+            client_seed=data["client_seed"],
+            nonce=int(data["nonce"]),
+            crash_point=Decimal(data["crash_point"]),
+            room=self.room,
+            status=data["status"],
+            created_at=_from_ms(data["created_at"]),
+            started_at=_from_ms(data["started_at"]),
+            crashed_at=_from_ms(data["crashed_at"]),
+        )
+
+    def bets(self, round_id) -> list:
+        return [json.loads(raw) for raw in self.r.hvals(self.bets_key(round_id))]
+
+    def settle(self, bet: dict, status: str, credit: Decimal, multiplier=None, ceiling=None):
+        """
+        Move an ACTIVE bet to status and credit the player. Returns the new
+        balance, or None if the bet was no longer ACTIVE (or, with ceiling,
+        no longer had an auto cashout at or below it).
+        """
+        balance = self.r.eval(
+            SETTLE_LUA, 2, self.bets_key(bet["round_id"]), self.balance_key(bet["user_id"]),
+            bet["user_id"], status, to_kobo(credit), str(ceiling) if ceiling is not None else "",
+            str(credit), str(multiplier) if multiplier is not None else "", timezone.now().isoformat(),
+            to_kobo(settings.CRASH_DEMO_BALANCE), DEMO_BALANCE_TTL,
+        )
+        return None if balance < 0 else _kobo_to_amount(balance)
+
+    def settle_lost(self, round_id) -> list:
+        """(bet_id, user_id, amount) of every bet lost at the crash"""
+        lost = [json.loads(raw) for raw in self.r.eval(LOSE_LUA, 1, self.bets_key(round_id))]
+        return [(bet["id"], bet["user_id"], Decimal(bet["amount"])) for bet in lost]
+
+    def void_open_round(self):
+        """
+        A round left open by a dead engine: refund its bets and close it.
+        Returns (round, [(bet_id, user_id, amount) per refund]), or (None, []).
+        """
+        round_obj = self.current_round()
+        if not round_obj or round_obj.status not in ("PENDING", "RUNNING"):
+            return None, []
+        round_obj.status = "VOIDED"
+        round_obj.crashed_at = timezone.now()
+        self.save_round(round_obj)
+        refunded = []
+        for bet in self.bets(round_obj.id):
+            if self.settle(bet, "CANCELLED", Decimal(bet["amount"])) is not None:
+                refunded.append((bet["id"], bet["user_id"], Decimal(bet["amount"])))
+        return round_obj, refunded
+
+    def last_nonce(self) -> int:
+        return int(self.r.get(self.nonce_key) or 0)
+
+    # ======================================================
+    # PLAYERS (CONSUMERS)
+    # ======================================================
+    def balance(self, user_id) -> Decimal:
+        key = self.balance_key(user_id)
+        self.r.set(key, to_kobo(settings.CRASH_DEMO_BALANCE), nx=True, ex=DEMO_BALANCE_TTL)
+        return _kobo_to_amount(self.r.get(key))
+
+    def place_bet(self, user, amount: Decimal, auto_cashout, channel):
+        """Book a bet in the current betting round; returns (bet, new balance)"""
+        round_obj = self.current_round()
+        if not round_obj or round_obj.status != "PENDING":
+            raise ValueError("No active betting round available")
+
+        bet = {
+            "id": self.r.incr("crash:demo:bet_seq"),
+            "round_id": round_obj.id,
+            "user_id": user.id,
+            "username": user.username,
+            "channel": channel,
+            "amount": str(amount),
+            "auto_cashout": str(auto_cashout) if auto_cashout else None,
+            "status": "ACTIVE",
+            "placed_at": timezone.now().isoformat(),
+        }
+        result = self.r.eval(
+            PLACE_LUA, 3, self.round_key, self.bets_key(round_obj.id), self.balance_key(user.id),
+            round_obj.id, user.id, to_kobo(amount), to_kobo(settings.CRASH_DEMO_BALANCE),
+            json.dumps(bet), DEMO_TTL, DEMO_BALANCE_TTL,
+        )
+        if result == BET_CLOSED:
+            raise ValueError("Betting is closed for this round")
+        if result == ALREADY_BET:
+            raise ValueError("You already have an active bet in this round")
+        if result == INSUFFICIENT:
+            raise ValueError("Insufficient demo balance")
+        return bet, _kobo_to_amount(result)
+
+    def player_bet(self, user_id, bet_id):
+        """The player's bet in the current round, if bet_id is its id"""
+        round_obj = self.current_round()
+        if not round_obj:
+            return None, None
+        raw = self.r.hget(self.bets_key(round_obj.id), user_id)
+        bet = json.loads(raw) if raw else None
+        if not bet or str(bet["id"]) != str(bet_id):
+            return round_obj, None
+        return round_obj, bet
+
+    def cancel_auto_cashout(self, bet: dict) -> bool:
+        return bool(self.r.eval(CANCEL_AUTO_LUA, 1, self.bets_key(bet["round_id"]), bet["user_id"]))
+
+
+class DemoAsyncRound(AsyncRound):
+    """AsyncRound over a DemoStore: same phases and broadcasts, no database"""
+
+    def __init__(self, round_obj: DemoGameRound, store: DemoStore, channel_layer=None, heartbeat=None):
+        super().__init__(round_obj, channel_layer=channel_layer, heartbeat=heartbeat)
+        self.store = store
+        self._seen = set()  # bet ids already in the feed
+        self._bets = {}  # bet id -> bet, once bets are locked
+
+    async def save_round(self, **fields):
+        for name, value in fields.items():
+            setattr(self.round, name, value)
+        await sync_to_async(self.store.save_round, thread_sensitive=False)(self.round)
+
+    async def flush_bets(self):
+        """Demo bets are final when placed; only the feed and the channel map need them"""
+        bets = await sync_to_async(self.store.bets, thread_sensitive=False)(self.round.id)
+        new = [bet for bet in bets if bet["id"] not in self._seen]
+        self._seen.update(bet["id"] for bet in new)
+        for bet in new:
+            if bet.get("channel"):
+                self.channels[bet["user_id"]] = bet["channel"]
+        if new:
+            self.feed.add_bets([
+                {"bet_id": bet["id"], "user": bet["username"], "amount": bet["amount"],
+                 "auto_cashout": bet["auto_cashout"]}
+                for bet in new
+            ])
+
+    async def close_betting(self):
+        # place_bet() checks the round status atomically: PENDING -> RUNNING closes the window
+        await self.flush_bets()
+
+    async def load_flight(self):
+        bets = await sync_to_async(self.store.bets, thread_sensitive=False)(self.round.id)
+        self._bets = {bet["id"]: bet for bet in bets}
+        book = AutoCashoutBook(
+            (Decimal(bet["auto_cashout"]), bet["id"]) for bet in bets if bet["auto_cashout"]
+        )
+        risk = await self.db(RiskSettings.get)()
+        return book, risk.max_win_per_bet
+
+    async def settle_auto_cashouts(self, due, ceiling, max_win):
+        def settle():
+            results = []
+            for bet_id in due:
+                bet = self._bets[bet_id]
+                multiplier = Decimal(bet["auto_cashout"])
+                payout = (Decimal(bet["amount"]) * multiplier).quantize(Decimal("0.01"))
+                if payout > max_win:
+                    continue
+                balance = self.store.settle(bet, "CASHED_OUT", payout, multiplier=multiplier, ceiling=ceiling)
+                if balance is None:
+                    continue
+                results.append({
+                    "bet_id": bet_id,
+                    "user_id": bet["user_id"],
+                    "username": bet["username"],
+                    "payout": payout,
+                    "multiplier": multiplier,
+                    "wallet_balance": balance,
+                })
+            return results
+
+        return await sync_to_async(settle, thread_sensitive=False)()
+
+    async def settle_lost(self):
+        lost = await sync_to_async(self.store.settle_lost, thread_sensitive=False)(self.round.id)
+        await self.save_round(status="SETTLED")
+        return lost
+
+    async def push_history(self):
+        def push():
+            bets = self.store.bets(self.round.id)
+            totals = {
+                "bets": len(bets),
+                "wagered": sum((Decimal(bet["amount"]) for bet in bets), Decimal("0")),
+                "paid": sum((Decimal(bet.get("win_amount") or 0) for bet in bets), Decimal("0")),
+            }
+            self.history.push(round_summary(self.round, totals))
+
+        await sync_to_async(push, thread_sensitive=False)()
+
+
+def void_demo_round(store: DemoStore, channel_layer=None):
+    """
+    take_over_round() for a demo room. Demo rounds are never resumed: one
+    left open by a dead engine is voided and its stakes go back to the
+    players' demo balances.
+    """
+    round_obj, refunded = store.void_open_round()
+    if round_obj is None:
+        return None
+    channel_layer = channel_layer or get_channel_layer()
+    room = round_obj.room_key
+    send_room(channel_layer, room, {
+        "type": "round.void",
+        "data": {
+            "round_id": round_obj.id,
+            "crash_point": str(round_obj.crash_point),
+            "server_seed": round_obj.server_seed,
+            "client_seed": round_obj.client_seed,
+            "nonce": round_obj.nonce,
+        },
+    })
+    for bet_id, user_id, amount in refunded:
+        group_send(channel_layer, room, user_group(user_id, room), {
+            "type": "bet.refunded",
+            "data": {"bet_id": bet_id, "round_id": round_obj.id, "amount": str(amount)},
+        })
+    logger.warning(f"[CRASH] Voided demo round {round_obj.id} ({room}), refunded {len(refunded)} bet(s)")
+    return round_obj
+
+
+def open_demo_seed_cursor(store: DemoStore, path=None):
+    """open_seed_cursor() for a demo room: resumes after the room's last nonce"""
+    path = Path(path) if path else default_chain_path(group_name(room_key("demo", store.room)))
+    if not path.exists():
+        return None
+    chain = SeedChain(path)
+    nonce = store.last_nonce()
+    return SeedCursor(chain, nonce + 1 if 1 <= nonce <= chain.length else 1)
+
+
+async def run_demo_engine(
+    heartbeat=None,
+    seeds=None,
+    is_running=lambda: True,
+    on_round=None,
+    room: str = DEFAULT_ROOM,
+    channel_layer=None,
+):
+    """run_engine_async() for a demo room on DemoStore"""
+    channel_layer = channel_layer or get_channel_layer()
+    store = DemoStore(room)
+
+    while is_running():
+        if heartbeat:
+            await sync_to_async(heartbeat.tick, thread_sensitive=False)()
+
+        round_start = time.monotonic()
+        risk = await database_sync_to_async(RiskSettings.get)()
+        round_obj = await sync_to_async(store.create_round, thread_sensitive=False)(seeds, risk)
+        await DemoAsyncRound(round_obj, store, channel_layer=channel_layer, heartbeat=heartbeat).run()
+
+        if on_round:
+            on_round(round_obj, time.monotonic() - round_start)
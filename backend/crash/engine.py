@@ -1,51 +1,334 @@
+import logging
 import time
 from decimal import Decimal
+from pathlib import Path
+from django.db import transaction
 from django.utils import timezone
 from django.conf import settings
 from asgiref.sync import async_to_sync
 from channels.layers import get_channel_layer
 
 from .models import GameRound, CrashBet, RiskSettings
-from .provably_fair import generate_round_result, generate_server_seed, sha256_hex
-from wallets.services import settle_lost_bet_atomic
+from .provably_fair import UNCHAINED_CLIENT_SEED, generate_round_result, generate_server_seed, sha256_hex
+from . import metrics
+from .autocashout import AutoCashoutBook
+from .capture import record_room
+from .checkpoint import EngineCheckpoint, PHASE_SETTLED
+from .curve import curve_params, flight_elapsed, multiplier_at, multiplier_since, time_to_reach
+from .feed import PlayerFeed
+from .history import RoundHistory, round_summary, phase_snapshot, PHASE_BETTING, PHASE_RUNNING, PHASE_CRASHED
+from .intake import BetIntake, FINAL_FLUSH_ATTEMPTS, INTAKE_FLUSH_INTERVAL
+from .ledger import RoundLedger
+from .protocol import (
+    DEFAULT_ROOM, SYNC_INTERVAL, PROTOCOL_SPARSE, group_name, room_groups, room_key, user_group,
+)
+from .seed_chain import SeedChain, SeedCursor, default_chain_path
+from wallets.services import settle_lost_bets_bulk, settle_auto_cashouts_atomic, void_round_bets
+
+logger = logging.getLogger(__name__)
 
 BETTING_DURATION = 10    # seconds
+COUNTDOWN_INTERVAL = 0.5  # seconds
 TICK_INTERVAL = 0.05    # 20 FPS
 COOLDOWN_DURATION = 3   # seconds
 
 
-def create_new_round(is_demo: bool = False) -> GameRound:
+def create_new_round(is_demo: bool = False, seeds=None, room: str = DEFAULT_ROOM) -> GameRound:
+    """
+    seeds (optional): SeedCursor over a pre-generated hash chain, played with
+    the chain's committed client seed. Without one a fresh random seed is
+    drawn and the nonce follows the room's last round.
+    """
     risk = RiskSettings.get()
 
-    server_seed = generate_server_seed(settings.SECRET_KEY)
-    server_seed_hash = sha256_hex(server_seed)
-    client_seed = "global-client"
+    if seeds is not None:
+        nonce, server_seed = seeds.take()
+        client_seed = seeds.client_seed
+    else:
+        server_seed = generate_server_seed(settings.SECRET_KEY)
+        last_round = GameRound.objects.filter(is_demo=is_demo, room=room).order_by("-id").first()
+        nonce = last_round.nonce + 1 if last_round else 1
+        client_seed = UNCHAINED_CLIENT_SEED
 
-    last_round = GameRound.objects.filter(is_demo=is_demo).order_by("-id").first()
-    nonce = last_round.nonce + 1 if last_round else 1
+    server_seed_hash = sha256_hex(server_seed)
 
     crash_point = generate_round_result(server_seed, client_seed, nonce)
 
     if crash_point > risk.max_multiplier_cap:
         crash_point = Decimal(str(risk.max_multiplier_cap)).quantize(Decimal("0.01"))
 
-    return GameRound.objects.create(
+    round_obj = GameRound.objects.create(
         server_seed=server_seed,
         server_seed_hash=server_seed_hash,
         client_seed=client_seed,
         nonce=nonce,
         crash_point=crash_point,
         is_demo=is_demo,
+        room=room,
+    )
+    RoundLedger(round_obj.id).initialize()
+    return round_obj
+
+
+def recover_open_rounds(is_demo: bool = False, room: str = DEFAULT_ROOM) -> int:
+    """
+    Write bets still queued for every unfinished round (a batch a failed
+    write left in processing included), then reload its Redis ledger from
+    CrashBet. Called on engine start so a restart never
+    loses queued bets or trusts a stale ledger.
+    """
+    open_rounds = GameRound.objects.filter(is_demo=is_demo, room=room, status__in=["PENDING", "RUNNING"])
+    count = 0
+    for round_id in open_rounds.values_list("id", flat=True):
+        intake = BetIntake(round_id)
+        intake.close()
+        intake.flush()
+        ledger = RoundLedger(round_id)
+        ledger.reset()
+        ledger.rebuild()
+        count += 1
+    return count
+
+
+def void_round(round_obj: GameRound, channel_layer=None):
+    """
+    Give up on a round a dead engine left behind: refund every open bet and
+    mark the round VOIDED. Bets already cashed out keep their payout.
+    """
+    channel_layer = channel_layer or get_channel_layer()
+    room = round_obj.room_key
+
+    with metrics.db_write(room, "void"), transaction.atomic():
+        # Flip the status first so cashouts racing in see a finished round
+        round_obj.status = "VOIDED"
+        round_obj.crashed_at = timezone.now()
+        round_obj.save(update_fields=["status", "crashed_at"])
+        refunded = void_round_bets(round_obj)
+    RoundLedger(round_obj.id).reset()
+
+    send_room(
+        channel_layer,
+        room,
+        {
+            "type": "round.void",
+            "data": {
+                "round_id": round_obj.id,
+                "crash_point": str(round_obj.crash_point),
+                "server_seed": round_obj.server_seed,
+                "client_seed": round_obj.client_seed,
+                "nonce": round_obj.nonce,
+            },
+        },
+    )
+    for bet_id, user_id, amount in refunded:
+        group_send(
+            channel_layer,
+            room,
+            user_group(user_id, room),
+            {
+                "type": "bet.refunded",
+                "data": {"bet_id": bet_id, "round_id": round_obj.id, "amount": str(amount)},
+            },
+        )
+    return refunded
+
+
+def can_resume(round_obj: GameRound) -> bool:
+    """
+    Whether a round taken over from a dead engine can still be played out.
+    A flight that would already have crashed by now cannot: nobody was
+    able to cash out while no engine was ticking.
+    """
+    if round_obj.status in ("PENDING", "CRASHED"):
+        return True
+    if round_obj.status != "RUNNING" or not round_obj.started_at:
+        return False
+    return multiplier_since(round_obj.started_at) < round_obj.crash_point
+
+
+def take_over_round(is_demo: bool = False, room: str = DEFAULT_ROOM, channel_layer=None):
+    """
+    Called once the room's lock is ours, after recover_open_rounds(). Finds
+    the round the previous engine was playing from its checkpoint (falling
+    back to the latest open round) and returns it if run_single_round() can
+    pick it up where it stopped, otherwise voids it and returns None. Any
+    older round still open is voided too.
+    """
+    key = room_key("demo" if is_demo else "real", room)
+    checkpoint = EngineCheckpoint(key).load()
+    open_rounds = list(
+        GameRound.objects.filter(
+            is_demo=is_demo, room=room, status__in=["PENDING", "RUNNING", "CRASHED"]
+        ).order_by("-id")
     )
+    if not open_rounds:
+        return None
+
+    in_flight = open_rounds[0]
+    if checkpoint:
+        in_flight = next((r for r in open_rounds if r.id == checkpoint["round_id"]), in_flight)
+
+    resume = None
+    for round_obj in open_rounds:
+        if round_obj is in_flight and can_resume(round_obj):
+            resume = round_obj
+            continue
+        refunded = void_round(round_obj, channel_layer)
+        logger.warning(
+            f"[CRASH] Voided round {round_obj.id} ({round_obj.room_key}), refunded {len(refunded)} bet(s)"
+        )
+    return resume
+
+
+def open_seed_cursor(is_demo: bool = False, path=None, room: str = DEFAULT_ROOM):
+    """
+    Map the room's seed chain and resume after the last round played from it.
+    Returns None when no chain file exists.
+    """
+    key = room_key("demo" if is_demo else "real", room)
+    path = Path(path) if path else default_chain_path(group_name(key))
+    if not path.exists():
+        return None
+
+    chain = SeedChain(path)
+    last_round = GameRound.objects.filter(is_demo=is_demo, room=room).order_by("-id").first()
+    return SeedCursor.resume(chain, last_round)
+
+
+def group_send(channel_layer, room, group, message):
+    with metrics.broadcast(room):
+        async_to_sync(channel_layer.group_send)(group, message)
+
+
+def send_room(channel_layer, room, message):
+    """Room-wide events go to the groups of every protocol"""
+    record_room(room, message["type"], message.get("data"))
+    for group in room_groups(room):
+        group_send(channel_layer, room, group, message)
+
+
+def send_player(channel_layer, room, user_id, message, channel=None):
+    """
+    To every socket of the bettor through the user group, so a reconnected
+    socket or a second tab hears it too. The socket the bet came from
+    (channel, see flush_intake) gets it straight away and ignores the
+    group copy, which is marked sent_to.
+    """
+    if channel:
+        with metrics.broadcast(room):
+            async_to_sync(channel_layer.send)(channel, message)
+        message = {**message, "sent_to": channel}
+    group_send(channel_layer, room, user_group(user_id, room), message)
+
+
+def send_feed(channel_layer, room, feed):
+    """One player.feed frame with whatever the room's feed gathered, if anything"""
+    data = feed.collect()
+    if data:
+        send_room(channel_layer, room, {"type": "player.feed", "data": data})
+
+
+def write_intake(room, intake):
+    """Write the queued bets; returns (written, dropped) as BetIntake.flush() does"""
+    with metrics.db_write(room, "intake"):
+        return intake.flush()
+
+
+def bet_feed_items(written):
+    """Feed items for the (entry, bet) pairs write_intake() saved"""
+    return [
+        {
+            "bet_id": bet.id,
+            "user": entry.get("username"),
+            "amount": entry["amount"],
+            "auto_cashout": entry["auto_cashout"],
+        }
+        for entry, bet in written
+    ]
+
+
+def flush_intake(channel_layer, room, intake, feed=None, channels=None):
+    """
+    Write the queued bets and tell each bettor how it went: the stored bet
+    id for written bets, a refund notice for rejected ones. Written bets go
+    to the feed; each bettor's channel name is remembered in channels
+    (user id -> channel) for the notifications later in the round.
+    """
+    written, dropped = write_intake(room, intake)
+    for entry, bet in written:
+        if channels is not None and entry.get("channel"):
+            channels[entry["user_id"]] = entry["channel"]
+        send_player(
+            channel_layer,
+            room,
+            entry["user_id"],
+            {"type": "bet.confirmed", "data": {"ref": entry["ref"], "bet_id": bet.id}},
+            channel=entry.get("channel"),
+        )
+    for entry in dropped:
+        send_player(
+            channel_layer,
+            room,
+            entry["user_id"],
+            {"type": "bet.rejected", "data": {"ref": entry["ref"], "bet_amount": entry["amount"]}},
+            channel=entry.get("channel"),
+        )
+    if feed and written:
+        feed.add_bets(bet_feed_items(written))
+    return len(written)
+
+
+def auto_cashout_items(results):
+    """Feed items for a batch of settle_auto_cashouts_atomic() results"""
+    return [
+        {
+            "bet_id": result["bet_id"],
+            "user": result["username"],
+            "payout": str(result["payout"]),
+            "multiplier": str(result["multiplier"]),
+            "cashout_type": "AUTO",
+        }
+        for result in results
+    ]
+
+
+def broadcast_auto_cashouts(channel_layer, room, results, feed=None, channels=None):
+    """
+    The batch goes to the room's feed; each winner gets a notification.
+    """
+    if feed:
+        feed.add_cashouts(auto_cashout_items(results))
+
+    for result in results:
+        send_player(
+            channel_layer,
+            room,
+            result["user_id"],
+            {
+                "type": "bet.auto.cashout",
+                "data": {
+                    "bet_id": result["bet_id"],
+                    "multiplier": str(result["multiplier"]),
+                    "payout": str(result["payout"]),
+                    "balance": str(result["wallet_balance"]),
+                },
+            },
+            channel=channels.get(result["user_id"]) if channels else None,
+        )
 
 
 def run_single_round(round_obj: GameRound, heartbeat=None):
     """
     Blocking loop for ONE round.
     heartbeat (optional): LockHeartbeat instance to keep Redis lock alive.
+
+    A round returned by take_over_round() is picked up from its status: a
+    RUNNING round keeps its original started_at, a CRASHED one only settles.
     """
     channel_layer = get_channel_layer()
-    group_name = "crash_demo" if round_obj.is_demo else "crash_real"
+    room = round_obj.room_key
+    dense_group = group_name(room)
+    sparse_group = group_name(room, PROTOCOL_SPARSE)
 
     # 🔒 Heartbeat helper - tracks when we last called heartbeat
     last_heartbeat_time = time.time()
@@ -60,90 +343,190 @@ def run_single_round(round_obj: GameRound, heartbeat=None):
                 heartbeat.tick()
                 last_heartbeat_time = current_time
 
-    # 1️⃣ BETTING PHASE
-    check_heartbeat()  # Initial heartbeat check
+    history = RoundHistory(room)
+    checkpoint = EngineCheckpoint(room)
+    report = metrics.RoundReport(room)
+    # Bets and cashouts reach the room as one player.feed frame per FEED_INTERVAL
+    feed = PlayerFeed(room, round_obj.id)
+    channels = {}  # user id -> channel name of the socket the bet came from
+
+    # A round taken over from a dead engine skips the phases it already went through
+    if round_obj.status == "PENDING":
+        # 1️⃣ BETTING PHASE
+        check_heartbeat()  # Initial heartbeat check
     
-    async_to_sync(channel_layer.group_send)(
-        group_name,
-        {
-            "type": "round.start",
-            "data": {
-                "round_id": round_obj.id,
-                "betting_duration": BETTING_DURATION,
-                "crash_point": str(round_obj.crash_point),
-                "server_seed_hash": round_obj.server_seed_hash,
+        send_room(
+            channel_layer,
+            room,
+            {
+                "type": "round.start",
+                "data": {
+                    "round_id": round_obj.id,
+                    "betting_duration": BETTING_DURATION,
+                    "server_seed_hash": round_obj.server_seed_hash,
+                },
             },
-        },
-    )
+        )
 
-    round_obj.status = "PENDING"
-    round_obj.save(update_fields=["status"])
+        round_obj.status = "PENDING"
+        with metrics.db_write(room, "betting"):
+            round_obj.save(update_fields=["status"])
 
-    betting_end = time.time() + BETTING_DURATION
-    while time.time() < betting_end:
-        check_heartbeat()  # 🔒 Regular heartbeat check during betting
+        intake = BetIntake(round_obj.id)
+        betting_end = time.time() + BETTING_DURATION
+        history.set_phase(phase_snapshot(round_obj, PHASE_BETTING, betting_ends_at=int(betting_end * 1000)))
+        checkpoint.save(round_obj, PHASE_BETTING)
+        next_countdown = time.time()
+        while time.time() < betting_end:
+            check_heartbeat()  # 🔒 Regular heartbeat check during betting
         
-        remaining = betting_end - time.time()
-        async_to_sync(channel_layer.group_send)(
-            group_name,
-            {
-                "type": "round.countdown",
-                "data": {"remaining": remaining},
-            },
-        )
-        time.sleep(0.5)
+            if time.time() >= next_countdown:
+                remaining = betting_end - time.time()
+                send_room(
+                    channel_layer,
+                    room,
+                    {
+                        "type": "round.countdown",
+                        "data": {"remaining": remaining},
+                    },
+                )
+                next_countdown += COUNTDOWN_INTERVAL
 
-    # 2️⃣ LOCK BETS → START FLIGHT
-    check_heartbeat()  # 🔒 Before starting flight phase
+            # Queued bets are written in batches while the window is open;
+            # a failed batch stays queued for the next pass
+            try:
+                flush_intake(channel_layer, room, intake, feed, channels)
+            except Exception as e:
+                logger.error(f"[CRASH] Bet flush failed, retrying: {e}")
+            if feed.due():
+                send_feed(channel_layer, room, feed)
+            time.sleep(max(0.0, min(INTAKE_FLUSH_INTERVAL, betting_end - time.time())))
+
+        # 2️⃣ LOCK BETS → START FLIGHT
+        check_heartbeat()  # 🔒 Before starting flight phase
+
+        # No bet gets queued after this; write the rest before locking
+        intake.close()
+        for attempt in range(1, FINAL_FLUSH_ATTEMPTS + 1):
+            try:
+                flush_intake(channel_layer, room, intake, feed, channels)
+                break
+            except Exception as e:
+                # Out of attempts: the batch is still queued for recover_open_rounds()
+                if attempt == FINAL_FLUSH_ATTEMPTS:
+                    raise
+                logger.error(f"[CRASH] Final bet flush failed (attempt {attempt}): {e}")
+                time.sleep(INTAKE_FLUSH_INTERVAL)
+        send_feed(channel_layer, room, feed)
     
-    round_obj.status = "RUNNING"
-    round_obj.started_at = timezone.now()
-    round_obj.save(update_fields=["status", "started_at"])
+        round_obj.status = "RUNNING"
+        round_obj.started_at = timezone.now()
+        with metrics.db_write(room, "lock"):
+            round_obj.save(update_fields=["status", "started_at"])
 
-    async_to_sync(channel_layer.group_send)(
-        group_name,
-        {
-            "type": "round.lock_bets",
-            "data": {"round_id": round_obj.id},
-        },
-    )
+    if round_obj.status == "RUNNING":
+        history.set_phase(phase_snapshot(round_obj, PHASE_RUNNING))
+        checkpoint.save(round_obj, PHASE_RUNNING)
+
+        send_room(
+            channel_layer,
+            room,
+            {
+                "type": "round.lock_bets",
+                "data": {
+                    "round_id": round_obj.id,
+                    # Sparse clients draw the curve from these
+                    "started_at": int(round_obj.started_at.timestamp() * 1000),
+                    "curve": curve_params(),
+                },
+            },
+        )
 
     # 3️⃣ FLIGHT PHASE
     check_heartbeat()  # 🔒 Before flight starts
+
+    # Bets are locked now, so the auto cashout targets can't change except by cancel
+    auto_cashouts = AutoCashoutBook.for_round(round_obj)
+    max_win = RiskSettings.get().max_win_per_bet
     
-    start_time = time.time()
+    # Wall clock, so a resumed flight carries on from where it was
+    start_time = round_obj.started_at.timestamp()
+    # The last tick lands on the crash itself, where the consumers stop accepting cashouts
+    crash_at = time_to_reach(round_obj.crash_point)
+    next_sync = time.time()
+    next_tick = None
     crashed = False
 
     while not crashed:
+        if next_tick is not None:
+            metrics.TICK_LAG.observe(max(0.0, time.time() - next_tick), room=room)
         check_heartbeat()  # 🔒 Regular heartbeat check during flight
         
         elapsed = time.time() - start_time
-        multiplier = Decimal(str(1.0025 ** (elapsed * 100))).quantize(Decimal("0.01"))
+        multiplier = multiplier_at(elapsed)
 
         if multiplier >= round_obj.crash_point:
             multiplier = round_obj.crash_point
             crashed = True
 
-        async_to_sync(channel_layer.group_send)(
-            group_name,
-            {
-                "type": "round.multiplier",
-                "data": {"multiplier": str(multiplier)},
-            },
-        )
+        due = auto_cashouts.pop_due(multiplier, round_obj.crash_point)
+        if due:
+            settle_start = time.perf_counter()
+            with metrics.db_write(room, "flight"):
+                results = settle_auto_cashouts_atomic(due, ceiling=multiplier, max_win=max_win)
+            metrics.bets_settled(room, "auto_cashout", len(results), time.perf_counter() - settle_start)
+            if results:
+                broadcast_auto_cashouts(channel_layer, room, results, feed, channels)
+        if crashed or feed.due():
+            send_feed(channel_layer, room, feed)
+
+        if settings.CRASH_LEGACY_TICKS:
+            group_send(
+                channel_layer,
+                room,
+                dense_group,
+                {
+                    "type": "round.multiplier",
+                    "data": {"multiplier": str(multiplier)},
+                },
+            )
+
+        # Sparse clients interpolate; they only need a periodic correction
+        if not crashed and time.time() >= next_sync:
+            group_send(
+                channel_layer,
+                room,
+                sparse_group,
+                {
+                    "type": "round.sync",
+                    "data": {
+                        "multiplier": str(multiplier),
+                        "elapsed": elapsed,
+                        "server_time": int(time.time() * 1000),
+                    },
+                },
+            )
+            next_sync += SYNC_INTERVAL
 
         if not crashed:
-            time.sleep(TICK_INTERVAL)
+            delay = max(0.0, min(TICK_INTERVAL, crash_at - flight_elapsed(round_obj.started_at)))
+            next_tick = time.time() + delay
+            time.sleep(delay)
 
     # 4️⃣ CRASH
     check_heartbeat()  # 🔒 Before crash announcement
     
-    round_obj.status = "CRASHED"
-    round_obj.crashed_at = timezone.now()
-    round_obj.save(update_fields=["status", "crashed_at"])
+    if round_obj.status == "RUNNING":
+        round_obj.status = "CRASHED"
+        round_obj.crashed_at = timezone.now()
+        with metrics.db_write(room, "crash"):
+            round_obj.save(update_fields=["status", "crashed_at"])
+    history.set_phase(phase_snapshot(round_obj, PHASE_CRASHED))
+    checkpoint.save(round_obj, PHASE_CRASHED)
 
-    async_to_sync(channel_layer.group_send)(
-        group_name,
+    send_room(
+        channel_layer,
+        room,
         {
             "type": "round.crash",
             "data": {
@@ -156,26 +539,33 @@ def run_single_round(round_obj: GameRound, heartbeat=None):
         },
     )
 
-    # 5️⃣ SETTLE LOSERS - Process in batches with heartbeat checks
+    # 5️⃣ SETTLE LOSERS - One conditional UPDATE, heartbeat kept alive between audit batches
     check_heartbeat()  # 🔒 Before starting settlement
-    
-    bets = CrashBet.objects.filter(
-        round=round_obj, status__in=["PENDING", "ACTIVE"]
-    )
-    
-    # Process in smaller batches to allow heartbeat checks
-    batch_size = 5
-    bet_list = list(bets)
-    
-    for i in range(0, len(bet_list), batch_size):
-        batch = bet_list[i:i + batch_size]
-        for bet in batch:
-            settle_lost_bet_atomic(bet)
-        
-        check_heartbeat()  # 🔒 Check heartbeat after each batch
 
-    round_obj.status = "SETTLED"
-    round_obj.save(update_fields=["status"])
+    settle_start = time.perf_counter()
+    with metrics.db_write(room, "settle"):
+        lost = settle_lost_bets_bulk(round_obj, on_progress=check_heartbeat)
+        round_obj.status = "SETTLED"
+        round_obj.save(update_fields=["status"])
+    metrics.bets_settled(room, "lost", len(lost), time.perf_counter() - settle_start)
+    history.push(round_summary(round_obj))
+    checkpoint.save(round_obj, PHASE_SETTLED)
+
+    for bet_id, user_id, amount in lost:
+        send_player(
+            channel_layer,
+            room,
+            user_id,
+            {
+                "type": "bet.crashed",
+                "data": {
+                    "bet_id": bet_id,
+                    "crash_multiplier": str(round_obj.crash_point),
+                    "lost_amount": str(amount),
+                },
+            },
+            channel=channels.get(user_id),
+        )
 
     # 6️⃣ COOLDOWN
     check_heartbeat()  # 🔒 Before starting cooldown
@@ -186,4 +576,6 @@ def run_single_round(round_obj: GameRound, heartbeat=None):
         time.sleep(0.5)
     
     # Final heartbeat check
-    check_heartbeat()
\ No newline at end of file
+    check_heartbeat()
+
+    logger.info(report.line(round_obj))
\ No newline at end of file
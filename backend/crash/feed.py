@@ -0,0 +1,103 @@
+"""
+Coalesced player feed of a crash room.
+
+Instead of one room-wide group_send per bet and per cashout, which fans out
+to O(n²) frames a round, the engine gathers them and sends a single
+player.feed frame per FEED_INTERVAL: the FEED_TOP biggest bets and cashouts
+of the batch, plus counts and totals for the batch and the round so far.
+
+Where the items come from:
+- bets: the engine's intake flushes, as they are written
+- auto cashouts: the engine's settlement batches
+- manual cashouts: paid by the consumers, which push them to a Redis list
+  the engine drains whenever a frame is due
+
+Keys (TTL FEED_TTL):
+    crash:feed:<room>   list of JSON cashout items
+"""
+import heapq
+import json
+import threading
+import time
+from decimal import Decimal
+
+from .redis_lock import shared_redis
+
+FEED_INTERVAL = 0.2  # seconds between player.feed frames of a room
+FEED_TOP = 20  # items of each kind per frame
+FEED_TTL = 60  # seconds
+
+
+def feed_key(room: str) -> str:
+    return f"crash:feed:{room}"
+
+
+def push_cashout(room: str, item: dict):
+    """Consumer side: queue a manual cashout (with its round_id) for the room's next frame"""
+    pipe = shared_redis().pipeline()
+    pipe.rpush(feed_key(room), json.dumps(item))
+    pipe.expire(feed_key(room), FEED_TTL)
+    pipe.execute()
+
+
+class PlayerFeed:
+    """
+    One round's feed, kept by the engine. add_*() may be called from the
+    engine's DB thread while the loop collects, hence the lock.
+    """
+
+    def __init__(self, room: str, round_id: int, interval: float = FEED_INTERVAL, top: int = FEED_TOP):
+        self.key = feed_key(room)
+        self.round_id = round_id
+        self.interval = interval
+        self.top = top
+        self.round_bets = 0
+        self.round_cashouts = 0
+        self._bets = []
+        self._cashouts = []
+        self._lock = threading.Lock()
+        self._next_at = time.monotonic() + interval
+
+    def add_bets(self, items):
+        with self._lock:
+            self._bets.extend(items)
+
+    def add_cashouts(self, items):
+        with self._lock:
+            self._cashouts.extend(items)
+
+    def due(self) -> bool:
+        return time.monotonic() >= self._next_at
+
+    def collect(self):
+        """
+        Drain the queued manual cashouts and build the next frame. Returns
+        None when nothing happened since the last one.
+        """
+        self._next_at = time.monotonic() + self.interval
+
+        pipe = shared_redis().pipeline()
+        pipe.lrange(self.key, 0, -1)
+        pipe.delete(self.key)
+        queued, _ = pipe.execute()
+
+        # Stragglers of the previous round are dropped: its feed is closed
+        manual = [item for item in map(json.loads, queued) if item["round_id"] == self.round_id]
+        with self._lock:
+            bets, self._bets = self._bets, []
+            cashouts, self._cashouts = self._cashouts + manual, []
+        if not bets and not cashouts:
+            return None
+
+        self.round_bets += len(bets)
+        self.round_cashouts += len(cashouts)
+        return {
+            "bets": heapq.nlargest(self.top, bets, key=lambda item: Decimal(item["amount"])),
+            "cashouts": heapq.nlargest(self.top, cashouts, key=lambda item: Decimal(item["payout"])),
+            "bet_count": len(bets),
+            "cashout_count": len(cashouts),
+            "bet_total": str(sum((Decimal(item["amount"]) for item in bets), Decimal("0"))),
+            "payout_total": str(sum((Decimal(item["payout"]) for item in cashouts), Decimal("0"))),
+            "round_bets": self.round_bets,
+            "round_cashouts": self.round_cashouts,
+        }
@@ -0,0 +1,123 @@
+"""
+Recent crash rounds and the live round phase, kept in Redis by the engine.
+
+The lobby endpoint and the websocket connect handshake read from here, so
+a reconnect storm costs no SQL at all.
+
+Keys:
+    crash:history:<room>   list of JSON round summaries, newest first,
+                           trimmed to HISTORY_SIZE
+    crash:phase:<room>     JSON snapshot of the round in play
+"""
+import json
+
+from django.conf import settings
+from django.db.models import Count, Sum
+
+from .models import GameRound, CrashBet
+from .protocol import parse_room_key
+from .redis_lock import shared_redis
+
+HISTORY_SIZE = getattr(settings, "CRASH_HISTORY_SIZE", 100)
+PHASE_TTL = 60  # seconds; a dead engine's snapshot expires on its own
+
+PHASE_BETTING = "betting"
+PHASE_RUNNING = "running"
+PHASE_CRASHED = "crashed"
+
+# LPUSH + LTRIM in one round trip
+PUSH_LUA = """
+redis.call('LPUSH', KEYS[1], ARGV[1])
+redis.call('LTRIM', KEYS[1], 0, tonumber(ARGV[2]) - 1)
+return 1
+"""
+
+
+def _ms(dt):
+    return int(dt.timestamp() * 1000) if dt else None
+
+
+def round_summary(round_obj: GameRound, totals=None) -> dict:
+    """History entry for a settled round; one aggregate over its bets unless totals are given"""
+    if totals is None:
+        totals = CrashBet.objects.filter(round=round_obj).aggregate(
+            bets=Count("id"),
+            wagered=Sum("bet_amount"),
+            paid=Sum("win_amount"),
+        )
+    return {
+        "round_id": round_obj.id,
+        "crash_point": str(round_obj.crash_point),
+        "server_seed_hash": round_obj.server_seed_hash,
+        "server_seed": round_obj.server_seed,
+        "client_seed": round_obj.client_seed,
+        "nonce": round_obj.nonce,
+        "created_at": _ms(round_obj.created_at),
+        "started_at": _ms(round_obj.started_at),
+        "crashed_at": _ms(round_obj.crashed_at),
+        "bets": totals["bets"],
+        "wagered": str(totals["wagered"] or 0),
+        "paid": str(totals["paid"] or 0),
+    }
+
+
+def phase_snapshot(round_obj: GameRound, phase: str, **extra) -> dict:
+    snapshot = {
+        "round_id": round_obj.id,
+        "phase": phase,
+        "status": round_obj.status,
+        "server_seed_hash": round_obj.server_seed_hash,
+        "started_at": _ms(round_obj.started_at),
+    }
+    if phase == PHASE_CRASHED:
+        snapshot["crash_point"] = str(round_obj.crash_point)
+    snapshot.update(extra)
+    return snapshot
+
+
+class RoundHistory:
+    def __init__(self, room, client=None):
+        """room: room key, see protocol.room_key()"""
+        self.room = room
+        self.r = client or shared_redis()
+        self.history_key = f"crash:history:{room}"
+        self.phase_key = f"crash:phase:{room}"
+
+    def push(self, summary: dict):
+        self.r.eval(PUSH_LUA, 1, self.history_key, json.dumps(summary), HISTORY_SIZE)
+
+    def recent(self, limit=HISTORY_SIZE):
+        return [json.loads(item) for item in self.r.lrange(self.history_key, 0, limit - 1)]
+
+    def set_phase(self, snapshot: dict):
+        self.r.set(self.phase_key, json.dumps(snapshot), ex=PHASE_TTL)
+
+    def phase(self):
+        raw = self.r.get(self.phase_key)
+        return json.loads(raw) if raw else None
+
+    def rebuild(self):
+        """Refill the buffer from the DB, e.g. after Redis lost it. Engine start only."""
+        mode, room = parse_room_key(self.room)
+        rounds = GameRound.objects.filter(
+            is_demo=mode == "demo", room=room, status="SETTLED"
+        ).annotate(
+            bet_count=Count("bets"),
+            wagered=Sum("bets__bet_amount"),
+            paid=Sum("bets__win_amount"),
+        ).order_by("-id")[:HISTORY_SIZE]
+        summaries = [
+            round_summary(round_obj, totals={
+                "bets": round_obj.bet_count,
+                "wagered": round_obj.wagered,
+                "paid": round_obj.paid,
+            })
+            for round_obj in rounds
+        ]
+
+        pipe = self.r.pipeline()
+        pipe.delete(self.history_key)
+        if summaries:
+            pipe.rpush(self.history_key, *(json.dumps(summary) for summary in summaries))
+        pipe.execute()
+        return len(summaries)
@@ -0,0 +1,274 @@
+"""
+Bet intake queue for the crash betting window.
+
+Consumers check limits against the round ledger and take the stake out of
+the wallet straight away (reserve_bet_funds), then push the bet here. The
+engine drains the queue every INTAKE_FLUSH_INTERVAL and once more, after
+closing it, right before round.lock_bets, writing CrashBet,
+WalletTransaction and AuditLog rows with bulk_create.
+
+Keys (TTL INTAKE_TTL):
+    crash:intake:<round_id>              list of JSON bet entries
+    crash:intake:<round_id>:processing   the batch being written, until it commits
+    crash:intake:<round_id>:closed       set once the betting window is over
+
+A drained batch stays in the processing list until its rows are committed,
+so a failed write (database locked, connection lost, engine killed) loses
+nothing: the next flush, or recover_open_rounds() after a takeover, writes
+the batch again, skipping entries an earlier attempt already committed.
+
+Until a bet is flushed its only id is the CRASHBET-<round>-<user>-<nonce>
+reference of its wallet transaction; bet_lookup() resolves either form.
+The nonce is random, so every entry has a reference of its own, even two
+bets of one player in the same second (after the first was refunded).
+"""
+import json
+import logging
+import secrets
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+
+from wallets.models import WalletTransaction
+from wallets.services import release_bet_funds
+from .ledger import RoundLedger
+from .models import AuditLog, CrashBet
+from .redis_lock import shared_redis
+
+logger = logging.getLogger(__name__)
+
+INTAKE_FLUSH_INTERVAL = 0.25  # seconds
+INTAKE_BATCH = 500
+INTAKE_TTL = 3600  # seconds
+FINAL_FLUSH_ATTEMPTS = 3
+
+PUSH_LUA = """
+if redis.call('EXISTS', KEYS[2]) == 1 then
+    return 0
+end
+redis.call('RPUSH', KEYS[1], ARGV[1])
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+return 1
+"""
+
+# KEYS: queue, processing list. A batch left in processing by a failed
+# write comes back first; otherwise up to ARGV[1] entries move atomically
+# from the head of the queue to processing. ARGV[2]: TTL.
+DRAIN_LUA = """
+local unfinished = redis.call('LRANGE', KEYS[2], 0, -1)
+if #unfinished > 0 then
+    return unfinished
+end
+local n = tonumber(ARGV[1])
+local items = redis.call('LRANGE', KEYS[1], 0, n - 1)
+if #items > 0 then
+    redis.call('LTRIM', KEYS[1], #items, -1)
+    redis.call('RPUSH', KEYS[2], unpack(items))
+    redis.call('EXPIRE', KEYS[2], ARGV[2])
+end
+return items
+"""
+
+
+def bet_reference(round_id, user_id) -> str:
+    return f"CRASHBET-{round_id}-{user_id}-{secrets.token_hex(8)}"
+
+
+def bet_lookup(bet_id) -> dict:
+    """
+    Filter kwargs for a CrashBet given either its id or the provisional
+    reference handed out at bet time. A user has one bet per round
+    (unique_together), so the round id in the reference is enough.
+    """
+    if isinstance(bet_id, int) or str(bet_id).isdigit():
+        return {"id": int(bet_id)}
+    try:
+        prefix, round_id, _ = str(bet_id).split("-", 2)
+        if prefix != "CRASHBET":
+            raise ValueError
+        return {"round_id": int(round_id)}
+    except ValueError:
+        raise ValueError("Invalid bet id")
+
+
+class BetIntake:
+    def __init__(self, round_id, client=None):
+        self.round_id = round_id
+        self.r = client or shared_redis()
+        self.key = f"crash:intake:{round_id}"
+        self.closed_key = f"{self.key}:closed"
+        self.processing_key = f"{self.key}:processing"
+
+    def push(self, entry: dict) -> bool:
+        """Queue a bet; False once the betting window has been closed"""
+        payload = json.dumps(entry, default=str)
+        return bool(self.r.eval(PUSH_LUA, 2, self.key, self.closed_key, payload, INTAKE_TTL))
+
+    def close(self):
+        self.r.set(self.closed_key, "1", ex=INTAKE_TTL)
+
+    def drain(self, limit=INTAKE_BATCH):
+        """Next batch to write; it stays in the processing list until ack()"""
+        items = self.r.eval(DRAIN_LUA, 2, self.key, self.processing_key, limit, INTAKE_TTL)
+        return [json.loads(item) for item in items]
+
+    def ack(self):
+        """The drained batch is committed (or refunded): forget it"""
+        self.r.delete(self.processing_key)
+
+    def pending(self) -> int:
+        return self.r.llen(self.key) + self.r.llen(self.processing_key)
+
+    def queued(self) -> list:
+        """Every entry not acknowledged yet: the queue and the batch being written"""
+        pipe = self.r.pipeline()
+        pipe.lrange(self.key, 0, -1)
+        pipe.lrange(self.processing_key, 0, -1)
+        waiting, processing = pipe.execute()
+        return [json.loads(item) for item in waiting + processing]
+
+    def flush(self):
+        """
+        Write everything queued so far. Returns (written, dropped): the
+        (entry, bet) pairs saved and the entries that were refunded instead.
+
+        Any error other than a rejected row propagates with the failed batch
+        still in the processing list, to be written by the next flush.
+        """
+        written, dropped = [], []
+        while True:
+            entries = self.drain()
+            if not entries:
+                return written, dropped
+            batch_written, batch_dropped = write_bets(entries)
+            self.ack()
+            written.extend(batch_written)
+            dropped.extend(batch_dropped)
+
+
+def _build_rows(entries):
+    bets, txs, logs = [], [], []
+    for entry in entries:
+        amount = Decimal(entry["amount"])
+        bets.append(CrashBet(
+            user_id=entry["user_id"],
+            round_id=entry["round_id"],
+            bet_amount=amount,
+            auto_cashout=Decimal(entry["auto_cashout"]) if entry["auto_cashout"] else None,
+            status="ACTIVE",
+            is_demo=entry["is_demo"],
+            ip_address=entry["ip"],
+            device_fingerprint=entry["device_fp"][:256],
+        ))
+        txs.append(WalletTransaction(
+            user_id=entry["user_id"],
+            amount=amount,
+            tx_type=WalletTransaction.DEBIT,
+            reference=entry["ref"],
+            meta={
+                "reason": "crash_bet",
+                "taken_from_wallet": entry["from_wallet"],
+                "taken_from_spot": entry["from_spot"],
+                "placed_at": entry["placed_at"],
+            },
+        ))
+        logs.append(AuditLog(
+            user_id=entry["user_id"],
+            action="BET_PLACED",
+            ip_address=entry["ip"],
+            details={
+                "amount": str(amount),
+                "reference": entry["ref"],
+                "wallet_used": entry["from_wallet"],
+                "spot_used": entry["from_spot"],
+                "placed_at": entry["placed_at"],
+            },
+        ))
+    return bets, txs, logs
+
+
+def refund_reference(entry) -> str:
+    return f"{entry['ref']}-REFUND"
+
+
+def _refund(entry):
+    """
+    Give a rejected bet's stake back. The CREDIT transaction doubles as the
+    marker that keeps a retried batch from refunding it twice.
+    """
+    release_bet_funds(entry["user_id"], Decimal(entry["from_wallet"]), Decimal(entry["from_spot"]))
+    WalletTransaction.objects.create(
+        user_id=entry["user_id"],
+        amount=Decimal(entry["amount"]),
+        tx_type=WalletTransaction.CREDIT,
+        reference=refund_reference(entry),
+        meta={"reason": "crash_bet_rejected", "bet_reference": entry["ref"]},
+    )
+
+
+def _already_handled(entries):
+    """
+    Entries of a batch that an earlier attempt committed before it could
+    ack: (written entries with their stored bets, refunded entries).
+    """
+    refs = set(
+        WalletTransaction.objects.filter(
+            reference__in=[entry["ref"] for entry in entries] + [refund_reference(entry) for entry in entries]
+        ).values_list("reference", flat=True)
+    )
+    if not refs:
+        return [], []
+    refunded = [entry for entry in entries if refund_reference(entry) in refs]
+    stored = [entry for entry in entries if entry["ref"] in refs and refund_reference(entry) not in refs]
+    bets = {
+        (bet.round_id, bet.user_id): bet
+        for bet in CrashBet.objects.filter(
+            round_id__in={entry["round_id"] for entry in stored},
+            user_id__in=[entry["user_id"] for entry in stored],
+        )
+    }
+    return [(entry, bets[(entry["round_id"], entry["user_id"])]) for entry in stored], refunded
+
+
+def write_bets(entries):
+    """
+    bulk_create one batch in a single transaction. If the batch is rejected
+    (e.g. a bet that raced in through the REST endpoint), fall back to one
+    savepoint per entry and refund the ones that still fail, all in one
+    transaction. Entries an earlier attempt at the batch already handled
+    come back as they were written or refunded then.
+    """
+    handled_written, handled_dropped = _already_handled(entries)
+    if handled_written or handled_dropped:
+        done = {entry["ref"] for entry, _ in handled_written} | {entry["ref"] for entry in handled_dropped}
+        rest = [entry for entry in entries if entry["ref"] not in done]
+        written, dropped = write_bets(rest) if rest else ([], [])
+        return handled_written + written, handled_dropped + dropped
+
+    bets, txs, logs = _build_rows(entries)
+    try:
+        with transaction.atomic():
+            CrashBet.objects.bulk_create(bets)
+            WalletTransaction.objects.bulk_create(txs)
+            AuditLog.objects.bulk_create(logs)
+        return list(zip(entries, bets)), []
+    except IntegrityError:
+        logger.warning(f"[CRASH] Bet batch of {len(entries)} rejected, writing one by one")
+
+    written, dropped = [], []
+    with transaction.atomic():
+        for entry, bet, tx, log in zip(entries, bets, txs, logs):
+            try:
+                with transaction.atomic():
+                    for row in (bet, tx, log):
+                        # May carry a pk from the rolled back bulk insert
+                        row.pk = None
+                        row.save()
+                written.append((entry, bet))
+            except IntegrityError as e:
+                logger.error(f"[CRASH] Dropping bet {entry['ref']}: {e}")
+                _refund(entry)
+                dropped.append(entry)
+    for entry in dropped:
+        RoundLedger(entry["round_id"]).release(entry["user_id"], Decimal(entry["amount"]))
+    return written, dropped
@@ -0,0 +1,155 @@
+"""
+Live per-round bet ledger in Redis.
+
+Holds each player's stake and the round's total exposure so bet limits from
+RiskSettings are enforced with one Lua call instead of SQL aggregates over
+CrashBet. Amounts are stored in kobo (integer cents) to keep Lua arithmetic
+exact.
+
+Keys (TTL LEDGER_TTL):
+    crash:ledger:<round_id>:users     hash user_id -> stake
+    crash:ledger:<round_id>:exposure  round total
+    crash:ledger:<round_id>:ready     set once the ledger matches the DB
+"""
+from decimal import Decimal
+
+from django.db.models import Sum
+
+from .models import CrashBet
+from .redis_lock import shared_redis
+
+LEDGER_TTL = 3600  # seconds
+
+# Statuses that count towards round exposure
+EXPOSED_STATUSES = ["PENDING", "ACTIVE", "CASHED_OUT"]
+
+OK = 1
+ALREADY_BET = -1
+PLAYER_LIMIT = -2
+EXPOSURE_LIMIT = -3
+NOT_READY = -4
+
+RESERVE_LUA = """
+if redis.call('EXISTS', KEYS[3]) == 0 then
+    return -4
+end
+local current = tonumber(redis.call('HGET', KEYS[1], ARGV[1]) or '0')
+if current > 0 then
+    return -1
+end
+local amount = tonumber(ARGV[2])
+if current + amount > tonumber(ARGV[3]) then
+    return -2
+end
+local exposure = tonumber(redis.call('GET', KEYS[2]) or '0')
+if exposure + amount > tonumber(ARGV[4]) then
+    return -3
+end
+redis.call('HINCRBY', KEYS[1], ARGV[1], amount)
+redis.call('INCRBY', KEYS[2], amount)
+redis.call('EXPIRE', KEYS[1], ARGV[5])
+redis.call('EXPIRE', KEYS[2], ARGV[5])
+return 1
+"""
+
+RELEASE_LUA = """
+local left = redis.call('HINCRBY', KEYS[1], ARGV[1], -tonumber(ARGV[2]))
+if left <= 0 then
+    redis.call('HDEL', KEYS[1], ARGV[1])
+end
+redis.call('DECRBY', KEYS[2], ARGV[2])
+return left
+"""
+
+# Load a DB snapshot unless another process already did
+LOAD_LUA = """
+if redis.call('EXISTS', KEYS[3]) == 1 then
+    return 0
+end
+redis.call('DEL', KEYS[1])
+local n = tonumber(ARGV[2])
+for i = 1, n do
+    redis.call('HSET', KEYS[1], ARGV[2 + 2 * i - 1], ARGV[2 + 2 * i])
+end
+redis.call('SET', KEYS[2], ARGV[3 + 2 * n])
+redis.call('SET', KEYS[3], '1')
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+redis.call('EXPIRE', KEYS[2], ARGV[1])
+redis.call('EXPIRE', KEYS[3], ARGV[1])
+return 1
+"""
+
+
+def to_kobo(amount: Decimal) -> int:
+    return int((Decimal(amount) * 100).to_integral_value())
+
+
+class RoundLedger:
+    def __init__(self, round_id, client=None):
+        self.round_id = round_id
+        self.r = client or shared_redis()
+        prefix = f"crash:ledger:{round_id}"
+        self.keys = [f"{prefix}:users", f"{prefix}:exposure", f"{prefix}:ready"]
+
+    def reserve(self, user_id, amount: Decimal, risk) -> int:
+        """
+        Atomically check the per-player and round exposure limits and book
+        the stake. Returns one of OK / ALREADY_BET / PLAYER_LIMIT /
+        EXPOSURE_LIMIT; rebuilds from the DB first if the ledger is missing.
+        """
+        args = [
+            user_id,
+            to_kobo(amount),
+            to_kobo(risk.max_bet_per_player_per_round),
+            to_kobo(risk.max_exposure_per_round),
+            LEDGER_TTL,
+        ]
+        result = self.r.eval(RESERVE_LUA, len(self.keys), *self.keys, *args)
+        if result == NOT_READY:
+            self.rebuild()
+            result = self.r.eval(RESERVE_LUA, len(self.keys), *self.keys, *args)
+        return int(result)
+
+    def release(self, user_id, amount: Decimal):
+        """Undo a reservation (bet failed after reserve, or was cancelled)"""
+        self.r.eval(RELEASE_LUA, 2, self.keys[0], self.keys[1], user_id, to_kobo(amount))
+
+    def initialize(self):
+        """New round: nothing staked yet"""
+        self._load({}, 0)
+
+    def rebuild(self):
+        """
+        Recompute the ledger from CrashBet plus the bets still in the intake
+        queue, e.g. after an engine restart or an expired key. The queue is
+        read first: a bet written in between is then seen twice and counted
+        once, never missed. A player has one bet per round, so a queued
+        entry of a player who already has a CrashBet is that same bet.
+        """
+        # intake imports this module
+        from .intake import BetIntake
+
+        queued = BetIntake(self.round_id, self.r).queued()
+        rows = (
+            CrashBet.objects.filter(round_id=self.round_id, status__in=EXPOSED_STATUSES)
+            .values("user_id")
+            .annotate(total=Sum("bet_amount"))
+        )
+        users = {row["user_id"]: to_kobo(row["total"]) for row in rows}
+        for entry in queued:
+            users.setdefault(int(entry["user_id"]), to_kobo(entry["amount"]))
+        self._load(users, sum(users.values()))
+
+    def _load(self, users: dict, exposure: int):
+        args = [LEDGER_TTL, len(users)]
+        for user_id, total in users.items():
+            args.extend([user_id, total])
+        args.append(exposure)
+        self.r.eval(LOAD_LUA, len(self.keys), *self.keys, *args)
+
+    def reset(self):
+        """Drop the ledger so the next reserve() rebuilds it from the DB"""
+        self.r.delete(*self.keys)
+
+    def exposure(self) -> Decimal:
+        return Decimal(int(self.r.get(self.keys[1]) or 0)) / 100
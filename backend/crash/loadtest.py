@@ -0,0 +1,249 @@
+"""
+Websocket load test for CrashConsumer.
+
+Thousands of simulated players connect to the consumer in-process through
+channels.testing, over whatever channel layer is configured (Redis by
+default), while an AsyncRound drives one real round on the same loop. The
+engine's sends are timestamped by TimestampingLayer, so each client can
+measure how late every frame reached it and count the ticks it never got.
+
+Scenarios are fixed mixes of behaviour so runs can be compared over time
+(see the loadtest_crash_ws command and its --baseline option).
+"""
+import asyncio
+import json
+import os
+import random
+import resource
+import time
+from dataclasses import dataclass
+from decimal import Decimal
+
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.conf import settings
+from django.core.management.base import CommandError
+
+from .benchmarks import bench_users
+from .ledger import RoundLedger
+from .models import AuditLog, CrashBet, GameRound
+from .protocol import PROTOCOL_DENSE, PROTOCOL_SPARSE
+from .routing import websocket_urlpatterns
+from wallets.models import WalletTransaction
+
+CONNECT_BATCH = 100
+CONNECT_TIMEOUT = 30  # per socket; a loaded layer accepts slowly
+DRAIN_SECONDS = 1.0  # wait for frames still in flight after the crash
+
+
+@dataclass(frozen=True)
+class Scenario:
+    bet: float      # share of clients that bet
+    auto: float     # share of bettors with an auto cashout
+    manual: float   # share of the other bettors that cash out by hand
+    protocol: str = PROTOCOL_DENSE
+
+
+SCENARIOS = {
+    "watch": Scenario(bet=0.0, auto=0.0, manual=0.0),
+    "mixed": Scenario(bet=0.5, auto=0.5, manual=0.6),
+    "rush": Scenario(bet=1.0, auto=0.0, manual=1.0),
+    "sparse": Scenario(bet=0.5, auto=0.5, manual=0.6, protocol=PROTOCOL_SPARSE),
+}
+
+
+def rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as fh:
+            return int(fh.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        # Peak, not current, but all there is off Linux (KiB on Linux, bytes on macOS)
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def frame_key(event, data):
+    """Identifies one flight frame on both sides: the multiplier of a tick, the server_time of a sync"""
+    if event in ("round.multiplier", "multiplier_update"):
+        return data["multiplier"]
+    return f"sync:{data['server_time']}"
+
+
+class TimestampingLayer:
+    """Wraps the engine's channel layer and records when each flight frame was sent"""
+
+    def __init__(self, layer):
+        self._layer = layer
+        self.sent = {PROTOCOL_DENSE: {}, PROTOCOL_SPARSE: {}}  # frame key -> perf_counter at send
+
+    def __getattr__(self, name):
+        return getattr(self._layer, name)
+
+    async def group_send(self, group, message):
+        if message["type"] == "round.multiplier":
+            self.sent[PROTOCOL_DENSE].setdefault(frame_key(message["type"], message["data"]), time.perf_counter())
+        elif message["type"] == "round.sync":
+            self.sent[PROTOCOL_SPARSE].setdefault(frame_key(message["type"], message["data"]), time.perf_counter())
+        await self._layer.group_send(group, message)
+
+
+class LoadClient:
+    """One simulated player: a websocket, a role and what it received"""
+
+    def __init__(self, user, path, protocol, stake=None, auto_cashout=None, manual_at=None):
+        self.user = user
+        self.path = path
+        self.protocol = protocol
+        self.stake = stake
+        self.auto_cashout = auto_cashout
+        self.manual_at = manual_at
+        self.communicator = None
+        self.bet_id = None
+        self.cashout_sent = False
+        self.frames = []  # (frame key, perf_counter at receipt)
+        self.counts = {}
+
+    def count(self, key):
+        self.counts[key] = self.counts.get(key, 0) + 1
+
+    async def connect(self, application):
+        self.communicator = WebsocketCommunicator(application, self.path)
+        self.communicator.scope["user"] = self.user
+        connected, _ = await self.communicator.connect(timeout=CONNECT_TIMEOUT)
+        if not connected:
+            raise RuntimeError(f"{self.user.username} could not connect")
+        await self.communicator.receive_json_from(timeout=CONNECT_TIMEOUT)  # handshake
+
+    async def run(self):
+        """Listen until cancelled"""
+        while True:
+            # Straight from the output queue: receive_output(timeout=...) would
+            # cancel the consumer when it times out
+            message = json.loads((await self.communicator.output_queue.get())["text"])
+            now = time.perf_counter()
+            event, data = message.get("event"), message.get("data") or {}
+
+            if event in ("multiplier_update", "multiplier_sync"):
+                self.frames.append((frame_key(event, data), now))
+                await self._maybe_cash_out(Decimal(data["multiplier"]))
+            elif event == "round_start" and self.stake:
+                await self.communicator.send_json_to({"event": "place_bet", "data": {
+                    "amount": str(self.stake),
+                    "auto_cashout": str(self.auto_cashout) if self.auto_cashout else None,
+                }})
+            elif event == "bet_accepted":
+                self.bet_id = data["bet_id"]
+                self.count("bets")
+            elif event in ("bet_failed", "cashout_success", "cashout_failed", "auto_cashout_triggered", "player_feed"):
+                self.count(event)
+            elif event == "round_crash":
+                self.count("crash")
+
+    async def _maybe_cash_out(self, multiplier):
+        if self.manual_at and self.bet_id and not self.cashout_sent and multiplier >= self.manual_at:
+            self.cashout_sent = True
+            await self.communicator.send_json_to({"event": "cashout", "data": {
+                "bet_id": self.bet_id, "multiplier": str(multiplier),
+            }})
+
+    async def close(self):
+        if self.communicator:
+            await self.communicator.disconnect()
+
+    @property
+    def role(self):
+        if not self.stake:
+            return "watch"
+        return "auto" if self.auto_cashout else "manual" if self.manual_at else "ride"
+
+
+def build_clients(users, scenario, path, stake, crash_point, min_auto, seed=0):
+    """
+    Roles and targets are drawn from a seeded RNG so the same scenario gives
+    the same mix on every run. Targets go up to 1.2x the crash point: some
+    cashouts are meant to miss.
+    """
+    rng = random.Random(seed)
+    if scenario.protocol == PROTOCOL_SPARSE:
+        path = f"{path}?protocol={PROTOCOL_SPARSE}"
+    ceiling = float(crash_point) * 1.2
+    clients = []
+    for user in users:
+        client = LoadClient(user, path, scenario.protocol)
+        if rng.random() < scenario.bet:
+            client.stake = stake
+            target = Decimal(str(round(rng.uniform(float(min_auto), ceiling), 2)))
+            if rng.random() < scenario.auto:
+                client.auto_cashout = max(target, min_auto)
+            elif rng.random() < scenario.manual:
+                client.manual_at = target
+        clients.append(client)
+    return clients
+
+
+async def connect_all(clients, application=None):
+    application = application or URLRouter(websocket_urlpatterns)
+    for i in range(0, len(clients), CONNECT_BATCH):
+        await asyncio.gather(*(client.connect(application) for client in clients[i:i + CONNECT_BATCH]))
+
+
+async def close_all(clients):
+    for i in range(0, len(clients), CONNECT_BATCH):
+        await asyncio.gather(*(client.close() for client in clients[i:i + CONNECT_BATCH]))
+
+
+def require_disposable_db(confirmed: bool):
+    """
+    Load tests create and delete users, wallets and rounds. Refuse to run
+    unless the operator vouched for the database (--i-know-this-db) or the
+    settings mark it as a throwaway one (CRASH_LOADTEST_DB).
+    """
+    if not (confirmed or settings.CRASH_LOADTEST_DB):
+        name = settings.DATABASES["default"]["NAME"]
+        raise CommandError(
+            f"This writes and deletes test users and rounds in {name}: pass --i-know-this-db, "
+            "or set CRASH_LOADTEST_DB=true on a database that is only used for testing"
+        )
+
+
+def cleanup(prefix, room):
+    """
+    Delete the test users made with make_users(prefix=...), their money
+    trail, and the rounds of room that no one else has bet in
+    """
+    users = bench_users(prefix)
+    played_by_others = CrashBet.objects.exclude(user__in=users).values("round_id")
+    round_ids = set(
+        GameRound.objects.filter(room=room).exclude(id__in=played_by_others).values_list("id", flat=True)
+    )
+    round_ids.update(
+        CrashBet.objects.filter(user__in=users)
+        .exclude(round_id__in=played_by_others)
+        .values_list("round_id", flat=True)
+    )
+    for round_id in round_ids:
+        RoundLedger(round_id).reset()
+    AuditLog.objects.filter(user__in=users).delete()
+    WalletTransaction.objects.filter(user__in=users).delete()
+    GameRound.objects.filter(id__in=round_ids).delete()
+    users.delete()
+
+
+def report(clients, layer):
+    """
+    Delivery lag of every frame a client got, against the moment the engine
+    sent it, and the frames it never got. Frames sent before a client was
+    connected do not exist here: every client connects before round.start.
+    """
+    lags, dropped, expected = [], 0, 0
+    counts = {}
+    roles = {}
+    for client in clients:
+        sent = layer.sent[client.protocol]
+        received = {key for key, _ in client.frames}
+        lags.extend(at - sent[key] for key, at in client.frames if key in sent)
+        expected += len(sent)
+        dropped += len(sent.keys() - received)
+        roles[client.role] = roles.get(client.role, 0) + 1
+        for key, value in client.counts.items():
+            counts[key] = counts.get(key, 0) + value
+    return {"lags": lags, "frames": expected, "dropped": dropped, "counts": counts, "roles": roles}
@@ -0,0 +1,92 @@
+import asyncio
+import time
+from collections import Counter
+from decimal import Decimal
+
+from channels.layers import channel_layers
+from django.core.management.base import BaseCommand
+
+from crash import engine, async_engine
+from crash.benchmarks import RecordingChannelLayer, percentile
+from crash.models import GameRound
+
+
+class Command(BaseCommand):
+    help = "Compare tick jitter and CPU per round of the blocking and asyncio crash engines"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rounds", type=int, default=3, help="Rounds per engine (default: 3)")
+        parser.add_argument(
+            "--crash-point",
+            default="3.00",
+            help="Crash point of every benchmark round (default: 3.00, about 4.4s of flight)",
+        )
+        parser.add_argument(
+            "--send-latency",
+            type=float,
+            default=1.0,
+            help="Simulated channel layer latency per send in ms (default: 1.0)",
+        )
+        parser.add_argument(
+            "--betting",
+            type=float,
+            default=1.0,
+            help="Betting phase length in seconds for the benchmark (default: 1.0)",
+        )
+
+    def handle(self, *args, **options):
+        crash_point = Decimal(options["crash_point"])
+        latency = options["send_latency"] / 1000
+
+        for module in (engine, async_engine):
+            module.BETTING_DURATION = options["betting"]
+            module.COOLDOWN_DURATION = 0
+
+        rows = []
+        flight_sends = Counter()
+        for name, runner in (("blocking", self._run_blocking), ("asyncio", self._run_async)):
+            jitter, cpu, ticks = [], [], []
+            for _ in range(options["rounds"]):
+                round_obj = GameRound.objects.create(
+                    server_seed="bench",
+                    server_seed_hash="bench",
+                    client_seed="bench",
+                    nonce=0,
+                    crash_point=crash_point,
+                )
+                layer = RecordingChannelLayer(send_latency=latency)
+                channel_layers.set("default", layer)
+                try:
+                    cpu_start = time.process_time()
+                    runner(round_obj, layer)
+                    cpu.append(time.process_time() - cpu_start)
+                finally:
+                    round_obj.delete()
+
+                intervals = [b - a for a, b in zip(layer.tick_times, layer.tick_times[1:])]
+                jitter.extend(abs(i - engine.TICK_INTERVAL) for i in intervals)
+                ticks.append(len(layer.tick_times))
+                flight_sends.update(layer.flight_sends)
+
+            rows.append((name, jitter, cpu, ticks))
+
+        self.stdout.write(
+            f"{'engine':<10} {'ticks/round':>12} {'jitter p50':>12} {'jitter p99':>12} {'cpu/round':>11}"
+        )
+        for name, jitter, cpu, ticks in rows:
+            self.stdout.write(
+                f"{name:<10} {sum(ticks) / len(ticks):>12.1f} "
+                f"{percentile(jitter, 50) * 1000:>10.2f}ms "
+                f"{percentile(jitter, 99) * 1000:>10.2f}ms "
+                f"{sum(cpu) / len(cpu) * 1000:>9.1f}ms"
+            )
+
+        self.stdout.write("\nFlight broadcasts per group (all rounds, both engines):")
+        for group, count in sorted(flight_sends.items()):
+            self.stdout.write(f"  {group:<24} {count:>6}")
+
+    def _run_blocking(self, round_obj, layer):
+        engine.run_single_round(round_obj)
+
+    def _run_async(self, round_obj, layer):
+        asyncio.run(async_engine.run_single_round_async(round_obj, channel_layer=layer))
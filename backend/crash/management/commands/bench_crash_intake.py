@@ -0,0 +1,129 @@
+import asyncio
+import time
+from decimal import Decimal
+
+from channels.db import database_sync_to_async
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from crash.benchmarks import bench_users, percentile, make_users, make_round
+from crash.consumers import CrashConsumer
+from crash.intake import BetIntake
+from crash.ledger import RoundLedger
+from crash.protocol import DEFAULT_ROOM
+from crash.models import AuditLog, CrashBet, GameRound, RiskSettings
+from wallets.models import WalletTransaction
+from wallets.services import place_bet_atomic
+
+PREFIX = "benchintake"
+
+
+def legacy_place_bet(user, round_id, amount):
+    """Per-bet transaction as the consumer did it before the intake queue"""
+    with transaction.atomic():
+        round_obj = GameRound.objects.select_for_update().get(id=round_id)
+        if CrashBet.objects.filter(user=user, round=round_obj).exists():
+            raise ValueError("You already have an active bet in this round")
+        CrashBet.objects.filter(
+            user=user, round=round_obj, status__in=["PENDING", "ACTIVE"]
+        ).aggregate(total=Sum("bet_amount"))
+        CrashBet.objects.filter(
+            round=round_obj, status__in=["PENDING", "ACTIVE", "CASHED_OUT"]
+        ).aggregate(total=Sum("bet_amount"))
+        place_bet_atomic(user, amount, f"CRASHBET-{round_id}-{user.id}-{int(timezone.now().timestamp())}")
+        return CrashBet.objects.create(
+            user=user, round=round_obj, bet_amount=amount, status="ACTIVE",
+            ip_address="127.0.0.1", device_fingerprint="bench",
+        )
+
+
+class Command(BaseCommand):
+    help = "Throughput of N simultaneous crash bettors: per-bet transactions vs the intake queue (needs Redis)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--bettors", type=int, default=1000, help="Simultaneous bettors (default: 1000)")
+        parser.add_argument("--amount", default=None, help="Stake per bet (default: RiskSettings minimum)")
+
+    def handle(self, *args, **options):
+        bettors = options["bettors"]
+        amount = Decimal(options["amount"] or RiskSettings.get().min_bet_per_player)
+
+        self._cleanup()
+        users = make_users(bettors, prefix=PREFIX)
+        try:
+            legacy = self._run_legacy(users, amount)
+            queued = self._run_intake(users, amount)
+        finally:
+            self._cleanup()
+
+        self.stdout.write(
+            f"{'path':<10} {'accepted':>9} {'wall':>9} {'bets/s':>9} {'ack p50':>10} {'ack p99':>10} {'flush':>9}"
+        )
+        for name, (accepted, wall, acks, flush) in (("per-bet", legacy), ("intake", queued)):
+            self.stdout.write(
+                f"{name:<10} {accepted:>9} {wall:>8.3f}s {accepted / wall if wall else 0:>9.0f} "
+                f"{percentile(acks, 50) * 1000:>8.2f}ms {percentile(acks, 99) * 1000:>8.2f}ms "
+                f"{(f'{flush:.3f}s' if flush is not None else '-'):>9}"
+            )
+
+    def _gather(self, place, users):
+        """Fire every bet at once; returns (accepted, wall, per-bet ack latencies)"""
+        acks = []
+
+        async def one(user):
+            start = time.perf_counter()
+            try:
+                await place(user)
+            except ValueError:
+                return 0
+            acks.append(time.perf_counter() - start)
+            return 1
+
+        async def run_all():
+            return sum(await asyncio.gather(*(one(user) for user in users)))
+
+        start = time.perf_counter()
+        accepted = asyncio.run(run_all())
+        return accepted, time.perf_counter() - start, acks
+
+    def _run_legacy(self, users, amount):
+        round_obj = make_round(status="PENDING")
+        place = database_sync_to_async(legacy_place_bet)
+        accepted, wall, acks = self._gather(lambda user: place(user, round_obj.id, amount), users)
+        return accepted, wall, acks, None
+
+    def _run_intake(self, users, amount):
+        round_obj = make_round(status="PENDING")
+        RoundLedger(round_obj.id).initialize()
+        consumer = CrashConsumer()
+        consumer.is_demo = False
+        consumer.room_name = DEFAULT_ROOM
+        consumer.channel_name = None  # no socket: notifications go through the user groups
+
+        accepted, wall, acks = self._gather(
+            lambda user: consumer._place_bet(user, amount, None, "127.0.0.1", "bench"), users
+        )
+
+        # What the engine does before round.lock_bets
+        intake = BetIntake(round_obj.id)
+        intake.close()
+        start = time.perf_counter()
+        written, dropped = intake.flush()
+        flush = time.perf_counter() - start
+        assert len(written) == accepted and not dropped, "intake flush lost bets"
+        return accepted, wall + flush, acks, flush
+
+    def _cleanup(self):
+        users = bench_users(PREFIX)
+        round_ids = list(
+            CrashBet.objects.filter(user__in=users).values_list("round_id", flat=True).distinct()
+        )
+        for round_id in round_ids:
+            RoundLedger(round_id).reset()
+        AuditLog.objects.filter(user__in=users).delete()
+        WalletTransaction.objects.filter(user__in=users).delete()
+        GameRound.objects.filter(id__in=round_ids).delete()
+        GameRound.objects.filter(server_seed="bench", status="PENDING").delete()
+        users.delete()
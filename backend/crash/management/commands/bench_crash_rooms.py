@@ -0,0 +1,102 @@
+import asyncio
+import math
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+
+from crash import engine, async_engine
+from crash.benchmarks import RecordingChannelLayer, percentile
+from crash.curve import CURVE_BASE, CURVE_RATE
+from crash.models import GameRound
+from crash.redis_lock import shared_redis
+
+
+class Command(BaseCommand):
+    help = "How many crash rooms one event loop (one core) can drive at 20 Hz (needs Redis)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--rooms",
+            default="1,10,50,100,200",
+            help="Comma separated room counts (default: 1,10,50,100,200)",
+        )
+        parser.add_argument(
+            "--crash-point",
+            default="3.00",
+            help="Crash point of every benchmark round (default: 3.00, about 4.4s of flight)",
+        )
+        parser.add_argument(
+            "--send-latency",
+            type=float,
+            default=0.0,
+            help="Simulated channel layer latency per send in ms (default: 0)",
+        )
+        parser.add_argument(
+            "--betting",
+            type=float,
+            default=1.0,
+            help="Betting phase length in seconds for the benchmark (default: 1.0)",
+        )
+
+    def handle(self, *args, **options):
+        counts = [int(c) for c in options["rooms"].split(",") if c.strip()]
+        crash_point = Decimal(options["crash_point"])
+        latency = options["send_latency"] / 1000
+
+        async_engine.BETTING_DURATION = options["betting"]
+        async_engine.COOLDOWN_DURATION = 0
+
+        self.stdout.write(
+            f"{'rooms':>6} {'ticks/room':>11} {'expected':>9} {'lag p50':>10} {'lag p99':>10} {'cpu':>6}  verdict"
+        )
+        # Ticks a room should get at 20 Hz before reaching the crash point
+        flight = math.log(float(crash_point)) / (CURVE_RATE * math.log(CURVE_BASE))
+        expected = flight / engine.TICK_INTERVAL
+        for count in counts:
+            rounds = [
+                GameRound.objects.create(
+                    server_seed="bench",
+                    server_seed_hash="bench",
+                    client_seed="bench",
+                    nonce=0,
+                    crash_point=crash_point,
+                    room=f"bench-{i}",
+                )
+                for i in range(count)
+            ]
+            layer = RecordingChannelLayer(send_latency=latency)
+            try:
+                wall, cpu, runs = self._run(rounds, layer)
+            finally:
+                GameRound.objects.filter(id__in=[r.id for r in rounds]).delete()
+                self._forget_rooms(rounds)
+
+            lags = [lag for run in runs for lag in run.tick_lags]
+            achieved = len(lags) / count
+            p99 = percentile(lags, 99)
+            verdict = "ok" if p99 < engine.TICK_INTERVAL and cpu / wall < 0.9 else "saturated"
+            self.stdout.write(
+                f"{count:>6} {achieved:>11.1f} {expected:>9.1f} "
+                f"{percentile(lags, 50) * 1000:>8.2f}ms {p99 * 1000:>8.2f}ms "
+                f"{cpu / wall * 100:>5.0f}%  {verdict}"
+            )
+
+    def _run(self, rounds, layer):
+        """One full round per room, all rooms on one loop as run_crash_engine --rooms does"""
+        runs = [async_engine.AsyncRound(round_obj, channel_layer=layer) for round_obj in rounds]
+
+        async def run_all():
+            await asyncio.gather(*(run.run() for run in runs))
+
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        asyncio.run(run_all())
+        return time.perf_counter() - wall_start, time.process_time() - cpu_start, runs
+
+    def _forget_rooms(self, rounds):
+        keys = set()
+        for round_obj in rounds:
+            key = round_obj.room_key
+            keys.update({f"crash:history:{key}", f"crash:phase:{key}"})
+        if keys:
+            shared_redis().delete(*keys)
@@ -0,0 +1,61 @@
+from django.core.management.base import BaseCommand
+
+from crash.benchmarks import rolled_back, timed, make_users, make_round, make_bets
+from crash.models import CrashBet
+from wallets.services import settle_lost_bet_atomic, settle_lost_bets_bulk
+
+
+class Command(BaseCommand):
+    help = "Benchmark settling a round's losing crash bets: per-bet vs bulk"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes",
+            default="10,1000,50000",
+            help="Comma separated bet counts (default: 10,1000,50000)",
+        )
+        parser.add_argument(
+            "--legacy-max",
+            type=int,
+            default=50000,
+            help="Skip the per-bet path above this many bets (default: 50000)",
+        )
+
+    def handle(self, *args, **options):
+        sizes = [int(s) for s in options["sizes"].split(",") if s.strip()]
+        legacy_max = options["legacy_max"]
+
+        self.stdout.write(f"{'bets':>8} {'per-bet':>12} {'bulk':>12} {'speedup':>9}")
+
+        for size in sizes:
+            results = {}
+
+            if size <= legacy_max:
+                with rolled_back():
+                    round_obj = self._fixture(size)
+                    bets = list(CrashBet.objects.filter(
+                        round=round_obj, status__in=["PENDING", "ACTIVE"]
+                    ))
+                    with timed(results, "legacy"):
+                        for bet in bets:
+                            settle_lost_bet_atomic(bet)
+
+            with rolled_back():
+                round_obj = self._fixture(size)
+                with timed(results, "bulk"):
+                    settle_lost_bets_bulk(round_obj)
+
+            legacy = results.get("legacy")
+            bulk = results["bulk"]
+            self.stdout.write(
+                f"{size:>8} "
+                f"{(f'{legacy:.3f}s' if legacy is not None else 'skipped'):>12} "
+                f"{bulk:>11.3f}s "
+                f"{(f'{legacy / bulk:.1f}x' if legacy is not None and bulk else '-'):>9}"
+            )
+
+    def _fixture(self, size):
+        users = make_users(size)
+        round_obj = make_round(status="CRASHED")
+        make_bets(round_obj, users)
+        return round_obj
@@ -0,0 +1,153 @@
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from crash.checkpoint import EngineCheckpoint, now_ms, PHASE_BETTING, PHASE_RUNNING
+from crash.models import CrashBet, GameRound
+from crash.protocol import room_key
+from crash.redis_lock import RedisEngineLock
+
+
+class Command(BaseCommand):
+    help = (
+        "Chaos test for hot-standby failover: SIGKILL the active crash engine mid-round "
+        "and check that the standby takes the room over (needs Redis)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--mode", choices=["real", "demo"], default="demo", help="Engine mode (default: demo)")
+        parser.add_argument("--room", default="chaos", help="Dedicated room for the test (default: chaos)")
+        parser.add_argument("--cycles", type=int, default=3, help="Engines to kill, one after the other (default: 3)")
+        parser.add_argument(
+            "--kill-phase",
+            choices=[PHASE_BETTING, PHASE_RUNNING],
+            default=PHASE_RUNNING,
+            help="Phase the active engine is killed in (default: running)",
+        )
+        parser.add_argument(
+            "--lock-ttl",
+            type=int,
+            default=8,
+            help="Engine lock TTL in seconds; the engine renews at most every 5s (default: 8)",
+        )
+        parser.add_argument("--heartbeat-interval", type=float, default=2, help="Engine heartbeat (default: 2)")
+        parser.add_argument("--timeout", type=float, default=120, help="Give up on a cycle after this many seconds")
+        parser.add_argument("--async", action="store_true", dest="use_async", help="Run the asyncio engine")
+
+    def handle(self, *args, **options):
+        self.options = options
+        mode, room = options["mode"], options["room"]
+        try:
+            key = room_key(mode, room)
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        lock = RedisEngineLock(f"crash:engine:{key}", options["lock_ttl"])
+        if not lock.acquire():
+            raise CommandError(f"An engine is already running room {key}")
+        lock.release()
+
+        checkpoint = EngineCheckpoint(key)
+        checkpoint.clear()
+        bound = options["lock_ttl"] + lock.poll_interval
+
+        self.stdout.write(f"[CHAOS:{key}] lock TTL {options['lock_ttl']}s, takeover expected within {bound:.1f}s")
+        self.stdout.write(
+            f"{'cycle':>5} {'round':>7} {'killed in':>10} {'outcome':>8} {'takeover':>9} {'next round':>11}  verdict"
+        )
+
+        active = self._spawn(standby=False)
+        standby = None
+        failures = 0
+        try:
+            # The first engine is up once it checkpoints a round
+            self._wait(checkpoint.load, "the first engine to start a round")
+
+            for cycle in range(1, options["cycles"] + 1):
+                standby = self._spawn(standby=True)
+
+                record = self._wait(
+                    lambda: self._in_phase(checkpoint.load(), options["kill_phase"]),
+                    f"a round in phase {options['kill_phase']}",
+                )
+                victim = record["round_id"]
+                active.kill()
+                active.wait()
+                killed_at = now_ms()
+
+                # First checkpoint the standby writes after taking the lock over
+                taken = self._wait(
+                    lambda: self._written_after(checkpoint.load(), killed_at), "the standby to take over"
+                )
+                takeover = (taken["written_at"] - killed_at) / 1000
+
+                round_obj = self._wait(
+                    lambda: GameRound.objects.filter(id=victim, status__in=["SETTLED", "VOIDED"]).first(),
+                    f"round {victim} to settle or void",
+                )
+                following = self._wait(
+                    lambda: self._later_round(checkpoint.load(), victim), "the next round to start"
+                )
+                open_bets = CrashBet.objects.filter(round_id=victim, status__in=["PENDING", "ACTIVE"]).count()
+
+                ok = takeover <= bound and not open_bets
+                failures += not ok
+                self.stdout.write(
+                    f"{cycle:>5} {victim:>7} {options['kill_phase']:>10} {round_obj.status:>8} "
+                    f"{takeover:>8.2f}s {following['round_id']:>11}  "
+                    + ("ok" if ok else f"FAILED ({open_bets} open bet(s))" if open_bets else "FAILED (slow)")
+                )
+
+                # The standby is the active engine now
+                active, standby = standby, None
+        finally:
+            for process in (active, standby):
+                if process and process.poll() is None:
+                    process.terminate()
+                    try:
+                        process.wait(timeout=options["lock_ttl"] + 30)
+                    except subprocess.TimeoutExpired:
+                        process.kill()
+
+        if failures:
+            raise CommandError(f"{failures} of {options['cycles']} failover(s) failed")
+
+    def _spawn(self, standby):
+        options = self.options
+        command = [
+            sys.executable, "manage.py", "run_crash_engine",
+            "--mode", options["mode"],
+            "--rooms", options["room"],
+            "--lock-ttl", str(options["lock_ttl"]),
+            "--heartbeat-interval", str(options["heartbeat_interval"]),
+        ]
+        if standby:
+            command.append("--standby")
+        if options["use_async"]:
+            command.append("--async")
+        output = None if options["verbosity"] > 1 else subprocess.DEVNULL
+        return subprocess.Popen(command, cwd=settings.BASE_DIR, stdout=output, stderr=output)
+
+    def _wait(self, probe, what, interval=0.05):
+        deadline = time.monotonic() + self.options["timeout"]
+        while time.monotonic() < deadline:
+            result = probe()
+            if result:
+                return result
+            time.sleep(interval)
+        raise CommandError(f"Timed out waiting for {what}")
+
+    @staticmethod
+    def _in_phase(record, phase):
+        return record if record and record["phase"] == phase else None
+
+    @staticmethod
+    def _written_after(record, ms):
+        return record if record and record["written_at"] > ms else None
+
+    @staticmethod
+    def _later_round(record, round_id):
+        return record if record and record["round_id"] > round_id else None
@@ -0,0 +1,54 @@
+import os
+from django.core.management.base import BaseCommand, CommandError
+
+from crash.protocol import DEFAULT_ROOM, group_name, room_key
+from crash.seed_chain import commit_client_seed, default_chain_path
+
+
+class Command(BaseCommand):
+    help = "Record the client seed of a seed chain whose terminating hash has been published (once per chain)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "client_seed",
+            help="A value fixed only after the terminating hash was published, e.g. a later Bitcoin block hash",
+        )
+        parser.add_argument(
+            "--source",
+            default="",
+            help='Where the client seed came from, published with it (e.g. "bitcoin block 870000")',
+        )
+        parser.add_argument(
+            "--mode",
+            choices=["real", "demo"],
+            default="real",
+            help="Engine mode the chain is for (default: real)",
+        )
+        parser.add_argument(
+            "--room",
+            default=DEFAULT_ROOM,
+            help=f"Room the chain is for (default: {DEFAULT_ROOM})",
+        )
+        parser.add_argument(
+            "--chain",
+            help="Chain file path (default: CRASH_SEED_CHAIN_DIR/crash_<mode>[.<room>].chain)",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            mode = room_key(options["mode"], options["room"])
+        except ValueError as e:
+            raise CommandError(str(e))
+        path = options["chain"] or default_chain_path(group_name(mode))
+
+        if not os.path.exists(path):
+            raise CommandError(f"{path} does not exist")
+
+        try:
+            record = commit_client_seed(path, options["client_seed"], options["source"])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(self.style.SUCCESS(f"[SEEDS:{mode}] Client seed committed."))
+        self.stdout.write(f"Terminating hash: {record['terminating_hash']}")
+        self.stdout.write(f"Client seed (publish this): {record['client_seed']}")
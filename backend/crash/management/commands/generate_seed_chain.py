@@ -0,0 +1,69 @@
+import os
+from django.core.management.base import BaseCommand, CommandError
+
+from crash.protocol import DEFAULT_ROOM, group_name, room_key
+from crash.seed_chain import default_chain_path, generate_chain
+
+
+class Command(BaseCommand):
+    help = "Precompute a reverse hash chain of crash server seeds"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--mode",
+            choices=["real", "demo"],
+            default="real",
+            help="Engine mode the chain is for (default: real)",
+        )
+        parser.add_argument(
+            "--room",
+            default=DEFAULT_ROOM,
+            help=f"Room the chain is for (default: {DEFAULT_ROOM})",
+        )
+        parser.add_argument(
+            "--length",
+            type=int,
+            default=10_000_000,
+            help="Number of seeds / games in the chain (default: 10,000,000)",
+        )
+        parser.add_argument(
+            "--output",
+            help="Chain file path (default: CRASH_SEED_CHAIN_DIR/crash_<mode>[.<room>].chain)",
+        )
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Overwrite an existing chain file",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            mode = room_key(options["mode"], options["room"])
+        except ValueError as e:
+            raise CommandError(str(e))
+        length = options["length"]
+        path = options["output"] or default_chain_path(group_name(mode))
+
+        if length <= 0:
+            raise CommandError("--length must be positive")
+
+        if not options["force"] and os.path.exists(path):
+            raise CommandError(
+                f"{path} already exists. Replacing a live chain restarts the game "
+                f"numbering; pass --force if that is intended."
+            )
+
+        self.stdout.write(f"[SEEDS:{mode}] Generating {length:,} seeds into {path}")
+
+        terminating_hash = generate_chain(
+            path,
+            length,
+            progress=lambda done: self.stdout.write(f"  {done:,} / {length:,}"),
+        )
+
+        self.stdout.write(self.style.SUCCESS(f"[SEEDS:{mode}] Done."))
+        self.stdout.write(f"Terminating hash (publish this): {terminating_hash}")
+        self.stdout.write(
+            "Then pick a client seed nobody could know yet (e.g. the hash of a Bitcoin block mined "
+            "after the announcement) and record it with commit_chain_client_seed before playing the chain."
+        )
@@ -0,0 +1,217 @@
+import asyncio
+import json
+import logging
+import math
+import time
+from decimal import Decimal
+
+from channels.layers import get_channel_layer
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from crash import async_engine, engine
+from crash.benchmarks import make_round, make_users, percentile
+from crash.curve import CURVE_BASE, CURVE_RATE
+from crash.demo import DemoAsyncRound, DemoStore, redis_demo
+from crash.ledger import RoundLedger
+from crash.loadtest import (
+    DRAIN_SECONDS, SCENARIOS, TimestampingLayer, build_clients, cleanup, close_all, connect_all, report,
+    require_disposable_db, rss_bytes,
+)
+from crash.models import RiskSettings
+from crash.redis_lock import shared_redis
+
+PREFIX = "loadtest"
+ROOM = "loadtest"
+
+# Compared against --baseline; all of them get worse as they grow
+REGRESSION_KEYS = ("lag_p50_ms", "lag_p99_ms", "drop_rate", "cpu_per_1k", "rss_per_1k_mb")
+
+
+class Command(BaseCommand):
+    help = (
+        "Websocket load test: thousands of simulated players on CrashConsumer while the engine "
+        "runs a round; reports delivery lag, dropped frames and CPU/memory per 1k sockets (needs Redis)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--clients", type=int, default=1000, help="Simulated players (default: 1000)")
+        parser.add_argument(
+            "--scenario",
+            choices=sorted(SCENARIOS),
+            default="mixed",
+            help="Player mix (default: mixed; see crash/loadtest.py)",
+        )
+        parser.add_argument("--mode", choices=["real", "demo"], default="real", help="Game mode (default: real)")
+        parser.add_argument(
+            "--crash-point",
+            default="3.00",
+            help="Crash point of the test round (default: 3.00, about 4.4s of flight)",
+        )
+        parser.add_argument("--betting", type=float, default=3.0, help="Betting phase length (default: 3.0s)")
+        parser.add_argument(
+            "--layer",
+            choices=["settings", "memory"],
+            default="settings",
+            help="Channel layer: CHANNEL_LAYERS as configured, or in-memory (default: settings)",
+        )
+        parser.add_argument("--seed", type=int, default=0, help="Seed of the player mix (default: 0)")
+        parser.add_argument("--json", dest="json_path", help="Write the results to this file")
+        parser.add_argument("--baseline", help="Fail if the results are worse than this --json file")
+        parser.add_argument(
+            "--i-know-this-db",
+            action="store_true",
+            help="Run against the configured database even though CRASH_LOADTEST_DB is not set",
+        )
+        parser.add_argument(
+            "--tolerance",
+            type=float,
+            default=0.25,
+            help="Allowed regression against --baseline, as a fraction (default: 0.25)",
+        )
+
+    def handle(self, *args, **options):
+        require_disposable_db(options["i_know_this_db"])
+        clients_count = options["clients"]
+        scenario = SCENARIOS[options["scenario"]]
+        crash_point = Decimal(options["crash_point"])
+        is_demo = options["mode"] == "demo"
+        risk = RiskSettings.get()
+
+        if options["verbosity"] < 2:
+            # Rejected bets and late cashouts are part of the load; they are counted below
+            logging.getLogger("crash.consumers").setLevel(logging.CRITICAL)
+
+        async_engine.BETTING_DURATION = options["betting"]
+        async_engine.COOLDOWN_DURATION = 0
+
+        layers = {}
+        if options["layer"] == "memory":
+            layers["CHANNEL_LAYERS"] = {"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}}
+
+        # Demo rooms kept in Redis play on DemoStore, like run_crash_engine --mode demo
+        store = DemoStore(ROOM) if is_demo and redis_demo() else None
+
+        cleanup(PREFIX, ROOM)
+        users = make_users(clients_count, prefix=PREFIX)
+        if store:
+            round_obj = store.create_round()
+            round_obj.crash_point = crash_point
+            store.save_round(round_obj)
+        else:
+            round_obj = make_round(status="PENDING", crash_point=crash_point, is_demo=is_demo, room=ROOM)
+            RoundLedger(round_obj.id).initialize()
+        clients = build_clients(
+            users, scenario, f"/ws/crash/{options['mode']}/{ROOM}/",
+            risk.min_bet_per_player, crash_point, risk.min_auto_cashout, seed=options["seed"],
+        )
+        try:
+            with override_settings(**layers):
+                result = asyncio.run(self._run(clients, round_obj, store))
+        finally:
+            cleanup(PREFIX, ROOM)
+            if store:
+                store.r.delete(
+                    store.round_key, store.bets_key(round_obj.id), *(store.balance_key(user.id) for user in users)
+                )
+            shared_redis().delete(*(f"crash:{name}:{round_obj.room_key}" for name in ("history", "phase", "checkpoint")))
+
+        # Ticks a dense client should get before the crash
+        flight = math.log(float(crash_point)) / (CURVE_RATE * math.log(CURVE_BASE))
+        stats = report(clients, result["layer"])
+        lags = stats["lags"]
+        per_k = clients_count / 1000
+        results = {
+            "scenario": options["scenario"],
+            "clients": clients_count,
+            "layer": options["layer"],
+            "crash_point": str(crash_point),
+            "roles": stats["roles"],
+            "events": stats["counts"],
+            "frames": stats["frames"],
+            "dropped": stats["dropped"],
+            "drop_rate": stats["dropped"] / stats["frames"] if stats["frames"] else 0.0,
+            "lag_p50_ms": percentile(lags, 50) * 1000,
+            "lag_p99_ms": percentile(lags, 99) * 1000,
+            "lag_max_ms": max(lags, default=0.0) * 1000,
+            "connect_s": result["connect"],
+            "round_s": result["wall"],
+            "cpu_per_1k": result["cpu"] / result["wall"] * 100 / per_k,
+            "rss_per_1k_mb": result["rss"] / per_k / 2 ** 20,
+        }
+        self._print(results, flight / engine.TICK_INTERVAL)
+
+        if options["json_path"]:
+            with open(options["json_path"], "w") as fh:
+                json.dump(results, fh, indent=2)
+        if options["baseline"]:
+            self._compare(results, options["baseline"], options["tolerance"])
+
+    async def _run(self, clients, round_obj, store=None):
+        """Connect everyone, then one full round on this loop with every client listening"""
+        layer = TimestampingLayer(get_channel_layer())
+
+        rss_start, connect_start = rss_bytes(), time.perf_counter()
+        await connect_all(clients)
+        connect = time.perf_counter() - connect_start
+        rss = rss_bytes() - rss_start
+
+        listeners = [asyncio.ensure_future(client.run()) for client in clients]
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        try:
+            if store:
+                await DemoAsyncRound(round_obj, store, channel_layer=layer).run()
+            else:
+                await async_engine.AsyncRound(round_obj, channel_layer=layer).run()
+            await asyncio.sleep(DRAIN_SECONDS)
+            wall, cpu = time.perf_counter() - wall_start, time.process_time() - cpu_start
+        finally:
+            for listener in listeners:
+                listener.cancel()
+            await asyncio.gather(*listeners, return_exceptions=True)
+            await close_all(clients)
+        return {"layer": layer, "connect": connect, "rss": rss, "wall": wall, "cpu": cpu}
+
+    def _print(self, results, expected_ticks):
+        events = results["events"]
+        roles = ", ".join(f"{count} {role}" for role, count in sorted(results["roles"].items()))
+        self.stdout.write(
+            f"[LOADTEST] {results['clients']} clients ({roles}), scenario {results['scenario']}, "
+            f"{results['layer']} layer, round @ {results['crash_point']}x (~{expected_ticks:.0f} ticks)"
+        )
+        self.stdout.write(
+            f"  connect  {results['connect_s']:.2f}s, round {results['round_s']:.2f}s, "
+            f"{results['rss_per_1k_mb']:.1f} MB and {results['cpu_per_1k']:.0f}% CPU per 1k sockets"
+        )
+        self.stdout.write(
+            f"  frames   {results['frames']} expected, {results['dropped']} dropped ({results['drop_rate']:.3%}), "
+            f"lag p50={results['lag_p50_ms']:.2f}ms p99={results['lag_p99_ms']:.2f}ms max={results['lag_max_ms']:.2f}ms"
+        )
+        self.stdout.write(
+            f"  bets     {events.get('bets', 0)} accepted, {events.get('bet_failed', 0)} failed; "
+            f"cashouts {events.get('cashout_success', 0)} manual, {events.get('auto_cashout_triggered', 0)} auto, "
+            f"{events.get('cashout_failed', 0)} failed; {events.get('crash', 0)} saw the crash, "
+            f"{events.get('player_feed', 0)} feed frames"
+        )
+
+    def _compare(self, results, path, tolerance):
+        try:
+            with open(path) as fh:
+                baseline = json.load(fh)
+        except (OSError, ValueError) as e:
+            raise CommandError(f"Could not read baseline {path}: {e}")
+        if (baseline["scenario"], baseline["clients"]) != (results["scenario"], results["clients"]):
+            raise CommandError(
+                f"Baseline is {baseline['scenario']} with {baseline['clients']} clients, "
+                f"not {results['scenario']} with {results['clients']}"
+            )
+
+        regressions = []
+        for key in REGRESSION_KEYS:
+            before, after = baseline[key], results[key]
+            # Small absolute slack so a zero baseline does not fail on noise
+            if after > before * (1 + tolerance) + (0.001 if key == "drop_rate" else 0.5):
+                regressions.append(f"{key} {before:.3f} -> {after:.3f}")
+        if regressions:
+            raise CommandError("Regressed against baseline: " + "; ".join(regressions))
+        self.stdout.write(self.style.SUCCESS(f"Within {tolerance:.0%} of baseline {path}"))
@@ -0,0 +1,177 @@
+import asyncio
+import json
+import logging
+from collections import Counter
+
+from channels.routing import URLRouter
+from django.core.management.base import BaseCommand, CommandError
+
+from crash import metrics
+from crash.async_engine import run_engine_async
+from crash.benchmarks import make_users, percentile
+from crash.capture import read_capture
+from crash.demo import DemoStore, redis_demo, run_demo_engine
+from crash.loadtest import cleanup, require_disposable_db
+from crash.protocol import DEFAULT_ROOM, PROTOCOL_SPARSE, room_key
+from crash.redis_lock import shared_redis
+from crash.replay import RESPONSES, ReplayClient, load_sessions, report
+from crash.routing import websocket_urlpatterns
+
+PREFIX = "replay"
+
+
+class Command(BaseCommand):
+    help = (
+        "Replay websocket traffic captured with CRASH_CAPTURE_DIR into a staging room at 1x-50x speed; "
+        "reports how late messages went out and how fast the server answered them (needs Redis)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("files", nargs="+", help="Capture files (.jsonl or .jsonl.gz)")
+        parser.add_argument("--speed", type=float, default=1.0, help="Replay speed, 1 to 50 (default: 1)")
+        parser.add_argument(
+            "--source",
+            help="Captured room key to replay, e.g. real or demo.vip (default: the busiest one)",
+        )
+        parser.add_argument("--room", default=PREFIX, help=f"Room the traffic is replayed into (default: {PREFIX})")
+        parser.add_argument("--skip", type=float, default=0.0, help="Seconds of capture to skip (default: 0)")
+        parser.add_argument("--duration", type=float, help="Seconds of capture to replay (default: all)")
+        parser.add_argument(
+            "--engine",
+            action="store_true",
+            help="Run the room's engine in this process instead of an external run_crash_engine",
+        )
+        parser.add_argument("--json", dest="json_path", help="Write the results to this file")
+        parser.add_argument(
+            "--i-know-this-db",
+            action="store_true",
+            help="Run against the configured database even though CRASH_LOADTEST_DB is not set",
+        )
+
+    def handle(self, *args, **options):
+        require_disposable_db(options["i_know_this_db"])
+        speed = options["speed"]
+        if not 1 <= speed <= 50:
+            raise CommandError("--speed must be between 1 and 50")
+        if options["room"] == DEFAULT_ROOM:
+            raise CommandError("Replay into a room of its own: its rounds are deleted afterwards")
+
+        if options["verbosity"] < 2:
+            # Bets outside a betting window and late cashouts are expected at speed; they are counted below
+            logging.getLogger("crash.consumers").setLevel(logging.CRITICAL)
+
+        records = read_capture(options["files"])
+        source = options["source"] or self._busiest(records)
+        sessions, length = load_sessions(records, room=source, skip=options["skip"], duration=options["duration"])
+        if not sessions:
+            raise CommandError(f"No captured sockets in room {source}")
+
+        mode = sessions[0].mode
+        key = room_key(mode, options["room"])
+        if not options["engine"] and not shared_redis().exists(f"crash:engine:{key}"):
+            raise CommandError(
+                f"No engine hosts {key}: start run_crash_engine --mode {mode} --rooms {options['room']} "
+                "or pass --engine"
+            )
+
+        user_ids = sorted({session.user_id for session in sessions})
+        messages = Counter(event for session in sessions for _, event, _ in session.messages)
+        self.stdout.write(
+            f"[REPLAY] {source}: {len(sessions)} sockets of {len(user_ids)} players, "
+            f"{sum(messages.values())} messages over {length:.0f}s -> {key} at {speed:g}x ({length / speed:.0f}s)"
+        )
+
+        cleanup(PREFIX, options["room"])
+        users = dict(zip(user_ids, make_users(len(user_ids), prefix=PREFIX)))
+        clients = [
+            ReplayClient(
+                session,
+                users[session.user_id],
+                f"/ws/crash/{mode}/{options['room']}/"
+                + (f"?protocol={PROTOCOL_SPARSE}" if session.protocol == PROTOCOL_SPARSE else ""),
+                speed,
+            )
+            for session in sessions
+        ]
+        store = DemoStore(options["room"]) if mode == "demo" and redis_demo() else None
+        try:
+            asyncio.run(self._run(clients, mode, options["room"], options["engine"], store))
+        finally:
+            cleanup(PREFIX, options["room"])
+            if store:
+                store.r.delete(store.round_key, *(store.balance_key(user.id) for user in users.values()))
+
+        stats = report(clients)
+        ticks = metrics.TICK_LAG.recent(room=key) if options["engine"] else []
+        results = {
+            "source": source,
+            "room": key,
+            "speed": speed,
+            "sockets": len(sessions),
+            "players": len(user_ids),
+            "captured_s": length,
+            "sent": {event: stats["counts"].get(event, 0) for event in RESPONSES},
+            "answered": {event: len(values) for event, values in stats["latencies"].items()},
+            "received": {
+                name.split(":", 1)[1]: count for name, count in stats["counts"].items() if name.startswith("recv:")
+            },
+            # Cashouts and cancellations of clients without a bet in this replay
+            "skipped": sum(stats["counts"].get(f"{event}_skipped", 0) for event in RESPONSES),
+            "rate_limited": stats["counts"].get("rate_limited", 0),
+            "connect_failed": stats["counts"].get("connect_failed", 0),
+            "late_p50_ms": percentile(stats["late"], 50) * 1000,
+            "late_p99_ms": percentile(stats["late"], 99) * 1000,
+            "answer_ms": {
+                event: {"p50": percentile(values, 50) * 1000, "p99": percentile(values, 99) * 1000}
+                for event, values in stats["latencies"].items()
+            },
+            "tick_lag_p99_ms": percentile(ticks, 99) * 1000,
+        }
+        self._print(results)
+        if options["json_path"]:
+            with open(options["json_path"], "w") as fh:
+                json.dump(results, fh, indent=2)
+
+    def _busiest(self, records):
+        rooms = Counter(record["r"] for record in records if record["k"] == "in")
+        if not rooms:
+            raise CommandError("The capture has no client messages")
+        return rooms.most_common(1)[0][0]
+
+    async def _run(self, clients, mode, room, with_engine, store):
+        application = URLRouter(websocket_urlpatterns)
+        engine = None
+        if with_engine:
+            if store:
+                engine = asyncio.ensure_future(run_demo_engine(room=room))
+            else:
+                engine = asyncio.ensure_future(run_engine_async(mode == "demo", room=room))
+        try:
+            start = asyncio.get_running_loop().time()
+            await asyncio.gather(*(client.run(application, start) for client in clients))
+        finally:
+            if engine:
+                # Mid-round; the round is deleted by cleanup()
+                engine.cancel()
+                await asyncio.gather(engine, return_exceptions=True)
+
+    def _print(self, results):
+        received = results["received"]
+        self.stdout.write(
+            "  sent     " + ", ".join(f"{count} {event}" for event, count in results["sent"].items())
+            + f" ({results['skipped']} skipped, no bet); {results['rate_limited']} rate limited, "
+            f"{results['connect_failed']} sockets failed to connect"
+        )
+        self.stdout.write(
+            f"  late     p50={results['late_p50_ms']:.2f}ms p99={results['late_p99_ms']:.2f}ms behind schedule"
+        )
+        for event, answer in results["answer_ms"].items():
+            self.stdout.write(
+                f"  {event:<20} answered {results['answered'][event]}, "
+                f"p50={answer['p50']:.2f}ms p99={answer['p99']:.2f}ms"
+            )
+        self.stdout.write(
+            f"  received {sum(received.values())} frames "
+            f"({received.get('player_feed', 0)} feed, {received.get('round_crash', 0)} crash)"
+            + (f", engine tick lag p99={results['tick_lag_p99_ms']:.2f}ms" if results["tick_lag_p99_ms"] else "")
+        )
@@ -1,10 +1,23 @@
+import asyncio
+import logging
 import signal
 import time
 import sys
-from django.core.management.base import BaseCommand
-from crash.engine import create_new_round, run_single_round
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from asgiref.sync import sync_to_async
+from channels.db import database_sync_to_async
+from crash.engine import (
+    create_new_round, run_single_round, open_seed_cursor, recover_open_rounds, take_over_round,
+)
+from crash.async_engine import run_engine_async
+from crash.demo import DemoStore, open_demo_seed_cursor, redis_demo, run_demo_engine, void_demo_round
+from crash import metrics
 from crash.models import RiskSettings
+from crash.history import RoundHistory
+from crash.protocol import DEFAULT_ROOM, room_key
 from crash.redis_lock import RedisEngineLock, LockHeartbeat
+from crash.seed_chain import ClientSeedNotCommitted
 import os
 
 # Prevent Django autoreloader / double execution on Windows
@@ -32,33 +45,67 @@ class Command(BaseCommand):
             default=10,
             help="Heartbeat interval in seconds (default: 10)",
         )
+        parser.add_argument(
+            "--rooms",
+            default=DEFAULT_ROOM,
+            help=(
+                f"Comma separated rooms to host in this process (default: {DEFAULT_ROOM}). "
+                "More than one room implies --async."
+            ),
+        )
+        parser.add_argument(
+            "--seed-chain",
+            help="Seed chain file (default: CRASH_SEED_CHAIN_DIR/crash_<mode>[.<room>].chain)",
+        )
+        parser.add_argument(
+            "--async",
+            action="store_true",
+            dest="use_async",
+            help="Run the asyncio engine (one event loop, drift-corrected ticks)",
+        )
+        parser.add_argument(
+            "--metrics-port",
+            type=int,
+            default=settings.CRASH_METRICS_PORT,
+            help=f"Port of the local Prometheus /metrics endpoint, 0 to disable (default: {settings.CRASH_METRICS_PORT})",
+        )
+        parser.add_argument(
+            "--standby",
+            action="store_true",
+            help=(
+                "Hot standby: wait for each room's lock instead of skipping the room, "
+                "then take over the round the previous engine left in flight"
+            ),
+        )
 
     def handle(self, *args, **options):
         mode = options["mode"]
         is_demo = mode == "demo"
         lock_ttl = options["lock_ttl"]
         heartbeat_interval = options["heartbeat_interval"]
+        use_async = options["use_async"]
+        standby = options["standby"]
 
-        lock_key = f"crash:engine:{mode}"
-        
-        self.stdout.write(f"[ENGINE:{mode}] Starting with lock TTL: {lock_ttl}s, heartbeat: {heartbeat_interval}s")
-
-        lock = RedisEngineLock(lock_key, lock_ttl)
-
-        if not lock.acquire():
-            self.stdout.write(
-                self.style.WARNING(
-                    f"[ENGINE:{mode}] Another engine already running. Exiting."
-                )
-            )
-            return
+        rooms = [room.strip() for room in options["rooms"].split(",") if room.strip()]
+        try:
+            keys = [room_key(mode, room) for room in rooms]
+        except ValueError as e:
+            raise CommandError(str(e))
+        if not rooms:
+            raise CommandError("--rooms needs at least one room")
+        if len(rooms) > 1:
+            if options["seed_chain"]:
+                raise CommandError("--seed-chain can only be used with a single room")
+            # Rooms share one event loop; the blocking engine can only drive one
+            use_async = True
+        if is_demo and redis_demo():
+            # Demo rounds kept in Redis are only driven by the asyncio engine
+            use_async = True
 
         self.stdout.write(
-            self.style.SUCCESS(f"[ENGINE:{mode}] Lock acquired. Engine starting.")
+            f"[ENGINE:{mode}] Starting rooms {', '.join(rooms)} with lock TTL: {lock_ttl}s, heartbeat: {heartbeat_interval}s"
         )
 
-        heartbeat = LockHeartbeat(lock, every_seconds=heartbeat_interval)
-        
         running = True
 
         def shutdown(*_):
@@ -71,23 +118,58 @@ class Command(BaseCommand):
         signal.signal(signal.SIGINT, shutdown)
         signal.signal(signal.SIGTERM, shutdown)
 
+        # One lock per room: another process may already host some of them
+        hosted = []
+        for room, key in zip(rooms, keys):
+            lock = RedisEngineLock(f"crash:engine:{key}", lock_ttl)
+            if standby:
+                # Acquired by the room itself, see _wait_for_lock()
+                hosted.append((room, key, lock, LockHeartbeat(lock, every_seconds=heartbeat_interval)))
+                continue
+            if not lock.acquire():
+                self.stdout.write(
+                    self.style.WARNING(
+                        f"[ENGINE:{key}] Another engine already running. Skipping room."
+                    )
+                )
+                continue
+            self.stdout.write(
+                self.style.SUCCESS(f"[ENGINE:{key}] Lock acquired. Room starting.")
+            )
+            hosted.append((room, key, lock, LockHeartbeat(lock, every_seconds=heartbeat_interval)))
+
+        if not hosted:
+            self.stdout.write(
+                self.style.WARNING(f"[ENGINE:{mode}] No room left to host. Exiting.")
+            )
+            return
+
+        self._configure_logging(options["verbosity"])
+        metrics_server = self._start_metrics(options["metrics_port"])
+
         try:
             # ensure singleton exists (table must already exist)
             RiskSettings.get()
 
-            while running:
-                heartbeat.tick()  # 🔒 renew lock before starting round
-                
-                round_start = time.time()
-                round_obj = create_new_round(is_demo=is_demo)
-                
-                # PASS heartbeat to run_single_round
-                run_single_round(round_obj, heartbeat=heartbeat)
-                
-                round_duration = time.time() - round_start
-                self.stdout.write(
-                    self.style.SUCCESS(f"[ENGINE:{mode}] Round completed in {round_duration:.2f} seconds")
-                )
+            if use_async:
+                self.stdout.write(f"[ENGINE:{mode}] Using asyncio engine for {len(hosted)} room(s).")
+                asyncio.run(self._run_rooms(is_demo, hosted, options["seed_chain"], standby, lambda: running))
+            else:
+                room, key, lock, heartbeat = hosted[0]
+                if standby and not self._wait_for_lock(key, lock, lambda: running):
+                    return
+                seeds, resume = self._prepare_room(is_demo, room, key, options["seed_chain"])
+                while running:
+                    heartbeat.tick()  # 🔒 renew lock before starting round
+                    
+                    round_start = time.time()
+                    round_obj = resume or create_new_round(is_demo=is_demo, seeds=seeds, room=room)
+                    resume = None
+                    
+                    # PASS heartbeat to run_single_round
+                    run_single_round(round_obj, heartbeat=heartbeat)
+                    
+                    self._round_done(key, round_obj, time.time() - round_start)
 
         except RuntimeError as e:
             if "Lost engine lock" in str(e):
@@ -105,10 +187,163 @@ class Command(BaseCommand):
             raise
 
         finally:
+            if metrics_server:
+                metrics_server.shutdown()
+            for room, key, lock, heartbeat in hosted:
+                try:
+                    # Standby rooms that never got their lock have nothing to release
+                    if lock.release():
+                        self.stdout.write(
+                            self.style.SUCCESS(f"[ENGINE:{key}] Lock released. Room stopped.")
+                        )
+                except:
+                    pass  # Ignore errors during cleanup
+
+    def _configure_logging(self, verbosity):
+        """Per-round summary lines are logged at INFO by crash.engine / crash.async_engine"""
+        engine_logger = logging.getLogger("crash")
+        if verbosity < 1 or engine_logger.handlers:
+            return
+        handler = logging.StreamHandler(self.stdout._out)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        engine_logger.addHandler(handler)
+        engine_logger.setLevel(logging.INFO)
+
+    def _start_metrics(self, port):
+        if not port:
+            return None
+        host = settings.CRASH_METRICS_HOST
+        try:
+            server = metrics.start_http_server(port, host=host)
+        except OSError as e:
+            # e.g. a standby engine on the same host already serves the port
+            self.stdout.write(self.style.WARNING(f"[ENGINE] Metrics endpoint not started on {host}:{port}: {e}"))
+            return None
+        self.stdout.write(f"[ENGINE] Metrics at http://{host}:{port}/metrics")
+        return server
+
+    def _wait_for_lock(self, key, lock, is_running):
+        """Standby: block until the active engine of the room stops renewing its lock"""
+        self.stdout.write(f"[ENGINE:{key}] Standing by for the room lock.")
+        waited = time.monotonic()
+        if not lock.acquire_blocking(should_continue=is_running):
+            return False
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"[ENGINE:{key}] Lock acquired after {time.monotonic() - waited:.2f}s on standby. Taking over."
+            )
+        )
+        return True
+
+    async def _await_lock(self, key, lock, is_running):
+        """_wait_for_lock() for a room task: polls without holding a thread while waiting"""
+        self.stdout.write(f"[ENGINE:{key}] Standing by for the room lock.")
+        waited = time.monotonic()
+        while not await sync_to_async(lock.acquire, thread_sensitive=False)():
+            if not is_running():
+                return False
+            await asyncio.sleep(lock.poll_interval)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"[ENGINE:{key}] Lock acquired after {time.monotonic() - waited:.2f}s on standby. Taking over."
+            )
+        )
+        return True
+
+    def _prepare_room(self, is_demo, room, key, seed_chain=None):
+        """
+        Recover open rounds, take over the one left in flight, load the history
+        buffer and open the seed chain of one room.
+        Returns (seeds, round to resume or None).
+        """
+        recovered = recover_open_rounds(is_demo=is_demo, room=room)
+        if recovered:
+            self.stdout.write(f"[ENGINE:{key}] Flushed queued bets and rebuilt ledgers for {recovered} open round(s).")
+
+        resume = take_over_round(is_demo=is_demo, room=room)
+        if resume:
+            self.stdout.write(f"[ENGINE:{key}] Resuming round {resume.id} ({resume.status}).")
+
+        # The lobby and connect handshake only read Redis; make sure the buffer is there
+        loaded = RoundHistory(key).rebuild()
+        self.stdout.write(f"[ENGINE:{key}] Round history buffer loaded with {loaded} round(s).")
+
+        try:
+            seeds = open_seed_cursor(is_demo=is_demo, path=seed_chain, room=room)
+        except ClientSeedNotCommitted as e:
+            raise CommandError(str(e))
+        if seeds:
+            self.stdout.write(
+                f"[ENGINE:{key}] Seed chain {seeds.chain.path.name}: "
+                f"game {seeds.next_game:,}, {seeds.remaining:,} left, "
+                f"terminating hash {seeds.chain.terminating_hash}, client seed {seeds.client_seed}"
+            )
+        else:
+            self.stdout.write(
+                self.style.WARNING(f"[ENGINE:{key}] No seed chain found, using random per-round seeds.")
+            )
+        return seeds, resume
+
+    def _prepare_demo_room(self, room, key, seed_chain=None):
+        """_prepare_room() for a demo room kept in Redis: nothing to recover from the database"""
+        store = DemoStore(room)
+        voided = void_demo_round(store)
+        if voided:
+            self.stdout.write(f"[ENGINE:{key}] Voided demo round {voided.id} left open by the previous engine.")
+
+        try:
+            seeds = open_demo_seed_cursor(store, seed_chain)
+        except ClientSeedNotCommitted as e:
+            raise CommandError(str(e))
+        if seeds:
+            self.stdout.write(
+                f"[ENGINE:{key}] Seed chain {seeds.chain.path.name}: "
+                f"game {seeds.next_game:,}, {seeds.remaining:,} left, "
+                f"terminating hash {seeds.chain.terminating_hash}, client seed {seeds.client_seed}"
+            )
+        else:
+            self.stdout.write(
+                self.style.WARNING(f"[ENGINE:{key}] No seed chain found, using random per-round seeds.")
+            )
+        return seeds
+
+    def _round_done(self, key, round_obj, round_duration):
+        self.stdout.write(
+            self.style.SUCCESS(f"[ENGINE:{key}] Round completed in {round_duration:.2f} seconds")
+        )
+
+    async def _run_rooms(self, is_demo, hosted, seed_chain, standby, is_running):
+        """Every room is one task on this loop; losing a room's lock only stops that room"""
+
+        async def run_room(room, key, lock, heartbeat):
             try:
-                lock.release()
+                if standby and not await self._await_lock(key, lock, is_running):
+                    return
+                if is_demo and redis_demo():
+                    seeds = await sync_to_async(self._prepare_demo_room, thread_sensitive=False)(room, key, seed_chain)
+                    await run_demo_engine(
+                        heartbeat=heartbeat,
+                        seeds=seeds,
+                        is_running=is_running,
+                        on_round=lambda round_obj, duration: self._round_done(key, round_obj, duration),
+                        room=room,
+                    )
+                    return
+                seeds, resume = await database_sync_to_async(self._prepare_room)(is_demo, room, key, seed_chain)
+                await run_engine_async(
+                    is_demo,
+                    heartbeat=heartbeat,
+                    seeds=seeds,
+                    is_running=is_running,
+                    on_round=lambda round_obj, duration: self._round_done(key, round_obj, duration),
+                    room=room,
+                    resume=resume,
+                )
+            except RuntimeError as e:
+                if "Lost engine lock" not in str(e):
+                    raise
                 self.stdout.write(
-                    self.style.SUCCESS(f"[ENGINE:{mode}] Lock released. Engine stopped.")
+                    self.style.ERROR(f"[ENGINE:{key}] Engine lock lost. Another instance may have taken over.")
                 )
-            except:
-                pass  # Ignore errors during cleanup
\ No newline at end of file
+
+        await asyncio.gather(*(run_room(*room) for room in hosted))
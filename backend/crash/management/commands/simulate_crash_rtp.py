@@ -0,0 +1,104 @@
+import os
+import random
+import secrets
+import time
+from decimal import Decimal, InvalidOperation
+from multiprocessing import Pool
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from crash.models import RiskSettings
+from crash.provably_fair import HOUSE_EDGE, generate_round_result, generate_server_seed
+
+
+class Command(BaseCommand):
+    help = "Simulate millions of crash rounds and report the empirical RTP of fixed cashout targets (needs NumPy)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rounds", type=int, default=10_000_000, help="Rounds to simulate (default: 10,000,000)")
+        parser.add_argument(
+            "--targets",
+            default="1.01,1.10,1.50,2,3,5,10,100,1000",
+            help="Comma separated auto cashout targets (default: 1.01,1.10,1.50,2,3,5,10,100,1000)",
+        )
+        parser.add_argument("--cap", help="Multiplier cap (default: RiskSettings max_multiplier_cap)")
+        parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Processes (default: one per core)")
+        parser.add_argument("--chunk", type=int, default=250_000, help="Rounds per work unit (default: 250,000)")
+        parser.add_argument("--client-seed", help="Client seed (default: a random one, printed)")
+        parser.add_argument(
+            "--check",
+            type=int,
+            default=2_000,
+            help="Rounds cross-checked against generate_round_result() (default: 2,000)",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            from crash.simulation import cross_check, cross_check_prefixes, simulate_chunk, SCALE
+        except ImportError as e:
+            raise CommandError(f"simulate_crash_rtp needs NumPy ({e})")
+
+        try:
+            targets = [Decimal(t) for t in options["targets"].split(",") if t.strip()]
+            cap = Decimal(options["cap"] or RiskSettings.get().max_multiplier_cap)
+        except InvalidOperation:
+            raise CommandError("--targets and --cap must be multipliers like 2 or 1.50")
+        target_cents = [int(t * 100) for t in targets]
+        cap_cents = int(cap * 100)
+        rounds, chunk = options["rounds"], options["chunk"]
+        client_seed = options["client_seed"] or secrets.token_hex(16)
+        self.stdout.write(f"Client seed: {client_seed}")
+
+        # One fresh server seed per chunk, like a stream of rounds with new seeds
+        seeds = []
+        jobs = []
+        for start in range(0, rounds, chunk):
+            seed = generate_server_seed(settings.SECRET_KEY)
+            seeds.append(seed)
+            jobs.append((seed, client_seed, start + 1, min(chunk, rounds - start), target_cents, cap_cents))
+
+        # Bit-exactness first: a random sample of real rounds plus the extremes of the 52-bit range
+        check_seed = seeds[0]
+        nonces = random.sample(range(1, jobs[0][3] + 1), min(options["check"], jobs[0][3]))
+        reference_start = time.perf_counter()
+        for nonce in nonces:
+            generate_round_result(check_seed, client_seed, nonce)
+        reference_rate = len(nonces) / (time.perf_counter() - reference_start)
+        mismatches = cross_check(check_seed, client_seed, nonces)
+        mismatches += cross_check_prefixes([0, 1, 2, SCALE // 2, SCALE - 2, SCALE - 1] + [
+            random.randrange(SCALE) for _ in range(options["check"])
+        ])
+        if mismatches:
+            for where, expected, got in mismatches[:10]:
+                self.stderr.write(f"  {where}: generate_round_result {expected}, simulator {got}")
+            raise CommandError(f"{len(mismatches)} crash point(s) differ from the Decimal implementation")
+        self.stdout.write(
+            self.style.SUCCESS(f"Cross-check: {len(nonces) + options['check'] + 6:,} crash points bit-exact")
+        )
+
+        wall_start = time.perf_counter()
+        total, clamped = 0, 0
+        wins = capped_wins = None
+        with Pool(processes=options["workers"]) as pool:
+            for count, chunk_wins, chunk_capped, chunk_clamped in pool.imap_unordered(simulate_chunk, jobs):
+                total += count
+                clamped += chunk_clamped
+                wins = chunk_wins if wins is None else wins + chunk_wins
+                capped_wins = chunk_capped if capped_wins is None else capped_wins + chunk_capped
+        wall = time.perf_counter() - wall_start
+
+        self.stdout.write(
+            f"{total:,} rounds in {wall:.2f}s on {options['workers']} worker(s): {total / wall:,.0f} rounds/s "
+            f"(Decimal path: {reference_rate:,.0f} rounds/s on one core)"
+        )
+        self.stdout.write(
+            f"HOUSE_EDGE {HOUSE_EDGE} -> theoretical RTP {Decimal(1) - HOUSE_EDGE:.2%}; "
+            f"{clamped:,} round(s) ({clamped / total:.4%}) clamped at the {cap}x cap"
+        )
+        self.stdout.write(f"{'target':>8} {'win rate':>10} {'RTP':>9} {'RTP capped':>11}")
+        for target, won, capped_won in zip(targets, wins, capped_wins):
+            rate, capped_rate = won / total, capped_won / total
+            self.stdout.write(
+                f"{target:>7}x {rate:>10.4%} {rate * float(target):>9.4%} {capped_rate * float(target):>11.4%}"
+            )
@@ -0,0 +1,57 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from crash.verification import verification_results, summarize, MISMATCH
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute crash points for a range of rounds, or a server seed over a nonce range, "
+        "and print the rounds that do not match as NDJSON"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--from-round", type=int, help="First round id")
+        parser.add_argument("--to-round", type=int, help="Last round id")
+        parser.add_argument("--mode", choices=["real", "demo"], help="Only rounds of this mode")
+        parser.add_argument("--room", help="Only rounds of this room")
+        parser.add_argument("--server-seed", help="Verify one server seed instead of stored rounds")
+        parser.add_argument(
+            "--client-seed",
+            help="Client seed the server seed was played with (required with --server-seed; "
+            "for a seed chain, the one committed after its terminating hash)",
+        )
+        parser.add_argument("--nonce-from", type=int, help="First nonce, with --server-seed")
+        parser.add_argument("--nonce-to", type=int, help="Last nonce, with --server-seed")
+        parser.add_argument("--all", action="store_true", help="Print every round, not just the ones that fail")
+
+    def handle(self, *args, **options):
+        try:
+            results = verification_results(
+                from_round=options["from_round"],
+                to_round=options["to_round"],
+                server_seed=options["server_seed"],
+                client_seed=options["client_seed"],
+                nonce_from=options["nonce_from"],
+                nonce_to=options["nonce_to"],
+                is_demo=(options["mode"] == "demo") if options["mode"] else None,
+                room=options["room"],
+                max_rounds=None,
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        start = time.perf_counter()
+        for result in summarize(results, emit_all=options["all"]):
+            self.stdout.write(json.dumps(result))
+        summary = result["summary"]
+        elapsed = time.perf_counter() - start
+
+        self.stderr.write(
+            f"{summary['checked']:,} round(s) checked in {elapsed:.2f}s "
+            f"({summary['checked'] / elapsed if elapsed else 0:,.0f}/s)"
+        )
+        if summary[MISMATCH]:
+            raise CommandError(f"{summary[MISMATCH]} round(s) do not verify")
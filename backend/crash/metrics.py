@@ -0,0 +1,269 @@
+"""
+In-process crash engine metrics, exposed in the Prometheus text format.
+
+Histograms are cumulative, as Prometheus expects, and each series also
+keeps its last ROLLING_WINDOW samples so recent quantiles can be read
+without a Prometheus server (the *_recent gauges and the per-round summary
+line). run_crash_engine serves them with start_http_server().
+
+Every series is labelled with the room key; the engine records through the
+helpers at the bottom of this module.
+"""
+import bisect
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+ROLLING_WINDOW = 2048
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+RECENT_QUANTILES = (0.5, 0.9, 0.99)
+
+
+def _labels(names, values, extra=None):
+    pairs = list(zip(names, values)) + (list(extra.items()) if extra else [])
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"') for _, v in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+def _quantile(samples, q):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {
+                    "buckets": [0] * len(self.buckets),
+                    "count": 0,
+                    "sum": 0.0,
+                    "recent": deque(maxlen=ROLLING_WINDOW),
+                }
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                series["buckets"][index] += 1
+            series["count"] += 1
+            series["sum"] += value
+            series["recent"].append(value)
+
+    def totals(self):
+        """{label values: (count, sum)}"""
+        with self._lock:
+            return {key: (s["count"], s["sum"]) for key, s in self._series.items()}
+
+    def recent(self, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            return list(series["recent"]) if series else []
+
+    def collect(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        recent = [f"# HELP {self.name}_recent Quantiles of the last {ROLLING_WINDOW} samples",
+                  f"# TYPE {self.name}_recent gauge"]
+        with self._lock:
+            series = [(key, list(s["buckets"]), s["count"], s["sum"], list(s["recent"]))
+                      for key, s in self._series.items()]
+        for key, buckets, count, total, samples in series:
+            cumulative = 0
+            for bound, hits in zip(self.buckets, buckets):
+                cumulative += hits
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, {'le': bound})} {cumulative}")
+            lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, {'le': '+Inf'})} {count}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {total}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {count}")
+            for q in RECENT_QUANTILES:
+                recent.append(f"{self.name}_recent{_labels(self.labelnames, key, {'quantile': q})} {_quantile(samples, q)}")
+        return lines + recent
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def totals(self):
+        with self._lock:
+            return dict(self._values)
+
+    def collect(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for key, value in self.totals().items():
+            lines.append(f"{self.name}{_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = value
+
+
+TICK_LAG = Histogram(
+    "crash_tick_lag_seconds", "How late each flight tick ran against its schedule", ["room"]
+)
+BROADCAST = Histogram(
+    "crash_broadcast_seconds", "Time spent in one channel layer group_send", ["room"]
+)
+DB_WRITE = Histogram(
+    "crash_db_write_seconds", "Engine database writes per round phase", ["room", "phase"]
+)
+HEARTBEAT_RENEW = Histogram(
+    "crash_heartbeat_renew_seconds", "Engine lock renew round trip", ["room"]
+)
+BETS_SETTLED = Counter(
+    "crash_bets_settled_total", "Bets settled by the engine", ["room", "kind"]
+)
+SETTLE_RATE = Gauge(
+    "crash_settle_rate_bets_per_second", "Bets per second of the last settlement batch", ["room", "kind"]
+)
+
+REGISTRY = [TICK_LAG, BROADCAST, DB_WRITE, HEARTBEAT_RENEW, BETS_SETTLED, SETTLE_RATE]
+
+
+def exposition() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.collect())
+    return "\n".join(lines) + "\n"
+
+
+# ======================================================
+# ENGINE HELPERS
+# ======================================================
+@contextmanager
+def timed(histogram, **labels):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram.observe(time.perf_counter() - start, **labels)
+
+
+def db_write(room, phase):
+    return timed(DB_WRITE, room=room, phase=phase)
+
+
+def broadcast(room):
+    return timed(BROADCAST, room=room)
+
+
+def bets_settled(room, kind, count, seconds):
+    if not count:
+        return
+    BETS_SETTLED.inc(count, room=room, kind=kind)
+    if seconds > 0:
+        SETTLE_RATE.set(count / seconds, room=room, kind=kind)
+
+
+class RoundReport:
+    """
+    Per-round summary: what the room's series gained between start and
+    line(). Quantiles come from the rolling window, so they cover at least
+    the round's own ticks.
+    """
+
+    def __init__(self, room):
+        self.room = room
+        self._start = self._snapshot()
+        self._started = time.perf_counter()
+
+    def _snapshot(self):
+        return {
+            "tick": TICK_LAG.totals().get((self.room,), (0, 0.0)),
+            "broadcast": BROADCAST.totals().get((self.room,), (0, 0.0)),
+            "renew": HEARTBEAT_RENEW.totals().get((self.room,), (0, 0.0)),
+            "db": {key[1]: value for key, value in DB_WRITE.totals().items() if key[0] == self.room},
+            "settled": {key[1]: value for key, value in BETS_SETTLED.totals().items() if key[0] == self.room},
+        }
+
+    def line(self, round_obj) -> str:
+        end = self._snapshot()
+
+        def delta(before, after):
+            return after[0] - before[0], after[1] - before[1]
+
+        ticks, _ = delta(self._start["tick"], end["tick"])
+        sends, send_time = delta(self._start["broadcast"], end["broadcast"])
+        renews, renew_time = delta(self._start["renew"], end["renew"])
+        lags = TICK_LAG.recent(room=self.room)[-ticks:] if ticks else []
+        db = " ".join(
+            f"{phase}={(total - self._start['db'].get(phase, (0, 0.0))[1]) * 1000:.1f}ms"
+            for phase, (_, total) in sorted(end["db"].items())
+            if total > self._start["db"].get(phase, (0, 0.0))[1]
+        )
+        settled = " ".join(
+            f"{kind}={count - self._start['settled'].get(kind, 0)}"
+            for kind, count in sorted(end["settled"].items())
+            if count > self._start["settled"].get(kind, 0)
+        )
+        return (
+            f"[CRASH] Round {round_obj.id} @ {round_obj.crash_point}x ({self.room}) "
+            f"in {time.perf_counter() - self._started:.2f}s: "
+            f"{ticks} ticks lag p50={_quantile(lags, 0.5) * 1000:.2f}ms p99={_quantile(lags, 0.99) * 1000:.2f}ms, "
+            f"{sends} sends avg={(send_time / sends * 1000) if sends else 0:.2f}ms, "
+            f"db {db or '-'}, settled {settled or '-'}, "
+            f"renew avg={(renew_time / renews * 1000) if renews else 0:.2f}ms"
+        )
+
+
+# ======================================================
+# HTTP ENDPOINT
+# ======================================================
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = exposition().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug("metrics: " + format, *args)
+
+
+def start_http_server(port, host="127.0.0.1"):
+    """Serve /metrics from a daemon thread; returns the server (shutdown() to stop)"""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="crash-metrics", daemon=True).start()
+    return server
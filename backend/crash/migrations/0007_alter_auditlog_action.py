@@ -0,0 +1,18 @@
+# Generated by Django 4.2.27 on 2026-10-16 22:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crash', '0006_alter_risksettings_max_bet_per_player_per_round_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='auditlog',
+            name='action',
+            field=models.CharField(choices=[('BET_PLACED', 'Bet placed'), ('CASHOUT', 'Cashout'), ('BET_LOST', 'Bet lost'), ('ADMIN_ADJUST', 'Admin wallet adjust'), ('BAN', 'Player banned')], max_length=32),
+        ),
+    ]
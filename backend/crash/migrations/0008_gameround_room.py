@@ -0,0 +1,18 @@
+# Generated by Django 4.2.27 on 2026-10-16 23:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crash', '0007_alter_auditlog_action'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gameround',
+            name='room',
+            field=models.CharField(db_index=True, default='main', max_length=32),
+        ),
+    ]
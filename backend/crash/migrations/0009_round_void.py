@@ -0,0 +1,23 @@
+# Generated by Django 4.2.27 on 2026-10-16 23:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crash', '0008_gameround_room'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='auditlog',
+            name='action',
+            field=models.CharField(choices=[('BET_PLACED', 'Bet placed'), ('CASHOUT', 'Cashout'), ('BET_LOST', 'Bet lost'), ('BET_REFUND', 'Bet refunded'), ('ADMIN_ADJUST', 'Admin wallet adjust'), ('BAN', 'Player banned')], max_length=32),
+        ),
+        migrations.AlterField(
+            model_name='gameround',
+            name='status',
+            field=models.CharField(choices=[('PENDING', 'Pending Bets'), ('RUNNING', 'Running'), ('CRASHED', 'Crashed'), ('SETTLED', 'Settled'), ('VOIDED', 'Voided')], default='PENDING', max_length=16),
+        ),
+    ]
@@ -1,12 +1,15 @@
 from django.conf import settings
 from django.db import models
 
+from .protocol import DEFAULT_ROOM, room_key
+
 class GameRound(models.Model):
     ROUND_STATUS = [
         ("PENDING", "Pending Bets"),
         ("RUNNING", "Running"),
         ("CRASHED", "Crashed"),
         ("SETTLED", "Settled"),
+        ("VOIDED", "Voided"),
     ]
 
     server_seed = models.CharField(max_length=128)
@@ -20,6 +23,7 @@ class GameRound(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
 
     is_demo = models.BooleanField(default=False)
+    room = models.CharField(max_length=32, default=DEFAULT_ROOM, db_index=True)
 
     class Meta:
         ordering = ["-id"]
@@ -27,6 +31,10 @@ class GameRound(models.Model):
     def __str__(self):
         return f"Round {self.id} @ {self.crash_point}x"
 
+    @property
+    def room_key(self):
+        return room_key("demo" if self.is_demo else "real", self.room)
+
 
 class CrashBet(models.Model):
     BET_STATUS = [
@@ -170,6 +178,8 @@ class AuditLog(models.Model):
     ACTION_TYPES = [
         ("BET_PLACED", "Bet placed"),
         ("CASHOUT", "Cashout"),
+        ("BET_LOST", "Bet lost"),
+        ("BET_REFUND", "Bet refunded"),
         ("ADMIN_ADJUST", "Admin wallet adjust"),
         ("BAN", "Player banned"),
     ]
@@ -0,0 +1,52 @@
+"""
+Channel group naming for the crash websocket protocols.
+
+A room is identified by its key: the mode ("real"/"demo") for the default
+room of each mode, "<mode>.<room>" for any other room (see room_key()).
+Every room has two broadcast groups:
+
+- dense  (crash_<key>):        legacy clients, a round.multiplier every tick
+- sparse (crash_<key>_sparse): clients that draw the curve locally from the
+  round.lock_bets parameters and only get a round.sync every SYNC_INTERVAL
+
+All other room events (round.start, round.crash, player.*) go to both.
+A connection picks its protocol with ?protocol=sparse on the websocket URL.
+"""
+import re
+
+PROTOCOL_DENSE = "dense"
+PROTOCOL_SPARSE = "sparse"
+PROTOCOLS = (PROTOCOL_DENSE, PROTOCOL_SPARSE)
+
+SYNC_INTERVAL = 1.0  # seconds between round.sync messages for sparse clients
+
+DEFAULT_ROOM = "main"
+ROOM_NAME_RE = re.compile(r"^[a-z0-9-]{1,32}$")
+
+
+def room_key(mode: str, room: str = DEFAULT_ROOM) -> str:
+    if room == DEFAULT_ROOM:
+        return mode
+    if not ROOM_NAME_RE.match(room):
+        raise ValueError(f"Invalid room name: {room!r}")
+    return f"{mode}.{room}"
+
+
+def parse_room_key(key: str):
+    """Inverse of room_key(): (mode, room)"""
+    mode, _, room = key.partition(".")
+    return mode, room or DEFAULT_ROOM
+
+
+def group_name(room: str, protocol: str = PROTOCOL_DENSE) -> str:
+    if protocol == PROTOCOL_SPARSE:
+        return f"crash_{room}_sparse"
+    return f"crash_{room}"
+
+
+def room_groups(room: str):
+    return [group_name(room, protocol) for protocol in PROTOCOLS]
+
+
+def user_group(user_id, room: str) -> str:
+    return f"crash_user_{user_id}_{room}"
@@ -1,18 +1,23 @@
 import hmac
 import hashlib
+import secrets
 from decimal import Decimal, getcontext
 
 HOUSE_EDGE_DIVISOR = 48  # standard bustabit-style, gives ~1% edge
 
+# Client seed of rounds drawn without a seed chain; chained rounds use the
+# chain's committed client seed (see seed_chain.commit_client_seed)
+UNCHAINED_CLIENT_SEED = "global-client"
+
 def sha256_hex(value: str) -> str:
     return hashlib.sha256(value.encode("utf-8")).hexdigest()
 
 
 def generate_server_seed(secret_key: str) -> str:
-    # Use SECRET_KEY as master seed base
+    # Use SECRET_KEY as master seed base, salted per call so every round differs
     return hmac.new(
         key=secret_key.encode("utf-8"),
-        msg=hashlib.sha256().digest(),
+        msg=secrets.token_bytes(32),
         digestmod=hashlib.sha256,
     ).hexdigest()
 
@@ -64,3 +69,14 @@ def generate_round_result(server_seed: str, client_seed: str, nonce: int) -> Dec
 def verify_round(server_seed: str, client_seed: str, nonce: int, crash_point: Decimal) -> bool:
     expected = generate_round_result(server_seed, client_seed, nonce)
     return expected == crash_point
+
+
+def verify_chain(server_seed: str, nonce: int, terminating_hash: str) -> bool:
+    """
+    A seed from a published hash chain, hashed `nonce` times,
+    must land on the chain's terminating hash.
+    """
+    value = server_seed
+    for _ in range(nonce):
+        value = sha256_hex(value)
+    return hmac.compare_digest(value, terminating_hash)
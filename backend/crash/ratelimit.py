@@ -0,0 +1,139 @@
+"""
+Token-bucket limiter for crash websocket messages.
+
+CrashConsumer.receive_json() checks every place_bet / cashout message here
+before any database work, so a flood is turned away with one Redis round
+trip and never reaches the wallet lock. One Lua script checks the buckets
+of the user, the IP and the device fingerprint together and only takes a
+token from them if all of them have one.
+
+Bets use RiskSettings: max_bets_per_minute (refilled continuously) and
+bet_cooldown_seconds (a bucket of one). Cashouts and auto cashout
+cancellations share a fixed CASHOUT_RATE / CASHOUT_BURST bucket. IP buckets
+are CRASH_RATE_LIMIT_IP_FACTOR times larger, since players behind one NAT
+share them (0: IPs are not limited).
+
+Keys (expire once refilled):
+    crash:rl:<action>:<scope>:<id>:<bucket>   hash {tokens, ts}
+"""
+import time
+
+from django.conf import settings
+
+from .models import RiskSettings
+from .redis_lock import shared_redis
+
+ACTION_BET = "bet"
+ACTION_CASHOUT = "cashout"
+
+CASHOUT_RATE = 5.0  # tokens per second
+CASHOUT_BURST = 10
+LIMITS_TTL = 30  # seconds RiskSettings limits are reused before being read again
+# Placeholder fingerprints sent by older clients: one bucket for all of them would limit everyone
+GENERIC_DEVICES = {"web-client", "web_client"}
+
+# KEYS: buckets. ARGV[1]: now (ms), then capacity and refill (tokens per ms)
+# per bucket. Returns 0, or the ms until every bucket has a token again.
+TAKE_LUA = """
+local now = tonumber(ARGV[1])
+local state = {}
+local wait = 0
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[i * 2])
+    local rate = tonumber(ARGV[i * 2 + 1])
+    local bucket = redis.call('HMGET', key, 'tokens', 'ts')
+    local tokens = tonumber(bucket[1]) or capacity
+    local ts = tonumber(bucket[2]) or now
+    tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+    if tokens < 1 then
+        wait = math.max(wait, (1 - tokens) / rate)
+    end
+    state[i] = tokens
+end
+if wait > 0 then
+    return math.ceil(wait)
+end
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[i * 2])
+    local rate = tonumber(ARGV[i * 2 + 1])
+    redis.call('HSET', key, 'tokens', tostring(state[i] - 1), 'ts', ARGV[1])
+    redis.call('PEXPIRE', key, math.ceil(capacity / rate))
+end
+return 0
+"""
+
+_limits = {"at": None, "buckets": None, "risk": None}
+
+
+class RateLimited(Exception):
+    def __init__(self, retry_after_ms: int):
+        self.retry_after_ms = retry_after_ms
+        super().__init__(f"Too many requests. Try again in {retry_after_ms / 1000:.1f}s")
+
+
+def _bet_buckets(risk):
+    """(name, capacity, tokens per second) of the bet buckets of RiskSettings"""
+    buckets = []
+    if risk.max_bets_per_minute > 0:
+        buckets.append(("minute", risk.max_bets_per_minute, risk.max_bets_per_minute / 60))
+    if risk.bet_cooldown_seconds > 0:
+        buckets.append(("cooldown", 1, 1 / risk.bet_cooldown_seconds))
+    return buckets
+
+
+def buckets_for(action: str):
+    """
+    Buckets of an action, or None when the bet limits read from
+    RiskSettings are older than LIMITS_TTL: call load_limits() then. Most
+    messages cost no SQL at all.
+    """
+    if action == ACTION_CASHOUT:
+        return [("burst", CASHOUT_BURST, CASHOUT_RATE)]
+    if _limits["at"] is None or time.monotonic() - _limits["at"] > LIMITS_TTL:
+        return None
+    return _limits["buckets"]
+
+
+def load_limits():
+    """Re-read the bet limits (DB thread); returns the bet buckets"""
+    risk = RiskSettings.get()
+    _limits["risk"] = risk
+    _limits["buckets"] = _bet_buckets(risk)
+    _limits["at"] = time.monotonic()
+    return _limits["buckets"]
+
+
+def risk_settings():
+    """
+    The RiskSettings row load_limits() read, reused like the buckets for
+    LIMITS_TTL. Reads it again when stale, so call it from the DB thread,
+    or right after load_limits() ran there.
+    """
+    if buckets_for(ACTION_BET) is None:
+        load_limits()
+    return _limits["risk"]
+
+
+def take(action: str, buckets, user_id, ip=None, device_fp=None, client=None):
+    """
+    Take one token from every bucket of the user, ip and device_fp (the last
+    two only when known). Raises RateLimited if any of them is empty.
+    """
+    if not buckets:
+        return
+    scopes = [("user", user_id, 1)]
+    ip_factor = settings.CRASH_RATE_LIMIT_IP_FACTOR
+    if ip and ip_factor:
+        scopes.append(("ip", ip, ip_factor))
+    if device_fp and device_fp not in GENERIC_DEVICES:
+        scopes.append(("device", device_fp, 1))
+
+    keys, args = [], [int(time.time() * 1000)]
+    for scope, ident, factor in scopes:
+        for name, capacity, per_second in buckets:
+            keys.append(f"crash:rl:{action}:{scope}:{ident}:{name}")
+            args.extend([capacity * factor, repr(per_second * factor / 1000)])
+
+    wait = (client or shared_redis()).eval(TAKE_LUA, len(keys), *keys, *args)
+    if wait:
+        raise RateLimited(int(wait))
@@ -1,17 +1,43 @@
 import time
 import uuid
+from functools import lru_cache
 import redis
 from django.conf import settings
 
+from . import metrics
+
 def get_redis():
     return redis.Redis.from_url(settings.REDIS_URL, decode_responses=True)
 
+
+@lru_cache(maxsize=None)
+def shared_redis():
+    """Process-wide client for hot paths (redis-py clients pool connections and are thread safe)"""
+    return get_redis()
+
+# Compare-and-pexpire: extend the TTL only while we still hold the lock
+RENEW_LUA = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+# Compare-and-delete
+RELEASE_LUA = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
 class RedisEngineLock:
     """
     Production-safe Redis lock using:
     - acquire: SET NX PX
-    - renew:   SET XX PX
-    - release: compare-and-delete (safe)
+    - renew:   compare-and-pexpire (Lua, atomic)
+    - release: compare-and-delete (Lua, atomic)
     """
 
     def __init__(self, key: str, ttl_seconds: int):
@@ -31,36 +57,33 @@ class RedisEngineLock:
             )
         )
 
-    def renew(self) -> bool:
-        # Only renew if WE still own the lock
-        current = self.r.get(self.key)
-        if current != self.token:
-            return False
+    def acquire_blocking(self, poll_interval: float = None, should_continue=lambda: True) -> bool:
+        """
+        Standby mode: keep trying until the lock is ours. The holder's key
+        expires at most one TTL after it stops renewing, so a standby polling
+        every poll_interval takes over within TTL + poll_interval.
+        Returns False if should_continue() turns false first.
+        """
+        if poll_interval is None:
+            poll_interval = self.poll_interval
+        while should_continue():
+            if self.acquire():
+                return True
+            time.sleep(poll_interval)
+        return False
 
-        # SET key token XX PX ttl  (atomic renew)
-        return bool(
-            self.r.set(
-                self.key,
-                self.token,
-                xx=True,
-                px=self.ttl_ms,
-            )
-        )
+    @property
+    def poll_interval(self) -> float:
+        """Default standby poll: a tenth of the TTL, at most a second"""
+        return min(1.0, self.ttl_ms / 1000 / 10)
+
+    def renew(self) -> bool:
+        # Only renew if WE still own the lock, in one round trip
+        return bool(self.r.eval(RENEW_LUA, 1, self.key, self.token, self.ttl_ms))
 
     def release(self) -> bool:
         # Safe release: delete only if token matches
-        pipe = self.r.pipeline()
-        try:
-            pipe.watch(self.key)
-            if pipe.get(self.key) == self.token:
-                pipe.multi()
-                pipe.delete(self.key)
-                pipe.execute()
-                return True
-            pipe.unwatch()
-        except redis.WatchError:
-            pass
-        return False
+        return bool(self.r.eval(RELEASE_LUA, 1, self.key, self.token))
 
 
 class LockHeartbeat:
@@ -68,10 +91,14 @@ class LockHeartbeat:
         self.lock = lock
         self.every = every_seconds
         self._next = time.monotonic() + self.every
+        # crash:engine:<room key>
+        self.room = lock.key.rsplit(":", 1)[-1]
 
     def tick(self):
         now = time.monotonic()
         if now >= self._next:
-            if not self.lock.renew():
+            with metrics.timed(metrics.HEARTBEAT_RENEW, room=self.room):
+                renewed = self.lock.renew()
+            if not renewed:
                 raise RuntimeError("Lost engine lock")
             self._next = now + self.every
\ No newline at end of file
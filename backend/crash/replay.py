@@ -0,0 +1,179 @@
+"""
+Accelerated replay of captured crash traffic (see crash/capture.py).
+
+Every captured socket becomes one ReplayClient. It connects, sends its
+place_bet / cashout / cancel_auto_cashout messages and disconnects at the
+captured times divided by the replay speed, into a replay room hosted by
+whatever engine is running for it. Cashouts and cancellations go out
+for the bet the client got in this replay, not the captured one.
+
+Rounds of the replay do not line up with the captured ones, so at high
+speeds many bets land outside a betting window and are answered with
+bet_failed; what is reproduced is the load: sockets, message rates and
+their bursts. Each client measures how late it managed to send every
+message and how long the server took to answer it.
+"""
+import asyncio
+import json
+import time
+from collections import deque
+from dataclasses import dataclass, field
+
+from channels.testing import WebsocketCommunicator
+
+from .loadtest import CONNECT_TIMEOUT
+from .protocol import PROTOCOL_DENSE, parse_room_key
+
+# Client messages that are replayed, and the events that answer them
+RESPONSES = {
+    "place_bet": ("bet_accepted", "bet_failed"),
+    "cashout": ("cashout_success", "cashout_failed"),
+    "cancel_auto_cashout": ("auto_cashout_cancelled", "cancel_auto_cashout_failed"),
+}
+ANSWERS = {event: request for request, events in RESPONSES.items() for event in events}
+
+
+@dataclass
+class Session:
+    """One captured socket; times are seconds from the start of the capture"""
+
+    socket_id: str
+    user_id: int
+    mode: str
+    protocol: str
+    opened_at: float
+    closed_at: float = None
+    messages: list = field(default_factory=list)  # (time, event, data)
+
+
+def load_sessions(records, room=None, skip=0.0, duration=None):
+    """
+    Sessions of the captured sockets, from read_capture() records. room:
+    only this room key. skip / duration: window of the capture to keep, in
+    seconds; sockets already open when it starts are opened at its start.
+    Returns (sessions, window length in seconds).
+    """
+    records = [record for record in records if record["s"] and (room is None or record["r"] == room)]
+    if not records:
+        return [], 0.0
+    start = records[0]["t"] + skip
+    end = records[-1]["t"] if duration is None else min(records[-1]["t"], start + duration)
+
+    sessions = {}
+    for record in records:
+        at = record["t"] - start
+        if record["t"] > end:
+            break
+        session = sessions.get(record["s"])
+        if session is None:
+            if record["k"] == "close":
+                continue
+            mode, _ = parse_room_key(record["r"])
+            data = record["d"] if record["k"] == "conn" else {}
+            session = sessions[record["s"]] = Session(
+                socket_id=record["s"],
+                user_id=record["u"],
+                mode=data.get("mode", mode),
+                protocol=data.get("protocol", PROTOCOL_DENSE),
+                opened_at=max(0.0, at),
+            )
+        if at < 0:
+            continue
+        if record["k"] == "in" and record["e"] in RESPONSES:
+            session.messages.append((at, record["e"], record["d"] or {}))
+        elif record["k"] == "close":
+            session.closed_at = at
+
+    length = end - start
+    for session in sessions.values():
+        if session.closed_at is None:
+            session.closed_at = length
+    return list(sessions.values()), length
+
+
+class ReplayClient:
+    def __init__(self, session: Session, user, path: str, speed: float):
+        self.session = session
+        self.user = user
+        self.path = path
+        self.speed = speed
+        self.communicator = None
+        self.bet_id = None
+        self.pending = {request: deque() for request in RESPONSES}  # perf_counter of unanswered sends
+        self.latencies = {request: [] for request in RESPONSES}
+        self.late = []  # seconds each action happened after its scheduled time
+        self.counts = {}
+
+    def count(self, key):
+        self.counts[key] = self.counts.get(key, 0) + 1
+
+    async def _wait(self, start, at):
+        loop = asyncio.get_running_loop()
+        delay = start + at / self.speed - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        else:
+            self.late.append(-delay)
+
+    async def run(self, application, start):
+        """start: loop.time() of the beginning of the replay"""
+        session = self.session
+        await self._wait(start, session.opened_at)
+        self.communicator = WebsocketCommunicator(application, self.path)
+        self.communicator.scope["user"] = self.user
+        connected, _ = await self.communicator.connect(timeout=CONNECT_TIMEOUT)
+        if not connected:
+            self.count("connect_failed")
+            return
+        self.count("connected")
+
+        listener = asyncio.ensure_future(self._listen())
+        try:
+            for at, event, data in session.messages:
+                await self._wait(start, at)
+                data = dict(data)
+                if event != "place_bet":
+                    if not self.bet_id:
+                        self.count(f"{event}_skipped")
+                        continue
+                    data["bet_id"] = self.bet_id
+                self.pending[event].append(time.perf_counter())
+                await self.communicator.send_json_to({"event": event, "data": data})
+                self.count(event)
+            await self._wait(start, session.closed_at)
+        finally:
+            listener.cancel()
+            await asyncio.gather(listener, return_exceptions=True)
+            await self.communicator.disconnect()
+
+    async def _listen(self):
+        while True:
+            # Straight from the output queue, as in LoadClient.run()
+            message = json.loads((await self.communicator.output_queue.get())["text"])
+            now = time.perf_counter()
+            event, data = message.get("event"), message.get("data") or {}
+            self.count(f"recv:{event}")
+
+            request = ANSWERS.get(event)
+            if request and self.pending[request]:
+                self.latencies[request].append(now - self.pending[request].popleft())
+            if event == "bet_accepted":
+                self.bet_id = data["bet_id"]
+            elif event == "bet_confirmed" and data.get("ref") == self.bet_id:
+                self.bet_id = data["bet_id"]
+            elif event == "round_crash":
+                self.bet_id = None
+            if event in ("bet_failed", "cashout_failed", "cancel_auto_cashout_failed") and "retry_after_ms" in data:
+                self.count("rate_limited")
+
+
+def report(clients):
+    latencies = {request: [] for request in RESPONSES}
+    late, counts = [], {}
+    for client in clients:
+        late.extend(client.late)
+        for request, values in client.latencies.items():
+            latencies[request].extend(values)
+        for key, value in client.counts.items():
+            counts[key] = counts.get(key, 0) + value
+    return {"latencies": latencies, "late": late, "counts": counts}
@@ -3,4 +3,5 @@ from .consumers import CrashConsumer
 
 websocket_urlpatterns = [
     path("ws/crash/<str:mode>/", CrashConsumer.as_asgi()),
+    path("ws/crash/<str:mode>/<str:room>/", CrashConsumer.as_asgi()),
 ]
@@ -0,0 +1,200 @@
+"""
+Pre-generated reverse hash chain of crash server seeds (bustabit style).
+
+A chain is generated backwards from one random seed: every link is the
+sha256_hex() of the link generated before it. Rounds then consume the chain
+in the opposite order, so each round's server_seed_hash is exactly the
+previous round's server_seed and hashing game N's seed N times lands on the
+published terminating hash.
+
+File layout (all seeds stored as raw 32 byte digests, in play order):
+
+    MAGIC (8 bytes) | length (uint64 BE) | terminating hash (32 bytes) | seeds
+
+The client seed mixed into every crash point is chosen only after the
+terminating hash is published, so the chain cannot have been picked to
+suit it: publish the hash, wait for a value nobody knows yet (e.g. the hash
+of a Bitcoin block mined after the announcement), then record that value
+with commit_client_seed(). It lives next to the chain in <chain>.client-seed
+and can be set once; a SeedCursor refuses a chain without one.
+"""
+import hashlib
+import json
+import mmap
+import os
+import secrets
+import struct
+from pathlib import Path
+
+from django.conf import settings
+
+MAGIC = b"CRSHCHN1"
+HEADER = struct.Struct(">8sQ32s")
+SEED_SIZE = 32
+
+
+class SeedChainExhausted(RuntimeError):
+    pass
+
+
+class ClientSeedNotCommitted(RuntimeError):
+    pass
+
+
+def default_chain_path(group_name: str) -> Path:
+    return Path(settings.CRASH_SEED_CHAIN_DIR) / f"{group_name}.chain"
+
+
+def _link(digest: bytes) -> bytes:
+    # Same hashing as provably_fair.sha256_hex(), on the seed's hex string
+    return hashlib.sha256(digest.hex().encode("utf-8")).digest()
+
+
+def generate_chain(path, length: int, progress=None, progress_every=1_000_000) -> str:
+    """
+    Write a new chain of `length` seeds to `path`; returns the terminating hash.
+    The file is filled back to front through a memory map, so memory use stays
+    flat no matter how long the chain is.
+    """
+    if length <= 0:
+        raise ValueError("Chain length must be positive")
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(path.suffix + ".tmp")
+
+    size = HEADER.size + length * SEED_SIZE
+    with open(tmp_path, "wb") as fh:
+        fh.truncate(size)
+
+    with open(tmp_path, "r+b") as fh, mmap.mmap(fh.fileno(), size) as mm:
+        digest = secrets.token_bytes(SEED_SIZE)
+        # The first generated seed is played last
+        for generated in range(length):
+            offset = HEADER.size + (length - 1 - generated) * SEED_SIZE
+            mm[offset:offset + SEED_SIZE] = digest
+            digest = _link(digest)
+            if progress and (generated + 1) % progress_every == 0:
+                progress(generated + 1)
+
+        terminating_hash = digest
+        mm[:HEADER.size] = HEADER.pack(MAGIC, length, terminating_hash)
+        mm.flush()
+
+    os.replace(tmp_path, path)
+    return terminating_hash.hex()
+
+
+def read_header(path):
+    """Return (length, terminating_hash) without mapping the seeds"""
+    with open(path, "rb") as fh:
+        magic, length, terminating_hash = HEADER.unpack(fh.read(HEADER.size))
+    if magic != MAGIC:
+        raise ValueError(f"{path} is not a crash seed chain")
+    return length, terminating_hash.hex()
+
+
+def client_seed_path(path) -> Path:
+    path = Path(path)
+    return path.with_name(path.name + ".client-seed")
+
+
+def read_client_seed(path):
+    """The chain's committed client seed record, or None before it is committed"""
+    try:
+        with open(client_seed_path(path)) as fh:
+            return json.load(fh)
+    except FileNotFoundError:
+        return None
+
+
+def commit_client_seed(path, client_seed: str, source: str = "") -> dict:
+    """
+    Record the client seed of a chain whose terminating hash is already
+    published. It can only be set once: changing it later would let the
+    operator pick crash points after the fact.
+    """
+    if not client_seed:
+        raise ValueError("The client seed must not be empty")
+    _, terminating_hash = read_header(path)
+    record = {
+        "terminating_hash": terminating_hash,
+        "client_seed": client_seed,
+        "source": source,
+    }
+    try:
+        with open(client_seed_path(path), "x") as fh:
+            json.dump(record, fh)
+    except FileExistsError:
+        raise ValueError(f"{Path(path).name} already has a client seed")
+    return record
+
+
+class SeedChain:
+    """
+    Read-only, memory-mapped view of a chain file.
+    Game numbers are 1-based and match GameRound.nonce.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.length, self.terminating_hash = read_header(self.path)
+        record = read_client_seed(self.path)
+        if record is not None and record["terminating_hash"] != self.terminating_hash:
+            raise ValueError(f"{client_seed_path(self.path).name} belongs to another chain")
+        self.client_seed = record["client_seed"] if record else None
+        self._fh = open(self.path, "rb")
+        self._mm = mmap.mmap(self._fh.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def close(self):
+        self._mm.close()
+        self._fh.close()
+
+    def seed(self, game: int) -> str:
+        if not 1 <= game <= self.length:
+            raise SeedChainExhausted(
+                f"Seed chain {self.path.name} has no game {game} (length {self.length})"
+            )
+        offset = HEADER.size + (game - 1) * SEED_SIZE
+        return self._mm[offset:offset + SEED_SIZE].hex()
+
+
+class SeedCursor:
+    """
+    Hands out consecutive games from a chain. The starting point is resolved
+    once when the engine starts; after that every round is an index lookup.
+    """
+
+    def __init__(self, chain: SeedChain, next_game: int = 1):
+        if chain.client_seed is None:
+            raise ClientSeedNotCommitted(
+                f"Seed chain {chain.path.name} has no client seed yet: publish its terminating hash, "
+                f"then run commit_chain_client_seed"
+            )
+        self.chain = chain
+        self.next_game = next_game
+
+    @classmethod
+    def resume(cls, chain: SeedChain, last_round):
+        """
+        Continue after last_round if it was played from this chain,
+        otherwise start the chain from its first game.
+        """
+        if last_round is not None and 1 <= last_round.nonce <= chain.length:
+            if chain.seed(last_round.nonce) == last_round.server_seed:
+                return cls(chain, last_round.nonce + 1)
+        return cls(chain, 1)
+
+    @property
+    def remaining(self) -> int:
+        return max(0, self.chain.length - self.next_game + 1)
+
+    @property
+    def client_seed(self) -> str:
+        return self.chain.client_seed
+
+    def take(self):
+        game = self.next_game
+        seed = self.chain.seed(game)
+        self.next_game += 1
+        return game, seed
@@ -14,6 +14,13 @@ class GameRoundSerializer(serializers.ModelSerializer):
             "is_demo",
         ]
 
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        # Only revealed once the round is over, as with round.crash
+        if instance.status not in ("CRASHED", "SETTLED", "VOIDED"):
+            data["crash_point"] = None
+        return data
+
 
 class CrashBetSerializer(serializers.ModelSerializer):
     class Meta:
@@ -0,0 +1,123 @@
+"""
+Bulk crash point generation for RTP simulation (needs NumPy).
+
+crash_points() gives the same result as provably_fair.generate_round_result()
+for a run of consecutive nonces, in cents (1.23x -> 123). The HMACs are
+computed with hashlib in a tight loop; the Decimal arithmetic is replaced by
+exact integer arithmetic on int64 arrays:
+
+    crash = (1 - HOUSE_EDGE) / (1 - h / 2**52)
+          = p * 2**52 / (q * (2**52 - h))        with 1 - HOUSE_EDGE = p / q
+
+rounded half-even to cents and floored at 1.00x, as the quantize() does.
+With 28 significant digits the Decimal path lands on the same cent except
+when 1 - h / 2**52 is tiny: there its rounding error grows past a cent, so
+those prefixes (about one round in 2**32) go through crash_point_from_hash()
+itself. cross_check() compares both paths.
+"""
+import hashlib
+import hmac
+from decimal import Decimal
+
+import numpy as np
+
+from .provably_fair import HOUSE_EDGE, crash_point_from_hash, generate_round_result
+
+SCALE = 2 ** 52
+_P, _Q = (Decimal(1) - HOUSE_EDGE).as_integer_ratio()
+_NUMERATOR = 100 * _P * SCALE
+if _NUMERATOR >= 2 ** 63:
+    raise ImportError(f"HOUSE_EDGE {HOUSE_EDGE} does not fit the int64 crash point arithmetic")
+
+# Below this 2**52 - h the Decimal rounding error can reach a cent
+DECIMAL_FALLBACK = 2 ** 20
+
+
+def hash_prefixes(server_seed: str, client_seed: str, start: int, count: int) -> np.ndarray:
+    """First 52 bits of HMAC-SHA256(server_seed, "client_seed:nonce") for nonces start..start+count-1"""
+    base = hmac.new(server_seed.encode("utf-8"), digestmod=hashlib.sha256)
+    prefix = f"{client_seed}:".encode("utf-8")
+
+    def first_bytes(nonce):
+        mac = base.copy()
+        mac.update(prefix + str(nonce).encode("ascii"))
+        return mac.digest()[:7]
+
+    raw = np.frombuffer(
+        b"".join(first_bytes(nonce) for nonce in range(start, start + count)), dtype=np.uint8
+    ).reshape(count, 7)
+
+    # 7 bytes big-endian -> uint64, then drop the low nibble: 13 hex digits
+    padded = np.zeros((count, 8), dtype=np.uint8)
+    padded[:, 1:] = raw
+    return (padded.view(">u8").ravel() >> 4).astype(np.int64)
+
+
+def crash_points(prefixes: np.ndarray) -> np.ndarray:
+    """provably_fair.crash_point_from_hash() over an array of 52-bit prefixes, in cents"""
+    den = _Q * (SCALE - prefixes)
+    quotient = _NUMERATOR // den
+    twice_rem = 2 * (_NUMERATOR - quotient * den)
+    # Half-even, like Decimal.quantize()
+    quotient += (twice_rem > den) | ((twice_rem == den) & (quotient % 2 == 1))
+    points = np.maximum(quotient, 100)
+
+    for i in np.flatnonzero(SCALE - prefixes < DECIMAL_FALLBACK):
+        points[i] = int(crash_point_from_hash(f"{int(prefixes[i]):013x}") * 100)
+    return points
+
+
+def simulate_chunk(args):
+    """
+    Worker for multiprocessing.Pool. args is
+    (server_seed, client_seed, start, count, targets, cap), with targets
+    and cap in cents. A cashout at target wins when the crash point is
+    above it (see AutoCashoutBook.pop_due()).
+
+    Returns (rounds, wins, capped_wins, clamped) with wins and capped_wins
+    counted per target.
+    """
+    server_seed, client_seed, start, count, targets, cap = args
+    points = crash_points(hash_prefixes(server_seed, client_seed, start, count))
+    capped = np.minimum(points, cap)
+    targets = np.asarray(targets, dtype=np.int64)
+
+    # Count points above each target with one sort + searchsorted
+    points.sort()
+    capped.sort()
+    wins = count - np.searchsorted(points, targets, side="right")
+    capped_wins = count - np.searchsorted(capped, targets, side="right")
+    clamped = int(count - np.searchsorted(points, cap, side="right"))
+    return count, wins, capped_wins, clamped
+
+
+def _cents(value) -> Decimal:
+    return Decimal(int(value)) / 100
+
+
+def cross_check(server_seed: str, client_seed: str, nonces) -> list:
+    """
+    Compare crash_points() with generate_round_result() for the given
+    nonces. Returns (nonce, expected, got) for every mismatch.
+    """
+    mismatches = []
+    for nonce in nonces:
+        expected = generate_round_result(server_seed, client_seed, nonce)
+        got = _cents(crash_points(hash_prefixes(server_seed, client_seed, nonce, 1))[0])
+        if got != expected:
+            mismatches.append((nonce, expected, got))
+    return mismatches
+
+
+def cross_check_prefixes(prefixes) -> list:
+    """
+    Same against crash_point_from_hash() for raw 52-bit prefixes, e.g. the
+    extremes no sample of real hashes would hit. Returns (prefix, expected, got).
+    """
+    got = crash_points(np.asarray(prefixes, dtype=np.int64))
+    mismatches = []
+    for prefix, cents in zip(prefixes, got):
+        expected = crash_point_from_hash(f"{prefix:013x}")
+        if _cents(cents) != expected:
+            mismatches.append((prefix, expected, _cents(cents)))
+    return mismatches
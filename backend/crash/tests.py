@@ -1,3 +1,606 @@
-from django.test import TestCase
+import math
+import tempfile
+from decimal import Decimal
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from wallets import balance_cache
+from wallets.models import LedgerEntry, Wallet, WalletTransaction
+from wallets.services import reserve_bet_funds, settle_auto_cashouts_atomic, settle_lost_bets_bulk, void_round_bets
+
+from . import intake, ratelimit
+from .autocashout import AutoCashoutBook
+from .curve import multiplier_at, time_to_reach
+from .demo import DemoStore
+from .consumers import CrashConsumer
+from .intake import BetIntake, bet_reference, refund_reference, write_bets
+from .ledger import ALREADY_BET, EXPOSURE_LIMIT, OK, PLAYER_LIMIT, RoundLedger
+from .models import AuditLog, CrashBet, GameRound
+from .redis_lock import shared_redis
+from .provably_fair import generate_round_result, sha256_hex, verify_chain
+from .seed_chain import (
+    ClientSeedNotCommitted, SeedChain, SeedChainExhausted, SeedCursor, commit_client_seed, generate_chain,
+)
+
+try:
+    from . import simulation
+except ImportError:
+    simulation = None
+
+# Far above any id the dev database hands out, so the Redis keys are the test's own
+ROUND_ID = 900_000_001
+
+
+def make_round(crash_point="2.00"):
+    return GameRound.objects.create(
+        id=ROUND_ID,
+        server_seed="seed",
+        server_seed_hash="hash",
+        client_seed="global-client",
+        nonce=1,
+        crash_point=Decimal(crash_point),
+    )
+
+
+def make_player(username, balance="1000.00", spot_balance="500.00"):
+    user = get_user_model().objects.create(username=username, email=f"{username}@example.com")
+    Wallet.objects.create(user=user, balance=Decimal(balance), spot_balance=Decimal(spot_balance))
+    return user
+
+
+class BetIntakeTests(TestCase):
+    def setUp(self):
+        self.round = make_round()
+        self.intake = BetIntake(self.round.id)
+        self.clear_redis()
+        self.addCleanup(self.clear_redis)
+
+    def clear_redis(self):
+        self.intake.r.delete(self.intake.key, self.intake.processing_key, self.intake.closed_key)
+        RoundLedger(self.round.id).reset()
+
+    def player(self, username, balance="1000.00", spot_balance="500.00"):
+        return make_player(username, balance, spot_balance)
+
+    def bet(self, user, amount="300.00"):
+        """Take the stake and queue the bet, as the consumer does"""
+        taken_from_wallet, taken_from_spot, _ = reserve_bet_funds(user.id, Decimal(amount))
+        entry = {
+            "ref": bet_reference(self.round.id, user.id),
+            "round_id": self.round.id,
+            "user_id": user.id,
+            "username": user.username,
+            "channel": None,
+            "amount": amount,
+            "auto_cashout": None,
+            "from_wallet": str(taken_from_wallet),
+            "from_spot": str(taken_from_spot),
+            "is_demo": False,
+            "ip": "127.0.0.1",
+            "device_fp": "",
+            "placed_at": timezone.now().isoformat(),
+        }
+        self.assertTrue(self.intake.push(entry))
+        return entry
+
+    def balances(self, user):
+        return Wallet.objects.values_list("balance", "spot_balance").get(user=user)
+
+    def test_flush_writes_queued_bets(self):
+        users = [self.player(f"intake_{i}") for i in range(3)]
+        for user in users:
+            self.bet(user)
+
+        written, dropped = self.intake.flush()
+
+        self.assertEqual(len(written), 3)
+        self.assertEqual(dropped, [])
+        self.assertEqual(CrashBet.objects.filter(round=self.round, status="ACTIVE").count(), 3)
+        self.assertEqual(self.intake.pending(), 0)
+
+    def test_rejected_bet_is_refunded_once(self):
+        user = self.player("intake_rejected")
+        entry = self.bet(user, "1200.00")
+        self.assertEqual(self.balances(user), (Decimal("0.00"), Decimal("300.00")))
+        # A bet that raced in through the REST endpoint
+        CrashBet.objects.create(user=user, round=self.round, bet_amount=Decimal("100.00"), status="ACTIVE")
+
+        written, dropped = self.intake.flush()
+
+        self.assertEqual(written, [])
+        self.assertEqual([e["ref"] for e in dropped], [entry["ref"]])
+        self.assertEqual(self.balances(user), (Decimal("1000.00"), Decimal("500.00")))
+        self.assertTrue(WalletTransaction.objects.filter(reference=refund_reference(entry)).exists())
+
+        # The same batch again, as after a failed ack: no second refund
+        written, dropped = write_bets([entry])
+        self.assertEqual(written, [])
+        self.assertEqual(len(dropped), 1)
+        self.assertEqual(self.balances(user), (Decimal("1000.00"), Decimal("500.00")))
+
+    def test_bets_of_one_player_in_the_same_second_are_each_refunded(self):
+        user = self.player("intake_twice")
+        CrashBet.objects.create(user=user, round=self.round, bet_amount=Decimal("100.00"), status="ACTIVE")
+        with mock.patch("django.utils.timezone.now", return_value=timezone.now()):
+            first = self.bet(user, "1200.00")
+            self.assertEqual(len(self.intake.flush()[1]), 1)
+            second = self.bet(user, "200.00")
+            written, dropped = self.intake.flush()
+
+        self.assertNotEqual(first["ref"], second["ref"])
+        self.assertEqual([e["ref"] for e in dropped], [second["ref"]])
+        self.assertEqual(self.balances(user), (Decimal("1000.00"), Decimal("500.00")))
+        for entry in (first, second):
+            self.assertTrue(WalletTransaction.objects.filter(reference=refund_reference(entry)).exists())
+
+    def test_void_refunds_each_stake_to_where_it_came_from(self):
+        user = self.player("void_split", balance="100.00")
+        self.bet(user)
+        self.intake.flush()
+        # An earlier stake of the player in this round, already refunded
+        stale = f"CRASHBET-{self.round.id}-{user.id}-stale"
+        WalletTransaction.objects.create(
+            user=user, amount=Decimal("300.00"), tx_type=WalletTransaction.DEBIT, reference=stale,
+            meta={"reason": "crash_bet", "taken_from_wallet": "300.00", "taken_from_spot": "0.00"},
+        )
+        WalletTransaction.objects.create(
+            user=user, amount=Decimal("300.00"), tx_type=WalletTransaction.CREDIT, reference=f"{stale}-REFUND",
+        )
+        # A stake whose recorded split does not add up
+        other = self.player("void_bad_split")
+        CrashBet.objects.create(user=other, round=self.round, bet_amount=Decimal("50.00"), status="ACTIVE")
+        WalletTransaction.objects.create(
+            user=other, amount=Decimal("50.00"), tx_type=WalletTransaction.DEBIT,
+            reference=bet_reference(self.round.id, other.id),
+            meta={"reason": "crash_bet", "taken_from_wallet": "10.00", "taken_from_spot": "10.00"},
+        )
+        self.assertEqual(self.balances(user), (Decimal("0.00"), Decimal("300.00")))
+
+        void_round_bets(self.round)
+
+        self.assertEqual(self.balances(user), (Decimal("100.00"), Decimal("500.00")))
+        self.assertEqual(self.balances(other), (Decimal("1050.00"), Decimal("500.00")))
+        refund = WalletTransaction.objects.get(reference=f"CRASHVOID-{CrashBet.objects.get(user=user).id}")
+        self.assertEqual(refund.meta["refunded_to_spot"], "200.00")
+
+    def test_ledger_rebuild_counts_bets_still_queued(self):
+        queued, drained, stored = (self.player(f"ledger_{name}") for name in ("queued", "drained", "stored"))
+        self.bet(stored, "100.00")
+        self.intake.flush()
+        self.bet(drained, "200.00")
+        self.intake.drain()
+        self.bet(queued, "300.00")
+        risk = SimpleNamespace(max_bet_per_player_per_round=Decimal("1000.00"), max_exposure_per_round=Decimal("10000.00"))
+        ledger = RoundLedger(self.round.id)
+        ledger.reset()
+
+        self.assertEqual(ledger.reserve(queued.id, Decimal("50.00"), risk), ALREADY_BET)
+        self.assertEqual(ledger.reserve(drained.id, Decimal("50.00"), risk), ALREADY_BET)
+        self.assertEqual(ledger.exposure(), Decimal("600.00"))
+        self.assertEqual(ledger.reserve(self.player("ledger_new").id, Decimal("50.00"), risk), OK)
+
+    def test_resumed_settlement_logs_only_the_bets_it_settles(self):
+        earlier, open_bet, cashed = (self.player(f"lost_{name}") for name in ("earlier", "open", "cashed"))
+        for user, bet_status in ((earlier, "LOST"), (open_bet, "ACTIVE"), (cashed, "CASHED_OUT")):
+            CrashBet.objects.create(user=user, round=self.round, bet_amount=Decimal("100.00"), status=bet_status)
+        # A first settlement got through part of the round before it stopped
+        AuditLog.objects.create(user=earlier, action="BET_LOST", details={"round_id": self.round.id})
+
+        lost = settle_lost_bets_bulk(self.round)
+
+        self.assertEqual([user_id for _, user_id, _ in lost], [open_bet.id])
+        self.assertEqual(AuditLog.objects.filter(action="BET_LOST", user=earlier).count(), 1)
+        self.assertEqual(AuditLog.objects.filter(action="BET_LOST", user=open_bet).count(), 1)
+        self.assertFalse(AuditLog.objects.filter(action="BET_LOST", user=cashed).exists())
+        self.assertEqual(CrashBet.objects.get(user=cashed).status, "CASHED_OUT")
+
+    def test_failed_write_keeps_the_batch(self):
+        user = self.player("intake_failed")
+        self.bet(user)
+
+        with mock.patch.object(intake, "write_bets", side_effect=RuntimeError("database went away")):
+            with self.assertRaises(RuntimeError):
+                self.intake.flush()
+        self.assertEqual(self.intake.pending(), 1)
+        self.assertFalse(CrashBet.objects.filter(round=self.round).exists())
+
+        written, dropped = self.intake.flush()
+        self.assertEqual(len(written), 1)
+        self.assertEqual(self.intake.pending(), 0)
+
+    def test_batch_committed_before_its_ack_is_not_written_twice(self):
+        user = self.player("intake_unacked")
+        entry = self.bet(user)
+
+        # The engine wrote the batch, then died before acknowledging it
+        write_bets(self.intake.drain())
+
+        written, dropped = self.intake.flush()
+        self.assertEqual([e["ref"] for e, _ in written], [entry["ref"]])
+        self.assertEqual(CrashBet.objects.filter(round=self.round).count(), 1)
+        self.assertEqual(WalletTransaction.objects.filter(reference=entry["ref"]).count(), 1)
+        self.assertEqual(self.intake.pending(), 0)
+
+
+class RestBetCase(TestCase):
+    """A player betting in ROUND_ID through the REST endpoints"""
+
+    def setUp(self):
+        self.round = make_round()
+        RoundLedger(self.round.id).reset()
+        self.addCleanup(RoundLedger(self.round.id).reset)
+        self.user = make_player("rest_bettor", balance="100.00")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def balances(self):
+        return Wallet.objects.values_list("balance", "spot_balance").get(user=self.user)
+
+    def place(self, amount="300.00"):
+        response = self.client.post("/api/crash/place-bet/", {"amount": amount}, format="json")
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()["bet_id"]
+
+
+class RestBetTests(RestBetCase):
+    def test_bet_records_where_its_stake_came_from(self):
+        self.place()
+
+        debit = WalletTransaction.objects.get(user=self.user, tx_type=WalletTransaction.DEBIT)
+        self.assertTrue(debit.reference.startswith(f"CRASHBET-{self.round.id}-{self.user.id}-"))
+        self.assertEqual(
+            (debit.meta["taken_from_wallet"], debit.meta["taken_from_spot"]), ("100.00", "200.00")
+        )
+
+    def test_void_refunds_a_rest_bet_to_where_it_came_from(self):
+        self.place()
+
+        void_round_bets(self.round)
+
+        self.assertEqual(self.balances(), (Decimal("100.00"), Decimal("500.00")))
+
+    def test_cancel_refunds_to_where_the_stake_came_from(self):
+        bet_id = self.place()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post("/api/crash/cancel-bet/", {"bet_id": bet_id}, format="json")
+
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(self.balances(), (Decimal("100.00"), Decimal("500.00")))
+        debit = WalletTransaction.objects.get(user=self.user, tx_type=WalletTransaction.DEBIT)
+        self.assertTrue(WalletTransaction.objects.filter(reference=f"{debit.reference}-REFUND").exists())
+        # Nothing left to refund if the round is voided afterwards
+        self.assertEqual(void_round_bets(self.round), [])
+
+
+class RoundLedgerTests(SimpleTestCase):
+    def setUp(self):
+        self.ledger = RoundLedger(ROUND_ID)
+        self.ledger.initialize()
+        self.addCleanup(self.ledger.reset)
+        self.risk = SimpleNamespace(max_bet_per_player_per_round=Decimal("500.00"), max_exposure_per_round=Decimal("800.00"))
+
+    def test_reserve_enforces_player_and_round_limits(self):
+        self.assertEqual(self.ledger.reserve(1, Decimal("500.01"), self.risk), PLAYER_LIMIT)
+        self.assertEqual(self.ledger.reserve(1, Decimal("500.00"), self.risk), OK)
+        self.assertEqual(self.ledger.reserve(1, Decimal("1.00"), self.risk), ALREADY_BET)
+        self.assertEqual(self.ledger.reserve(2, Decimal("300.01"), self.risk), EXPOSURE_LIMIT)
+        self.assertEqual(self.ledger.reserve(2, Decimal("300.00"), self.risk), OK)
+        self.assertEqual(self.ledger.exposure(), Decimal("800.00"))
+
+    def test_release_frees_the_stake_and_the_exposure(self):
+        self.ledger.reserve(1, Decimal("500.00"), self.risk)
+
+        self.ledger.release(1, Decimal("500.00"))
+
+        self.assertEqual(self.ledger.exposure(), Decimal("0.00"))
+        self.assertEqual(self.ledger.reserve(1, Decimal("200.00"), self.risk), OK)
+
+    def test_initialize_does_not_replace_a_loaded_ledger(self):
+        self.ledger.reserve(1, Decimal("100.00"), self.risk)
+
+        self.ledger.initialize()
+
+        self.assertEqual(self.ledger.exposure(), Decimal("100.00"))
+
+
+class CurveTests(SimpleTestCase):
+    def test_time_to_reach_is_the_first_instant_at_the_multiplier(self):
+        for target in ("1.01", "1.50", "2.00", "10.00", "123.45"):
+            elapsed = time_to_reach(target)
+            self.assertGreaterEqual(multiplier_at(elapsed), Decimal(target))
+            self.assertLess(multiplier_at(math.nextafter(elapsed, 0)), Decimal(target))
+
+
+class AutoCashoutBookTests(SimpleTestCase):
+    def test_pop_due_returns_each_target_once(self):
+        book = AutoCashoutBook([(Decimal("1.50"), 1), (Decimal("2.00"), 2), (Decimal("1.20"), 3)])
+
+        self.assertEqual(book.pop_due(Decimal("1.10"), Decimal("5.00")), [])
+        self.assertEqual(book.pop_due(Decimal("1.50"), Decimal("5.00")), [3, 1])
+        self.assertEqual(book.pop_due(Decimal("1.60"), Decimal("5.00")), [])
+        self.assertEqual(len(book), 1)
+
+    def test_targets_at_or_above_the_crash_point_never_win(self):
+        book = AutoCashoutBook([(Decimal("1.50"), 1), (Decimal("2.00"), 2), (Decimal("2.50"), 3)])
+
+        self.assertEqual(book.pop_due(Decimal("3.00"), Decimal("2.00")), [1])
+
+
+class CashoutPricingTests(RestBetCase):
+    def fly(self, crash_point):
+        started_at = timezone.now()
+        GameRound.objects.filter(id=self.round.id).update(
+            status="RUNNING", started_at=started_at, crash_point=Decimal(crash_point)
+        )
+        return started_at.timestamp()
+
+    def cash_out(self, bet_id, at):
+        with mock.patch("crash.views.time") as clock:
+            clock.time.return_value = at
+            # The client's multiplier is ignored
+            return self.client.post("/api/crash/cash-out/", {"bet_id": bet_id, "multiplier": "9.00"}, format="json")
+
+    def test_cashout_is_priced_on_the_server_clock(self):
+        bet_id = self.place()
+        started = self.fly("10.00")
+
+        response = self.cash_out(bet_id, started + time_to_reach("1.50") + 0.001)
+
+        self.assertEqual(response.status_code, 200, response.content)
+        bet = CrashBet.objects.get(id=bet_id)
+        self.assertEqual((bet.status, bet.cashout_multiplier, bet.win_amount), ("CASHED_OUT", Decimal("1.50"), Decimal("450.00")))
+
+    def test_cashout_after_the_crash_time_is_refused(self):
+        bet_id = self.place()
+        started = self.fly("1.20")
+
+        response = self.cash_out(bet_id, started + time_to_reach("1.20") + 0.001)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(CrashBet.objects.get(id=bet_id).status, "ACTIVE")
+
+
+class AutoCashoutSettlementTests(TestCase):
+    def setUp(self):
+        self.round = make_round(crash_point="5.00")
+
+    def bet(self, username, amount, target):
+        user = make_player(username, balance="0.00", spot_balance="0.00")
+        return CrashBet.objects.create(
+            user=user, round=self.round, bet_amount=Decimal(amount), auto_cashout=Decimal(target), status="ACTIVE"
+        )
+
+    def test_batch_pays_each_bet_at_its_target_up_to_max_win(self):
+        small = self.bet("auto_small", "100.00", "1.50")
+        # User ids come round again between tests; start from an empty cache entry
+        shared_redis().delete(balance_cache.key(small.user_id))
+        self.addCleanup(shared_redis().delete, balance_cache.key(small.user_id))
+        big = self.bet("auto_big", "1000.00", "2.00")
+        later = self.bet("auto_later", "100.00", "3.00")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            results = settle_auto_cashouts_atomic(
+                [small.id, big.id, later.id], ceiling=Decimal("2.00"), max_win=Decimal("1500.00")
+            )
+
+        self.assertEqual([(r["bet_id"], r["payout"]) for r in results], [(small.id, Decimal("150.00"))])
+        self.assertEqual(results[0]["wallet_balance"], Decimal("150.00"))
+        wallet = Wallet.objects.get(user=small.user)
+        self.assertEqual(wallet.spot_balance, Decimal("150.00"))
+        self.assertGreater(wallet.updated_at, small.created_at)
+        self.assertEqual(LedgerEntry.objects.get(user=small.user, account=LedgerEntry.SPOT).amount, Decimal("150.00"))
+        self.assertEqual(balance_cache.get(small.user_id).spot_balance, Decimal("150.00"))
+        # Over max_win, and not reached yet: both left open
+        self.assertEqual(set(CrashBet.objects.filter(status="ACTIVE").values_list("id", flat=True)), {big.id, later.id})
+        self.assertEqual(Wallet.objects.get(user=big.user).spot_balance, Decimal("0.00"))
+
+
+class SeedChainTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = Path(tmp.name) / "crash_test.chain"
+        self.terminating_hash = generate_chain(self.path, 5)
+
+    def open(self):
+        chain = SeedChain(self.path)
+        self.addCleanup(chain.close)
+        return chain
+
+    def test_chain_is_not_played_before_its_client_seed_is_committed(self):
+        with self.assertRaises(ClientSeedNotCommitted):
+            SeedCursor(self.open())
+
+        commit_client_seed(self.path, "block-hash", source="bitcoin block 1")
+
+        self.assertEqual(SeedCursor(self.open()).client_seed, "block-hash")
+
+    def test_every_game_hashes_back_to_the_terminating_hash(self):
+        chain = self.open()
+
+        for game in range(1, chain.length + 1):
+            self.assertTrue(verify_chain(chain.seed(game), game, self.terminating_hash))
+        # Each round's seed hash is the previous round's seed
+        self.assertEqual(sha256_hex(chain.seed(3)), chain.seed(2))
+        self.assertFalse(verify_chain(chain.seed(2), 3, self.terminating_hash))
+        with self.assertRaises(SeedChainExhausted):
+            chain.seed(chain.length + 1)
+
+    def test_cursor_resumes_after_the_last_round_played_from_the_chain(self):
+        commit_client_seed(self.path, "block-hash")
+        chain = self.open()
+        played = SimpleNamespace(nonce=2, server_seed=chain.seed(2))
+
+        cursor = SeedCursor.resume(chain, played)
+
+        self.assertEqual(cursor.take(), (3, chain.seed(3)))
+        self.assertEqual(cursor.remaining, 2)
+        # A round from another chain, or none at all, starts this one from game 1
+        self.assertEqual(SeedCursor.resume(chain, SimpleNamespace(nonce=2, server_seed="f" * 64)).next_game, 1)
+        self.assertEqual(SeedCursor.resume(chain, None).next_game, 1)
+
+    def test_client_seed_is_committed_once(self):
+        record = commit_client_seed(self.path, "block-hash")
+
+        self.assertEqual(record["terminating_hash"], self.terminating_hash)
+        with self.assertRaises(ValueError):
+            commit_client_seed(self.path, "a-better-seed")
+        self.assertEqual(self.open().client_seed, "block-hash")
+
+
+class RiskSettingsCacheTests(TestCase):
+    def test_bets_reuse_the_limits_read_by_the_rate_limiter(self):
+        ratelimit.load_limits()
+
+        with self.assertNumQueries(0):
+            for _ in range(3):
+                risk = ratelimit.risk_settings()
+        self.assertEqual(risk.pk, 1)
+
+        with mock.patch.object(ratelimit.time, "monotonic", return_value=ratelimit._limits["at"] + ratelimit.LIMITS_TTL + 1):
+            with self.assertNumQueries(1):
+                ratelimit.risk_settings()
+
+
+@skipUnless(simulation, "the simulator needs NumPy")
+class SimulationTests(SimpleTestCase):
+    def test_vectorized_crash_points_are_bit_exact(self):
+        self.assertEqual(simulation.cross_check("server-seed", "client-seed", range(1, 501)), [])
+        scale = simulation.SCALE
+        self.assertEqual(simulation.cross_check_prefixes([0, 1, scale // 2, scale - 2, scale - 1]), [])
+
+    def test_chunk_counts_the_rounds_that_beat_each_target(self):
+        points = [generate_round_result("server-seed", "client-seed", nonce) for nonce in range(1, 301)]
+        targets, cap = [Decimal("1.50"), Decimal("2.00"), Decimal("5.00")], Decimal("3.00")
+
+        count, wins, capped_wins, clamped = simulation.simulate_chunk(
+            ("server-seed", "client-seed", 1, 300, [int(t * 100) for t in targets], int(cap * 100))
+        )
+
+        self.assertEqual(count, 300)
+        self.assertEqual(list(wins), [sum(p > t for p in points) for t in targets])
+        self.assertEqual(list(capped_wins), [sum(min(p, cap) > t for p in points) for t in targets])
+        self.assertEqual(clamped, sum(p > cap for p in points))
+
+
+class DemoStoreTests(SimpleTestCase):
+    """No database at all: SimpleTestCase fails any query"""
+
+    def setUp(self):
+        self.store = DemoStore("tests")
+        self.risk = SimpleNamespace(max_multiplier_cap=Decimal("500.00"))
+        self.round = self.store.create_round(risk=self.risk)
+        self.players = [SimpleNamespace(id=ROUND_ID + i, username=f"demo_{i}") for i in range(2)]
+        self.addCleanup(
+            self.store.r.delete,
+            self.store.round_key,
+            self.store.nonce_key,
+            self.store.bets_key(self.round.id),
+            *[self.store.balance_key(player.id) for player in self.players],
+        )
+        self.start = self.store.balance(self.players[0].id)
+
+    def test_bet_and_cashout_move_the_demo_balance(self):
+        player = self.players[0]
+        bet, balance = self.store.place_bet(player, Decimal("1000.00"), None, "channel")
+        self.assertEqual(balance, self.start - Decimal("1000.00"))
+        with self.assertRaisesMessage(ValueError, "already have an active bet"):
+            self.store.place_bet(player, Decimal("10.00"), None, "channel")
+
+        balance = self.store.settle(bet, "CASHED_OUT", Decimal("1500.00"), multiplier=Decimal("1.50"))
+
+        self.assertEqual(balance, self.start + Decimal("500.00"))
+        # Settled once only
+        self.assertIsNone(self.store.settle(bet, "CASHED_OUT", Decimal("1500.00"), multiplier=Decimal("1.50")))
+        self.assertEqual(self.store.balance(player.id), self.start + Decimal("500.00"))
+
+    def test_bets_close_with_the_round_and_open_ones_lose(self):
+        first, second = self.players
+        bet, _ = self.store.place_bet(first, Decimal("100.00"), Decimal("2.00"), None)
+        self.round.status = "RUNNING"
+        self.store.save_round(self.round)
+
+        with self.assertRaisesMessage(ValueError, "No active betting round"):
+            self.store.place_bet(second, Decimal("100.00"), None, None)
+        self.assertEqual(self.store.settle_lost(self.round.id), [(bet["id"], first.id, Decimal("100.00"))])
+        self.assertEqual([b["status"] for b in self.store.bets(self.round.id)], ["LOST"])
+
+    def test_stake_above_the_demo_balance_is_refused(self):
+        with self.assertRaisesMessage(ValueError, "Insufficient demo balance"):
+            self.store.place_bet(self.players[0], self.start + 1, None, None)
+        self.assertEqual(self.store.balance(self.players[0].id), self.start)
+
+
+class TokenBucketTests(SimpleTestCase):
+    def setUp(self):
+        self.r = shared_redis()
+        self.user_id = ROUND_ID
+        self.clear()
+        self.addCleanup(self.clear)
+
+    def clear(self):
+        keys = self.r.keys(f"crash:rl:*:{self.user_id}:*")
+        if keys:
+            self.r.delete(*keys)
+
+    def take(self, buckets, at, **kwargs):
+        with mock.patch.object(ratelimit.time, "time", return_value=at):
+            ratelimit.take(ratelimit.ACTION_BET, buckets, self.user_id, client=self.r, **kwargs)
+
+    def test_bucket_refills_over_time(self):
+        buckets = [("minute", 2, 1.0)]  # two tokens, one more per second
+        self.take(buckets, 1000.0)
+        self.take(buckets, 1000.0)
+
+        with self.assertRaises(ratelimit.RateLimited) as limited:
+            self.take(buckets, 1000.5)
+        self.assertEqual(limited.exception.retry_after_ms, 500)
+
+        self.take(buckets, 1001.0)
+
+    def test_a_token_is_taken_only_when_every_bucket_has_one(self):
+        buckets = [("minute", 5, 1.0), ("cooldown", 1, 0.5)]
+        self.take(buckets, 1000.0)
+
+        with self.assertRaises(ratelimit.RateLimited) as limited:
+            self.take(buckets, 1000.0)
+        self.assertEqual(limited.exception.retry_after_ms, 2000)
+        # The refused message did not cost a minute token: four are left
+        self.take([("minute", 5, 1.0)], 1000.0)
+        for _ in range(3):
+            self.take([("minute", 5, 1.0)], 1000.0)
+        with self.assertRaises(ratelimit.RateLimited):
+            self.take([("minute", 5, 1.0)], 1000.0)
+
+
+class PlayerMessageTests(SimpleTestCase):
+    def consumer(self, channel_name):
+        consumer = CrashConsumer()
+        consumer.channel_name = channel_name
+        consumer.send_json = mock.AsyncMock()
+        return consumer
+
+    def test_group_copy_is_skipped_by_the_socket_it_was_sent_to(self):
+        event = {"type": "bet.crashed", "data": {"bet_id": 1}, "sent_to": "bettor"}
+        bettor, other_tab = self.consumer("bettor"), self.consumer("other-tab")
+
+        async_to_sync(bettor.bet_crashed)(event)
+        async_to_sync(other_tab.bet_crashed)(event)
+
+        bettor.send_json.assert_not_called()
+        other_tab.send_json.assert_called_once_with({"event": "bet_crashed", "data": {"bet_id": 1}})
+
+    def test_direct_message_is_delivered(self):
+        consumer = self.consumer("bettor")
+
+        async_to_sync(consumer.bet_confirmed)({"type": "bet.confirmed", "data": {"ref": "r", "bet_id": 1}})
+
+        consumer.send_json.assert_called_once()
@@ -3,7 +3,10 @@ from . import views
 
 urlpatterns = [
     path("recent-rounds/", views.RecentRoundsView.as_view(), name="recent-rounds"),
+    path("lobby/", views.LobbyView.as_view(), name="lobby"),
     path("verify-round/", views.VerifyRoundView.as_view(), name="verify-round"),
+    path("verify-rounds/", views.VerifyRoundsView.as_view(), name="verify-rounds"),
+    path("seed-chain/", views.SeedChainView.as_view(), name="seed-chain"),
     path('place-bet/', views.place_bet, name='crash_place_bet'),
     path('cash-out/', views.cash_out, name='crash_cash_out'),
     path('stats/', views.get_stats, name='crash_stats'),
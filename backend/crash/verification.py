@@ -0,0 +1,174 @@
+"""
+Bulk provably-fair verification.
+
+Recomputes crash points for a range of stored rounds, or for a server seed
+over a range of nonces, and yields one result per round. The HMAC key
+schedule is done once per server seed and copied for each nonce, and
+stored rounds are read as plain tuples in batches, so 100k rounds take
+seconds. Rounds that have not finished are skipped: their seed is still
+secret.
+
+Every result is a dict with a "status":
+    ok        recomputed crash point matches
+    capped    stored point is the max_multiplier_cap clamp of the recomputed one
+    mismatch  anything else, or a server_seed that does not hash to server_seed_hash
+"""
+import hashlib
+import hmac
+
+from django.conf import settings
+
+from .models import GameRound, RiskSettings
+from .provably_fair import crash_point_from_hash, sha256_hex
+
+VERIFY_BATCH = 2000
+MAX_VERIFY_ROUNDS = getattr(settings, "CRASH_VERIFY_MAX_ROUNDS", 1000)
+FINISHED = ["CRASHED", "SETTLED", "VOIDED"]
+
+OK = "ok"
+CAPPED = "capped"
+MISMATCH = "mismatch"
+
+
+class SeedHasher:
+    """HMAC-SHA256 keyed once per server seed; the last few keys are kept"""
+
+    def __init__(self, keep=64):
+        self.keep = keep
+        self._bases = {}
+
+    def crash_point(self, server_seed: str, client_seed: str, nonce: int):
+        base = self._bases.get(server_seed)
+        if base is None:
+            if len(self._bases) >= self.keep:
+                self._bases.pop(next(iter(self._bases)))
+            base = self._bases[server_seed] = hmac.new(server_seed.encode("utf-8"), digestmod=hashlib.sha256)
+        mac = base.copy()
+        mac.update(f"{client_seed}:{nonce}".encode("utf-8"))
+        return crash_point_from_hash(mac.hexdigest())
+
+
+def _classify(stored, expected, cap):
+    if stored == expected:
+        return OK
+    if stored < expected and stored == cap:
+        return CAPPED
+    return MISMATCH
+
+
+def verify_stored_rounds(queryset, cap=None, hasher=None):
+    """
+    Yield a result per finished round of queryset, in id order, plus a
+    {"status": "skipped"} result per unfinished one (no seed or crash point).
+    """
+    cap = RiskSettings.get().max_multiplier_cap if cap is None else cap
+    hasher = hasher or SeedHasher()
+    rows = queryset.order_by("id").values_list(
+        "id", "status", "server_seed", "server_seed_hash", "client_seed", "nonce", "crash_point"
+    )
+    for round_id, round_status, server_seed, seed_hash, client_seed, nonce, stored in rows.iterator(
+        chunk_size=VERIFY_BATCH
+    ):
+        if round_status not in FINISHED:
+            yield {"round_id": round_id, "status": "skipped"}
+            continue
+
+        expected = hasher.crash_point(server_seed, client_seed, nonce)
+        result_status = _classify(stored, expected, cap)
+        result = {
+            "round_id": round_id,
+            "nonce": nonce,
+            "crash_point": str(stored),
+            "expected": str(expected),
+            "status": result_status,
+        }
+        if sha256_hex(server_seed) != seed_hash:
+            result["status"] = MISMATCH
+            result["reason"] = "server_seed does not hash to server_seed_hash"
+        yield result
+
+
+def verify_seed(server_seed: str, client_seed: str, nonce_from: int, nonce_to: int, cap=None):
+    """
+    Yield the crash point of every nonce in [nonce_from, nonce_to] for one
+    server seed. Where a finished round was played with that seed and nonce
+    its stored crash point is compared too; otherwise the status is ok.
+    """
+    cap = RiskSettings.get().max_multiplier_cap if cap is None else cap
+    hasher = SeedHasher(keep=1)
+    stored = {
+        nonce: (round_id, crash_point)
+        for nonce, round_id, crash_point in GameRound.objects.filter(
+            server_seed=server_seed,
+            client_seed=client_seed,
+            nonce__gte=nonce_from,
+            nonce__lte=nonce_to,
+            status__in=FINISHED,
+        ).values_list("nonce", "id", "crash_point")
+    }
+
+    for nonce in range(nonce_from, nonce_to + 1):
+        expected = hasher.crash_point(server_seed, client_seed, nonce)
+        result = {"nonce": nonce, "expected": str(expected), "status": OK}
+        if nonce in stored:
+            round_id, crash_point = stored[nonce]
+            result["round_id"] = round_id
+            result["crash_point"] = str(crash_point)
+            result["status"] = _classify(crash_point, expected, cap)
+        yield result
+
+
+def summarize(results, emit_all=False):
+    """
+    Pass through the results worth reporting (all of them with emit_all,
+    otherwise everything but ok) and yield a {"summary": counts} last.
+    """
+    counts = {"checked": 0, OK: 0, CAPPED: 0, MISMATCH: 0, "skipped": 0}
+    for result in results:
+        counts[result["status"]] += 1
+        if result["status"] != "skipped":
+            counts["checked"] += 1
+        if emit_all or result["status"] != OK:
+            yield result
+    yield {"summary": counts}
+
+
+def verification_results(
+    from_round=None,
+    to_round=None,
+    server_seed=None,
+    client_seed=None,
+    nonce_from=None,
+    nonce_to=None,
+    is_demo=None,
+    room=None,
+    max_rounds=MAX_VERIFY_ROUNDS,
+):
+    """
+    Results for either a round id range (optionally one mode / room) or a
+    server seed over a nonce range. Raises ValueError on a bad or too large
+    request; max_rounds=None lifts the size limit.
+    """
+    if server_seed:
+        if nonce_from is None or nonce_to is None or not client_seed:
+            raise ValueError("client_seed, nonce_from and nonce_to are required with server_seed")
+        first, last = int(nonce_from), int(nonce_to)
+    elif from_round is not None and to_round is not None:
+        first, last = int(from_round), int(to_round)
+    else:
+        raise ValueError("Give from_round and to_round, or server_seed with nonce_from and nonce_to")
+
+    if first < 0 or last < first:
+        raise ValueError("Invalid range")
+    if max_rounds is not None and last - first + 1 > max_rounds:
+        raise ValueError(f"At most {max_rounds} rounds per request")
+
+    if server_seed:
+        return verify_seed(server_seed, client_seed, first, last)
+
+    rounds = GameRound.objects.filter(id__gte=first, id__lte=last)
+    if is_demo is not None:
+        rounds = rounds.filter(is_demo=is_demo)
+    if room:
+        rounds = rounds.filter(room=room)
+    return verify_stored_rounds(rounds)
@@ -3,18 +3,40 @@ from rest_framework import generics, permissions, views, response, status
 from .models import GameRound
 from .serializers import GameRoundSerializer
 from .provably_fair import verify_round
+from .verification import verification_results, summarize
+from .seed_chain import SeedChain, default_chain_path, read_client_seed, read_header
+from .history import RoundHistory, HISTORY_SIZE
+from .protocol import DEFAULT_ROOM, group_name, room_key
+from .curve import multiplier_since
+import hmac
 import json
+import time
 from decimal import Decimal
 from django.utils import timezone
 from django.db import transaction
 from django.db.models import Sum, Q
 from django.conf import settings
+from django.http import HttpResponse
+from django.utils.decorators import method_decorator
+from django.views.decorators.cache import cache_control
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.throttling import ScopedRateThrottle
 
 from .models import GameRound, CrashBet, RiskSettings
-from wallets.models import Wallet
+from .intake import bet_reference
+from .ledger import RoundLedger, ALREADY_BET, PLAYER_LIMIT, EXPOSURE_LIMIT
+from wallets.models import Wallet, WalletTransaction
+from wallets.services import (
+    InsufficientFunds,
+    cashout_atomic,
+    crash_stake_sources,
+    debit_stake,
+    refund_stake,
+    stake_split,
+    wallet_balances,
+)
 
 
 class RecentRoundsView(generics.ListAPIView):
@@ -26,17 +48,168 @@ class RecentRoundsView(generics.ListAPIView):
         return GameRound.objects.all().order_by("-id")[:50]
 
 
+@method_decorator(cache_control(public=True, max_age=1), name="get")
+class LobbyView(views.APIView):
+    """Current round phase and the recent crash-point strip, straight from Redis"""
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request):
+        mode = "demo" if request.GET.get("mode") == "demo" else "real"
+        room = request.GET.get("room", DEFAULT_ROOM)
+        try:
+            limit = min(int(request.GET.get("limit", 50)), HISTORY_SIZE)
+            key = room_key(mode, room)
+        except ValueError:
+            return response.Response(
+                {"error": "Invalid limit or room"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        history = RoundHistory(key)
+        return response.Response({
+            "mode": mode,
+            "room": room,
+            "current": history.phase(),
+            "history": history.recent(limit),
+        })
+
+
+def chain_path(params):
+    """(mode, room, seed chain file) of the room named by ?mode=&room="""
+    mode = "demo" if params.get("mode") == "demo" else "real"
+    room = params.get("room", DEFAULT_ROOM)
+    return mode, room, default_chain_path(group_name(room_key(mode, room)))
+
+
+def in_chain(path, server_seed, nonce, terminating_hash) -> bool:
+    """
+    Whether server_seed is game `nonce` of the published chain: looked up in
+    the stored chain rather than hashed `nonce` times. Raises ValueError
+    for a chain that is not the room's or a nonce it does not have.
+    """
+    length, published_hash = read_header(path)
+    if not hmac.compare_digest(published_hash, terminating_hash):
+        raise ValueError("Unknown seed chain")
+    if not 1 <= nonce <= length:
+        raise ValueError(f"nonce must be between 1 and {length}")
+    chain = SeedChain(path)
+    try:
+        return hmac.compare_digest(chain.seed(nonce), server_seed)
+    finally:
+        chain.close()
+
+
 class VerifyRoundView(views.APIView):
     permission_classes = [permissions.AllowAny]
+    throttle_classes = [ScopedRateThrottle]
+    throttle_scope = "crash_verify"
 
     def post(self, request):
-        server_seed = request.data.get("server_seed")
-        client_seed = request.data.get("client_seed")
-        nonce = int(request.data.get("nonce"))
-        crash_point = Decimal(str(request.data.get("crash_point")))
+        try:
+            server_seed = str(request.data["server_seed"])
+            client_seed = str(request.data["client_seed"])
+            nonce = int(request.data["nonce"])
+            crash_point = Decimal(str(request.data["crash_point"]))
+        except (KeyError, TypeError, ValueError, ArithmeticError):
+            return response.Response(
+                {"error": "server_seed, client_seed, nonce and crash_point are required"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
 
         ok = verify_round(server_seed, client_seed, nonce, crash_point)
-        return response.Response({"valid": ok})
+        payload = {"valid": ok}
+
+        # Optional: prove the seed belongs to the room's published hash chain
+        terminating_hash = request.data.get("terminating_hash")
+        if terminating_hash:
+            try:
+                _, _, path = chain_path(request.data)
+                if not path.exists():
+                    raise ValueError("No seed chain published")
+                payload["in_chain"] = in_chain(path, server_seed, nonce, str(terminating_hash))
+            except ValueError as e:
+                return response.Response(
+                    {"error": str(e)},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+
+        return response.Response(payload)
+
+
+class VerifyRoundsView(views.APIView):
+    """
+    Bulk verification as NDJSON: one line per round that is not ok (every
+    round with ?all=1), then a {"summary": ...} line. Public requests cover
+    at most CRASH_VERIFY_MAX_ROUNDS rounds, so the body is built in one go
+    rather than streamed (manage.py verify_crash_rounds has no limit).
+
+    ?from_round=&to_round=[&mode=&room=]  stored rounds by id
+    ?server_seed=&client_seed=&nonce_from=&nonce_to=  one seed over a nonce range
+    """
+    permission_classes = [permissions.AllowAny]
+    throttle_classes = [ScopedRateThrottle]
+    throttle_scope = "crash_verify_bulk"
+
+    def get(self, request):
+        params = request.GET
+        mode = params.get("mode")
+        try:
+            results = verification_results(
+                from_round=params.get("from_round"),
+                to_round=params.get("to_round"),
+                server_seed=params.get("server_seed"),
+                client_seed=params.get("client_seed"),
+                nonce_from=params.get("nonce_from"),
+                nonce_to=params.get("nonce_to"),
+                is_demo=(mode == "demo") if mode else None,
+                room=params.get("room"),
+            )
+        except ValueError as e:
+            return response.Response(
+                {"error": str(e)},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        body = "".join(
+            json.dumps(result) + "\n"
+            for result in summarize(results, emit_all=params.get("all") == "1")
+        )
+        return HttpResponse(body, content_type="application/x-ndjson")
+
+
+class SeedChainView(views.APIView):
+    """
+    Published terminating hash of the seed chain currently in play, and the
+    client seed committed after it (null until then, and no round is played
+    from the chain before it is set).
+    """
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request):
+        try:
+            mode, room, path = chain_path(request.GET)
+        except ValueError:
+            return response.Response(
+                {"error": "Invalid room"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        if not path.exists():
+            return response.Response(
+                {"error": "No seed chain published"},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+
+        length, terminating_hash = read_header(path)
+        committed = read_client_seed(path) or {}
+        return response.Response({
+            "mode": mode,
+            "room": room,
+            "length": length,
+            "terminating_hash": terminating_hash,
+            "client_seed": committed.get("client_seed"),
+            "client_seed_source": committed.get("source"),
+        })
 
 
 @api_view(['POST'])
@@ -113,53 +286,6 @@ def place_bet(request):
                     status=status.HTTP_400_BAD_REQUEST
                 )
             
-            # Get wallet with lock
-            wallet = Wallet.objects.select_for_update().get(user=user)
-            
-            # Check available funds: first balance, then spot_balance
-            available_balance = wallet.balance
-            available_spot = wallet.spot_balance
-            
-            # Calculate total available
-            total_available = available_balance + available_spot
-            
-            if amount > total_available:
-                return Response(
-                    {'error': 'Insufficient funds'}, 
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            
-            # Calculate how much to take from each balance
-            amount_from_balance = min(amount, available_balance)
-            amount_from_spot = amount - amount_from_balance
-            
-            # Check player exposure per round
-            max_player_per_round = getattr(risk, 'max_bet_per_player_per_round', Decimal('5000'))
-            player_total_bet = CrashBet.objects.filter(
-                user=user,
-                round=round_obj,
-                status='ACTIVE'
-            ).aggregate(total=Sum('bet_amount'))['total'] or Decimal('0')
-            
-            if player_total_bet + amount > max_player_per_round:
-                return Response(
-                    {'error': f'Maximum bet per round is ₦{max_player_per_round}'}, 
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            
-            # Check round exposure
-            max_exposure = getattr(risk, 'max_exposure_per_round', Decimal('10000'))
-            round_total_bet = CrashBet.objects.filter(
-                round=round_obj,
-                status='ACTIVE'
-            ).aggregate(total=Sum('bet_amount'))['total'] or Decimal('0')
-            
-            if round_total_bet + amount > max_exposure:
-                return Response(
-                    {'error': 'Round exposure limit reached'}, 
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            
             # Check cooldown (prevent spam)
             bet_cooldown = getattr(risk, 'bet_cooldown_seconds', 1)
             last_bet = CrashBet.objects.filter(
@@ -186,29 +312,61 @@ def place_bet(request):
                     status=status.HTTP_429_TOO_MANY_REQUESTS
                 )
             
-            # Deduct from balances
-            if amount_from_balance > 0:
-                wallet.balance -= amount_from_balance
+            # Existing bet, per-player total and round exposure from the live
+            # round ledger instead of aggregating CrashBet
+            ledger = RoundLedger(round_obj.id)
+            reserved = ledger.reserve(user.id, amount, risk)
             
-            if amount_from_spot > 0:
-                wallet.spot_balance -= amount_from_spot
+            if reserved == ALREADY_BET:
+                return Response(
+                    {'error': 'You already have an active bet in this round'}, 
+                    status=status.HTTP_400_BAD_REQUEST
+                )
             
-            # Save wallet changes
-            wallet.save(update_fields=['balance', 'spot_balance'])
+            if reserved == PLAYER_LIMIT:
+                return Response(
+                    {'error': f'Maximum bet per round is ₦{risk.max_bet_per_player_per_round}'}, 
+                    status=status.HTTP_400_BAD_REQUEST
+                )
             
-            # Create bet record
-            bet = CrashBet.objects.create(
-                user=user,
-                round=round_obj,
-                bet_amount=amount,
-                auto_cashout=auto_cashout,
-                status='ACTIVE',
-                ip_address=request.META.get('REMOTE_ADDR'),
-                device_fingerprint=request.META.get('HTTP_USER_AGENT', '')[:200],
-            )
-        
-        # Get updated wallet
-        wallet.refresh_from_db()
+            if reserved == EXPOSURE_LIMIT:
+                return Response(
+                    {'error': 'Round exposure limit reached'}, 
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            
+            try:
+                # Create bet record
+                bet = CrashBet.objects.create(
+                    user=user,
+                    round=round_obj,
+                    bet_amount=amount,
+                    auto_cashout=auto_cashout,
+                    status='ACTIVE',
+                    ip_address=request.META.get('REMOTE_ADDR'),
+                    device_fingerprint=request.META.get('HTTP_USER_AGENT', '')[:200],
+                )
+                # Wallet balance first, then spot balance, in one conditional UPDATE
+                reference = bet_reference(round_obj.id, user.id)
+                wallet = debit_stake(user.id, amount, game="crash", reference=reference)
+                # Same record as a bet from the intake queue, so a void or a
+                # cancel refunds the stake to where it came from
+                WalletTransaction.objects.create(
+                    user=user,
+                    amount=amount,
+                    tx_type=WalletTransaction.DEBIT,
+                    reference=reference,
+                    meta={
+                        'reason': 'crash_bet',
+                        'bet_id': bet.id,
+                        'taken_from_wallet': str(wallet.taken_from_wallet),
+                        'taken_from_spot': str(wallet.taken_from_spot),
+                        'placed_at': bet.created_at.isoformat(),
+                    },
+                )
+            except Exception:
+                ledger.release(user.id, amount)
+                raise
         
         return Response({
             'success': True,
@@ -216,10 +374,15 @@ def place_bet(request):
             'round_id': round_obj.id,
             'balance': float(wallet.balance),
             'spot_balance': float(wallet.spot_balance),
-            'total_balance': float(wallet.balance + wallet.spot_balance),
+            'total_balance': float(wallet.combined_balance),
             'message': 'Bet placed successfully'
         })
         
+    except InsufficientFunds:
+        return Response(
+            {'error': 'Insufficient funds'}, 
+            status=status.HTTP_400_BAD_REQUEST
+        )
     except Wallet.DoesNotExist:
         return Response(
             {'error': 'Wallet not found'}, 
@@ -236,81 +399,57 @@ def place_bet(request):
 @permission_classes([IsAuthenticated])
 def cash_out(request):
     """
-    REST API endpoint for cashing out in Crash game
+    REST API endpoint for cashing out in Crash game, priced like the socket
+    cashout: at the multiplier the round has on this server's clock when
+    the request arrives. A multiplier sent by the client is ignored.
     """
     user = request.user
+    received_at = time.time()
     
     try:
-        # Get request data
-        data = request.data
-        bet_id = data.get('bet_id')
-        multiplier = Decimal(str(data.get('multiplier', '1.0')))
+        bet_id = request.data.get('bet_id')
+        bet = CrashBet.objects.select_related('round', 'user').get(id=bet_id, user=user)
         
-        # Validate multiplier
-        if multiplier <= Decimal('1.0'):
+        # Check bet status
+        if bet.status != 'ACTIVE':
             return Response(
-                {'error': 'Invalid multiplier'}, 
+                {'error': 'Bet is not active'}, 
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        with transaction.atomic():
-            # Get bet with lock
-            bet = CrashBet.objects.select_for_update().select_related(
-                'round'
-            ).get(
-                id=bet_id,
-                user=user
+        # Check round status
+        round_obj = bet.round
+        if round_obj.status != 'RUNNING' or not round_obj.started_at:
+            return Response(
+                {'error': 'Round is not running'}, 
+                status=status.HTTP_400_BAD_REQUEST
             )
-            
-            # Check bet status
-            if bet.status != 'ACTIVE':
-                return Response(
-                    {'error': 'Bet is not active'}, 
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            
-            # Get round
-            round_obj = bet.round
-            
-            # Check round status
-            if round_obj.status != 'RUNNING':
-                return Response(
-                    {'error': 'Round is not running'}, 
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            
-            # Check if round has crashed
-            if round_obj.crash_point and multiplier > round_obj.crash_point:
-                return Response(
-                    {'error': 'Too late to cash out - round has crashed'}, 
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            
-            # Calculate payout
-            payout = (bet.bet_amount * multiplier).quantize(Decimal('0.01'))
-            
-            # Check maximum win
-            risk = RiskSettings.get()
-            max_win = getattr(risk, 'max_win_per_bet', Decimal('50000'))
-            if payout > max_win:
-                payout = max_win
-            
-            # Get wallet
-            wallet = Wallet.objects.select_for_update().get(user=user)
-            
-            # Credit winnings to main balance
-            wallet.spot_balance += payout
-            wallet.save(update_fields=['balance'])
-            
-            # Update bet
-            bet.cashout_multiplier = multiplier
-            bet.win_amount = payout
-            bet.status = 'CASHED_OUT'
-            bet.cashed_out_at = timezone.now()
-            bet.save()
         
-        # Get updated wallet
-        wallet.refresh_from_db()
+        # The engine crashes at exactly time_to_reach(crash_point) on the same curve
+        multiplier = multiplier_since(round_obj.started_at, now=received_at)
+        if multiplier >= round_obj.crash_point:
+            return Response(
+                {'error': 'Too late to cash out - round has crashed'}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        # Calculate payout
+        payout = (bet.bet_amount * multiplier).quantize(Decimal('0.01'))
+        
+        # Check maximum win
+        risk = RiskSettings.get()
+        if payout > risk.max_win_per_bet:
+            payout = risk.max_win_per_bet
+        
+        # Claims the bet and credits the spot balance without locking either
+        ref = f"CRASHCASHOUT-{bet.id}-{int(received_at)}"
+        if cashout_atomic(bet, multiplier, payout, ref) is None:
+            # An auto cashout or the crash settlement got to the bet first
+            return Response(
+                {'error': 'Bet is not active'}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        wallet = wallet_balances(user.id)
         
         return Response({
             'success': True,
@@ -319,7 +458,7 @@ def cash_out(request):
             'payout': float(payout),
             'balance': float(wallet.balance),
             'spot_balance': float(wallet.spot_balance),
-            'total_balance': float(wallet.balance + wallet.spot_balance),
+            'total_balance': float(wallet.combined_balance),
             'message': 'Successfully cashed out'
         })
         
@@ -401,7 +540,6 @@ def get_stats(request):
                 'id': current_round.id,
                 'status': current_round.status,
                 'created_at': current_round.created_at,
-                'crash_point': float(current_round.crash_point) if current_round.crash_point else None,
             }
         
         # Get wallet info
@@ -512,43 +650,57 @@ def cancel_bet(request):
     bet_id = request.data.get('bet_id')
     
     try:
-        with transaction.atomic():
-            # Get bet with lock
-            bet = CrashBet.objects.select_for_update().select_related(
-                'round'
-            ).get(
-                id=bet_id,
-                user=user
+        bet = CrashBet.objects.select_related('round').get(
+            id=bet_id,
+            user=user
+        )
+        
+        # Check if cancellation is allowed
+        if bet.status != 'ACTIVE':
+            return Response(
+                {'error': 'Bet is not active'}, 
+                status=status.HTTP_400_BAD_REQUEST
             )
-            
-            # Check if cancellation is allowed
-            if bet.status != 'ACTIVE':
+        
+        round_obj = bet.round
+        
+        if round_obj.status != 'PENDING':
+            return Response(
+                {'error': 'Cannot cancel bet - round has started'}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        with transaction.atomic():
+            # Claim the bet with a conditional UPDATE instead of locking it
+            claimed = CrashBet.objects.filter(id=bet.id, status='ACTIVE').update(status='CANCELLED')
+            if not claimed:
                 return Response(
                     {'error': 'Bet is not active'}, 
                     status=status.HTTP_400_BAD_REQUEST
                 )
             
-            round_obj = bet.round
-            
-            if round_obj.status != 'PENDING':
-                return Response(
-                    {'error': 'Cannot cancel bet - round has started'}, 
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            
-            # Get wallet with lock
-            wallet = Wallet.objects.select_for_update().get(user=user)
-            
-            # Refund bet amount to main balance (always refund to main balance)
-            wallet.balance += bet.bet_amount
-            wallet.save(update_fields=['balance'])
+            # Refund the stake to the balances it was taken from
+            sources = crash_stake_sources(round_obj.id, user.id)
+            to_wallet, to_spot = stake_split(sources, user.id, bet.bet_amount)
+            reference = sources[user.id][2] if user.id in sources else f"CRASHBET-{bet.id}"
+            wallet = refund_stake(user.id, to_wallet, to_spot, game="crash", reference=reference)
+            WalletTransaction.objects.create(
+                user=user,
+                amount=bet.bet_amount,
+                tx_type=WalletTransaction.CREDIT,
+                reference=f"{reference}-REFUND",
+                meta={
+                    'reason': 'crash_bet_cancelled',
+                    'bet_id': bet.id,
+                    'refunded_to_wallet': str(to_wallet),
+                    'refunded_to_spot': str(to_spot),
+                },
+            )
             
-            # Update bet status
-            bet.status = 'CANCELLED'
-            bet.save()
-        
-        # Get updated wallet
-        wallet.refresh_from_db()
+            # Free the stake in the round ledger once the refund is committed
+            transaction.on_commit(
+                lambda: RoundLedger(round_obj.id).release(user.id, bet.bet_amount)
+            )
         
         return Response({
             'success': True,
@@ -556,7 +708,7 @@ def cancel_bet(request):
             'refunded_amount': float(bet.bet_amount),
             'balance': float(wallet.balance),
             'spot_balance': float(wallet.spot_balance),
-            'total_balance': float(wallet.balance + wallet.spot_balance)
+            'total_balance': float(wallet.combined_balance)
         })
         
     except CrashBet.DoesNotExist:
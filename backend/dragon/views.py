@@ -6,7 +6,7 @@ from rest_framework.response import Response
 from django.db import transaction
 from django.db.models import Sum, Count, Q
 from .models import DragonBattle, DragonStats
-from accounts.models import User
+from wallets.services import InsufficientFunds, debit_stake
 
 DRAGONS = {
     'earth': {'name': 'Earth Dragon', 'image': '🐉', 'base_multiplier': 2.0, 'weakness': 'air'},
@@ -32,54 +32,50 @@ def start_battle(request):
     if user_element not in ELEMENTS:
         return Response({'error': 'Invalid element'}, status=status.HTTP_400_BAD_REQUEST)
     
+    # Determine opponent dragon (5% chance for legendary)
+    is_legendary = random.random() < 0.05
+    if is_legendary:
+        opponent_dragon = DRAGONS['legendary']
+    else:
+        opponent_element = random.choice([e for e in ELEMENTS if e != user_element])
+        opponent_dragon = DRAGONS[opponent_element]
+    
+    # Calculate battle outcome
+    user_power = random.uniform(0.7, 1.3)
+    opponent_power = random.uniform(0.7, 1.3)
+    
+    # Element advantage
+    has_element_advantage = opponent_dragon['weakness'] == user_element
+    if has_element_advantage:
+        user_power *= 1.5
+    
+    # Determine winner
+    if user_power > opponent_power:
+        outcome = 'victory'
+        base_multiplier = opponent_dragon['base_multiplier']
+        
+        # Critical hit chance
+        is_critical = random.random() < 0.1  # 10% critical
+        if is_critical:
+            base_multiplier *= 2
+            
+        win_amount = bet_amount * Decimal(str(base_multiplier))
+    else:
+        outcome = 'defeat'
+        win_amount = Decimal('0')
+        is_critical = False
+    
+    user = request.user
+
     try:
         with transaction.atomic():
-            user = User.objects.select_for_update().get(id=request.user.id)
-            
-            if user.balance < bet_amount:
+            # Deduct bet amount and add winnings if victorious
+            try:
+                wallet = debit_stake(user.id, bet_amount, payout=win_amount, game="dragon")
+            except InsufficientFunds:
                 return Response({'error': 'Insufficient balance'}, status=status.HTTP_400_BAD_REQUEST)
-            
-            # Deduct bet amount
-            user.balance -= bet_amount
-            user.save()
-            
-            # Determine opponent dragon (5% chance for legendary)
-            is_legendary = random.random() < 0.05
-            if is_legendary:
-                opponent_dragon = DRAGONS['legendary']
-            else:
-                opponent_element = random.choice([e for e in ELEMENTS if e != user_element])
-                opponent_dragon = DRAGONS[opponent_element]
-            
-            # Calculate battle outcome
-            user_power = random.uniform(0.7, 1.3)
-            opponent_power = random.uniform(0.7, 1.3)
-            
-            # Element advantage
-            has_element_advantage = opponent_dragon['weakness'] == user_element
-            if has_element_advantage:
-                user_power *= 1.5
-            
-            # Determine winner
-            if user_power > opponent_power:
-                outcome = 'victory'
-                base_multiplier = opponent_dragon['base_multiplier']
-                
-                # Critical hit chance
-                is_critical = random.random() < 0.1  # 10% critical
-                if is_critical:
-                    base_multiplier *= 2
-                    
-                win_amount = bet_amount * Decimal(str(base_multiplier))
-            else:
-                outcome = 'defeat'
-                win_amount = Decimal('0')
-                is_critical = False
-            
-            # Add winnings if victorious
-            if outcome == 'victory':
-                user.balance += win_amount
-                user.save()
+            except ValueError as e:
+                return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
             
             # Create battle record
             battle = DragonBattle.objects.create(
@@ -135,7 +131,7 @@ def start_battle(request):
                 'opponent_dragon': opponent_dragon,
                 'battle_details': battle.battle_result,
                 'win_amount': float(win_amount),
-                'new_balance': float(user.balance),
+                'new_balance': float(wallet.combined_balance),
                 'battle_id': battle.id
             })
             
@@ -6,7 +6,7 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from django.db import transaction
-from wallets.models import Wallet
+from wallets.services import InsufficientFunds, debit_stake
 from .models import FishingSession, FishingStats
 from accounts.models import User
 
@@ -251,67 +251,47 @@ def cast_line(request):
     if bet_amount <= 0:
         return Response({"error": "Invalid bet"}, status=400)
 
-    with transaction.atomic():
-        wallet = Wallet.objects.select_for_update().get(user=request.user)
-
-        # Check combined balance first
-        combined_balance = wallet.balance + wallet.spot_balance
-        
-        if combined_balance < bet_amount:
-            return Response({'error': 'Insufficient balance'}, status=400)
-
-        remaining_cost = bet_amount
-        taken_from_wallet = Decimal('0')
-        taken_from_spot = Decimal('0')
-
-        # Deduct stake from main balance first
-        if wallet.balance > 0:
-            taken_from_wallet = min(wallet.balance, remaining_cost)
-            wallet.balance -= taken_from_wallet
-            remaining_cost -= taken_from_wallet
-
-        # If still remaining, deduct from spot balance
-        if remaining_cost > 0 and wallet.spot_balance > 0:
-            taken_from_spot = min(wallet.spot_balance, remaining_cost)
-            wallet.spot_balance -= taken_from_spot
-            remaining_cost -= taken_from_spot
-
-        # Get the fish catch
-        catch = _choose_fish()
-
-        # Calculate win amount based on catch type
-        if catch["is_trap"]:
-            if catch.get("trap_effect") == "DOUBLE_LOSS":
-                # Double loss: lose bet amount plus extra penalty
-                penalty = bet_amount  # Lose another bet amount as penalty
-                win_amount = Decimal("0.00")
-                # Apply penalty to spot balance
-                wallet.spot_balance -= penalty
-            elif catch.get("trap_effect") == "CURSED":
-                # Cursed trap: lose bet with minor extra effect
-                win_amount = Decimal("0.00")
-                # Could implement cooldown or other effects here
-            elif catch.get("trap_effect") == "PENALTY":
-                # Penalty: lose 50% of bet
-                win_amount = bet_amount * Decimal(str(catch["multiplier"]))
-                win_amount = win_amount.quantize(Decimal("0.01"))
-            elif catch.get("trap_effect") == "COMPLETE_LOSS":
-                # Complete loss: lose entire bet
-                win_amount = Decimal("0.00")
-            else:
-                # Regular trap: just lose the bet
-                win_amount = Decimal("0.00")
-        else:
-            # Apply the multiplier to the bet
+    # Get the fish catch
+    penalty = Decimal("0.00")
+    catch = _choose_fish()
+
+    # Calculate win amount based on catch type
+    if catch["is_trap"]:
+        if catch.get("trap_effect") == "DOUBLE_LOSS":
+            # Double loss: lose bet amount plus extra penalty
+            penalty = bet_amount  # Lose another bet amount as penalty
+            win_amount = Decimal("0.00")
+        elif catch.get("trap_effect") == "CURSED":
+            # Cursed trap: lose bet with minor extra effect
+            win_amount = Decimal("0.00")
+            # Could implement cooldown or other effects here
+        elif catch.get("trap_effect") == "PENALTY":
+            # Penalty: lose 50% of bet
             win_amount = bet_amount * Decimal(str(catch["multiplier"]))
             win_amount = win_amount.quantize(Decimal("0.01"))
-        
-        # Calculate profit/loss
-        profit = win_amount - bet_amount
-        
-        # Add winnings to spot balance
-        wallet.spot_balance += win_amount
-        wallet.save(update_fields=["balance", "spot_balance"])
+        elif catch.get("trap_effect") == "COMPLETE_LOSS":
+            # Complete loss: lose entire bet
+            win_amount = Decimal("0.00")
+        else:
+            # Regular trap: just lose the bet
+            win_amount = Decimal("0.00")
+    else:
+        # Apply the multiplier to the bet
+        win_amount = bet_amount * Decimal(str(catch["multiplier"]))
+        win_amount = win_amount.quantize(Decimal("0.01"))
+    
+    # Calculate profit/loss
+    profit = win_amount - bet_amount
+
+    with transaction.atomic():
+        # Deduct stake (main balance first), add winnings to spot balance and
+        # charge any penalty to spot balance
+        try:
+            wallet = debit_stake(request.user.id, bet_amount, payout=win_amount - penalty, game="fishing")
+        except InsufficientFunds:
+            return Response({"error": "Insufficient balance"}, status=400)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=409)
 
         # Create fishing session record
         FishingSession.objects.create(
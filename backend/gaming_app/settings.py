@@ -42,6 +42,7 @@ INSTALLED_APPS = [
     'wallets',
     'fortune',
     'sa_conf',
+    'leaderboards',
 
 ]
 
@@ -100,6 +101,29 @@ CHANNEL_LAYERS = {
     },
 }
 CRASH_ENGINE_LOCK_TTL = int(os.getenv("CRASH_ENGINE_LOCK_TTL", "15"))  # seconds
+CRASH_SEED_CHAIN_DIR = os.getenv("CRASH_SEED_CHAIN_DIR", str(BASE_DIR / "seedchains"))
+# Per-tick round.multiplier stream for clients that don't interpolate the curve
+CRASH_LEGACY_TICKS = os.getenv("CRASH_LEGACY_TICKS", "true").lower() == "true"
+# Rounds kept in the Redis history buffer served by the lobby endpoint
+CRASH_HISTORY_SIZE = int(os.getenv("CRASH_HISTORY_SIZE", "100"))
+# Most rounds one request to the public bulk verification endpoint may cover
+# (manage.py verify_crash_rounds has no limit)
+CRASH_VERIFY_MAX_ROUNDS = int(os.getenv("CRASH_VERIFY_MAX_ROUNDS", "1000"))
+# Local Prometheus endpoint of run_crash_engine (0 disables it)
+CRASH_METRICS_HOST = os.getenv("CRASH_METRICS_HOST", "127.0.0.1")
+CRASH_METRICS_PORT = int(os.getenv("CRASH_METRICS_PORT", "9108"))
+# "redis": demo rooms keep rounds, bets and balances in Redis only (crash/demo.py);
+# "db": demo rounds are stored and paid like real ones
+CRASH_DEMO_STORE = os.getenv("CRASH_DEMO_STORE", "redis")
+# Starting demo balance of every player, in naira
+CRASH_DEMO_BALANCE = os.getenv("CRASH_DEMO_BALANCE", "100000.00")
+# IP buckets of the websocket rate limiter are this many players wide (0: no IP limit)
+CRASH_RATE_LIMIT_IP_FACTOR = int(os.getenv("CRASH_RATE_LIMIT_IP_FACTOR", "20"))
+# Websocket traffic capture for replay_crash_traffic (crash/capture.py); empty disables it
+CRASH_CAPTURE_DIR = os.getenv("CRASH_CAPTURE_DIR", "")
+CRASH_CAPTURE_TICKS = os.getenv("CRASH_CAPTURE_TICKS", "false").lower() == "true"
+# The database is a throwaway one: load tests may run without --i-know-this-db
+CRASH_LOADTEST_DB = os.getenv("CRASH_LOADTEST_DB", "false").lower() == "true"
 
 DATABASES = {
     'default': {
@@ -129,7 +153,12 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
         #'rest_framework.permissions.AllowAny',
-    ]
+    ],
+    # Per user, or per IP for anonymous requests (ScopedRateThrottle)
+    'DEFAULT_THROTTLE_RATES': {
+        'crash_verify': os.getenv('CRASH_VERIFY_RATE', '30/min'),
+        'crash_verify_bulk': os.getenv('CRASH_VERIFY_BULK_RATE', '6/min'),
+    },
 }
 
 LOGIN_URL = "/admin/admin_login/"
@@ -29,6 +29,7 @@ urlpatterns = [
     path('api/guessing/', include('guessing.urls')),
     path('api/minesweeper/', include('minesweeper.urls')),
     path('api/wallet/', include('wallets.urls')),
+    path('api/leaderboard/', include('leaderboards.urls')),
 
     # ✅ Fortune Games (NEW)
     path('api/fortune/', include('fortune.urls')),
@@ -7,7 +7,7 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from django.db import transaction
 from .models import GuessingGame, GuessingStats
-from wallets.models import Wallet
+from wallets.services import InsufficientFunds, credit_winnings, debit_stake, wallet_balances
 
 MIN_BET = Decimal("100.00")
 
@@ -75,31 +75,12 @@ def start_guessing(request):
         return Response({'error': 'Max attempts must be between 3 and 20'}, status=400)
 
     with transaction.atomic():
-        wallet = Wallet.objects.select_for_update().get(user=request.user)
-
-        # Check combined balance
-        combined_balance = wallet.balance + wallet.spot_balance
-        
-        if combined_balance < bet_amount:
+        try:
+            wallet = debit_stake(request.user.id, bet_amount, game="guessing")
+        except InsufficientFunds:
             return Response({'error': 'Insufficient balance (wallet + spot)'}, status=400)
-
-        remaining_cost = bet_amount
-        taken_from_wallet = Decimal('0')
-        taken_from_spot = Decimal('0')
-
-        # Deduct from wallet balance first
-        if wallet.balance > 0:
-            taken_from_wallet = min(wallet.balance, remaining_cost)
-            wallet.balance -= taken_from_wallet
-            remaining_cost -= taken_from_wallet
-
-        # If still remaining, deduct from spot balance
-        if remaining_cost > 0 and wallet.spot_balance > 0:
-            taken_from_spot = min(wallet.spot_balance, remaining_cost)
-            wallet.spot_balance -= taken_from_spot
-            remaining_cost -= taken_from_spot
-
-        wallet.save(update_fields=["balance", "spot_balance"])
+        except ValueError as e:
+            return Response({'error': str(e)}, status=409)
 
         # Generate target number
         target_number = random.randint(1, max_number)
@@ -136,7 +117,6 @@ def make_guess(request):
         return Response({'error': 'Invalid parameters'}, status=400)
 
     with transaction.atomic():
-        wallet = Wallet.objects.select_for_update().get(user=request.user)
         game = GuessingGame.objects.select_for_update().get(
             id=game_id, user=request.user, status="playing"
         )
@@ -186,8 +166,7 @@ def make_guess(request):
                     win_tier = "mega_jackpot"
 
             # Credit winnings to spot_balance
-            wallet.spot_balance += win_amount
-            wallet.save(update_fields=["spot_balance"])
+            wallet = credit_winnings(request.user.id, win_amount, game="guessing")
 
             game.win_amount = win_amount
             game.win_ratio = win_ratio
@@ -228,6 +207,7 @@ def make_guess(request):
             stats.total_games += 1
             stats.save()
 
+            wallet = wallet_balances(request.user.id)
             return Response({
                 "status": "lost",
                 "correct": False,
@@ -256,6 +236,7 @@ def make_guess(request):
         else:
             proximity_hint = "❄️ Cold"
 
+        wallet = wallet_balances(request.user.id)
         return Response({
             "status": "playing",
             "correct": False,
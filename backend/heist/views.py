@@ -8,8 +8,7 @@ from rest_framework.response import Response
 from rest_framework import status
 
 from .models import CyberHeist, HeistStats
-from wallets.models import Wallet
-from accounts.models import User
+from wallets.services import InsufficientFunds, debit_stake
 
 MIN_STAKE = Decimal("100")
 
@@ -160,99 +159,84 @@ def start_heist(request):
     if not target:
         return Response({"error": "Invalid target"}, status=400)
 
-    with transaction.atomic():
-        user = User.objects.select_for_update().get(id=request.user.id)
-        wallet = Wallet.objects.select_for_update().get(user=user)
-
-        # Check combined balance (wallet + spot_balance)
-        combined_balance = wallet.balance + wallet.spot_balance
-        if combined_balance < bet_amount:
-            return Response({"error": "Insufficient balance (wallet + spot)"}, status=400)
-
-        # =====================
-        # DEDUCT STAKE (wallet → spot)
-        # =====================
-        remaining_cost = bet_amount
-
-        if wallet.balance >= remaining_cost:
-            wallet.balance -= remaining_cost
-            remaining_cost = Decimal("0.00")
-        else:
-            remaining_cost -= wallet.balance
-            wallet.balance = Decimal("0.00")
-            wallet.spot_balance -= remaining_cost
+    user = request.user
 
-        # ================= HEIST LOGIC =================
-        # First determine win type
-        roll = random.random()
+    # ================= HEIST LOGIC =================
+    # First determine win type
+    roll = random.random()
+    
+    if roll < ABOVE_1_5X_CHANCE:  # 45% chance: win above 1.5x
+        win_type = 'above_1_5x'
+        is_loss = False
+    elif roll < ABOVE_1_5X_CHANCE + BELOW_1_5X_CHANCE:  # 10% chance: win below 1.5x
+        win_type = 'below_1_5x'
+        is_loss = False
+    else:  # 45% chance: lose
+        win_type = None
+        is_loss = True
+
+    # Select hacks
+    hacks_used, is_failed_scenario = select_hacks()
+    
+    if is_loss:
+        # Immediate loss
+        win_multiplier = Decimal("0.00")
+        win_amount = Decimal("0.00")
+        successful_hacks = []
+        failed_hacks = []
+        hack_multiplier = Decimal("0.00")
+        base_multiplier = Decimal("0.00")
+        heist_tier = "failed"
+    else:
+        # Calculate hack success and effects
+        successful_hacks, failed_hacks, hack_multiplier = calculate_hack_success(
+            hacks_used, target['security'], target['difficulty']
+        )
+        
+        # Get base multiplier based on win type
+        base_multiplier = Decimal(str(get_heist_multiplier(win_type)))
+        
+        # For above 1.5x wins, ensure multiplier stays above 1.5x
+        if win_type == 'above_1_5x':
+            base_multiplier = max(Decimal("0.25"), base_multiplier)
         
-        if roll < ABOVE_1_5X_CHANCE:  # 45% chance: win above 1.5x
-            win_type = 'above_1_5x'
-            is_loss = False
-        elif roll < ABOVE_1_5X_CHANCE + BELOW_1_5X_CHANCE:  # 10% chance: win below 1.5x
-            win_type = 'below_1_5x'
-            is_loss = False
-        else:  # 45% chance: lose
-            win_type = None
-            is_loss = True
-
-        # Select hacks
-        hacks_used, is_failed_scenario = select_hacks()
+        # Calculate final multiplier (blend: 70% base, 30% hacks)
+        blended_multiplier = (base_multiplier * Decimal("0.7")) + (hack_multiplier * Decimal("0.3"))
         
-        if is_loss:
-            # Immediate loss
+        # Apply bank multiplier
+        final_multiplier = blended_multiplier * Decimal(str(target['base_multiplier']))
+        
+        # Cap multipliers based on win type
+        if win_type == 'above_1_5x':
+            final_multiplier = max(Decimal("0.25"), min(Decimal("5.0"), final_multiplier))
+        else:  # below_1_5x
+            final_multiplier = min(Decimal("1.49"), final_multiplier)
+        
+        # Check escape success (based on hack performance)
+        escape_success_rate = len(successful_hacks) / len(hacks_used) if hacks_used else 0
+        escape_success = random.random() < (0.4 + escape_success_rate * 0.6)  # 40-100% chance
+        
+        if not escape_success:
+            # Escape failed - heist compromised
             win_multiplier = Decimal("0.00")
             win_amount = Decimal("0.00")
-            successful_hacks = []
-            failed_hacks = []
-            hack_multiplier = Decimal("0.00")
-            base_multiplier = Decimal("0.00")
             heist_tier = "failed"
         else:
-            # Calculate hack success and effects
-            successful_hacks, failed_hacks, hack_multiplier = calculate_hack_success(
-                hacks_used, target['security'], target['difficulty']
-            )
-            
-            # Get base multiplier based on win type
-            base_multiplier = Decimal(str(get_heist_multiplier(win_type)))
-            
-            # For above 1.5x wins, ensure multiplier stays above 1.5x
-            if win_type == 'above_1_5x':
-                base_multiplier = max(Decimal("0.25"), base_multiplier)
-            
-            # Calculate final multiplier (blend: 70% base, 30% hacks)
-            blended_multiplier = (base_multiplier * Decimal("0.7")) + (hack_multiplier * Decimal("0.3"))
-            
-            # Apply bank multiplier
-            final_multiplier = blended_multiplier * Decimal(str(target['base_multiplier']))
-            
-            # Cap multipliers based on win type
-            if win_type == 'above_1_5x':
-                final_multiplier = max(Decimal("0.25"), min(Decimal("5.0"), final_multiplier))
-            else:  # below_1_5x
-                final_multiplier = min(Decimal("1.49"), final_multiplier)
-            
-            # Check escape success (based on hack performance)
-            escape_success_rate = len(successful_hacks) / len(hacks_used) if hacks_used else 0
-            escape_success = random.random() < (0.4 + escape_success_rate * 0.6)  # 40-100% chance
-            
-            if not escape_success:
-                # Escape failed - heist compromised
-                win_multiplier = Decimal("0.00")
-                win_amount = Decimal("0.00")
-                heist_tier = "failed"
-            else:
-                # Successful heist
-                win_multiplier = final_multiplier
-                win_amount = (bet_amount * final_multiplier).quantize(Decimal("0.01"))
-                heist_tier = get_heist_tier(float(final_multiplier))
+            # Successful heist
+            win_multiplier = final_multiplier
+            win_amount = (bet_amount * final_multiplier).quantize(Decimal("0.01"))
+            heist_tier = get_heist_tier(float(final_multiplier))
 
+    with transaction.atomic():
         # =====================
-        # CREDIT WIN → SPOT BALANCE
+        # DEDUCT STAKE, CREDIT WIN → SPOT BALANCE
         # =====================
-        wallet.spot_balance += win_amount
-        wallet.save(update_fields=["balance", "spot_balance"])
+        try:
+            wallet = debit_stake(request.user.id, bet_amount, payout=win_amount, game="heist")
+        except InsufficientFunds:
+            return Response({"error": "Insufficient balance (wallet + spot)"}, status=400)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=409)
 
         # Prepare hack results
         hack_results = {
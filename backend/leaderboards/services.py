@@ -0,0 +1,147 @@
+"""
+Biggest-win leaderboards, kept in Redis sorted sets.
+
+Every settled win is recorded with record_win(): the instant games through
+the post_save hooks of signals.py, crash from wallets.services. A board
+keeps each player's biggest single win of its window as their score, so
+recording the same win twice changes nothing and a player's rank is one
+ZREVRANK. Reads never touch the database.
+
+Keys:
+    lb:<window>:<period>:<game>        sorted set: user id -> biggest win (kobo)
+    lb:<window>:<period>:<game>:wins   hash: user id -> JSON of that win
+
+window is day (period YYYYMMDD), week (YYYY-Www) or all (period "all");
+game is a game name, or "all" for the board across every game. Day and
+week boards expire a while after their period ends.
+"""
+import json
+import logging
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.utils import timezone
+from redis import RedisError
+
+from crash.ledger import to_kobo
+from crash.redis_lock import shared_redis
+
+logger = logging.getLogger(__name__)
+
+WINDOWS = ("day", "week", "all")
+ALL_GAMES = "all"
+WINDOW_TTL = {"day": 8 * 24 * 3600, "week": 5 * 7 * 24 * 3600, "all": None}  # seconds
+MAX_TOP = 100
+TOP_CACHE_SECONDS = 10
+
+# KEYS: (sorted set, wins hash) per board. ARGV: user id, score, win JSON,
+# then the TTL of each board (0: none). Only a bigger win replaces a player's.
+RECORD_LUA = """
+for i = 1, #KEYS, 2 do
+    local current = redis.call('ZSCORE', KEYS[i], ARGV[1])
+    if not current or tonumber(ARGV[2]) > tonumber(current) then
+        redis.call('ZADD', KEYS[i], ARGV[2], ARGV[1])
+        redis.call('HSET', KEYS[i + 1], ARGV[1], ARGV[3])
+    end
+    local ttl = tonumber(ARGV[3 + (i + 1) / 2])
+    if ttl > 0 then
+        redis.call('EXPIRE', KEYS[i], ttl)
+        redis.call('EXPIRE', KEYS[i + 1], ttl)
+    end
+end
+return 1
+"""
+
+
+def period(window: str, when=None) -> str:
+    when = timezone.localtime(when or timezone.now())
+    if window == "day":
+        return when.strftime("%Y%m%d")
+    if window == "week":
+        year, week, _ = when.isocalendar()
+        return f"{year}-W{week:02d}"
+    return "all"
+
+
+def board_key(window: str, game: str = ALL_GAMES, when=None) -> str:
+    return f"lb:{window}:{period(window, when)}:{game}"
+
+
+def _record_args(game, user_id, username, amount, multiplier, at):
+    """RECORD_LUA keys and arguments of one win"""
+    amount = Decimal(amount)
+    at = at or timezone.now()
+    win = json.dumps({
+        "username": username,
+        "game": game,
+        "amount": str(amount),
+        "multiplier": str(multiplier) if multiplier is not None else None,
+        "at": int(at.timestamp() * 1000),
+    })
+
+    keys, ttls = [], []
+    for window in WINDOWS:
+        for board in (game, ALL_GAMES):
+            key = board_key(window, board, at)
+            keys.extend([key, f"{key}:wins"])
+            ttls.append(WINDOW_TTL[window] or 0)
+    return len(keys), *keys, user_id, to_kobo(amount), win, *ttls
+
+
+def record_win(game: str, user_id, username: str, amount, multiplier=None, at=None, client=None):
+    """
+    Put one settled win on the day, week and all-time boards of its game
+    and of all games. Leaderboards are best effort: a Redis failure is
+    logged, never raised into the game that paid the win.
+    """
+    if Decimal(amount) <= 0:
+        return
+    try:
+        (client or shared_redis()).eval(RECORD_LUA, *_record_args(game, user_id, username, amount, multiplier, at))
+    except RedisError as e:
+        logger.warning(f"[LEADERBOARD] Could not record {game} win of user {user_id}: {e}")
+
+
+def record_wins(game: str, wins, client=None):
+    """record_win() for a batch of (user_id, username, amount, multiplier, at), in one round trip"""
+    pipe = (client or shared_redis()).pipeline(transaction=False)
+    for user_id, username, amount, multiplier, at in wins:
+        if Decimal(amount) > 0:
+            pipe.eval(RECORD_LUA, *_record_args(game, user_id, username, amount, multiplier, at))
+    try:
+        pipe.execute()
+    except RedisError as e:
+        logger.warning(f"[LEADERBOARD] Could not record {len(wins)} {game} win(s): {e}")
+
+
+def _read_top(key: str, limit: int):
+    r = shared_redis()
+    entries = r.zrevrange(key, 0, limit - 1, withscores=True)
+    if not entries:
+        return []
+    wins = r.hmget(f"{key}:wins", [user_id for user_id, _ in entries])
+    top = []
+    for rank, ((user_id, _), raw) in enumerate(zip(entries, wins), start=1):
+        win = json.loads(raw) if raw else {}
+        top.append({"rank": rank, "user_id": int(user_id), **win})
+    return top
+
+
+def top(window: str, game: str = ALL_GAMES, limit: int = 20):
+    """Best players of a board, cached for TOP_CACHE_SECONDS"""
+    key = board_key(window, game)
+    return cache.get_or_set(
+        f"{key}:top:{limit}", lambda: _read_top(key, limit), TOP_CACHE_SECONDS
+    )
+
+
+def rank(window: str, game: str, user_id):
+    """A player's rank and biggest win on a board, or None if they have no win there"""
+    key = board_key(window, game)
+    pipe = shared_redis().pipeline()
+    pipe.zrevrank(key, user_id)
+    pipe.hget(f"{key}:wins", user_id)
+    position, raw = pipe.execute()
+    if position is None:
+        return None
+    return {"rank": position + 1, "user_id": int(user_id), **(json.loads(raw) if raw else {})}
@@ -0,0 +1,58 @@
+# leaderboards/signals.py
+from django.apps import apps
+from django.db import transaction
+from django.db.models.signals import post_save
+
+from .services import record_win
+
+# Game result models: (model, game name, multiplier field, statuses of a game still in play).
+# A row counts as a win once it is saved with win_amount > 0 outside those statuses.
+# Crash bets are recorded by wallets.services, which settles them with bulk updates.
+GAME_RESULTS = [
+    ("slots.SlotGame", "slots", "multiplier", ()),
+    ("fishing.FishingSession", "fishing", None, ()),
+    ("treasure.TreasureHunt", "treasure", "total_multiplier", ()),
+    ("dragon.DragonBattle", "dragon", None, ()),
+    ("potion.PotionBrew", "potion", None, ()),
+    ("pyramid.PyramidExploration", "pyramid", None, ()),
+    ("heist.CyberHeist", "heist", None, ()),
+    ("wheel.WheelGame", "wheel", "multiplier", ()),
+    ("tower.TowerGame", "tower", "multiplier", ("building",)),
+    ("cards.CardGame", "cards", "multiplier", ("playing",)),
+    ("colorswitch.ColorSwitchGame", "colorswitch", "multiplier", ("showing", "playing")),
+    ("guessing.GuessingGame", "guessing", "multiplier", ("playing",)),
+    ("minesweeper.MinesweeperGame", "minesweeper", "multiplier", ("playing",)),
+]
+
+GAMES = ["crash", "fortune"] + [game for _, game, _, _ in GAME_RESULTS]
+
+
+def _connect(label, game, multiplier_field, open_statuses):
+    def on_save(sender, instance, **kwargs):
+        if instance.win_amount <= 0 or getattr(instance, "status", None) in open_statuses:
+            return
+        win = (
+            game,
+            instance.user_id,
+            instance.user.username,
+            instance.win_amount,
+            getattr(instance, multiplier_field) if multiplier_field else None,
+        )
+        # Only wins that were actually paid: the view's transaction may still roll back
+        transaction.on_commit(lambda: record_win(*win))
+
+    post_save.connect(on_save, sender=apps.get_model(label), weak=False, dispatch_uid=f"leaderboard_{game}")
+
+
+for label, game, multiplier_field, open_statuses in GAME_RESULTS:
+    _connect(label, game, multiplier_field, open_statuses)
+
+
+def on_fortune_save(sender, instance, **kwargs):
+    if instance.status != instance.STATUS_CASHED or instance.payout_amount <= 0:
+        return
+    win = ("fortune", instance.user_id, instance.user.username, instance.payout_amount, instance.current_multiplier)
+    transaction.on_commit(lambda: record_win(*win))
+
+
+post_save.connect(on_fortune_save, sender=apps.get_model("fortune.GameSession"), dispatch_uid="leaderboard_fortune")
@@ -0,0 +1,51 @@
+from decimal import Decimal
+
+from django.test import SimpleTestCase
+
+from crash.redis_lock import shared_redis
+
+from . import services
+
+# Far above any real user id, so the test's entries are its own
+USER_IDS = (900_000_001, 900_000_002)
+GAME = "tests"
+
+
+class LeaderboardTests(SimpleTestCase):
+    def setUp(self):
+        self.r = shared_redis()
+        self.clear()
+        self.addCleanup(self.clear)
+
+    def clear(self):
+        for window in services.WINDOWS:
+            key = services.board_key(window, GAME)
+            self.r.delete(key, f"{key}:wins")
+            # The all-games boards are shared: only take the test's players off them
+            key = services.board_key(window, services.ALL_GAMES)
+            self.r.zrem(key, *USER_IDS)
+            self.r.hdel(f"{key}:wins", *USER_IDS)
+
+    def test_a_board_keeps_each_players_biggest_win(self):
+        first, second = USER_IDS
+        services.record_win(GAME, first, "first", Decimal("500.00"), Decimal("5.00"))
+        services.record_win(GAME, second, "second", Decimal("800.00"))
+        services.record_win(GAME, first, "first", Decimal("100.00"))
+
+        self.assertEqual(services.rank("day", GAME, second)["rank"], 1)
+        mine = services.rank("week", GAME, first)
+        self.assertEqual((mine["rank"], mine["amount"], mine["multiplier"]), (2, "500.00", "5.00"))
+
+        services.record_win(GAME, first, "first", Decimal("900.00"))
+        self.assertEqual(services.rank("all", GAME, first)["rank"], 1)
+        self.assertEqual(services.rank("day", services.ALL_GAMES, first)["amount"], "900.00")
+
+    def test_batch_records_like_single_wins_and_skips_nothing_won(self):
+        first, second = USER_IDS
+        services.record_wins(GAME, [
+            (first, "first", Decimal("250.00"), Decimal("2.50"), None),
+            (second, "second", Decimal("0.00"), None, None),
+        ])
+
+        self.assertEqual(services.rank("day", GAME, first)["amount"], "250.00")
+        self.assertIsNone(services.rank("day", GAME, second))
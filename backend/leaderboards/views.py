@@ -0,0 +1,36 @@
+from rest_framework import permissions, response, status, views
+
+from .services import ALL_GAMES, MAX_TOP, WINDOWS, period, rank, top
+from .signals import GAMES
+
+
+class LeaderboardView(views.APIView):
+    """
+    Biggest wins of a window, across all games or for one, straight from Redis.
+
+    ?window=day|week|all (default day) &game=<game> (default all) &limit=N (default 20)
+    Signed-in players also get their own rank on the board as "me".
+    """
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request):
+        window = request.GET.get("window", "day")
+        game = request.GET.get("game", ALL_GAMES)
+        try:
+            limit = int(request.GET.get("limit", 20))
+        except ValueError:
+            limit = 0
+        if window not in WINDOWS or (game != ALL_GAMES and game not in GAMES) or not 1 <= limit <= MAX_TOP:
+            return response.Response(
+                {"error": f"window must be one of {', '.join(WINDOWS)}, game one of {', '.join(GAMES)} "
+                          f"or {ALL_GAMES}, and limit between 1 and {MAX_TOP}"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        return response.Response({
+            "window": window,
+            "period": period(window),
+            "game": game,
+            "top": top(window, game, limit),
+            "me": rank(window, game, request.user.id) if request.user.is_authenticated else None,
+        })
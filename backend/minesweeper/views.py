@@ -8,7 +8,7 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 
 from .models import MinesweeperGame, MinesweeperStats
-from wallets.models import Wallet
+from wallets.services import InsufficientFunds, credit_winnings, debit_stake, wallet_balances
 import logging
 
 logger = logging.getLogger(__name__)
@@ -153,26 +153,12 @@ def start_minesweeper(request):
         return Response({"error": "At least 1 mine required"}, status=400)
 
     with transaction.atomic():
-        wallet = Wallet.objects.select_for_update().get(user=request.user)
-
-        # Check combined balance (wallet + spot)
-        combined_balance = wallet.balance + wallet.spot_balance
-        
-        if combined_balance < bet_amount:
+        try:
+            wallet = debit_stake(request.user.id, bet_amount, game="minesweeper")
+        except InsufficientFunds:
             return Response({"error": "Insufficient balance (wallet + spot)"}, status=400)
-
-        # Deduct from spot_balance first, then main balance
-        remaining_cost = bet_amount
-        
-        if wallet.balance >= remaining_cost:
-            wallet.balance -= remaining_cost
-            remaining_cost = Decimal("0.00")
-        else:
-            remaining_cost -= wallet.balance
-            wallet.balance = Decimal("0.00")
-            wallet.spot_balance -= remaining_cost
-            
-        wallet.save(update_fields=["balance", "spot_balance"])
+        except ValueError as e:
+            return Response({"error": str(e)}, status=409)
 
         # Create game without mines (will generate on first click)
         game = MinesweeperGame.objects.create(
@@ -207,10 +193,10 @@ def reveal_cell(request):
         return Response({"error": "Invalid parameters"}, status=400)
 
     with transaction.atomic():
-        wallet = Wallet.objects.select_for_update().get(user=request.user)
         game = MinesweeperGame.objects.select_for_update().get(
             id=game_id, user=request.user, status="playing"
         )
+        wallet = wallet_balances(request.user.id)
 
         # Generate mines on first click if not already generated
         if not game.mines_positions:
@@ -437,7 +423,6 @@ def cash_out(request):
     game_id = request.data.get("game_id")
 
     with transaction.atomic():
-        wallet = Wallet.objects.select_for_update().get(user=request.user)
         game = MinesweeperGame.objects.select_for_update().get(
             id=game_id, user=request.user, status="playing"
         )
@@ -506,8 +491,7 @@ def cash_out(request):
                 win_message = f"PERFECT WIN! {win_multiplier:.2f}x multiplier"
 
         # Credit winnings to spot_balance
-        wallet.spot_balance += win_amount
-        wallet.save(update_fields=["spot_balance"])
+        wallet = credit_winnings(request.user.id, win_amount, game="minesweeper")
 
         game.status = "cashed_out"
         game.win_amount = win_amount
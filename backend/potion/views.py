@@ -8,7 +8,7 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 
-from wallets.models import Wallet
+from wallets.services import InsufficientFunds, debit_stake
 from .models import PotionBrew, PotionStats
 
 # ================= CONSTANTS =================
@@ -175,71 +175,55 @@ def brew_potion(request):
     if bet_amount < MIN_STAKE:
         return Response({"error": "Minimum stake is ₦100"}, status=400)
 
-    with transaction.atomic():
-        wallet = Wallet.objects.select_for_update().get(user=request.user)
-
-        # Check combined balance (wallet + spot_balance)
-        combined_balance = wallet.balance + wallet.spot_balance
-        if combined_balance < bet_amount:
-            return Response({"error": "Insufficient balance (wallet + spot)"}, status=400)
-
-        # =====================
-        # DEDUCT STAKE (spot → wallet)
-        # =====================
-        remaining_cost = bet_amount
-
-        if wallet.balance >= remaining_cost:
-            wallet.balance -= remaining_cost
-            remaining_cost = Decimal("0.00")
-        else:
-            remaining_cost -= wallet.balance
-            wallet.balance = Decimal("0.00")
-            wallet.spot_balance -= remaining_cost
-
-        # ================= GAME LOGIC =================
-        # Select ingredients (70% normal, 30% cursed)
-        ingredients_used, is_cursed = select_ingredients()
+    # ================= GAME LOGIC =================
+    # Select ingredients (70% normal, 30% cursed)
+    ingredients_used, is_cursed = select_ingredients()
+    
+    if is_cursed:
+        # Cursed brew - immediate loss
+        win_multiplier = Decimal("0.00")
+        win_amount = Decimal("0.00")
+        success_level = "cursed"
+        visual_multiplier = Decimal("0.00")
+        ingredient_power = Decimal("0.00")
+        legendary_count = 0
+        preferred_matches = 0
+        cursed_count = 1
+        base_multiplier = Decimal("0.00")
+    else:
+        # Normal brewing process
+        # Get base multiplier
+        base_multiplier = Decimal(str(get_brew_multiplier()))
         
-        if is_cursed:
-            # Cursed brew - immediate loss
-            win_multiplier = Decimal("0.00")
-            win_amount = Decimal("0.00")
-            success_level = "cursed"
-            visual_multiplier = Decimal("0.00")
-            ingredient_power = Decimal("0.00")
-            legendary_count = 0
-            preferred_matches = 0
-            cursed_count = 1
-            base_multiplier = Decimal("0.00")
-        else:
-            # Normal brewing process
-            # Get base multiplier
-            base_multiplier = Decimal(str(get_brew_multiplier()))
-            
-            # Calculate ingredient effects
-            ingredient_power, legendary_count, preferred_matches, cursed_count = calculate_ingredient_effect(
-                ingredients_used, potion_key
-            )
-            
-            # Blend base multiplier with ingredient power (70% base, 30% ingredients)
-            blended_multiplier = (base_multiplier * Decimal("0.7")) + (ingredient_power * Decimal("0.3"))
-            
-            # Ensure multiplier stays within 0.5x-3.5x range
-            final_multiplier = max(Decimal("0.5"), min(Decimal("3.5"), blended_multiplier))
-            
-            # Calculate win amount
-            win_amount = (bet_amount * final_multiplier).quantize(Decimal("0.01"))
-            
-            # Determine success level
-            success_level = get_success_level(float(final_multiplier))
-            
-            visual_multiplier = final_multiplier
+        # Calculate ingredient effects
+        ingredient_power, legendary_count, preferred_matches, cursed_count = calculate_ingredient_effect(
+            ingredients_used, potion_key
+        )
+        
+        # Blend base multiplier with ingredient power (70% base, 30% ingredients)
+        blended_multiplier = (base_multiplier * Decimal("0.7")) + (ingredient_power * Decimal("0.3"))
+        
+        # Ensure multiplier stays within 0.5x-3.5x range
+        final_multiplier = max(Decimal("0.5"), min(Decimal("3.5"), blended_multiplier))
+        
+        # Calculate win amount
+        win_amount = (bet_amount * final_multiplier).quantize(Decimal("0.01"))
+        
+        # Determine success level
+        success_level = get_success_level(float(final_multiplier))
+        
+        visual_multiplier = final_multiplier
 
+    with transaction.atomic():
         # =====================
-        # CREDIT WIN → SPOT BALANCE
+        # DEDUCT STAKE, CREDIT WIN → SPOT BALANCE
         # =====================
-        wallet.spot_balance += win_amount
-        wallet.save(update_fields=["balance", "spot_balance"])
+        try:
+            wallet = debit_stake(request.user.id, bet_amount, payout=win_amount, game="potion")
+        except InsufficientFunds:
+            return Response({"error": "Insufficient balance (wallet + spot)"}, status=400)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=409)
 
         # Prepare potion result data
         potion_result = {
@@ -9,8 +9,7 @@ from rest_framework.response import Response
 from rest_framework import status
 
 from .models import PyramidExploration, PyramidStats
-from wallets.models import Wallet
-from accounts.models import User
+from wallets.services import InsufficientFunds, debit_stake
 
 MIN_STAKE = Decimal("100")
 LOSS_PROBABILITY = 0.50  # 50% chance of complete loss (50% win chance) - Changed from 30%
@@ -191,103 +190,88 @@ def explore_pyramid(request):
     if bet_amount < MIN_STAKE:
         return Response({"error": f"Minimum stake is ₦{MIN_STAKE}"}, status=400)
 
-    with transaction.atomic():
-        user = User.objects.select_for_update().get(id=request.user.id)
-        wallet = Wallet.objects.select_for_update().get(user=user)
-
-        # Check combined balance (wallet + spot_balance)
-        combined_balance = wallet.balance + wallet.spot_balance
-        if combined_balance < bet_amount:
-            return Response({"error": "Insufficient balance (wallet + spot)"}, status=400)
-
-        # =====================
-        # DEDUCT STAKE (spot → wallet)
-        # =====================
-        remaining_cost = bet_amount
-
-        if wallet.balance >= remaining_cost:
-            wallet.balance -= remaining_cost
-            remaining_cost = Decimal("0.00")
-        else:
-            remaining_cost -= wallet.balance
-            wallet.balance = Decimal("0.00")
-            wallet.spot_balance -= remaining_cost
+    user = request.user
 
-        # ================= EXPEDITION LOGIC =================
-        # Select chambers and traps
-        chambers_explored, traps_encountered, cursed_traps, is_cursed = select_chambers_and_traps()
-        
-        artifacts_found = []
+    # ================= EXPEDITION LOGIC =================
+    # Select chambers and traps
+    chambers_explored, traps_encountered, cursed_traps, is_cursed = select_chambers_and_traps()
+    
+    artifacts_found = []
+    legendary_count = 0
+    divine_count = 0
+    
+    # Find artifacts in chambers (only if not cursed)
+    if not is_cursed:
+        for chamber in chambers_explored:
+            if random.random() < chamber["treasure_chance"]:
+                # Weighted selection: higher chance for common artifacts
+                rarity_roll = random.random()
+                if rarity_roll < 0.40:
+                    artifact_pool = [a for a in ALL_ARTIFACTS if a['rarity'] in ['common', 'uncommon']]
+                elif rarity_roll < 0.70:
+                    artifact_pool = [a for a in ALL_ARTIFACTS if a['rarity'] in ['rare', 'epic']]
+                elif rarity_roll < 0.90:
+                    artifact_pool = [a for a in ALL_ARTIFACTS if a['rarity'] in ['legendary', 'mythic']]
+                else:
+                    artifact_pool = [a for a in ALL_ARTIFACTS if a['rarity'] == 'divine']
+                
+                if artifact_pool:
+                    artifact = random.choice(artifact_pool)
+                    artifacts_found.append(artifact)
+
+    if is_cursed:
+        # Cursed expedition - immediate loss
+        win_multiplier = Decimal("0.00")
+        win_amount = Decimal("0.00")
+        survival_rate = Decimal("0.00")
+        artifact_multiplier = Decimal("0.00")
         legendary_count = 0
         divine_count = 0
+        expedition_rank = "cursed"
+    else:
+        # Normal expedition
+        # Get base multiplier
+        base_multiplier = Decimal(str(get_pyramid_multiplier()))
+        
+        # Calculate artifact multipliers
+        artifact_multiplier, legendary_count, divine_count = calculate_artifact_multiplier(artifacts_found)
+        
+        # Calculate trap penalty
+        trap_penalty = calculate_trap_penalty(traps_encountered, len(chambers_explored))
         
-        # Find artifacts in chambers (only if not cursed)
-        if not is_cursed:
-            for chamber in chambers_explored:
-                if random.random() < chamber["treasure_chance"]:
-                    # Weighted selection: higher chance for common artifacts
-                    rarity_roll = random.random()
-                    if rarity_roll < 0.40:
-                        artifact_pool = [a for a in ALL_ARTIFACTS if a['rarity'] in ['common', 'uncommon']]
-                    elif rarity_roll < 0.70:
-                        artifact_pool = [a for a in ALL_ARTIFACTS if a['rarity'] in ['rare', 'epic']]
-                    elif rarity_roll < 0.90:
-                        artifact_pool = [a for a in ALL_ARTIFACTS if a['rarity'] in ['legendary', 'mythic']]
-                    else:
-                        artifact_pool = [a for a in ALL_ARTIFACTS if a['rarity'] == 'divine']
-                    
-                    if artifact_pool:
-                        artifact = random.choice(artifact_pool)
-                        artifacts_found.append(artifact)
-
-        if is_cursed:
-            # Cursed expedition - immediate loss
-            win_multiplier = Decimal("0.00")
-            win_amount = Decimal("0.00")
-            survival_rate = Decimal("0.00")
-            artifact_multiplier = Decimal("0.00")
-            legendary_count = 0
-            divine_count = 0
-            expedition_rank = "cursed"
+        # Calculate survival rate (inverse of trap ratio)
+        if len(chambers_explored) > 0:
+            survival_rate = Decimal("1.0") - (Decimal(str(traps_encountered)) / Decimal(str(len(chambers_explored))))
         else:
-            # Normal expedition
-            # Get base multiplier
-            base_multiplier = Decimal(str(get_pyramid_multiplier()))
-            
-            # Calculate artifact multipliers
-            artifact_multiplier, legendary_count, divine_count = calculate_artifact_multiplier(artifacts_found)
-            
-            # Calculate trap penalty
-            trap_penalty = calculate_trap_penalty(traps_encountered, len(chambers_explored))
-            
-            # Calculate survival rate (inverse of trap ratio)
-            if len(chambers_explored) > 0:
-                survival_rate = Decimal("1.0") - (Decimal(str(traps_encountered)) / Decimal(str(len(chambers_explored))))
-            else:
-                survival_rate = Decimal("1.0")
-            
-            # Calculate final multiplier (blend: 60% base, 40% artifacts)
-            blended_multiplier = (base_multiplier * Decimal("0.6")) + (artifact_multiplier * Decimal("0.4"))
-            
-            # Apply trap penalty
-            final_multiplier = blended_multiplier * trap_penalty
-            
-            # Cap multiplier but allow higher values (0.75x - 6.0x range)
-            final_multiplier = max(Decimal("0.75"), min(Decimal("6.0"), final_multiplier))
-            
-            # Calculate win amount
-            win_amount = (bet_amount * final_multiplier).quantize(Decimal("0.01"))
-            
-            # Determine expedition rank
-            expedition_rank = get_expedition_rank(float(final_multiplier), artifacts_found, traps_encountered)
-            
-            win_multiplier = final_multiplier
+            survival_rate = Decimal("1.0")
+        
+        # Calculate final multiplier (blend: 60% base, 40% artifacts)
+        blended_multiplier = (base_multiplier * Decimal("0.6")) + (artifact_multiplier * Decimal("0.4"))
+        
+        # Apply trap penalty
+        final_multiplier = blended_multiplier * trap_penalty
+        
+        # Cap multiplier but allow higher values (0.75x - 6.0x range)
+        final_multiplier = max(Decimal("0.75"), min(Decimal("6.0"), final_multiplier))
+        
+        # Calculate win amount
+        win_amount = (bet_amount * final_multiplier).quantize(Decimal("0.01"))
+        
+        # Determine expedition rank
+        expedition_rank = get_expedition_rank(float(final_multiplier), artifacts_found, traps_encountered)
+        
+        win_multiplier = final_multiplier
 
+    with transaction.atomic():
         # =====================
-        # CREDIT WIN → SPOT BALANCE
+        # DEDUCT STAKE, CREDIT WIN → SPOT BALANCE
         # =====================
-        wallet.spot_balance += win_amount
-        wallet.save(update_fields=["balance", "spot_balance"])
+        try:
+            wallet = debit_stake(request.user.id, bet_amount, payout=win_amount, game="pyramid")
+        except InsufficientFunds:
+            return Response({"error": "Insufficient balance (wallet + spot)"}, status=400)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=409)
 
         exploration = PyramidExploration.objects.create(
             user=user,
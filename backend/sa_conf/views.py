@@ -17,6 +17,8 @@ from wallets.models import (
     Wallet, WalletTransaction, WithdrawalRequest, 
     AdminBank, DepositRequest, DepositLimit
 )
+from wallets import ledger
+from wallets.models import LedgerEntry
 from wallets.utils.email_service import send_deposit_confirmation_email, send_withdrawal_completion_email
 
 
@@ -316,6 +318,10 @@ def approve_deposit(request, reference):
             wallet.balance += half_amount
             wallet.spot_balance += half_amount
             wallet.save()
+            ledger.post(
+                deposit.user_id, half_amount, half_amount,
+                reason="deposit", reference=wallet_tx.reference, counter=LedgerEntry.EXTERNAL,
+            )
             
             # Update deposit request
             deposit.status = 'completed'
@@ -397,13 +403,16 @@ def decline_deposit(request, reference):
         
         # Update related wallet transaction if exists
         if deposit.transaction_reference:
-            WalletTransaction.objects.filter(
+            wallet_tx = WalletTransaction.objects.filter(
                 reference=deposit.transaction_reference
-            ).update(
-                meta__status='failed',
-                meta__declined_at=str(timezone.now()),
-                meta__decline_reason=admin_notes
-            )
+            ).first()
+            if wallet_tx:
+                wallet_tx.meta.update({
+                    'status': WalletTransaction.FAILED,
+                    'declined_at': str(timezone.now()),
+                    'decline_reason': admin_notes,
+                })
+                wallet_tx.save(update_fields=['meta'])
         
         return JsonResponse({
             'success': True,
@@ -786,6 +795,10 @@ def decline_withdrawal(request, reference):
             wallet = Wallet.objects.select_for_update().get(user=withdrawal.user)
             wallet.spot_balance += withdrawal.amount
             wallet.save()
+            ledger.post(
+                withdrawal.user_id, spot=withdrawal.amount,
+                reason="withdrawal_refund", reference=reference, counter=LedgerEntry.EXTERNAL,
+            )
             
             # Create refund transaction
             WalletTransaction.objects.create(
@@ -1098,7 +1111,7 @@ def referral_detail(request, user_id):
     txs = WalletTransaction.objects.filter(
         user=referred_user,
         tx_type=WalletTransaction.CREDIT,
-        meta__status="completed"
+        status=WalletTransaction.COMPLETED
     )
 
     # Fetch all transactions for the table (with first deposit info)
@@ -1191,13 +1204,19 @@ def update_wallet(request, user_id):
         return redirect("adminpanel:admin_user_detail", user_id=user_id)
 
     user = get_object_or_404(User, id=user_id)
-    wallet = get_object_or_404(Wallet, user=user)
 
     try:
-        wallet.balance = Decimal(request.POST.get("balance", wallet.balance))
-        wallet.spot_balance = Decimal(request.POST.get("spot_balance", wallet.spot_balance))
-        wallet.locked_balance = Decimal(request.POST.get("locked_balance", wallet.locked_balance))
-        wallet.save()
+        with db_transaction.atomic():
+            wallet = get_object_or_404(Wallet.objects.select_for_update(), user=user)
+            old_balance, old_spot = wallet.balance, wallet.spot_balance
+            wallet.balance = Decimal(request.POST.get("balance", wallet.balance))
+            wallet.spot_balance = Decimal(request.POST.get("spot_balance", wallet.spot_balance))
+            wallet.locked_balance = Decimal(request.POST.get("locked_balance", wallet.locked_balance))
+            wallet.save()
+            ledger.post(
+                user.id, wallet.balance - old_balance, wallet.spot_balance - old_spot,
+                reason="admin_update", reference=request.user.username, counter=LedgerEntry.ADJUSTMENT,
+            )
 
         messages.success(request, "Wallet updated successfully.")
     except Exception as e:
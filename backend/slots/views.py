@@ -9,7 +9,7 @@ from rest_framework import status
 from rest_framework.permissions import IsAuthenticated
 
 from .models import SlotGame, SlotStats
-from wallets.models import Wallet
+from wallets.services import InsufficientFunds, debit_stake
 
 SYMBOLS = {
     'classic': ['seven', 'bar', 'bell', 'cherry', 'orange', 'lemon'],
@@ -126,61 +126,43 @@ def spin_slots(request):
     if theme not in SYMBOLS:
         return Response({'error': 'Invalid theme'}, status=400)
 
+    # =====================
+    # SLOT GAME LOGIC - ADJUSTED WIN PROBABILITY
+    # =====================
+    # Generate random symbols for the 3x3 grid (9 positions)
+    reels = [random.choice(SYMBOLS[theme]) for _ in range(9)]
+    
+    # Check for normal wins
+    win_amount, winning_lines, total_multiplier = check_wins(reels, theme, bet_amount)
+    
+    # UPDATED: Increased win chance since wins are smaller
+    # If no normal win, apply 85% chance for bonus win (but always < stake)
+    if win_amount == 0:
+        if random.random() < 0.85:  # 85% chance for bonus win (higher frequency)
+            bonus_multiplier = Decimal(str(get_slot_multiplier()))
+            win_amount = bet_amount * bonus_multiplier
+            total_multiplier = float(bonus_multiplier)
+            winning_lines = [{
+                'line': 'bonus',
+                'symbol': 'bonus',
+                'count': 3,
+                'multiplier': float(bonus_multiplier)
+            }]
+    
+    # UPDATED: Ensure win amount is always less than bet amount
+    win_amount = min(win_amount, bet_amount * Decimal('0.95'))
+    win_amount = win_amount.quantize(Decimal("0.01"))
+    
     with transaction.atomic():
-        wallet = Wallet.objects.select_for_update().get(user=request.user)
-
-        # Check combined balance (wallet + spot_balance)
-        combined_balance = wallet.balance + wallet.spot_balance
-        if combined_balance < bet_amount:
-            return Response({'error': 'Insufficient balance (wallet + spot)'}, status=400)
-
-        # =====================
-        # DEDUCT STAKE
-        # =====================
-        remaining_cost = bet_amount
-
-        if wallet.balance >= remaining_cost:
-            wallet.balance -= remaining_cost
-            remaining_cost = Decimal("0.00")
-        else:
-            remaining_cost -= wallet.balance
-            wallet.balance = Decimal("0.00")
-            wallet.spot_balance -= remaining_cost
-
-        # =====================
-        # SLOT GAME LOGIC - ADJUSTED WIN PROBABILITY
-        # =====================
-        # Generate random symbols for the 3x3 grid (9 positions)
-        reels = [random.choice(SYMBOLS[theme]) for _ in range(9)]
-        
-        # Check for normal wins
-        win_amount, winning_lines, total_multiplier = check_wins(reels, theme, bet_amount)
-        
-        # UPDATED: Increased win chance since wins are smaller
-        # If no normal win, apply 85% chance for bonus win (but always < stake)
-        if win_amount == 0:
-            if random.random() < 0.85:  # 85% chance for bonus win (higher frequency)
-                bonus_multiplier = Decimal(str(get_slot_multiplier()))
-                win_amount = bet_amount * bonus_multiplier
-                total_multiplier = float(bonus_multiplier)
-                winning_lines = [{
-                    'line': 'bonus',
-                    'symbol': 'bonus',
-                    'count': 3,
-                    'multiplier': float(bonus_multiplier)
-                }]
-        
-        # UPDATED: Ensure win amount is always less than bet amount
-        win_amount = min(win_amount, bet_amount * Decimal('0.95'))
-        win_amount = win_amount.quantize(Decimal("0.01"))
-        
         # =====================
-        # CREDIT WIN → SPOT BALANCE
+        # DEDUCT STAKE, CREDIT WIN → SPOT BALANCE
         # =====================
-        if win_amount > 0:
-            wallet.spot_balance += win_amount
-        
-        wallet.save(update_fields=['balance', 'spot_balance'])
+        try:
+            wallet = debit_stake(request.user.id, bet_amount, payout=win_amount, game="slots")
+        except InsufficientFunds:
+            return Response({'error': 'Insufficient balance (wallet + spot)'}, status=400)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=409)
 
         # Create game record
         game = SlotGame.objects.create(
@@ -9,7 +9,7 @@ from django.db import transaction
 import logging
 
 from .models import TowerGame, TowerStats
-from wallets.models import Wallet
+from wallets.services import InsufficientFunds, credit_winnings, debit_stake, wallet_balances
 
 logger = logging.getLogger(__name__)
 
@@ -83,27 +83,13 @@ def start_tower(request):
 
     try:
         with transaction.atomic():
-            wallet = Wallet.objects.select_for_update().get(user=request.user)
-
-            # Check combined balance (wallet + spot)
-            combined_balance = wallet.balance + wallet.spot_balance
-            
-            if combined_balance < bet_amount:
-                logger.warning(f"Insufficient balance: {combined_balance} < {bet_amount}")
+            try:
+                wallet = debit_stake(request.user.id, bet_amount, game="tower")
+            except InsufficientFunds:
                 return Response({'error': 'Insufficient balance (wallet + spot)'}, status=400)
+            except ValueError as e:
+                return Response({'error': str(e)}, status=409)
 
-            # Deduct from spot_balance first, then main balance
-            remaining_cost = bet_amount
-            
-            if wallet.balance >= remaining_cost:
-                wallet.balance -= remaining_cost
-                remaining_cost = Decimal("0.00")
-            else:
-                remaining_cost -= wallet.balance
-                wallet.balance = Decimal("0.00")
-                wallet.spot_balance -= remaining_cost
-                
-            wallet.save(update_fields=["balance", "spot_balance"])
             logger.info(f"Deducted {bet_amount}, New balance: {wallet.balance}, Spot: {wallet.spot_balance}")
 
             game = TowerGame.objects.create(
@@ -140,7 +126,6 @@ def build_level(request):
 
     try:
         with transaction.atomic():
-            wallet = Wallet.objects.select_for_update().get(user=request.user)
             game = TowerGame.objects.select_for_update().get(
                 id=game_id, user=request.user, status="building"
             )
@@ -164,6 +149,7 @@ def build_level(request):
                 stats.total_games += 1
                 stats.save()
 
+                wallet = wallet_balances(request.user.id)
                 return Response({
                     "success": False,
                     "status": "crashed",
@@ -223,8 +209,7 @@ def build_level(request):
                     win_amount = (win_amount * Decimal("1.2")).quantize(Decimal("0.01"))  # 20% bonus
                 
                 # Credit to spot_balance
-                wallet.spot_balance += win_amount
-                wallet.save()
+                wallet = credit_winnings(request.user.id, win_amount, game="tower")
 
                 game.status = "completed"
                 game.win_amount = win_amount
@@ -268,6 +253,7 @@ def build_level(request):
                     "combined_balance": float(wallet.balance + wallet.spot_balance)
                 })
 
+            wallet = wallet_balances(request.user.id)
             return Response({
                 "success": True,
                 "status": "building",
@@ -297,7 +283,6 @@ def cash_out_tower(request):
 
     try:
         with transaction.atomic():
-            wallet = Wallet.objects.select_for_update().get(user=request.user)
             game = TowerGame.objects.select_for_update().get(
                 id=game_id, user=request.user, status="building"
             )
@@ -318,8 +303,7 @@ def cash_out_tower(request):
             win_amount = (win_amount * (Decimal("1.0") - cashout_deduction)).quantize(Decimal("0.01"))
 
             # Credit to spot_balance
-            wallet.spot_balance += win_amount
-            wallet.save()
+            wallet = credit_winnings(request.user.id, win_amount, game="tower")
 
             game.status = "cashed_out"
             game.win_amount = win_amount
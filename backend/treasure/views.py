@@ -9,7 +9,7 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 
 from .models import TreasureHunt, TreasureStats
-from wallets.models import Wallet
+from wallets.services import InsufficientFunds, debit_stake
 from accounts.models import User
 from accounts.serializers import UserSerializer
 
@@ -134,97 +134,77 @@ def start_hunt(request):
     if map_level < 1 or map_level > 5:
         return Response({"error": "Invalid map level"}, status=400)
 
-    with transaction.atomic():
-        wallet = Wallet.objects.select_for_update().get(user=request.user)
-
-        level_multiplier = Decimal(str(map_level * 1.5))
-        total_cost = (bet_amount * level_multiplier).quantize(Decimal("0.01"))
-
-        # ✅ COMBINED BALANCE
-        combined_balance = wallet.balance + wallet.spot_balance
-
-        if combined_balance < total_cost:
-            return Response(
-                {"error": "Insufficient balance (wallet + spot)"},
-                status=400
-            )
-
-        # =====================
-        # DEDUCT STAKE (spot → wallet)
-        # =====================
-        remaining_cost = total_cost
+    level_multiplier = Decimal(str(map_level * 1.5))
+    total_cost = (bet_amount * level_multiplier).quantize(Decimal("0.01"))
 
-        if wallet.balance >= remaining_cost:
-            wallet.balance -= remaining_cost
-            remaining_cost = Decimal("0.00")
+    # =====================
+    # CORE GAME LOGIC - 45% above 1.5x, 10% below 1.5x, 45% lose
+    # =====================
+    roll = random.random()
+    
+    if roll < ABOVE_1_5X_CHANCE:  # 45% chance: win above 1.5x
+        win_type = 'above_1_5x'
+        is_loss = False
+    elif roll < ABOVE_1_5X_CHANCE + BELOW_1_5X_CHANCE:  # 10% chance: win below 1.5x
+        win_type = 'below_1_5x'
+        is_loss = False
+    else:  # 45% chance: lose
+        win_type = None
+        is_loss = True
+
+    if is_loss:
+        win_amount = Decimal("0.00")
+        treasures_found = []
+        total_multiplier = Decimal("0.00")
+        win_multiplier = Decimal("0.00")
+    else:
+        # Find 1-3 treasures (weighted: 60% 1, 30% 2, 10% 3)
+        num_treasures_roll = random.random()
+        if num_treasures_roll < 0.60:
+            num_treasures = 1
+        elif num_treasures_roll < 0.90:
+            num_treasures = 2
         else:
-            remaining_cost -= wallet.balance
-            wallet.balance = Decimal("0.00")
-            wallet.spot_balance -= remaining_cost
-
-        # =====================
-        # CORE GAME LOGIC - 45% above 1.5x, 10% below 1.5x, 45% lose
-        # =====================
-        roll = random.random()
+            num_treasures = 3
         
-        if roll < ABOVE_1_5X_CHANCE:  # 45% chance: win above 1.5x
-            win_type = 'above_1_5x'
-            is_loss = False
-        elif roll < ABOVE_1_5X_CHANCE + BELOW_1_5X_CHANCE:  # 10% chance: win below 1.5x
-            win_type = 'below_1_5x'
-            is_loss = False
-        else:  # 45% chance: lose
-            win_type = None
-            is_loss = True
-
-        if is_loss:
-            win_amount = Decimal("0.00")
-            treasures_found = []
-            total_multiplier = Decimal("0.00")
-            win_multiplier = Decimal("0.00")
-        else:
-            # Find 1-3 treasures (weighted: 60% 1, 30% 2, 10% 3)
-            num_treasures_roll = random.random()
-            if num_treasures_roll < 0.60:
-                num_treasures = 1
-            elif num_treasures_roll < 0.90:
-                num_treasures = 2
-            else:
-                num_treasures = 3
-            
-            # Randomly select treasures from the map level
-            available_treasures = TREASURES[map_level]
-            treasures_found = random.sample(available_treasures, k=min(num_treasures, len(available_treasures)))
-            
-            # Calculate average multiplier from found treasures
-            treasure_multipliers = [t["multiplier"] for t in treasures_found]
-            average_treasure_multiplier = sum(treasure_multipliers) / len(treasure_multipliers)
-            
-            # Get win multiplier based on win type
-            win_multiplier = Decimal(str(get_win_multiplier_with_map_bonus(map_level, win_type)))
-            
-            # For above 1.5x wins, ensure multiplier stays above 1.5x
-            if win_type == 'above_1_5x':
-                win_multiplier = max(Decimal("1.51"), win_multiplier)
-            
-            # Blend treasure multiplier with win multiplier (weighted 70% win_mult, 30% treasure_mult)
-            blended_multiplier = (win_multiplier * Decimal("0.7")) + (Decimal(str(average_treasure_multiplier)) * Decimal("0.3"))
-            
-            # Cap multipliers
-            if win_type == 'above_1_5x':
-                final_multiplier = max(Decimal("1.51"), min(Decimal("9.0"), blended_multiplier))
-            else:  # below_1_5x
-                final_multiplier = min(Decimal("1.49"), blended_multiplier)
-            
-            # Calculate win amount
-            win_amount = (bet_amount * final_multiplier).quantize(Decimal("0.01"))
-            total_multiplier = final_multiplier
+        # Randomly select treasures from the map level
+        available_treasures = TREASURES[map_level]
+        treasures_found = random.sample(available_treasures, k=min(num_treasures, len(available_treasures)))
+        
+        # Calculate average multiplier from found treasures
+        treasure_multipliers = [t["multiplier"] for t in treasures_found]
+        average_treasure_multiplier = sum(treasure_multipliers) / len(treasure_multipliers)
+        
+        # Get win multiplier based on win type
+        win_multiplier = Decimal(str(get_win_multiplier_with_map_bonus(map_level, win_type)))
+        
+        # For above 1.5x wins, ensure multiplier stays above 1.5x
+        if win_type == 'above_1_5x':
+            win_multiplier = max(Decimal("1.51"), win_multiplier)
+        
+        # Blend treasure multiplier with win multiplier (weighted 70% win_mult, 30% treasure_mult)
+        blended_multiplier = (win_multiplier * Decimal("0.7")) + (Decimal(str(average_treasure_multiplier)) * Decimal("0.3"))
+        
+        # Cap multipliers
+        if win_type == 'above_1_5x':
+            final_multiplier = max(Decimal("1.51"), min(Decimal("9.0"), blended_multiplier))
+        else:  # below_1_5x
+            final_multiplier = min(Decimal("1.49"), blended_multiplier)
+        
+        # Calculate win amount
+        win_amount = (bet_amount * final_multiplier).quantize(Decimal("0.01"))
+        total_multiplier = final_multiplier
 
+    with transaction.atomic():
         # =====================
-        # CREDIT WIN → SPOT BALANCE
+        # DEDUCT STAKE, CREDIT WIN → SPOT BALANCE
         # =====================
-        wallet.spot_balance += win_amount
-        wallet.save(update_fields=["balance", "spot_balance"])
+        try:
+            wallet = debit_stake(request.user.id, total_cost, payout=win_amount, game="treasure")
+        except InsufficientFunds:
+            return Response({"error": "Insufficient balance (wallet + spot)"}, status=400)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=409)
 
         hunt = TreasureHunt.objects.create(
             user=request.user,
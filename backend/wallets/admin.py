@@ -4,4 +4,6 @@ from .models import *
 
 admin.site.register(WalletTransaction)
 
-admin.site.register(DepositRequest)
\ No newline at end of file
+admin.site.register(DepositRequest)
+admin.site.register(ReconciliationRun)
+admin.site.register(WalletDrift)
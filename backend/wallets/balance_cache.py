@@ -0,0 +1,208 @@
+"""
+Per-user wallet balances in Redis, written through on every commit.
+
+Every balance mutation posts to the ledger, and ledger.post_many() has the
+users' cached balances refreshed once the transaction commits;
+services._update_wallet() stores the balances its UPDATE returned instead
+of reading them back. Each cached value carries a version: the id of the
+user's newest ledger entry. A user's mutations are serialised by the
+wallet row lock, so versions grow in commit order and STORE_LUA never lets
+an older write replace a newer one, however late it arrives.
+
+get() serves reads from Redis; a miss or a Redis failure falls back to the
+database and fills the cache. Keys expire after CACHE_TTL, which bounds how
+long a write lost to a Redis outage can leave a balance stale
+(manage.py verify_balance_cache finds and repairs those).
+
+Key:
+    wallet:bal:<user_id>   hash: balance, spot_balance, locked_balance, updated_at, version
+"""
+import logging
+from dataclasses import dataclass
+from datetime import datetime
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from redis import RedisError
+
+from crash.redis_lock import shared_redis
+
+from .models import LedgerEntry, Wallet
+
+logger = logging.getLogger(__name__)
+
+CACHE_TTL = 3600  # seconds
+FIELDS = ("balance", "spot_balance", "locked_balance", "updated_at", "version")
+
+# KEYS: balance hash. ARGV: the FIELDS values, then the TTL.
+# Only a version at least as new as the cached one is written.
+STORE_LUA = """
+local current = redis.call('HGET', KEYS[1], 'version')
+if current and tonumber(current) > tonumber(ARGV[5]) then
+    return 0
+end
+redis.call('HSET', KEYS[1], 'balance', ARGV[1], 'spot_balance', ARGV[2], 'locked_balance', ARGV[3],
+    'updated_at', ARGV[4], 'version', ARGV[5])
+redis.call('EXPIRE', KEYS[1], ARGV[6])
+return 1
+"""
+
+
+@dataclass(frozen=True)
+class CachedBalance:
+    user_id: int
+    balance: Decimal
+    spot_balance: Decimal
+    locked_balance: Decimal
+    updated_at: datetime
+    version: int
+
+    @property
+    def combined_balance(self):
+        return self.balance + self.spot_balance
+
+    def as_wallet(self):
+        """Unsaved Wallet carrying these balances, for WalletSerializer"""
+        return Wallet(
+            user_id=self.user_id,
+            balance=self.balance,
+            spot_balance=self.spot_balance,
+            locked_balance=self.locked_balance,
+            updated_at=self.updated_at,
+        )
+
+
+def key(user_id) -> str:
+    return f"wallet:bal:{user_id}"
+
+
+def _decode(user_id, raw) -> CachedBalance:
+    return CachedBalance(
+        user_id=int(user_id),
+        balance=Decimal(raw["balance"]),
+        spot_balance=Decimal(raw["spot_balance"]),
+        locked_balance=Decimal(raw["locked_balance"]),
+        updated_at=datetime.fromisoformat(raw["updated_at"]),
+        version=int(raw["version"]),
+    )
+
+
+def store(balances, client=None):
+    """
+    Write balances to the cache, in one round trip. A failed write drops
+    the keys instead, so nothing older than the database is left behind.
+    """
+    balances = list(balances)
+    if not balances:
+        return
+    r = client or shared_redis()
+    pipe = r.pipeline(transaction=False)
+    for cached in balances:
+        pipe.eval(
+            STORE_LUA,
+            1,
+            key(cached.user_id),
+            str(cached.balance),
+            str(cached.spot_balance),
+            str(cached.locked_balance),
+            cached.updated_at.isoformat(),
+            cached.version,
+            CACHE_TTL,
+        )
+    try:
+        pipe.execute()
+    except RedisError as e:
+        logger.warning(f"[BALANCE CACHE] Could not store {len(balances)} balance(s): {e}")
+        try:
+            r.delete(*[key(cached.user_id) for cached in balances])
+        except RedisError:
+            pass
+
+
+def load(user_ids):
+    """Current balances of these users from the database, with their versions"""
+    newest = LedgerEntry.objects.filter(user_id=OuterRef("user_id")).order_by("-id").values("id")[:1]
+    rows = (
+        Wallet.objects.filter(user_id__in=user_ids)
+        .annotate(version=Coalesce(Subquery(newest), Value(0)))
+        .values_list("user_id", "balance", "spot_balance", "locked_balance", "updated_at", "version")
+    )
+    return [CachedBalance(*row) for row in rows]
+
+
+def refresh(user_ids, client=None):
+    store(load(user_ids), client)
+
+
+def store_on_commit(balances):
+    transaction.on_commit(lambda: store(balances))
+
+
+def refresh_on_commit(user_ids):
+    user_ids = set(user_ids)
+    if user_ids:
+        transaction.on_commit(lambda: refresh(user_ids))
+
+
+def get(user_id):
+    """
+    A user's balances, from Redis unless they are not cached (or Redis is
+    down). None when the user has no wallet.
+    """
+    try:
+        raw = shared_redis().hgetall(key(user_id))
+    except RedisError as e:
+        logger.warning(f"[BALANCE CACHE] Read of user {user_id} failed: {e}")
+        raw = None
+    if raw:
+        return _decode(user_id, raw)
+
+    loaded = load([user_id])
+    store(loaded)
+    return loaded[0] if loaded else None
+
+
+def verify(chunk_size=2000, user_ids=None, client=None):
+    """
+    Yield (user_id, cached, current) for every cached balance that differs
+    from the database; cached is None for wallets that are not cached.
+    Users without a cache entry are only reported when user_ids names them.
+    """
+    r = client or shared_redis()
+    wallets = Wallet.objects.order_by("user_id")
+    if user_ids is not None:
+        wallets = wallets.filter(user_id__in=user_ids)
+    ids = wallets.values_list("user_id", flat=True)
+
+    chunk = []
+    for user_id in ids.iterator(chunk_size=chunk_size):
+        chunk.append(user_id)
+        if len(chunk) >= chunk_size:
+            yield from _verify_chunk(r, chunk, user_ids is not None)
+            chunk = []
+    if chunk:
+        yield from _verify_chunk(r, chunk, user_ids is not None)
+
+
+def _verify_chunk(r, user_ids, report_missing):
+    pipe = r.pipeline(transaction=False)
+    for user_id in user_ids:
+        pipe.hgetall(key(user_id))
+    cached = dict(zip(user_ids, pipe.execute()))
+
+    for current in load(user_ids):
+        raw = cached.get(current.user_id)
+        if not raw:
+            if report_missing:
+                yield current.user_id, None, current
+            continue
+        entry = _decode(current.user_id, raw)
+        if (entry.balance, entry.spot_balance, entry.locked_balance, entry.version) != (
+            current.balance,
+            current.spot_balance,
+            current.locked_balance,
+            current.version,
+        ):
+            yield current.user_id, entry, current
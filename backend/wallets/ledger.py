@@ -0,0 +1,283 @@
+"""
+Double-entry ledger of every wallet balance mutation.
+
+Whatever changes Wallet.balance / spot_balance appends a posting here in
+the same transaction: one LedgerEntry per user account that moved plus a
+counter entry (house, external money or an admin adjustment), summing to
+zero. Entries are never updated or deleted.
+
+take_snapshots() periodically folds each user's new entries into a
+BalanceSnapshot, so a balance at any moment is the latest snapshot before
+it plus the entries after the snapshot (balance_at(), statement()), and
+reconcile() compares wallets against the ledger from their last snapshot
+on instead of replaying the whole history.
+"""
+import uuid
+from dataclasses import dataclass
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import DecimalField, F, Max, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Round
+from django.utils import timezone
+
+from . import balance_cache
+from .models import BalanceSnapshot, LedgerEntry, Wallet
+
+ZERO = Decimal("0.00")
+# Entries younger than this are left out of a snapshot: a transaction that
+# got its entry ids earlier may not have committed yet
+SNAPSHOT_LAG = timedelta(seconds=60)
+SNAPSHOT_BATCH = 5000
+
+
+@dataclass(frozen=True)
+class Posting:
+    """One balance mutation of one user; counter is the account on the other side"""
+
+    user_id: int
+    balance: Decimal = ZERO
+    spot: Decimal = ZERO
+    reason: str = ""
+    game: str = ""
+    reference: str = ""
+    counter: str = LedgerEntry.HOUSE
+
+    def entries(self, now):
+        posting = uuid.uuid4()
+        common = dict(
+            posting=posting,
+            user_id=self.user_id,
+            reason=self.reason,
+            game=self.game,
+            reference=self.reference[:64],
+            created_at=now,
+        )
+        entries = [
+            LedgerEntry(account=account, amount=amount, **common)
+            for account, amount in ((LedgerEntry.BALANCE, self.balance), (LedgerEntry.SPOT, self.spot))
+            if amount
+        ]
+        if entries:
+            entries.append(LedgerEntry(account=self.counter, amount=-(self.balance + self.spot), **common))
+        return entries
+
+
+def post_many(postings, refresh_cache=True):
+    """
+    Append the entries of several postings with one INSERT, and have the
+    users' cached balances refreshed once the transaction commits (callers
+    that already know the new balances store them themselves).
+    """
+    postings = list(postings)
+    now = timezone.now()
+    entries = [entry for posting in postings for entry in posting.entries(now)]
+    LedgerEntry.objects.bulk_create(entries, batch_size=1000)
+    if refresh_cache:
+        balance_cache.refresh_on_commit(posting.user_id for posting in postings)
+    return entries
+
+
+def post(user_id, balance=ZERO, spot=ZERO, reason="", game="", reference="", counter=LedgerEntry.HOUSE):
+    """Record that a user's balance and spot balance moved by these amounts"""
+    return post_many([Posting(user_id, balance, spot, reason, game, reference, counter)])
+
+
+def _sum(account):
+    money = DecimalField(max_digits=18, decimal_places=2)
+    return Coalesce(Sum("amount", filter=Q(account=account)), Value(ZERO), output_field=money)
+
+
+def _latest_snapshot(user_id, at=None):
+    snapshots = BalanceSnapshot.objects.filter(user_id=user_id)
+    if at is not None:
+        snapshots = snapshots.filter(taken_at__lte=at)
+    return snapshots.order_by("-last_entry_id").first()
+
+
+def balance_at(user_id, at=None):
+    """(balance, spot_balance) of a user at a moment (default: now), from the ledger"""
+    snapshot = _latest_snapshot(user_id, at)
+    tail = LedgerEntry.objects.filter(user_id=user_id, id__gt=snapshot.last_entry_id if snapshot else 0)
+    if at is not None:
+        tail = tail.filter(created_at__lte=at)
+    sums = tail.aggregate(balance=_sum(LedgerEntry.BALANCE), spot=_sum(LedgerEntry.SPOT))
+    if snapshot:
+        return snapshot.balance + sums["balance"], snapshot.spot_balance + sums["spot"]
+    return sums["balance"], sums["spot"]
+
+
+def statement(user_id, start, end=None):
+    """
+    Opening balances at start, then every movement of the user's accounts
+    until end with the running balances after it.
+    """
+    balance, spot = balance_at(user_id, start)
+    opening = {"balance": balance, "spot_balance": spot}
+    entries = LedgerEntry.objects.filter(
+        user_id=user_id, account__in=LedgerEntry.USER_ACCOUNTS, created_at__gt=start
+    )
+    if end is not None:
+        entries = entries.filter(created_at__lte=end)
+
+    lines = []
+    for entry in entries.order_by("id").iterator(chunk_size=2000):
+        if entry.account == LedgerEntry.BALANCE:
+            balance += entry.amount
+        else:
+            spot += entry.amount
+        lines.append({
+            "at": entry.created_at,
+            "account": entry.account,
+            "amount": entry.amount,
+            "reason": entry.reason,
+            "game": entry.game,
+            "reference": entry.reference,
+            "balance": balance,
+            "spot_balance": spot,
+        })
+    return {"opening": opening, "lines": lines, "closing": {"balance": balance, "spot_balance": spot}}
+
+
+def _with_snapshot(queryset):
+    """Annotate rows that have a user_id with their user's latest snapshot"""
+    latest = BalanceSnapshot.objects.filter(user_id=OuterRef("user_id")).order_by("-last_entry_id")
+    return queryset.annotate(
+        snap_balance=Coalesce(Subquery(latest.values("balance")[:1]), Value(ZERO)),
+        snap_spot=Coalesce(Subquery(latest.values("spot_balance")[:1]), Value(ZERO)),
+        snap_entry=Coalesce(Subquery(latest.values("last_entry_id")[:1]), Value(0)),
+    )
+
+
+def _tail_sum(account, upto=None):
+    """Subquery: sum of a user's entries on an account after their latest snapshot"""
+    entries = LedgerEntry.objects.filter(
+        user_id=OuterRef("user_id"), id__gt=OuterRef("snap_entry"), account=account
+    )
+    if upto is not None:
+        entries = entries.filter(id__lte=upto)
+    money = DecimalField(max_digits=18, decimal_places=2)
+    total = entries.values("user_id").annotate(total=Sum("amount")).values("total")
+    return Coalesce(Subquery(total, output_field=money), Value(ZERO), output_field=money)
+
+
+def take_snapshots(now=None, batch_size=SNAPSHOT_BATCH):
+    """
+    Snapshot every user with ledger entries since their last snapshot, up to
+    the newest entry older than SNAPSHOT_LAG. Returns the number of
+    snapshots taken.
+    """
+    now = now or timezone.now()
+    watermark = LedgerEntry.objects.filter(created_at__lte=now - SNAPSHOT_LAG).aggregate(last=Max("id"))["last"]
+    if watermark is None:
+        return 0
+    previous = BalanceSnapshot.objects.aggregate(last=Max("last_entry_id"))["last"] or 0
+    if previous >= watermark:
+        return 0
+
+    users = (
+        LedgerEntry.objects.filter(id__gt=previous, id__lte=watermark)
+        .values_list("user_id", flat=True)
+        .distinct()
+        .order_by("user_id")
+    )
+    taken = 0
+    batch = []
+    for user_id in users.iterator(chunk_size=batch_size):
+        batch.append(user_id)
+        if len(batch) >= batch_size:
+            taken += _snapshot_users(batch, watermark, now)
+            batch = []
+    if batch:
+        taken += _snapshot_users(batch, watermark, now)
+    return taken
+
+
+def _snapshot_users(user_ids, watermark, now):
+    rows = (
+        _with_snapshot(Wallet.objects.filter(user_id__in=user_ids))
+        .annotate(
+            tail_balance=_tail_sum(LedgerEntry.BALANCE, watermark),
+            tail_spot=_tail_sum(LedgerEntry.SPOT, watermark),
+        )
+        .values_list("user_id", "snap_balance", "snap_spot", "tail_balance", "tail_spot")
+    )
+    BalanceSnapshot.objects.bulk_create(
+        [
+            BalanceSnapshot(
+                user_id=user_id,
+                balance=snap_balance + tail_balance,
+                spot_balance=snap_spot + tail_spot,
+                last_entry_id=watermark,
+                taken_at=now,
+            )
+            for user_id, snap_balance, snap_spot, tail_balance, tail_spot in rows
+        ],
+        ignore_conflicts=True,
+    )
+    return len(rows)
+
+
+def drifted_wallets(wallets):
+    """
+    Filter a Wallet queryset down to the wallets whose balances differ from
+    their ledger, annotated with ledger_balance / ledger_spot. Each ledger
+    balance is the user's last snapshot plus the entries after it; the sums
+    and the comparison both run in the database, so only drifted rows come
+    back.
+    """
+    money = DecimalField(max_digits=18, decimal_places=2)
+    return (
+        _with_snapshot(wallets)
+        .annotate(
+            ledger_balance=Round(F("snap_balance") + _tail_sum(LedgerEntry.BALANCE), 2, output_field=money),
+            ledger_spot=Round(F("snap_spot") + _tail_sum(LedgerEntry.SPOT), 2, output_field=money),
+        )
+        .exclude(balance=F("ledger_balance"), spot_balance=F("ledger_spot"))
+    )
+
+
+def reconcile(user_ids=None, chunk_size=SNAPSHOT_BATCH):
+    """
+    Yield (user_id, wallet balances, ledger balances) for every wallet whose
+    balances differ from its ledger.
+    """
+    wallets = Wallet.objects.all() if user_ids is None else Wallet.objects.filter(user_id__in=user_ids)
+    rows = (
+        drifted_wallets(wallets)
+        .values_list("user_id", "balance", "spot_balance", "ledger_balance", "ledger_spot")
+        .order_by("user_id")
+    )
+    for user_id, balance, spot, ledger_balance, ledger_spot in rows.iterator(chunk_size=chunk_size):
+        yield user_id, (balance, spot), (ledger_balance, ledger_spot)
+
+
+def open_balances(user_ids=None):
+    """
+    Give wallets that predate the ledger an opening posting for whatever
+    their balances hold beyond it. Each wallet is locked while it is
+    compared, so a concurrent play cannot slip in between. Returns the
+    number of wallets opened.
+    """
+    opened = LedgerEntry.objects.filter(reason="opening").values("user_id")
+    wallets = Wallet.objects.exclude(user_id__in=opened)
+    if user_ids is not None:
+        wallets = wallets.filter(user_id__in=user_ids)
+
+    count = 0
+    for user_id in wallets.values_list("user_id", flat=True).iterator(chunk_size=SNAPSHOT_BATCH):
+        with transaction.atomic():
+            balance, spot = Wallet.objects.select_for_update().values_list(
+                "balance", "spot_balance"
+            ).get(user_id=user_id)
+            ledger_balance, ledger_spot = balance_at(user_id)
+            post(
+                user_id,
+                balance - ledger_balance,
+                spot - ledger_spot,
+                reason="opening",
+                counter=LedgerEntry.EXTERNAL,
+            )
+        count += 1
+    return count
@@ -0,0 +1,83 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max, Value
+from django.db.models.fields.json import KT
+from django.db.models.functions import Coalesce, Left
+from redis import RedisError
+
+from crash.redis_lock import shared_redis
+from wallets.models import WalletTransaction
+
+CURSOR_KEY = "wallets:status_backfill:next_id"
+
+
+class Command(BaseCommand):
+    help = (
+        "Copy meta['status'] of existing wallet transactions into the status column, "
+        "in id-range chunks that each commit on their own. Run it right after migrating; "
+        "it resumes where an interrupted run stopped"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=5000, help="Ids per UPDATE (default: 5000)")
+        parser.add_argument("--start-id", type=int, help="Start from this id instead of the saved position")
+        parser.add_argument("--restart", action="store_true", help="Ignore the saved position and start over")
+        parser.add_argument(
+            "--sleep-ms",
+            type=float,
+            default=0,
+            help="Pause between chunks to spare a busy database (default: 0)",
+        )
+
+    def handle(self, *args, **options):
+        last_id = WalletTransaction.objects.aggregate(last=Max("id"))["last"]
+        if last_id is None:
+            self.stdout.write("No wallet transactions")
+            return
+
+        next_id = options["start_id"]
+        if next_id is None and not options["restart"]:
+            next_id = self._saved_cursor()
+        next_id = next_id or 1
+        if next_id > 1:
+            self.stdout.write(f"Resuming at id {next_id:,}")
+
+        status = Left(Coalesce(KT("meta__status"), Value("")), 20)
+        chunk_size = options["chunk_size"]
+        start = time.perf_counter()
+        updated = 0
+        while next_id <= last_id:
+            end_id = next_id + chunk_size
+            with transaction.atomic():
+                # Rows written since the migration already carry their status
+                updated += WalletTransaction.objects.filter(
+                    id__gte=next_id, id__lt=end_id, status=""
+                ).update(status=status)
+            next_id = end_id
+            self._save_cursor(next_id)
+
+            done = min(next_id - 1, last_id)
+            self.stdout.write(f"  up to id {done:,} of {last_id:,}, {updated:,} row(s) written", ending="\r")
+            if options["sleep_ms"]:
+                time.sleep(options["sleep_ms"] / 1000)
+
+        self.stdout.write("")
+        self.stdout.write(self.style.SUCCESS(
+            f"Backfilled {updated:,} row(s) up to id {last_id:,} in {time.perf_counter() - start:.2f}s"
+        ))
+
+    def _saved_cursor(self):
+        try:
+            value = shared_redis().get(CURSOR_KEY)
+        except RedisError as e:
+            self.stderr.write(f"Could not read the saved position ({e}); starting over")
+            return None
+        return int(value) if value else None
+
+    def _save_cursor(self, next_id):
+        try:
+            shared_redis().set(CURSOR_KEY, next_id)
+        except RedisError as e:
+            self.stderr.write(f"Could not save the position ({e}); resume with --start-id {next_id}")
@@ -0,0 +1,177 @@
+import json
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Max, Min, Sum
+from django.utils import timezone
+
+from crash.benchmarks import bench_users, make_users, percentile
+from wallets.models import WalletTransaction
+
+PREFIX = "statusbench"
+STATUSES = [
+    WalletTransaction.COMPLETED,
+    WalletTransaction.COMPLETED,
+    WalletTransaction.COMPLETED,
+    WalletTransaction.PENDING,
+    WalletTransaction.FAILED,
+    WalletTransaction.EXPIRED,
+    None,  # game transactions carry no status
+]
+
+
+def _queries(user_ids, status_filter):
+    """
+    The deposit / withdrawal / referral lookups, filtering status through
+    status_filter(value): name -> (queryset to EXPLAIN, how the code runs it)
+    """
+    one_user = user_ids[len(user_ids) // 2]
+    referred = user_ids[: max(1, len(user_ids) // 20)]
+    credits = WalletTransaction.objects.filter(tx_type=WalletTransaction.CREDIT)
+    completed = status_filter(WalletTransaction.COMPLETED)
+
+    # expire_pending_transactions / delete_pending_transactions
+    pending = credits.filter(**status_filter(WalletTransaction.PENDING)).values_list("id", flat=True)
+    # otpay_webhook first-deposit check
+    first_deposit = credits.filter(user_id=one_user, **completed)
+    # referral_dashboard totals
+    referral = credits.filter(user_id__in=referred, **completed)
+    # referral_detail: one referred user's recent deposits
+    recent = credits.filter(
+        user_id=one_user, created_at__gte=timezone.now() - timedelta(days=30), **completed
+    ).order_by("-created_at")[:50]
+
+    return {
+        "pending credits": (pending, lambda: list(pending.all())),
+        "first deposit?": (first_deposit[:1], first_deposit.exists),
+        "referral totals": (referral, lambda: referral.aggregate(total=Sum("amount"))),
+        "user deposits": (recent, lambda: list(recent.all())),
+    }
+
+
+# before: meta JSON filter and only the indexes that predate the status column
+# after: the status column and its composite indexes
+PATHS = {
+    "before": lambda status: {"meta__status": status},
+    "after": lambda status: {"status": status},
+}
+STATUS_INDEXES = [index.name for index in WalletTransaction._meta.indexes if "status" in index.fields]
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the wallet transaction status lookups before (meta__status JSON filter, no status "
+        "indexes) and after (indexed status column): query plans and timings"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--transactions",
+            type=int,
+            default=200_000,
+            help="Transactions to seed (default: 200,000)",
+        )
+        parser.add_argument("--users", type=int, default=2_000, help="Users they are spread over (default: 2,000)")
+        parser.add_argument("--repeat", type=int, default=20, help="Runs of each query (default: 20)")
+        parser.add_argument("--json", dest="json_path", help="Write the results to this file")
+
+    def handle(self, *args, **options):
+        self._cleanup()
+        start = time.perf_counter()
+        user_ids = self._seed(options["users"], options["transactions"])
+        self.stdout.write(
+            f"Seeded {options['transactions']:,} transactions over {len(user_ids):,} users "
+            f"in {time.perf_counter() - start:.1f}s ({connection.vendor})"
+        )
+
+        results = []
+        try:
+            for path, status_filter in PATHS.items():
+                with transaction.atomic():
+                    if path == "before":
+                        # Dropped for this measurement only: the transaction is rolled back
+                        with connection.cursor() as cursor:
+                            for index in STATUS_INDEXES:
+                                cursor.execute(f"DROP INDEX {connection.ops.quote_name(index)}")
+                    for name, (queryset, query) in _queries(user_ids, status_filter).items():
+                        results.append(self._measure(name, path, queryset, query, options["repeat"]))
+                    transaction.set_rollback(True)
+        finally:
+            self._cleanup()
+
+        for result in results:
+            self.stdout.write(f"\n[{result['path']}] {result['query']}")
+            for line in result["plan"].splitlines():
+                self.stdout.write(f"    {line}")
+
+        self.stdout.write(f"\n{'query':<16} {'before p50':>11} {'after p50':>10} {'before p99':>11} {'after p99':>10}")
+        by_query = {}
+        for result in results:
+            by_query.setdefault(result["query"], {})[result["path"]] = result
+        for name, paths in by_query.items():
+            before, after = paths["before"], paths["after"]
+            self.stdout.write(
+                f"{name:<16} {before['p50_ms']:>9.2f}ms {after['p50_ms']:>8.2f}ms "
+                f"{before['p99_ms']:>9.2f}ms {after['p99_ms']:>8.2f}ms"
+            )
+
+        if options["json_path"]:
+            with open(options["json_path"], "w") as fh:
+                json.dump(results, fh, indent=2)
+
+    def _measure(self, name, path, queryset, query, repeat):
+        plan = queryset.explain()
+        timings = []
+        for _ in range(repeat):
+            began = time.perf_counter()
+            query()
+            timings.append(time.perf_counter() - began)
+        return {
+            "query": name,
+            "path": path,
+            "p50_ms": percentile(timings, 50) * 1000,
+            "p99_ms": percentile(timings, 99) * 1000,
+            "plan": plan,
+        }
+
+    def _seed(self, users, transactions):
+        user_ids = [user.id for user in make_users(users, prefix=PREFIX)]
+        rng = random.Random(7)
+        now = timezone.now()
+        batch = []
+        for i in range(transactions):
+            status = rng.choice(STATUSES)
+            meta = {"reason": "bench"} if status is None else {"status": status}
+            batch.append(WalletTransaction(
+                user_id=rng.choice(user_ids),
+                amount=Decimal(rng.randrange(100, 100_000)),
+                tx_type=rng.choice([WalletTransaction.CREDIT, WalletTransaction.DEBIT]),
+                reference=f"{PREFIX}-{i}",
+                meta=meta,
+                # bulk_create skips save(), which fills status from meta
+                status=WalletTransaction.status_from_meta(meta),
+            ))
+            if len(batch) >= 5000:
+                WalletTransaction.objects.bulk_create(batch)
+                batch = []
+        WalletTransaction.objects.bulk_create(batch)
+        # created_at is auto_now_add: spread the rows over the last 90 days
+        seeded = WalletTransaction.objects.filter(reference__startswith=f"{PREFIX}-")
+        bounds = seeded.aggregate(first=Min("id"), last=Max("id"))
+        first, last = bounds["first"], bounds["last"]
+        step = (last - first) // 90 + 1
+        for day in range(90):
+            WalletTransaction.objects.filter(
+                id__gte=first + day * step, id__lt=first + (day + 1) * step
+            ).update(created_at=now - timedelta(days=day))
+        # Fresh planner statistics, as production tables would have
+        with connection.cursor() as cursor:
+            cursor.execute(f"ANALYZE {connection.ops.quote_name(WalletTransaction._meta.db_table)}")
+        return user_ids
+
+    def _cleanup(self):
+        bench_users(PREFIX).delete()
@@ -0,0 +1,142 @@
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, connection, transaction
+
+from crash.benchmarks import bench_users, make_users, percentile
+from wallets.models import Wallet
+from wallets.services import InsufficientFunds, debit_stake
+
+PREFIX = "walletbench"
+START_BALANCE = Decimal("1000000.00")
+
+
+def locked_play(user_id, stake, payout, hold):
+    """How the game views used to move a stake: row lock held across the whole play"""
+    with transaction.atomic():
+        wallet = Wallet.objects.select_for_update().get(user_id=user_id)
+        if wallet.balance + wallet.spot_balance < stake:
+            raise InsufficientFunds("Insufficient balance")
+        taken_from_wallet = min(max(wallet.balance, Decimal("0.00")), stake)
+        wallet.balance -= taken_from_wallet
+        wallet.spot_balance -= stake - taken_from_wallet
+        time.sleep(hold)  # game logic, run while the wallet is locked
+        wallet.spot_balance += payout
+        wallet.save(update_fields=["balance", "spot_balance"])
+
+
+def service_play(user_id, stake, payout, hold):
+    """The game views now: outcome first, then one conditional UPDATE"""
+    time.sleep(hold)  # game logic, before the wallet is touched
+    with transaction.atomic():
+        debit_stake(user_id, stake, payout=payout)
+
+
+PATHS = {"locked": locked_play, "service": service_play}
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark concurrent game plays against the wallet: the old SELECT ... FOR UPDATE "
+        "path vs wallets.services.debit_stake(), for one user and spread across users"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=16, help="Concurrent players (default: 16)")
+        parser.add_argument("--plays", type=int, default=50, help="Plays per thread (default: 50)")
+        parser.add_argument(
+            "--users",
+            type=int,
+            help="Wallets the spread scenario plays on (default: one per thread)",
+        )
+        parser.add_argument(
+            "--hold-ms",
+            type=float,
+            default=2.0,
+            help="Game logic per play, in ms; the old path runs it under the row lock (default: 2)",
+        )
+        parser.add_argument("--stake", default="100.00", help="Stake per play (default: 100.00)")
+        parser.add_argument("--json", dest="json_path", help="Write the results to this file")
+
+    def handle(self, *args, **options):
+        threads = options["threads"]
+        stake = Decimal(options["stake"])
+        payout = (stake / 2).quantize(Decimal("0.01"))
+        hold = options["hold_ms"] / 1000
+        spread = options["users"] or threads
+
+        if connection.vendor == "sqlite":
+            self.stderr.write(
+                "SQLite takes one write lock for the whole database and ignores FOR UPDATE; "
+                "run this against PostgreSQL for meaningful numbers"
+            )
+
+        self._cleanup()
+        users = [user.id for user in make_users(spread, balance=START_BALANCE, prefix=PREFIX)]
+        scenarios = {"one user": users[:1], f"{spread} users": users}
+
+        self.stdout.write(
+            f"{'scenario':<12} {'path':<8} {'plays/s':>9} {'p50':>9} {'p99':>9} {'errors':>7} {'drift':>10}"
+        )
+        results = []
+        try:
+            for scenario, user_ids in scenarios.items():
+                for path, play in PATHS.items():
+                    Wallet.objects.filter(user_id__in=user_ids).update(balance=START_BALANCE, spot_balance=0)
+                    result = self._run(play, user_ids, threads, options["plays"], stake, payout, hold)
+                    result.update(scenario=scenario, path=path)
+                    results.append(result)
+                    self.stdout.write(
+                        f"{scenario:<12} {path:<8} {result['plays_per_s']:>9.0f} "
+                        f"{result['p50_ms']:>7.2f}ms {result['p99_ms']:>7.2f}ms "
+                        f"{result['errors']:>7} {result['drift']:>10}"
+                    )
+        finally:
+            self._cleanup()
+
+        if options["json_path"]:
+            with open(options["json_path"], "w") as fh:
+                json.dump(results, fh, indent=2)
+
+    def _run(self, play, user_ids, threads, plays, stake, payout, hold):
+        def worker(index):
+            latencies, errors = [], 0
+            try:
+                for i in range(plays):
+                    user_id = user_ids[(index + i * threads) % len(user_ids)]
+                    start = time.perf_counter()
+                    try:
+                        play(user_id, stake, payout, hold)
+                    except (ValueError, DatabaseError):
+                        errors += 1
+                        continue
+                    latencies.append(time.perf_counter() - start)
+            finally:
+                connection.close()
+            return latencies, errors
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            outcomes = list(pool.map(worker, range(threads)))
+        elapsed = time.perf_counter() - start
+
+        latencies = [value for values, _ in outcomes for value in values]
+        errors = sum(count for _, count in outcomes)
+        wallets = Wallet.objects.filter(user_id__in=user_ids).values_list("balance", "spot_balance")
+        # Money that went missing or appeared: lost updates show up here
+        expected = START_BALANCE * len(user_ids) - len(latencies) * (stake - payout)
+        drift = sum(balance + spot_balance for balance, spot_balance in wallets) - expected
+        return {
+            "plays": len(latencies),
+            "errors": errors,
+            "plays_per_s": len(latencies) / elapsed if elapsed else 0.0,
+            "p50_ms": percentile(latencies, 50) * 1000,
+            "p99_ms": percentile(latencies, 99) * 1000,
+            "drift": str(drift),
+        }
+
+    def _cleanup(self):
+        bench_users(PREFIX).delete()
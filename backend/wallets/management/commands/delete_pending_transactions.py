@@ -48,7 +48,7 @@ class Command(BaseCommand):
         # Build the query
         query = {
             'tx_type': 'CREDIT',
-            'meta__status': 'pending'
+            'status': WalletTransaction.PENDING
         }
         
         # Apply filters
@@ -36,7 +36,7 @@ class Command(BaseCommand):
         # Build the query for ALL pending transactions (no time filter)
         query = {
             'tx_type': 'CREDIT',
-            'meta__status': 'pending'
+            'status': WalletTransaction.PENDING
         }
         
         # Apply optional filters
@@ -0,0 +1,83 @@
+import os
+import time
+from multiprocessing import Pool
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.utils import timezone
+
+from wallets import ledger
+from wallets.models import ReconciliationRun
+from wallets.reconciliation import CHUNK_SIZE, RANGE_SIZE, reconcile_range, user_id_ranges
+
+
+class Command(BaseCommand):
+    help = (
+        "Check every wallet against its ledger in parallel over user id ranges and record "
+        "the drifted ones in WalletDrift"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Processes (default: one per core)")
+        parser.add_argument(
+            "--range-size",
+            type=int,
+            default=RANGE_SIZE,
+            help=f"User ids per work unit (default: {RANGE_SIZE:,})",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=CHUNK_SIZE,
+            help=f"Rows fetched / written at a time (default: {CHUNK_SIZE:,})",
+        )
+        parser.add_argument(
+            "--skip-snapshot",
+            action="store_true",
+            help="Do not take ledger snapshots first (reconciliation then sums longer ledger tails)",
+        )
+        parser.add_argument("--show", type=int, default=20, help="Drifted wallets to print (default: 20)")
+
+    def handle(self, *args, **options):
+        if not options["skip_snapshot"]:
+            start = time.perf_counter()
+            taken = ledger.take_snapshots()
+            self.stdout.write(f"Took {taken:,} snapshot(s) in {time.perf_counter() - start:.2f}s")
+
+        ranges = user_id_ranges(options["range_size"])
+        run = ReconciliationRun.objects.create(workers=options["workers"])
+        jobs = [(run.id, low, high, options["chunk_size"]) for low, high in ranges]
+
+        # Forked workers must not share the parent's database connections
+        connections.close_all()
+
+        start = time.perf_counter()
+        checked = drifted = done = 0
+        with Pool(processes=options["workers"]) as pool:
+            for _, _, range_checked, range_drifted in pool.imap_unordered(reconcile_range, jobs):
+                checked += range_checked
+                drifted += range_drifted
+                done += 1
+                if done % 10 == 0 or done == len(jobs):
+                    self.stdout.write(f"  {done}/{len(jobs)} ranges, {checked:,} wallets, {drifted:,} drifted")
+        wall = time.perf_counter() - start
+
+        run.finished_at = timezone.now()
+        run.wallets_checked = checked
+        run.drifted = drifted
+        run.save(update_fields=["finished_at", "wallets_checked", "drifted"])
+
+        rate = checked / wall if wall else 0.0
+        self.stdout.write(
+            f"Run {run.id}: {checked:,} wallets in {wall:.2f}s on {options['workers']} worker(s) ({rate:,.0f} wallets/s)"
+        )
+        if not drifted:
+            self.stdout.write(self.style.SUCCESS("Every wallet matches its ledger"))
+            return
+
+        self.stdout.write(self.style.ERROR(f"{drifted:,} wallet(s) differ from their ledger"))
+        for drift in run.drifts.order_by("user_id")[: options["show"]]:
+            self.stdout.write(
+                f"  user {drift.user_id}: wallet {drift.wallet_balance} / {drift.wallet_spot_balance}, "
+                f"ledger {drift.ledger_balance} / {drift.ledger_spot_balance} ({drift.difference:+})"
+            )
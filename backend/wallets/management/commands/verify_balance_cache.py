@@ -0,0 +1,54 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from crash.redis_lock import shared_redis
+from wallets import balance_cache
+
+
+class Command(BaseCommand):
+    help = "Compare the Redis balance cache with the Wallet table and optionally repair stale entries"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user-id", type=int, action="append", help="Only check this user (repeatable)")
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=2000,
+            help="Wallets compared per round trip (default: 2000)",
+        )
+        parser.add_argument("--fix", action="store_true", help="Reload mismatched entries from the database")
+        parser.add_argument("--show", type=int, default=20, help="Mismatches to print (default: 20)")
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        found = list(balance_cache.verify(options["chunk_size"], options["user_id"]))
+
+        # A commit can land between reading Redis and the database; only
+        # report what still differs on a second look
+        if found:
+            time.sleep(0.5)
+            found = list(balance_cache.verify(options["chunk_size"], [user_id for user_id, _, _ in found]))
+        elapsed = time.perf_counter() - start
+
+        for user_id, cached, current in found[: options["show"]]:
+            if cached is None:
+                self.stdout.write(f"  user {user_id}: not cached")
+                continue
+            self.stdout.write(
+                f"  user {user_id}: cached {cached.balance} / {cached.spot_balance} / {cached.locked_balance} "
+                f"v{cached.version}, database {current.balance} / {current.spot_balance} / "
+                f"{current.locked_balance} v{current.version}"
+            )
+
+        if not found:
+            self.stdout.write(self.style.SUCCESS(f"Balance cache matches the database ({elapsed:.2f}s)"))
+            return
+
+        self.stdout.write(self.style.ERROR(f"{len(found)} cached balance(s) differ from the database"))
+        if options["fix"]:
+            user_ids = [user_id for user_id, _, _ in found]
+            # Drop first: a stale entry may carry a version the database never reached
+            shared_redis().delete(*[balance_cache.key(user_id) for user_id in user_ids])
+            balance_cache.refresh(user_ids)
+            self.stdout.write(self.style.SUCCESS(f"Reloaded {len(user_ids)} balance(s)"))
@@ -0,0 +1,84 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from wallets import ledger
+
+
+def _moment(value):
+    try:
+        moment = datetime.fromisoformat(value)
+    except ValueError:
+        raise CommandError(f"Not an ISO date/time: {value}")
+    return timezone.make_aware(moment) if timezone.is_naive(moment) else moment
+
+
+class Command(BaseCommand):
+    help = (
+        "Maintain the wallet ledger: take balance snapshots (run it every few minutes), "
+        "open pre-ledger wallets, check wallets against the ledger or print a statement"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--open",
+            action="store_true",
+            help="First give wallets created before the ledger their opening posting",
+        )
+        parser.add_argument(
+            "--reconcile",
+            action="store_true",
+            help="Then list every wallet whose balances differ from its ledger",
+        )
+        parser.add_argument("--user-id", type=int, help="Limit --open/--reconcile to one user, or the statement user")
+        parser.add_argument(
+            "--statement",
+            metavar="START",
+            help="Print the statement of --user-id from this ISO date/time instead",
+        )
+        parser.add_argument("--end", help="End of the statement (default: now)")
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=ledger.SNAPSHOT_BATCH,
+            help=f"Users per snapshot query (default: {ledger.SNAPSHOT_BATCH})",
+        )
+
+    def handle(self, *args, **options):
+        user_ids = [options["user_id"]] if options["user_id"] else None
+
+        if options["statement"]:
+            if not user_ids:
+                raise CommandError("--statement needs --user-id")
+            self._statement(options["user_id"], _moment(options["statement"]), options["end"])
+            return
+
+        if options["open"]:
+            opened = ledger.open_balances(user_ids)
+            self.stdout.write(f"Opened {opened} wallet(s)")
+
+        taken = ledger.take_snapshots(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Took {taken} snapshot(s)"))
+
+        if options["reconcile"]:
+            drifted = 0
+            for user_id, wallet, booked in ledger.reconcile(user_ids):
+                drifted += 1
+                self.stdout.write(
+                    f"user {user_id}: wallet {wallet[0]} / {wallet[1]}, ledger {booked[0]} / {booked[1]}"
+                )
+            style = self.style.ERROR if drifted else self.style.SUCCESS
+            self.stdout.write(style(f"{drifted} wallet(s) differ from the ledger"))
+
+    def _statement(self, user_id, start, end):
+        result = ledger.statement(user_id, start, _moment(end) if end else None)
+        opening, closing = result["opening"], result["closing"]
+        self.stdout.write(f"Opening: balance {opening['balance']}, spot {opening['spot_balance']}")
+        for line in result["lines"]:
+            self.stdout.write(
+                f"{line['at']:%Y-%m-%d %H:%M:%S} {line['account']:<7} {line['amount']:>12} "
+                f"{line['reason']:<18} {line['game']:<12} {line['reference']:<24} "
+                f"{line['balance']:>12} {line['spot_balance']:>12}"
+            )
+        self.stdout.write(f"Closing: balance {closing['balance']}, spot {closing['spot_balance']}")
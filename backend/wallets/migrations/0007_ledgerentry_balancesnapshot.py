@@ -0,0 +1,52 @@
+# Generated by Django 4.2.27 on 2026-10-17 00:07
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('wallets', '0006_adminbank_depositlimit_depositrequest_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LedgerEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('posting', models.UUIDField(db_index=True)),
+                ('account', models.CharField(choices=[('balance', 'Wallet balance'), ('spot', 'Spot balance'), ('house', 'House'), ('external', 'Deposits / withdrawals'), ('adjustment', 'Admin adjustment')], max_length=10)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=18)),
+                ('reason', models.CharField(max_length=32)),
+                ('game', models.CharField(blank=True, max_length=32)),
+                ('reference', models.CharField(blank=True, max_length=64)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ledger_entries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'id'], name='wallets_led_user_id_98464c_idx'), models.Index(fields=['created_at'], name='wallets_led_created_4b818b_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='BalanceSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('balance', models.DecimalField(decimal_places=2, max_digits=18)),
+                ('spot_balance', models.DecimalField(decimal_places=2, max_digits=18)),
+                ('last_entry_id', models.BigIntegerField()),
+                ('taken_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='balance_snapshots', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', '-last_entry_id'], name='wallets_bal_user_id_c52831_idx'), models.Index(fields=['last_entry_id'], name='wallets_bal_last_en_5ad823_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='balancesnapshot',
+            constraint=models.UniqueConstraint(fields=('user', 'last_entry_id'), name='unique_snapshot_per_entry'),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 4.2.27 on 2026-10-17 00:12
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('wallets', '0007_ledgerentry_balancesnapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReconciliationRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('started_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('workers', models.PositiveIntegerField(default=1)),
+                ('wallets_checked', models.PositiveIntegerField(default=0)),
+                ('drifted', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['-started_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='WalletDrift',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('wallet_balance', models.DecimalField(decimal_places=2, max_digits=18)),
+                ('wallet_spot_balance', models.DecimalField(decimal_places=2, max_digits=18)),
+                ('ledger_balance', models.DecimalField(decimal_places=2, max_digits=18)),
+                ('ledger_spot_balance', models.DecimalField(decimal_places=2, max_digits=18)),
+                ('detected_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('run', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='drifts', to='wallets.reconciliationrun')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='wallet_drifts', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='walletdrift',
+            constraint=models.UniqueConstraint(fields=('run', 'user'), name='unique_drift_per_run'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.2.27 on 2026-10-17 00:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wallets', '0008_reconciliationrun_walletdrift'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='wallettransaction',
+            name='status',
+            field=models.CharField(blank=True, default='', max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='wallettransaction',
+            index=models.Index(fields=['user', 'tx_type', 'status', 'created_at'], name='wallets_wal_user_id_4c4108_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='wallettransaction',
+            index=models.Index(fields=['tx_type', 'status', 'created_at'], name='wallets_wal_tx_type_55997d_idx'),
+        ),
+    ]
@@ -1,5 +1,6 @@
 from django.conf import settings
 from django.db import models
+from django.utils import timezone
 from decimal import Decimal
 import random
 
@@ -27,6 +28,11 @@ class WalletTransaction(models.Model):
         (CREDIT, "Credit"),
     ]
 
+    PENDING = "pending"
+    COMPLETED = "completed"
+    FAILED = "failed"
+    EXPIRED = "expired"
+
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="wallet_txs"
     )
@@ -36,16 +42,145 @@ class WalletTransaction(models.Model):
     meta = models.JSONField(default=dict, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     first_deposit = models.BooleanField(default=False)
+    # Copy of meta["status"] ("" when there is none), kept in sync by save()
+    # so deposit / withdrawal / referral queries filter on an indexed column
+    status = models.CharField(max_length=20, blank=True, default="")
 
     class Meta:
         indexes = [
             models.Index(fields=["user", "created_at"]),
+            models.Index(fields=["user", "tx_type", "status", "created_at"]),
+            models.Index(fields=["tx_type", "status", "created_at"]),
         ]
 
+    def save(self, *args, **kwargs):
+        self.status = self.status_from_meta(self.meta)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "meta" in update_fields and "status" not in update_fields:
+            kwargs["update_fields"] = [*update_fields, "status"]
+        super().save(*args, **kwargs)
+
+    @staticmethod
+    def status_from_meta(meta):
+        status = (meta or {}).get("status")
+        return str(status)[:20] if status is not None else ""
+
     def __str__(self):
         return f"{self.tx_type} {self.amount} for {self.user_id}"
 
 
+class LedgerEntry(models.Model):
+    """
+    Append-only, double-entry record of every balance mutation (see
+    wallets/ledger.py). The entries of one posting sum to zero: the user's
+    balance and spot accounts against the house, external money or an
+    admin adjustment.
+    """
+    BALANCE = "balance"
+    SPOT = "spot"
+    HOUSE = "house"
+    EXTERNAL = "external"
+    ADJUSTMENT = "adjustment"
+    ACCOUNT_CHOICES = [
+        (BALANCE, "Wallet balance"),
+        (SPOT, "Spot balance"),
+        (HOUSE, "House"),
+        (EXTERNAL, "Deposits / withdrawals"),
+        (ADJUSTMENT, "Admin adjustment"),
+    ]
+    USER_ACCOUNTS = (BALANCE, SPOT)
+
+    posting = models.UUIDField(db_index=True)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="ledger_entries"
+    )
+    account = models.CharField(max_length=10, choices=ACCOUNT_CHOICES)
+    # Signed: positive adds to the account
+    amount = models.DecimalField(max_digits=18, decimal_places=2)
+    reason = models.CharField(max_length=32)
+    game = models.CharField(max_length=32, blank=True)
+    reference = models.CharField(max_length=64, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "id"]),
+            models.Index(fields=["created_at"]),
+        ]
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("Ledger entries are append-only")
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"{self.account} {self.amount:+} for {self.user_id} ({self.reason})"
+
+
+class BalanceSnapshot(models.Model):
+    """A user's balances once every ledger entry up to last_entry_id is applied"""
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="balance_snapshots"
+    )
+    balance = models.DecimalField(max_digits=18, decimal_places=2)
+    spot_balance = models.DecimalField(max_digits=18, decimal_places=2)
+    last_entry_id = models.BigIntegerField()
+    taken_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "last_entry_id"], name="unique_snapshot_per_entry"),
+        ]
+        indexes = [
+            models.Index(fields=["user", "-last_entry_id"]),
+            models.Index(fields=["last_entry_id"]),
+        ]
+
+    def __str__(self):
+        return f"Snapshot({self.user_id} @ {self.last_entry_id})"
+
+
+class ReconciliationRun(models.Model):
+    """One pass of manage.py reconcile_wallets over every wallet"""
+    started_at = models.DateTimeField(default=timezone.now)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    workers = models.PositiveIntegerField(default=1)
+    wallets_checked = models.PositiveIntegerField(default=0)
+    drifted = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ["-started_at"]
+
+    def __str__(self):
+        return f"Reconciliation {self.started_at:%Y-%m-%d %H:%M}: {self.drifted}/{self.wallets_checked} drifted"
+
+
+class WalletDrift(models.Model):
+    """A wallet whose balances did not match its ledger in a reconciliation run"""
+    run = models.ForeignKey(ReconciliationRun, on_delete=models.CASCADE, related_name="drifts")
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="wallet_drifts"
+    )
+    wallet_balance = models.DecimalField(max_digits=18, decimal_places=2)
+    wallet_spot_balance = models.DecimalField(max_digits=18, decimal_places=2)
+    ledger_balance = models.DecimalField(max_digits=18, decimal_places=2)
+    ledger_spot_balance = models.DecimalField(max_digits=18, decimal_places=2)
+    detected_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["run", "user"], name="unique_drift_per_run"),
+        ]
+
+    @property
+    def difference(self):
+        """Money in the wallet beyond what the ledger accounts for"""
+        return (self.wallet_balance + self.wallet_spot_balance) - (self.ledger_balance + self.ledger_spot_balance)
+
+    def __str__(self):
+        return f"Drift({self.user_id}: {self.difference:+})"
+
+
 class AdminBank(models.Model):
     """
     Admin-configured bank accounts that users will pay into for deposits
@@ -0,0 +1,68 @@
+"""
+Parallel wallet reconciliation: every wallet against its ledger.
+
+The user id space is cut into ranges that a multiprocessing.Pool works
+through independently. A worker counts the wallets of its range, lets the
+database sum each one's ledger and compare it (ledger.drifted_wallets()),
+streams back only the drifted rows and writes them to WalletDrift under
+the run. Work per wallet is a few index lookups, so a pass scales with the
+number of workers the database can serve.
+"""
+from django.db import connection
+from django.db.models import Max, Min
+
+from . import ledger
+from .models import Wallet, WalletDrift
+
+RANGE_SIZE = 10_000
+CHUNK_SIZE = 2_000
+
+
+def user_id_ranges(range_size=RANGE_SIZE):
+    """[low, high) user id ranges covering every wallet"""
+    bounds = Wallet.objects.aggregate(low=Min("user_id"), high=Max("user_id"))
+    if bounds["low"] is None:
+        return []
+    return [
+        (low, min(low + range_size, bounds["high"] + 1))
+        for low in range(bounds["low"], bounds["high"] + 1, range_size)
+    ]
+
+
+def reconcile_range(args):
+    """
+    Worker for multiprocessing.Pool. args is (run_id, low, high, chunk_size).
+    Returns (low, high, wallets checked, wallets drifted).
+    """
+    run_id, low, high, chunk_size = args
+    try:
+        wallets = Wallet.objects.filter(user_id__gte=low, user_id__lt=high)
+        checked = wallets.count()
+        rows = (
+            ledger.drifted_wallets(wallets)
+            .values_list("user_id", "balance", "spot_balance", "ledger_balance", "ledger_spot")
+            .order_by("user_id")
+        )
+
+        drifted, batch = 0, []
+        for user_id, balance, spot, ledger_balance, ledger_spot in rows.iterator(chunk_size=chunk_size):
+            batch.append(WalletDrift(
+                run_id=run_id,
+                user_id=user_id,
+                wallet_balance=balance,
+                wallet_spot_balance=spot,
+                ledger_balance=ledger_balance,
+                ledger_spot_balance=ledger_spot,
+            ))
+            if len(batch) >= chunk_size:
+                drifted += _save(batch)
+                batch = []
+        drifted += _save(batch)
+        return low, high, checked, drifted
+    finally:
+        connection.close()
+
+
+def _save(drifts):
+    WalletDrift.objects.bulk_create(drifts, ignore_conflicts=True)
+    return len(drifts)
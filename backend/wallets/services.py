@@ -1,9 +1,12 @@
+from dataclasses import dataclass
 from decimal import Decimal
-from django.db import transaction
+from django.db import connection, transaction
 from django.db.models import F
 from django.utils import timezone
+from . import balance_cache, ledger
 from .models import Wallet, WalletTransaction
-from crash.models import AuditLog
+from crash.models import AuditLog, CrashBet
+from leaderboards.services import record_win, record_wins
 
 
 # ======================================================
@@ -13,6 +16,216 @@ def _get_wallet_for_update(user):
     return Wallet.objects.select_for_update().get(user=user)
 
 
+# ======================================================
+# DEBIT / CREDIT (EVERY GAME, NO ROW LOCK HELD)
+# ======================================================
+CENT = Decimal("0.01")
+DEBIT_RETRIES = 5
+
+
+class InsufficientFunds(ValueError):
+    pass
+
+
+@dataclass(frozen=True)
+class WalletUpdate:
+    """Balances of a wallet right after a debit or credit, and where the stake came from"""
+
+    balance: Decimal
+    spot_balance: Decimal
+    taken_from_wallet: Decimal = Decimal("0.00")
+    taken_from_spot: Decimal = Decimal("0.00")
+
+    @property
+    def combined_balance(self):
+        return self.balance + self.spot_balance
+
+
+def _to_decimal(value):
+    # SQLite hands back floats from arithmetic on NUMERIC columns
+    return Decimal(str(value)).quantize(CENT)
+
+
+def _update_wallet(user_id, balance_delta, spot_delta, postings, conditions="", condition_params=()):
+    """
+    One UPDATE of a wallet row, returning its new (balance, spot_balance),
+    or None when no row matched. The row is locked only from the UPDATE to
+    the end of the caller's transaction, never across a read. The ledger
+    postings of the change are appended in the same transaction, and the
+    new balances go to the balance cache once it commits.
+    """
+    table = connection.ops.quote_name(Wallet._meta.db_table)
+    sql = (
+        f"UPDATE {table} SET balance = balance + CAST(%s AS NUMERIC), "
+        f"spot_balance = spot_balance + CAST(%s AS NUMERIC), updated_at = %s WHERE user_id = %s{conditions}"
+    )
+    now = timezone.now()
+    args = [
+        balance_delta,
+        spot_delta,
+        connection.ops.adapt_datetimefield_value(now),
+        user_id,
+        *condition_params,
+    ]
+    # PostgreSQL and SQLite >= 3.35 support UPDATE ... RETURNING
+    returning = connection.features.can_return_columns_from_insert
+
+    with transaction.atomic(savepoint=False):
+        with connection.cursor() as cursor:
+            if returning:
+                cursor.execute(f"{sql} RETURNING balance, spot_balance, locked_balance", args)
+                row = cursor.fetchone()
+            else:
+                cursor.execute(sql, args)
+                row = cursor.rowcount and Wallet.objects.values_list(
+                    "balance", "spot_balance", "locked_balance"
+                ).get(user_id=user_id)
+        if not row:
+            return None
+        balance, spot_balance, locked_balance = (_to_decimal(value) for value in row)
+
+        entries = ledger.post_many(postings, refresh_cache=False)
+        _cache_on_commit({user_id: (balance, spot_balance, locked_balance)}, entries, now)
+    return balance, spot_balance
+
+
+WALLET_BATCH = 1000
+
+
+def _update_wallets(deltas, postings):
+    """
+    _update_wallet() for many wallets at once: deltas maps user_id to
+    (balance_delta, spot_delta), applied with one UPDATE ... RETURNING per
+    WALLET_BATCH wallets. Returns {user_id: (balance, spot_balance)}.
+    """
+    table = connection.ops.quote_name(Wallet._meta.db_table)
+    now = timezone.now()
+    returning = connection.features.can_return_columns_from_insert
+    rows = {}
+
+    with transaction.atomic(savepoint=False):
+        user_ids = list(deltas)
+        for i in range(0, len(user_ids), WALLET_BATCH):
+            chunk = user_ids[i:i + WALLET_BATCH]
+            whens = " ".join(["WHEN %s THEN CAST(%s AS NUMERIC)"] * len(chunk))
+            sql = (
+                f"UPDATE {table} SET balance = balance + CASE user_id {whens} ELSE 0 END, "
+                f"spot_balance = spot_balance + CASE user_id {whens} ELSE 0 END, updated_at = %s "
+                f"WHERE user_id IN ({', '.join(['%s'] * len(chunk))})"
+            )
+            args = [
+                *[arg for uid in chunk for arg in (uid, deltas[uid][0])],
+                *[arg for uid in chunk for arg in (uid, deltas[uid][1])],
+                connection.ops.adapt_datetimefield_value(now),
+                *chunk,
+            ]
+            with connection.cursor() as cursor:
+                if returning:
+                    cursor.execute(f"{sql} RETURNING user_id, balance, spot_balance, locked_balance", args)
+                    found = cursor.fetchall()
+                else:
+                    cursor.execute(sql, args)
+                    found = Wallet.objects.filter(user_id__in=chunk).values_list(
+                        "user_id", "balance", "spot_balance", "locked_balance"
+                    )
+            for uid, *balances in found:
+                rows[uid] = tuple(_to_decimal(value) for value in balances)
+
+        entries = ledger.post_many(postings, refresh_cache=False)
+        _cache_on_commit(rows, entries, now)
+    return {uid: (balance, spot_balance) for uid, (balance, spot_balance, _) in rows.items()}
+
+
+def _cache_on_commit(rows, entries, now):
+    """
+    Put the new balances of rows ({user_id: (balance, spot_balance,
+    locked_balance)}) in the balance cache once the transaction commits.
+    The version is the newest ledger entry id, which only backends that
+    return rows from a bulk INSERT hand back; others reload it.
+    """
+    versions = {}
+    if connection.features.can_return_rows_from_bulk_insert:
+        for entry in entries:
+            versions[entry.user_id] = max(versions.get(entry.user_id, 0), entry.id)
+    cached = [
+        balance_cache.CachedBalance(uid, *balances, now, versions[uid])
+        for uid, balances in rows.items()
+        if uid in versions
+    ]
+    if cached:
+        balance_cache.store_on_commit(cached)
+    balance_cache.refresh_on_commit(uid for uid in rows if uid not in versions)
+
+
+def debit_stake(user_id, amount: Decimal, payout: Decimal = Decimal("0.00"), game="", reference="") -> WalletUpdate:
+    """
+    Take a stake out of a wallet, wallet balance first then spot balance,
+    and optionally pay the winnings of the same play to spot balance
+    (a negative payout is a penalty charged to spot balance on top).
+
+    The split is worked out from an unlocked read; a conditional UPDATE
+    then only matches while both balances still cover it, so there is no
+    SELECT ... FOR UPDATE and a concurrent play costs at most another
+    attempt. Raises InsufficientFunds, or ValueError when the wallet keeps
+    changing under us.
+    """
+    if amount <= 0:
+        raise ValueError("Invalid bet amount")
+
+    for _ in range(DEBIT_RETRIES):
+        balance, spot_balance = Wallet.objects.values_list("balance", "spot_balance").get(user_id=user_id)
+        if balance + spot_balance < amount:
+            raise InsufficientFunds("Insufficient balance")
+
+        taken_from_wallet = min(max(balance, Decimal("0.00")), amount)
+        taken_from_spot = amount - taken_from_wallet
+
+        postings = [ledger.Posting(user_id, -taken_from_wallet, -taken_from_spot, "stake", game, reference)]
+        if payout:
+            postings.append(ledger.Posting(user_id, spot=payout, reason="payout", game=game, reference=reference))
+
+        updated = _update_wallet(
+            user_id,
+            -taken_from_wallet,
+            payout - taken_from_spot,
+            postings,
+            " AND balance >= CAST(%s AS NUMERIC) AND spot_balance >= CAST(%s AS NUMERIC)",
+            [taken_from_wallet, taken_from_spot],
+        )
+        if updated:
+            return WalletUpdate(*updated, taken_from_wallet, taken_from_spot)
+
+    raise ValueError("Wallet is busy. Please try again.")
+
+
+def credit_winnings(user_id, amount: Decimal, game="", reference="") -> WalletUpdate:
+    """Pay winnings to spot balance with one UPDATE"""
+    if amount < 0:
+        raise ValueError("Invalid payout amount")
+    posting = ledger.Posting(user_id, spot=amount, reason="payout", game=game, reference=reference)
+    updated = _update_wallet(user_id, Decimal("0.00"), amount, [posting])
+    if updated is None:
+        raise Wallet.DoesNotExist(f"No wallet for user {user_id}")
+    return WalletUpdate(*updated)
+
+
+def refund_stake(user_id, taken_from_wallet: Decimal, taken_from_spot: Decimal, game="", reference="") -> WalletUpdate:
+    """Give back a stake taken by debit_stake() to where it came from"""
+    posting = ledger.Posting(user_id, taken_from_wallet, taken_from_spot, "refund", game, reference)
+    updated = _update_wallet(user_id, taken_from_wallet, taken_from_spot, [posting])
+    if updated is None:
+        raise Wallet.DoesNotExist(f"No wallet for user {user_id}")
+    return WalletUpdate(*updated)
+
+
+def wallet_balances(user_id) -> WalletUpdate:
+    """Current balances, for responses of plays that did not move money (from the balance cache)"""
+    cached = balance_cache.get(user_id)
+    if cached is None:
+        raise Wallet.DoesNotExist(f"No wallet for user {user_id}")
+    return WalletUpdate(cached.balance, cached.spot_balance)
+
+
 # ======================================================
 # PLACE BET (USES wallet balance first, then spot balance)
 # ======================================================
@@ -46,6 +259,7 @@ def place_bet_atomic(user, amount: Decimal, reference: str):
         raise ValueError("Insufficient funds")
 
     wallet.save(update_fields=["balance", "spot_balance"])
+    ledger.post(user.id, -taken_from_wallet, -taken_from_spot, "stake", "crash", reference)
 
     tx = WalletTransaction.objects.create(
         user=user,
@@ -73,45 +287,79 @@ def place_bet_atomic(user, amount: Decimal, reference: str):
     return tx
 
 
+# ======================================================
+# RESERVE BET FUNDS (NO ROW LOCK, NO LEDGER ROWS)
+# ======================================================
+def reserve_bet_funds(user_id, amount: Decimal):
+    """
+    Take a crash stake out of the wallet with debit_stake(). The
+    WalletTransaction / AuditLog rows are written later in bulk by the
+    caller. Returns (taken_from_wallet, taken_from_spot, new_total_balance).
+    """
+    update = debit_stake(user_id, amount, game="crash")
+    return update.taken_from_wallet, update.taken_from_spot, update.combined_balance
+
+
+def release_bet_funds(user_id, taken_from_wallet: Decimal, taken_from_spot: Decimal):
+    """Give back a reservation made by reserve_bet_funds()"""
+    refund_stake(user_id, taken_from_wallet, taken_from_spot, game="crash")
+
+
 # ======================================================
 # CASHOUT (CREDITS SPOT BALANCE ONLY)
 # ======================================================
 @transaction.atomic
-def cashout_atomic(user, bet, payout_amount: Decimal, reference: str):
-    wallet = _get_wallet_for_update(user)
+def cashout_atomic(bet, multiplier: Decimal, payout_amount: Decimal, reference: str):
+    """
+    Pay a manual crash cashout at a multiplier the server worked out.
 
-    if bet.status != "ACTIVE":
-        raise ValueError("Bet not active")
+    The bet is claimed with a conditional UPDATE (ACTIVE -> CASHED_OUT)
+    instead of locking it, or its round, up front: whichever of this, an
+    auto cashout or the crash settlement gets to the row first wins. The
+    wallet is credited with credit_winnings(), no SELECT ... FOR UPDATE.
 
+    Returns the player's total balance, or None if the bet was no longer
+    ACTIVE.
+    """
     if payout_amount < 0:
         raise ValueError("Invalid payout amount")
 
+    now = timezone.now()
+    claimed = CrashBet.objects.filter(id=bet.id, status="ACTIVE").update(
+        status="CASHED_OUT", cashout_multiplier=multiplier, win_amount=payout_amount, cashed_out_at=now
+    )
+    if not claimed:
+        return None
 
     # Credit winnings to SPOT balance
-    wallet.spot_balance = F("spot_balance") + payout_amount
-
-    wallet.save(update_fields=["spot_balance"])
+    wallet = credit_winnings(bet.user_id, payout_amount, game="crash", reference=reference)
 
-    tx = WalletTransaction.objects.create(
-        user=user,
+    WalletTransaction.objects.create(
+        user_id=bet.user_id,
         amount=payout_amount,
         tx_type=WalletTransaction.CREDIT,
         reference=reference,
-        meta={"reason": "crash_cashout", "bet_id": bet.id},
+        meta={"reason": "crash_cashout", "bet_id": bet.id, "multiplier": str(multiplier)},
     )
 
-    bet.win_amount = payout_amount
-    bet.status = "CASHED_OUT"
-    bet.cashed_out_at = timezone.now()
-    bet.save(update_fields=["win_amount", "status", "cashed_out_at"])
-
     AuditLog.objects.create(
-        user=user,
+        user_id=bet.user_id,
         action="CASHOUT",
         details={"bet_id": bet.id, "payout": str(payout_amount), "reference": reference},
     )
 
-    return tx
+    bet.status = "CASHED_OUT"
+    bet.cashout_multiplier = multiplier
+    bet.win_amount = payout_amount
+    bet.cashed_out_at = now
+
+    if not bet.is_demo:
+        username = bet.user.username
+        transaction.on_commit(
+            lambda: record_win("crash", bet.user_id, username, payout_amount, multiplier, now)
+        )
+
+    return wallet.combined_balance
 
 
 # ======================================================
@@ -126,59 +374,268 @@ def settle_lost_bet_atomic(bet):
     bet.save(update_fields=["status", "win_amount"])
 
 
-def process_auto_cashout(user, bet, payout_amount, reference, is_demo=False):
+# ======================================================
+# LOST BETS BULK (WHOLE ROUND, NO WALLET LOCKS)
+# ======================================================
+LOST_BET_AUDIT_BATCH = 1000
+
+
+@transaction.atomic
+def settle_lost_bets_bulk(round_obj, on_progress=None):
     """
-    Process an auto cashout for a crash bet and add winnings to wallet spot balance.
-    
-    Args:
-        user: The user who placed the bet
-        bet: The CrashBet instance
-        payout_amount: Decimal amount to pay out
-        reference: Transaction reference string
-        is_demo: Whether this is a demo transaction
-        
-    Returns:
-        Decimal: The new wallet balance after cashout
-    """
-    with transaction.atomic():
-        try:
-            # Get the wallet with lock to prevent race conditions
-            wallet = Wallet.objects.select_for_update().get(
-                user=user
-            )
-            
-            # Add the payout to spot balance (original bet was already deducted)
-            wallet.spot_balance += payout_amount
-            wallet.balance = wallet.spot_balance + wallet.bonus_balance
-            wallet.save()
-            
-            # Record the transaction
-            Transaction.objects.create(
-                wallet=wallet,
-                transaction_type="CRASH_WIN",
-                amount=payout_amount,
-                balance_before=wallet.spot_balance - payout_amount,
-                balance_after=wallet.spot_balance,
-                reference=reference,
-                description=f"Crash auto cashout at {bet.cashout_multiplier}x",
-                status="COMPLETED",
-                metadata={
-                    "bet_id": bet.id,
-                    "round_id": bet.round.id,
-                    "crash_multiplier": str(bet.cashout_multiplier),
-                    "auto_cashout": True,
-                    "original_bet": str(bet.bet_amount),
-                    "payout_multiplier": str(bet.cashout_multiplier)
-                }
+    Mark every remaining PENDING/ACTIVE bet of a round as LOST. The open
+    bets are locked and read first, then updated by id in batches, so a
+    round resumed after a partial settlement only logs the bets it settles
+    itself. Losing bets never touch the wallet, so no wallet row is locked.
+    Audit rows are written with bulk_create in the same batches, calling
+    on_progress() between batches (e.g. to renew the engine lock).
+
+    Returns (bet_id, user_id, bet_amount) for every bet that was settled.
+    """
+    lost = list(
+        CrashBet.objects.select_for_update()
+        .filter(round=round_obj, status__in=["PENDING", "ACTIVE"])
+        .values_list("id", "user_id", "bet_amount")
+    )
+
+    for i in range(0, len(lost), LOST_BET_AUDIT_BATCH):
+        CrashBet.objects.filter(id__in=[bet_id for bet_id, _, _ in lost[i:i + LOST_BET_AUDIT_BATCH]]).update(
+            status="LOST", win_amount=Decimal("0.00")
+        )
+        AuditLog.objects.bulk_create([
+            AuditLog(
+                user_id=user_id,
+                action="BET_LOST",
+                details={
+                    "bet_id": bet_id,
+                    "round_id": round_obj.id,
+                    "amount": str(amount),
+                    "crash_point": str(round_obj.crash_point),
+                },
             )
-            
-            logger.info(f"Auto cashout processed for user {user.id}: "
-                       f"bet {bet.id}, payout {payout_amount}, "
-                       f"new balance {wallet.spot_balance}")
-            
-            return wallet.spot_balance
-            
-        except Exception as e:
-            logger.error(f"Failed to process auto cashout for user {user.id}, "
-                        f"bet {bet.id}: {str(e)}")
-            raise ValueError(f"Auto cashout failed: {str(e)}")
\ No newline at end of file
+            for bet_id, user_id, amount in lost[i:i + LOST_BET_AUDIT_BATCH]
+        ])
+        if on_progress:
+            on_progress()
+
+    return lost
+
+
+# ======================================================
+# VOIDED ROUND (REFUNDS STAKES TO WHERE THEY CAME FROM)
+# ======================================================
+def crash_stake_sources(round_id, user_id=None):
+    """
+    Where each player's stake in a crash round was taken from, read from
+    the CRASHBET-<round>-... DEBIT transactions: {user_id: (from_wallet,
+    from_spot, reference)}. Stakes that were already given back (a -REFUND
+    credit exists for the reference) are skipped.
+    """
+    prefix = f"CRASHBET-{round_id}-"
+    txs = WalletTransaction.objects.filter(reference__startswith=prefix)
+    if user_id is not None:
+        txs = txs.filter(user_id=user_id)
+    refunded = set(txs.filter(reference__endswith="-REFUND").values_list("reference", flat=True))
+    sources = {}
+    for uid, reference, meta in txs.filter(tx_type=WalletTransaction.DEBIT).values_list(
+        "user_id", "reference", "meta"
+    ):
+        if f"{reference}-REFUND" in refunded or "taken_from_wallet" not in (meta or {}):
+            continue
+        sources[uid] = (Decimal(meta["taken_from_wallet"]), Decimal(meta["taken_from_spot"]), reference)
+    return sources
+
+
+def stake_split(sources, user_id, amount):
+    """
+    (to_wallet, to_spot) for refunding a stake. A split that does not add
+    up to the stake is not trusted, and the whole stake goes to the wallet
+    balance.
+    """
+    source = sources.get(user_id)
+    if source and source[0] + source[1] == amount:
+        return source[0], source[1]
+    return amount, Decimal("0")
+
+
+@transaction.atomic
+def void_round_bets(round_obj):
+    """
+    Refund every still open bet of a voided round. Each stake goes back to
+    the balances it was taken from, read from the bet's DEBIT transaction;
+    a bet without one, or whose split does not add up to the stake, is
+    refunded to the wallet balance. Bets that were already cashed out keep
+    their payout.
+
+    Returns (bet_id, user_id, bet_amount) for every refunded bet.
+    """
+    bets = list(
+        CrashBet.objects.select_for_update()
+        .filter(round=round_obj, status__in=["PENDING", "ACTIVE"])
+        .values_list("id", "user_id", "bet_amount")
+    )
+    if not bets:
+        return []
+
+    sources = crash_stake_sources(round_obj.id)
+
+    to_wallet, to_spot = {}, {}
+    for _, user_id, amount in bets:
+        to_wallet[user_id], to_spot[user_id] = stake_split(sources, user_id, amount)
+
+    _update_wallets(
+        {uid: (to_wallet[uid], to_spot[uid]) for uid in to_wallet},
+        [
+            ledger.Posting(uid, to_wallet[uid], to_spot[uid], "refund", "crash", f"CRASHVOID-{round_obj.id}")
+            for uid in to_wallet
+        ],
+    )
+
+    CrashBet.objects.filter(id__in=[bet_id for bet_id, _, _ in bets]).update(
+        status="CANCELLED", win_amount=Decimal("0.00")
+    )
+
+    WalletTransaction.objects.bulk_create([
+        WalletTransaction(
+            user_id=user_id,
+            amount=amount,
+            tx_type=WalletTransaction.CREDIT,
+            reference=f"CRASHVOID-{bet_id}",
+            meta={
+                "reason": "crash_void",
+                "bet_id": bet_id,
+                "round_id": round_obj.id,
+                "refunded_to_wallet": str(to_wallet[user_id]),
+                "refunded_to_spot": str(to_spot[user_id]),
+            },
+        )
+        for bet_id, user_id, amount in bets
+    ])
+
+    AuditLog.objects.bulk_create([
+        AuditLog(
+            user_id=user_id,
+            action="BET_REFUND",
+            details={
+                "bet_id": bet_id,
+                "round_id": round_obj.id,
+                "amount": str(amount),
+                "reference": f"CRASHVOID-{bet_id}",
+            },
+        )
+        for bet_id, user_id, amount in bets
+    ])
+
+    return bets
+
+
+# ======================================================
+# AUTO CASHOUT BATCH (CREDITS SPOT BALANCE ONLY)
+# ======================================================
+@transaction.atomic
+def settle_auto_cashouts_atomic(bet_ids, ceiling: Decimal, max_win: Decimal):
+    """
+    Settle a batch of crash auto cashouts in a single transaction.
+
+    Each bet is paid at its own auto_cashout target. Bets that are no longer
+    ACTIVE (a manual cashout won the race) or whose auto cashout was cancelled
+    are skipped. Payouts above max_win are skipped and left to lose at crash.
+
+    Returns one result dict per settled bet.
+    """
+    if not bet_ids:
+        return []
+
+    bets = list(
+        CrashBet.objects.select_for_update()
+        .filter(
+            id__in=bet_ids,
+            status="ACTIVE",
+            auto_cashout__isnull=False,
+            auto_cashout__lte=ceiling,
+        )
+        .select_related("user")
+    )
+
+    now = timezone.now()
+    stamp = int(now.timestamp())
+    settled = []
+    credits = {}
+
+    for bet in bets:
+        payout = (bet.bet_amount * bet.auto_cashout).quantize(Decimal("0.01"))
+        if payout > max_win:
+            continue
+
+        bet.status = "CASHED_OUT"
+        bet.cashout_multiplier = bet.auto_cashout
+        bet.win_amount = payout
+        bet.cashed_out_at = now
+        settled.append(bet)
+        credits[bet.user_id] = credits.get(bet.user_id, Decimal("0")) + payout
+
+    if not settled:
+        return []
+
+    # One UPDATE for every wallet in the batch
+    balances = _update_wallets(
+        {uid: (Decimal("0"), amount) for uid, amount in credits.items()},
+        [
+            ledger.Posting(bet.user_id, spot=bet.win_amount, reason="payout", game="crash", reference=f"AUTOCASHOUT-{bet.id}-{stamp}")
+            for bet in settled
+        ],
+    )
+
+    CrashBet.objects.bulk_update(
+        settled, ["status", "cashout_multiplier", "win_amount", "cashed_out_at"]
+    )
+
+    WalletTransaction.objects.bulk_create([
+        WalletTransaction(
+            user_id=bet.user_id,
+            amount=bet.win_amount,
+            tx_type=WalletTransaction.CREDIT,
+            reference=f"AUTOCASHOUT-{bet.id}-{stamp}",
+            meta={
+                "reason": "crash_cashout",
+                "bet_id": bet.id,
+                "round_id": bet.round_id,
+                "auto_cashout": True,
+                "multiplier": str(bet.cashout_multiplier),
+            },
+        )
+        for bet in settled
+    ])
+
+    AuditLog.objects.bulk_create([
+        AuditLog(
+            user_id=bet.user_id,
+            action="CASHOUT",
+            details={
+                "bet_id": bet.id,
+                "payout": str(bet.win_amount),
+                "reference": f"AUTOCASHOUT-{bet.id}-{stamp}",
+            },
+        )
+        for bet in settled
+    ])
+
+    wins = [
+        (bet.user_id, bet.user.username, bet.win_amount, bet.cashout_multiplier, now)
+        for bet in settled
+        if not bet.is_demo
+    ]
+    if wins:
+        transaction.on_commit(lambda: record_wins("crash", wins))
+
+    return [
+        {
+            "bet_id": bet.id,
+            "user_id": bet.user_id,
+            "username": bet.user.username,
+            "payout": bet.win_amount,
+            "multiplier": bet.cashout_multiplier,
+            "wallet_balance": sum(balances[bet.user_id]) if bet.user_id in balances else None,
+        }
+        for bet in settled
+    ]
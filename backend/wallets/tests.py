@@ -1,3 +1,301 @@
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Sum
 from django.test import TestCase
+from django.utils import timezone
+
+from crash.redis_lock import shared_redis
+
+from . import balance_cache, ledger, reconciliation, services
+from .management.commands.backfill_transaction_status import CURSOR_KEY
+from .models import BalanceSnapshot, LedgerEntry, ReconciliationRun, Wallet, WalletDrift, WalletTransaction
+from .services import InsufficientFunds, credit_winnings, debit_stake, refund_stake
+
+
+def make_wallet(username, balance, spot_balance):
+    user = get_user_model().objects.create(username=username, email=f"{username}@example.com")
+    return Wallet.objects.create(user=user, balance=Decimal(balance), spot_balance=Decimal(spot_balance))
+
+
+class WalletServiceTests(TestCase):
+    def setUp(self):
+        self.wallet = make_wallet("wallet_tests", "100.00", "150.00")
+        self.user_id = self.wallet.user_id
+
+    def balances(self):
+        return Wallet.objects.values_list("balance", "spot_balance").get(user_id=self.user_id)
+
+    def test_stake_comes_out_of_wallet_balance_first(self):
+        update = debit_stake(self.user_id, Decimal("130.00"), game="test")
+
+        self.assertEqual(update.taken_from_wallet, Decimal("100.00"))
+        self.assertEqual(update.taken_from_spot, Decimal("30.00"))
+        self.assertEqual((update.balance, update.spot_balance), (Decimal("0.00"), Decimal("120.00")))
+        self.assertEqual(self.balances(), (Decimal("0.00"), Decimal("120.00")))
+
+    def test_insufficient_funds_leaves_the_wallet_alone(self):
+        with self.assertRaises(InsufficientFunds):
+            debit_stake(self.user_id, Decimal("250.01"), game="test")
+
+        self.assertEqual(self.balances(), (Decimal("100.00"), Decimal("150.00")))
+        self.assertFalse(LedgerEntry.objects.filter(user_id=self.user_id).exists())
+
+    def test_stake_is_split_again_when_the_wallet_changed_under_it(self):
+        real_update = services._update_wallet
+        calls = []
+
+        def update_after_concurrent_play(*args, **kwargs):
+            if not calls:
+                # Another play spends the wallet balance between the read and the UPDATE
+                Wallet.objects.filter(user_id=self.user_id).update(balance=Decimal("20.00"))
+            calls.append(args)
+            return real_update(*args, **kwargs)
+
+        with mock.patch.object(services, "_update_wallet", side_effect=update_after_concurrent_play):
+            update = debit_stake(self.user_id, Decimal("50.00"), game="test")
+
+        self.assertEqual(len(calls), 2)
+        self.assertEqual((update.taken_from_wallet, update.taken_from_spot), (Decimal("20.00"), Decimal("30.00")))
+        self.assertEqual(self.balances(), (Decimal("0.00"), Decimal("120.00")))
+
+    def test_busy_wallet_gives_up_after_the_retries(self):
+        with mock.patch.object(services, "_update_wallet", return_value=None) as update:
+            with self.assertRaisesMessage(ValueError, "Wallet is busy"):
+                debit_stake(self.user_id, Decimal("50.00"), game="test")
+
+        self.assertEqual(update.call_count, services.DEBIT_RETRIES)
+        self.assertEqual(self.balances(), (Decimal("100.00"), Decimal("150.00")))
+
+    def test_negative_payout_is_charged_to_spot_balance(self):
+        # A fishing penalty: the stake plus a charge on top
+        update = debit_stake(self.user_id, Decimal("40.00"), payout=Decimal("-25.00"), game="fishing")
+
+        self.assertEqual((update.balance, update.spot_balance), (Decimal("60.00"), Decimal("125.00")))
+        self.assertEqual(self.balances(), (Decimal("60.00"), Decimal("125.00")))
+        payout = LedgerEntry.objects.get(user_id=self.user_id, reason="payout", account=LedgerEntry.SPOT)
+        self.assertEqual(payout.amount, Decimal("-25.00"))
+
+    def test_ledger_postings_sum_to_zero(self):
+        update = debit_stake(self.user_id, Decimal("130.00"), payout=Decimal("60.00"), game="test", reference="R1")
+        credit_winnings(self.user_id, Decimal("15.50"), game="test", reference="R2")
+        refund_stake(self.user_id, update.taken_from_wallet, update.taken_from_spot, game="test", reference="R1")
+
+        entries = LedgerEntry.objects.filter(user_id=self.user_id)
+        self.assertEqual(entries.values("posting").distinct().count(), 4)
+        for posting in entries.values("posting").annotate(total=Sum("amount")):
+            self.assertEqual(posting["total"], Decimal("0.00"))
+
+        # And the user's accounts add up to the wallet
+        user_accounts = entries.filter(account__in=LedgerEntry.USER_ACCOUNTS).aggregate(total=Sum("amount"))
+        balance, spot_balance = self.balances()
+        self.assertEqual(Decimal("250.00") + user_accounts["total"], balance + spot_balance)
+
+    def test_new_balance_is_cached_with_its_ledger_version(self):
+        r = shared_redis()
+        r.delete(balance_cache.key(self.user_id))
+        self.addCleanup(r.delete, balance_cache.key(self.user_id))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            debit_stake(self.user_id, Decimal("30.00"), game="test")
+
+        cached = balance_cache.get(self.user_id)
+        newest = LedgerEntry.objects.filter(user_id=self.user_id).order_by("-id").first()
+        self.assertEqual((cached.balance, cached.spot_balance), (Decimal("70.00"), Decimal("150.00")))
+        self.assertEqual(cached.version, newest.id)
+
+    def test_balance_is_reloaded_where_bulk_insert_returns_no_ids(self):
+        r = shared_redis()
+        r.delete(balance_cache.key(self.user_id))
+        self.addCleanup(r.delete, balance_cache.key(self.user_id))
+
+        features = type(connection.features)
+        with mock.patch.object(features, "can_return_rows_from_bulk_insert", False):
+            with self.captureOnCommitCallbacks(execute=True):
+                debit_stake(self.user_id, Decimal("30.00"), game="test")
+
+        cached = balance_cache.get(self.user_id)
+        newest = LedgerEntry.objects.filter(user_id=self.user_id).order_by("-id").first()
+        self.assertEqual((cached.balance, cached.spot_balance), (Decimal("70.00"), Decimal("150.00")))
+        self.assertEqual(cached.version, newest.id)
+
+
+class BalanceCacheTests(TestCase):
+    def setUp(self):
+        self.r = shared_redis()
+        self.user_id = 987654321
+        self.r.delete(balance_cache.key(self.user_id))
+        self.addCleanup(self.r.delete, balance_cache.key(self.user_id))
+
+    def cached(self, version, balance):
+        return balance_cache.CachedBalance(
+            self.user_id, Decimal(balance), Decimal("0.00"), Decimal("0.00"), timezone.now(), version
+        )
+
+    def test_older_version_does_not_replace_a_newer_one(self):
+        balance_cache.store([self.cached(5, "50.00")], self.r)
+        balance_cache.store([self.cached(3, "30.00")], self.r)
+
+        self.assertEqual(self.r.hget(balance_cache.key(self.user_id), "version"), "5")
+        self.assertEqual(self.r.hget(balance_cache.key(self.user_id), "balance"), "50.00")
+
+    def test_newer_version_replaces_the_cached_one(self):
+        balance_cache.store([self.cached(5, "50.00")], self.r)
+        balance_cache.store([self.cached(6, "60.00")], self.r)
+
+        self.assertEqual(self.r.hget(balance_cache.key(self.user_id), "balance"), "60.00")
+
+
+class LedgerTests(TestCase):
+    def setUp(self):
+        self.wallet = make_wallet("ledger_tests", "100.00", "150.00")
+        self.user_id = self.wallet.user_id
+        ledger.open_balances([self.user_id])
+
+    def snapshot(self):
+        # Far enough ahead that every entry so far is past SNAPSHOT_LAG
+        return ledger.take_snapshots(now=timezone.now() + ledger.SNAPSHOT_LAG + timedelta(seconds=1))
+
+    def test_opening_posting_matches_the_wallet(self):
+        self.assertEqual(ledger.balance_at(self.user_id), (Decimal("100.00"), Decimal("150.00")))
+        # Opening a second time posts nothing
+        self.assertEqual(ledger.open_balances([self.user_id]), 0)
+
+    def test_posting_without_movement_writes_no_entries(self):
+        self.assertEqual(ledger.post(self.user_id, reason="noop"), [])
+
+    def test_balance_at_adds_entries_after_the_snapshot(self):
+        self.assertEqual(self.snapshot(), 1)
+        ledger.post(self.user_id, Decimal("-30.00"), Decimal("5.00"), reason="stake", game="test")
+
+        snapshot = BalanceSnapshot.objects.get(user_id=self.user_id)
+        self.assertEqual((snapshot.balance, snapshot.spot_balance), (Decimal("100.00"), Decimal("150.00")))
+        self.assertEqual(ledger.balance_at(self.user_id), (Decimal("70.00"), Decimal("155.00")))
+
+    def test_snapshots_only_cover_new_entries(self):
+        self.assertEqual(self.snapshot(), 1)
+        self.assertEqual(self.snapshot(), 0)
+
+        ledger.post(self.user_id, Decimal("-30.00"), reason="stake", game="test")
+        self.assertEqual(self.snapshot(), 1)
+        latest = BalanceSnapshot.objects.filter(user_id=self.user_id).order_by("-last_entry_id").first()
+        self.assertEqual((latest.balance, latest.spot_balance), (Decimal("70.00"), Decimal("150.00")))
+
+    def test_entries_younger_than_the_lag_are_left_out(self):
+        self.assertEqual(ledger.take_snapshots(), 0)
+        self.assertFalse(BalanceSnapshot.objects.exists())
+
+    def test_balance_at_an_earlier_moment(self):
+        ledger.post(self.user_id, Decimal("-30.00"), reason="stake", game="test")
+        between = timezone.now()
+        ledger.post(self.user_id, spot=Decimal("12.50"), reason="payout", game="test")
+
+        self.assertEqual(ledger.balance_at(self.user_id, between), (Decimal("70.00"), Decimal("150.00")))
+        self.assertEqual(ledger.balance_at(self.user_id), (Decimal("70.00"), Decimal("162.50")))
+
+    def test_statement_runs_the_balances_forward(self):
+        start = timezone.now()
+        ledger.post(self.user_id, Decimal("-30.00"), Decimal("-10.00"), reason="stake", game="test", reference="R1")
+        ledger.post(self.user_id, spot=Decimal("80.00"), reason="payout", game="test", reference="R1")
+
+        statement = ledger.statement(self.user_id, start)
+
+        self.assertEqual(statement["opening"], {"balance": Decimal("100.00"), "spot_balance": Decimal("150.00")})
+        self.assertEqual(
+            [(line["account"], line["amount"], line["balance"], line["spot_balance"]) for line in statement["lines"]],
+            [
+                (LedgerEntry.BALANCE, Decimal("-30.00"), Decimal("70.00"), Decimal("150.00")),
+                (LedgerEntry.SPOT, Decimal("-10.00"), Decimal("70.00"), Decimal("140.00")),
+                (LedgerEntry.SPOT, Decimal("80.00"), Decimal("70.00"), Decimal("220.00")),
+            ],
+        )
+        self.assertEqual(statement["closing"], {"balance": Decimal("70.00"), "spot_balance": Decimal("220.00")})
+
+
+class ReconciliationTests(TestCase):
+    def setUp(self):
+        self.clean = make_wallet("reconcile_clean", "100.00", "150.00")
+        self.drifted = make_wallet("reconcile_drifted", "40.00", "10.00")
+        ledger.open_balances([self.clean.user_id, self.drifted.user_id])
+        # Money that reached the wallet without a posting
+        Wallet.objects.filter(user_id=self.drifted.user_id).update(balance=Decimal("65.00"))
+        self.user_ids = [self.clean.user_id, self.drifted.user_id]
+
+    def test_only_drifted_wallets_come_back(self):
+        wallets = Wallet.objects.filter(user_id__in=self.user_ids)
+        drifted = list(ledger.drifted_wallets(wallets).values_list("user_id", "ledger_balance", "ledger_spot"))
+
+        self.assertEqual(drifted, [(self.drifted.user_id, Decimal("40.00"), Decimal("10.00"))])
+
+    def test_reconcile_reads_past_the_snapshot(self):
+        ledger.take_snapshots(now=timezone.now() + ledger.SNAPSHOT_LAG + timedelta(seconds=1))
+        ledger.post(self.clean.user_id, Decimal("-30.00"), reason="stake", game="test")
+        Wallet.objects.filter(user_id=self.clean.user_id).update(balance=Decimal("70.00"))
+
+        self.assertEqual(
+            list(ledger.reconcile(self.user_ids)),
+            [(self.drifted.user_id, (Decimal("65.00"), Decimal("10.00")), (Decimal("40.00"), Decimal("10.00")))],
+        )
+
+    def test_ranges_cover_every_wallet(self):
+        ranges = reconciliation.user_id_ranges(range_size=1)
+        low, high = ranges[0][0], ranges[-1][1]
+
+        self.assertEqual(len(ranges), high - low)
+        self.assertFalse(Wallet.objects.exclude(user_id__gte=low, user_id__lt=high).exists())
+
+    def test_range_worker_records_the_drift(self):
+        run = ReconciliationRun.objects.create()
+        low, high = min(self.user_ids), max(self.user_ids) + 1
+
+        # The worker closes its connection for the pool; the test's is still in a transaction
+        with mock.patch.object(reconciliation, "connection"):
+            result = reconciliation.reconcile_range((run.id, low, high, 1))
+
+        self.assertEqual(result, (low, high, 2, 1))
+        drift = WalletDrift.objects.get(run=run)
+        self.assertEqual(drift.user_id, self.drifted.user_id)
+        self.assertEqual(drift.difference, Decimal("25.00"))
+
+
+class TransactionStatusTests(TestCase):
+    def setUp(self):
+        self.user = make_wallet("status_tests", "0.00", "0.00").user
+
+    def transaction(self, reference, meta):
+        return WalletTransaction.objects.create(
+            user=self.user, amount=Decimal("10.00"), tx_type=WalletTransaction.CREDIT, reference=reference, meta=meta
+        )
+
+    def test_status_is_copied_from_meta_on_save(self):
+        tx = self.transaction("STATUS-1", {"status": WalletTransaction.PENDING})
+        self.assertEqual(tx.status, WalletTransaction.PENDING)
+
+        tx.meta["status"] = WalletTransaction.COMPLETED
+        tx.save(update_fields=["meta"])
+        tx.refresh_from_db()
+        self.assertEqual(tx.status, WalletTransaction.COMPLETED)
+
+        self.assertEqual(self.transaction("STATUS-2", {}).status, "")
+
+    def test_backfill_copies_status_of_older_rows(self):
+        r = shared_redis()
+        r.delete(CURSOR_KEY)
+        self.addCleanup(r.delete, CURSOR_KEY)
+        self.transaction("BACKFILL-1", {"status": WalletTransaction.FAILED})
+        self.transaction("BACKFILL-2", {"status": "x" * 30})
+        self.transaction("BACKFILL-3", {"type": "bonus"})
+        # Rows written before the column existed
+        WalletTransaction.objects.filter(user=self.user).update(status="")
+
+        call_command("backfill_transaction_status", "--chunk-size", "1", stdout=StringIO())
 
-# Create your tests here.
+        self.assertEqual(
+            dict(WalletTransaction.objects.filter(user=self.user).values_list("reference", "status")),
+            {"BACKFILL-1": WalletTransaction.FAILED, "BACKFILL-2": "x" * 20, "BACKFILL-3": ""},
+        )
@@ -12,14 +12,16 @@ from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.authentication import SessionAuthentication, TokenAuthentication
+from .. import balance_cache, ledger
 from ..models import (
     Wallet, WalletTransaction, WithdrawalRequest, 
-    AdminBank, DepositRequest, DepositLimit
+    AdminBank, DepositRequest, DepositLimit, LedgerEntry
 )
 from ..wallet import (
     FundWalletSerializer,
     WithdrawalSerializer,
     WalletSerializer,
+    WalletBalanceSerializer,
     WalletTransactionSerializer,
     DepositRequestSerializer,
 )
@@ -159,6 +161,11 @@ class WalletViewSet(viewsets.GenericViewSet):
     # ---------------------------------------------------
     @action(detail=False, methods=["get"])
     def balance(self, request):
+        # Polled by the balance widget: served from the balance cache unless
+        # the recent transactions are asked for (?transactions=1)
+        cached = balance_cache.get(request.user.id)
+        if cached is not None and not request.query_params.get("transactions"):
+            return Response(WalletBalanceSerializer(cached.as_wallet()).data)
         wallet, _ = Wallet.objects.get_or_create(user=request.user)
         return Response(self.get_serializer(wallet).data)
 
@@ -696,6 +703,10 @@ class WalletViewSet(viewsets.GenericViewSet):
             # 2. Deduct from spot balance
             wallet.spot_balance -= amount
             wallet.save()
+            ledger.post(
+                request.user.id, spot=-amount,
+                reason="withdrawal", reference=withdrawal_ref, counter=LedgerEntry.EXTERNAL,
+            )
 
             # 3. Create wallet transaction record
             wallet_transaction = WalletTransaction.objects.create(
@@ -8,7 +8,8 @@ from django.db import transaction as db_transaction
 from django.conf import settings
 from decimal import Decimal
 
-from ..models import Wallet, WalletTransaction
+from .. import ledger
+from ..models import LedgerEntry, Wallet, WalletTransaction
 
 logger = logging.getLogger(__name__)
 
@@ -72,12 +73,16 @@ def otpay_webhook(request):
             wallet.balance += half
             wallet.spot_balance += half
             wallet.save(update_fields=["balance", "spot_balance"])
+            ledger.post(
+                wallet_tx.user_id, half, half,
+                reason="deposit", reference=wallet_tx.reference, counter=LedgerEntry.EXTERNAL,
+            )
             
             # Check if first deposit
             has_previous = WalletTransaction.objects.filter(
                 user=wallet_tx.user,
                 tx_type=WalletTransaction.CREDIT,
-                meta__status="completed"
+                status=WalletTransaction.COMPLETED
             ).exclude(id=wallet_tx.id).exists()
             
             wallet_tx.first_deposit = not has_previous
@@ -229,6 +229,17 @@ class WalletSerializer(serializers.ModelSerializer):
         return WalletTransactionSerializer(transactions, many=True).data
 
 
+class WalletBalanceSerializer(WalletSerializer):
+    """WalletSerializer without the recent transactions: needs nothing from the database"""
+    transactions = None
+
+    class Meta(WalletSerializer.Meta):
+        fields = [
+            'balance', 'spot_balance', 'locked_balance',
+            'total_balance', 'available_balance', 'updated_at',
+        ]
+
+
 # ============= VALIDATION SERIALIZERS =============
 
 class ValidateDepositAmountSerializer(serializers.Serializer):
@@ -10,7 +10,8 @@ from django.db import transaction as db_transaction
 from django.utils import timezone
 from datetime import timedelta
 
-from .models import Wallet, WalletTransaction, UnmatchedWebhook
+from . import ledger
+from .models import LedgerEntry, Wallet, WalletTransaction, UnmatchedWebhook
 
 logger = logging.getLogger(__name__)
 
@@ -368,13 +369,17 @@ def otpay_webhook(request):
             wallet.balance += half_amount
             wallet.spot_balance += half_amount
             wallet.save()
+            ledger.post(
+                wallet_tx.user_id, half_amount, half_amount,
+                reason="deposit", reference=wallet_tx.reference, counter=LedgerEntry.EXTERNAL,
+            )
             logger.info(f"   - New balance: {wallet.balance}, new spot: {wallet.spot_balance}")
             
             # Check if this is first deposit
             has_previous = WalletTransaction.objects.filter(
                 user=wallet_tx.user,
                 tx_type=WalletTransaction.CREDIT,
-                meta__status='completed'
+                status=WalletTransaction.COMPLETED
             ).exclude(id=wallet_tx.id).exists()
             
             # Update transaction meta with status
@@ -5,7 +5,7 @@ from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from django.db import transaction
 from .models import WheelGame, WheelStats
-from accounts.models import User
+from wallets.services import InsufficientFunds, debit_stake
 
 # Wheel segments with multipliers (example: 8 segments)
 WHEEL_SEGMENTS = [0.5, 1, 2, 5, 10, 2, 1, 0.5]
@@ -20,25 +20,21 @@ def spin_wheel(request):
     except (TypeError, ValueError):
         return Response({'error': 'Invalid bet amount'}, status=status.HTTP_400_BAD_REQUEST)
     
+    # Spin the wheel
+    segment = random.randint(0, len(WHEEL_SEGMENTS) - 1)
+    multiplier = Decimal(str(WHEEL_SEGMENTS[segment]))
+    win_amount = bet_amount * multiplier
+    user = request.user
+
     try:
         with transaction.atomic():
-            user = User.objects.select_for_update().get(id=request.user.id)
-            
-            if user.balance < bet_amount:
+            # Deduct bet amount and add winnings
+            try:
+                wallet = debit_stake(user.id, bet_amount, payout=win_amount, game="wheel")
+            except InsufficientFunds:
                 return Response({'error': 'Insufficient balance'}, status=status.HTTP_400_BAD_REQUEST)
-            
-            # Deduct bet amount
-            user.balance -= bet_amount
-            user.save()
-            
-            # Spin the wheel
-            segment = random.randint(0, len(WHEEL_SEGMENTS) - 1)
-            multiplier = Decimal(str(WHEEL_SEGMENTS[segment]))
-            win_amount = bet_amount * multiplier
-            
-            # Add winnings
-            user.balance += win_amount
-            user.save()
+            except ValueError as e:
+                return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
             
             # Create game record
             game = WheelGame.objects.create(
@@ -60,7 +56,7 @@ def spin_wheel(request):
                 'segment': segment,
                 'multiplier': float(multiplier),
                 'win_amount': float(win_amount),
-                'new_balance': float(user.balance),
+                'new_balance': float(wallet.combined_balance),
                 'game_id': game.id
             })
             
@@ -15,6 +15,16 @@ import "./CrashGame.css";
 
 const MINIMUM_STAKE = 100;
 
+// Stable per-browser id; the server rate limits bets per device as well as per user
+function getDeviceFingerprint() {
+  let fp = localStorage.getItem("device_fp");
+  if (!fp) {
+    fp = window.crypto?.randomUUID?.() || `${Date.now()}-${Math.random().toString(36).slice(2)}`;
+    localStorage.setItem("device_fp", fp);
+  }
+  return fp;
+}
+
 export default function CrashGame({ user, onBalanceUpdate, mode = "real" }) {
   const navigate = useNavigate();
   const { wallet, loading: walletLoading, refreshWallet, availableBalance } = useWallet();
@@ -161,12 +171,10 @@ export default function CrashGame({ user, onBalanceUpdate, mode = "real" }) {
         console.log(`[CRASH] Round crashed at ${cp}x`);
       }
 
-      if (event === "player_bet") {
-        pushLiveBet(data);
-      }
-
-      if (event === "player_cashout") {
-        updateLiveCashout(data);
+      // Room bets and cashouts, batched by the engine (biggest first)
+      if (event === "player_feed") {
+        [...(data.bets || [])].reverse().forEach(pushLiveBet);
+        (data.cashouts || []).forEach(updateLiveCashout);
       }
 
       if (event === "bet_accepted") {
@@ -331,7 +339,7 @@ export default function CrashGame({ user, onBalanceUpdate, mode = "real" }) {
       data: {
         amount: numericBet.toString(),
         auto_cashout: useAuto ? autoCashout.toString() : null,
-        device_fp: "web-client"
+        device_fp: getDeviceFingerprint()
       }
     });
 